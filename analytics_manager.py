@@ -0,0 +1,307 @@
+import math
+import logging
+import threading
+from itertools import islice
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Iterable
+import numpy as np
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+
+QUANTILES = {'p50': 0.50, 'p95': 0.95, 'p99': 0.99}
+
+# Values at or below this are counted in the zero bin of a sketch
+MIN_SKETCH_VALUE = 1e-9
+
+class QuantileSketch:
+    """Mergeable streaming quantile sketch with bounded relative error.
+
+    Values are counted in logarithmic bins (as in DDSketch), so any
+    quantile is within ``relative_accuracy`` of the true value and memory
+    grows with the value range rather than the number of values.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def key(self, value: float) -> int:
+        """Get the bin index for a positive value."""
+        return math.ceil(math.log(value) / self.log_gamma)
+
+    def add(self, value: float, count: int = 1):
+        """Add a value to the sketch."""
+        if value is None:
+            return
+        if value <= MIN_SKETCH_VALUE:
+            self.zero_count += count
+        else:
+            k = self.key(value)
+            self.bins[k] = self.bins.get(k, 0) + count
+        self.count += count
+
+    def add_bins(self, keys: Iterable[int], counts: Iterable[int], zero_count: int = 0):
+        """Add pre-binned counts, as produced by a vectorized bulk load."""
+        for k, c in zip(keys, counts):
+            k, c = int(k), int(c)
+            self.bins[k] = self.bins.get(k, 0) + c
+            self.count += c
+        self.zero_count += zero_count
+        self.count += zero_count
+
+    def merge(self, other: 'QuantileSketch'):
+        """Merge another sketch with the same accuracy into this one."""
+        self.add_bins(other.bins.keys(), other.bins.values(), other.zero_count)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the q-quantile (0 <= q <= 1), or None if the sketch is empty."""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0.0
+        for k in sorted(self.bins):
+            seen += self.bins[k]
+            if seen > rank:
+                return 2 * self.gamma ** k / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+
+class Aggregate:
+    """Counts and latency/throughput sketches for one model and time bucket."""
+
+    def __init__(self, relative_accuracy: float):
+        self.count = 0
+        self.success = 0
+        self.duration = QuantileSketch(relative_accuracy)
+        self.tokens_per_second = QuantileSketch(relative_accuracy)
+
+    def add(self, success: bool, duration: Optional[float], tokens_per_second: Optional[float]):
+        self.count += 1
+        self.success += 1 if success else 0
+        self.duration.add(duration)
+        self.tokens_per_second.add(tokens_per_second)
+
+    def merge(self, other: 'Aggregate'):
+        self.count += other.count
+        self.success += other.success
+        self.duration.merge(other.duration)
+        self.tokens_per_second.merge(other.tokens_per_second)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'success_rate': self.success / self.count if self.count else None,
+            'duration': {name: self.duration.quantile(q) for name, q in QUANTILES.items()},
+            'tokens_per_second': {name: self.tokens_per_second.quantile(q) for name, q in QUANTILES.items()},
+        }
+
+
+class AnalyticsManager:
+    """Per-model and per-time-bucket analytics maintained as history is written.
+
+    Registered as a HistoryManager listener, so each new entry updates its
+    model total and its hourly bucket in O(1). Queries merge the stored
+    sketches and never read the history itself. ``rebuild`` recomputes
+    everything from a batch of entries with NumPy.
+    """
+
+    def __init__(self, bucket_seconds=None, max_buckets=None, relative_accuracy=None):
+        """Initialize the analytics manager.
+
+        Args:
+            bucket_seconds (int): Width of a time bucket in seconds
+            max_buckets (int): Number of most recent buckets kept per model
+            relative_accuracy (float): Relative error of the quantile sketches
+        """
+        self.bucket_seconds = bucket_seconds or Config.ANALYTICS_BUCKET_SECONDS
+        self.max_buckets = max_buckets or Config.ANALYTICS_MAX_BUCKETS
+        self.relative_accuracy = relative_accuracy or Config.ANALYTICS_RELATIVE_ACCURACY
+        self._lock = threading.Lock()
+        self._models: Dict[str, Aggregate] = {}
+        self._buckets: Dict[str, Dict[int, Aggregate]] = {}
+
+    @staticmethod
+    def _seconds(timestamp: str) -> float:
+        """Convert an ISO timestamp from history to seconds since the epoch."""
+        dt = datetime.fromisoformat(timestamp)
+        if dt.tzinfo is not None:
+            dt = dt.replace(tzinfo=None) - dt.utcoffset()
+        return (dt - EPOCH).total_seconds()
+
+    @staticmethod
+    def _valid_timestamp(timestamp) -> bool:
+        try:
+            np.datetime64(timestamp, 'us')
+            return True
+        except (TypeError, ValueError):
+            return False
+
+    def _bucket_start(self, seconds: float) -> int:
+        return int(seconds // self.bucket_seconds) * self.bucket_seconds
+
+    def _trim_buckets(self, model: str):
+        """Drop the oldest buckets of a model beyond max_buckets. Caller holds the lock."""
+        buckets = self._buckets.get(model, {})
+        while len(buckets) > self.max_buckets:
+            del buckets[min(buckets)]
+
+    def add_entry(self, entry: Dict[str, Any]):
+        """Update the aggregates with one history entry."""
+        model = entry.get('model') or 'unknown'
+        try:
+            start = self._bucket_start(self._seconds(entry['timestamp']))
+        except (KeyError, TypeError, ValueError):
+            logger.warning(f"Skipping history entry without a valid timestamp for model {model}")
+            return
+        args = (bool(entry.get('success')), entry.get('duration'), entry.get('tokens_per_second'))
+        with self._lock:
+            self._models.setdefault(model, Aggregate(self.relative_accuracy)).add(*args)
+            buckets = self._buckets.setdefault(model, {})
+            buckets.setdefault(start, Aggregate(self.relative_accuracy)).add(*args)
+            self._trim_buckets(model)
+
+    def clear(self):
+        """Discard all aggregates."""
+        with self._lock:
+            self._models = {}
+            self._buckets = {}
+
+    def rebuild(self, entries: Iterable[Dict[str, Any]], batch_size: int = None):
+        """Recompute all aggregates from history entries.
+
+        Entries are read in batches, so memory stays bounded by the batch
+        size and the kept buckets however long the history is. Binning and
+        grouping are done on NumPy arrays, so the Python-level work is
+        proportional to the number of distinct (model, bucket, bin)
+        combinations rather than the number of entries.
+
+        Args:
+            entries (iterable): History entries, read lazily
+            batch_size (int): Entries aggregated at a time
+        """
+        batch_size = batch_size or Config.HISTORY_BATCH_SIZE
+        entries = iter(entries)
+        models: Dict[str, Aggregate] = {}
+        buckets: Dict[str, Dict[int, Aggregate]] = {}
+        total = 0
+        while True:
+            rows = [(e.get('model') or 'unknown', e.get('timestamp'), bool(e.get('success')),
+                     e.get('duration'), e.get('tokens_per_second')) for e in islice(entries, batch_size)]
+            if not rows:
+                break
+            total += self._add_batch(rows, models, buckets)
+            # Older buckets cannot come back into the newest max_buckets, so memory stays bounded
+            for model_buckets in buckets.values():
+                while len(model_buckets) > self.max_buckets:
+                    del model_buckets[min(model_buckets)]
+
+        with self._lock:
+            self._models = models
+            self._buckets = buckets
+        logger.info(f'Rebuilt analytics from {total} history entries')
+
+    def _add_batch(self, rows, models: Dict[str, Aggregate], buckets: Dict[str, Dict[int, Aggregate]]) -> int:
+        """Add a batch of (model, timestamp, success, duration, tokens/s) rows to the aggregates.
+
+        Returns:
+            The number of rows with a valid timestamp, which were added
+        """
+        rows = [r for r in rows if r[1]]
+        try:
+            times = np.array([r[1] for r in rows], dtype='datetime64[us]')
+        except (TypeError, ValueError):
+            # Parse one by one only when the batch has a bad timestamp, skipping those rows like add_entry does
+            valid = [r for r in rows if self._valid_timestamp(r[1])]
+            logger.warning(f'Skipping {len(rows) - len(valid)} history entries without a valid timestamp')
+            rows = valid
+            times = np.array([r[1] for r in rows], dtype='datetime64[us]')
+        if not rows:
+            return 0
+        names, model_ids = np.unique([r[0] for r in rows], return_inverse=True)
+        times = times.astype('int64') / 1e6
+        starts = (times // self.bucket_seconds).astype(np.int64) * self.bucket_seconds
+        success = np.array([r[2] for r in rows], dtype=bool)
+        duration = np.array([np.nan if r[3] is None else r[3] for r in rows], dtype=float)
+        tps = np.array([np.nan if r[4] is None else r[4] for r in rows], dtype=float)
+        bucket_keys, bucket_ids = np.unique(np.stack([model_ids, starts], axis=1), axis=0, return_inverse=True)
+        bucket_ids = bucket_ids.reshape(-1)
+
+        model_aggs = [models.setdefault(name, Aggregate(self.relative_accuracy)) for name in names]
+        bucket_aggs = [buckets.setdefault(names[model_id], {}).setdefault(int(start), Aggregate(self.relative_accuracy))
+                       for model_id, start in bucket_keys]
+
+        for group_ids, aggs in ((model_ids, model_aggs), (bucket_ids, bucket_aggs)):
+            counts = np.bincount(group_ids, minlength=len(aggs))
+            successes = np.bincount(group_ids, weights=success, minlength=len(aggs))
+            for agg, c, s in zip(aggs, counts, successes):
+                agg.count += int(c)
+                agg.success += int(s)
+            self._bulk_sketch(group_ids, duration, aggs, 'duration')
+            self._bulk_sketch(group_ids, tps, aggs, 'tokens_per_second')
+        return len(rows)
+
+    def _bulk_sketch(self, group_ids, values, aggs, attr):
+        """Fill one sketch per group from a value array."""
+        valid = ~np.isnan(values)
+        groups, values = group_ids[valid], values[valid]
+        zero = values <= MIN_SKETCH_VALUE
+        log_gamma = getattr(aggs[0], attr).log_gamma if aggs else 1.0
+        zero_counts = np.bincount(groups[zero], minlength=len(aggs))
+        keys = np.ceil(np.log(values[~zero]) / log_gamma).astype(np.int64)
+        pairs, counts = np.unique(np.stack([groups[~zero], keys], axis=1), axis=0, return_counts=True)
+        for agg, zc in zip(aggs, zero_counts):
+            getattr(agg, attr).add_bins([], [], int(zc))
+        for (group, key), count in zip(pairs, counts):
+            getattr(aggs[group], attr).add_bins([key], [count])
+
+    def summary(self, model: str = None, since: datetime = None, resolution: int = None) -> Dict[str, Any]:
+        """Get per-model totals and a time series of buckets.
+
+        Args:
+            model (str): Only include this model
+            since (datetime): Only include buckets starting at or after this time
+            resolution (int): Merge buckets into windows of this many seconds,
+                a multiple of the bucket width
+
+        Returns:
+            Dictionary with 'models' (totals per model) and 'buckets'
+            (one row per model and time window, oldest first)
+        """
+        resolution = max(resolution or self.bucket_seconds, self.bucket_seconds)
+        since_seconds = (since - EPOCH).total_seconds() if since else None
+        with self._lock:
+            names = [model] if model else sorted(self._models)
+            totals = {}
+            rows = []
+            for name in names:
+                if name not in self._models:
+                    continue
+                if since_seconds is None:
+                    totals[name] = self._models[name].to_dict()
+                windows: Dict[int, Aggregate] = {}
+                for start, agg in self._buckets.get(name, {}).items():
+                    if since_seconds is not None and start < since_seconds:
+                        continue
+                    window = start // resolution * resolution
+                    windows.setdefault(window, Aggregate(self.relative_accuracy)).merge(agg)
+                for start in sorted(windows):
+                    row = windows[start].to_dict()
+                    row['model'] = name
+                    row['start'] = (EPOCH + timedelta(seconds=start)).isoformat()
+                    rows.append(row)
+                if since_seconds is not None and windows:
+                    total = Aggregate(self.relative_accuracy)
+                    for agg in windows.values():
+                        total.merge(agg)
+                    totals[name] = total.to_dict()
+        rows.sort(key=lambda r: (r['start'], r['model']))
+        return {'models': totals, 'buckets': rows, 'bucket_seconds': resolution}
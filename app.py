@@ -1,44 +1,65 @@
 import os
+import math
 import secrets
 import logging
+import threading
 import requests
 import base64
 import time
 import json
+from types import SimpleNamespace
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, jsonify, Response, session
-from flask_session import Session
+from functools import wraps
+from flask import (Flask, Blueprint, render_template, request, jsonify, Response, session, stream_with_context,
+                   send_file)
 from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import case, func, inspect, or_, select, update
+from contextlib import contextmanager
 from flask_wtf.csrf import CSRFProtect
 from prompt_manager import PromptManager
 from config import Config
-from history_manager import HistoryManager
+from history_manager import HistoryManager, GENERATION_KEY
 from fetch_manager import FetchManager
 from model_manager import ModelManager
+from log_manager import configure_logging, set_level, get_level, get_dropped, SAMPLED
+from conversation_manager import ConversationManager
+from budget_manager import BudgetManager, SUMMARY_PREFIX
+from model_metadata import ModelMetadataCache, parse_timestamp
+from library_catalog import LibraryCatalog
+from storage_manager import ModelStorageManager
+from cache_keys import images_hash
+from fair_scheduler import FairScheduler, SchedulerBusy
+from profile_manager import ProfileManager
+from model_benchmark import ModelBenchmark, BenchmarkStore, format_leaderboard
+from pull_queue import PullQueue
+from request_profiler import ProfileStore, SamplingProfiler, init_profiling
+from tracing import (Tracer, MemoryExporter, FileExporter, init_tracing, span, inject, current_span,
+                     format_waterfall)
+from startup import LazyObject, timed, startup_timings, startup_report
+from http_cache import init_http_cache, cached_json
+from history_export import EXPORT_COLUMNS, FORMATS as EXPORT_FORMATS, check_format, export_lines, read_entries
 
-# Configure logging
+# Configure logging through a background queue listener
+configure_logging()
 logger = logging.getLogger(__name__)
-handler = logging.StreamHandler()
-handler.setFormatter(logging.Formatter('%(levelname)s    %(name)s:%(filename)s:%(lineno)d %(message)s'))
-logger.addHandler(handler)
-
-# Initialize Flask app
-app = Flask(__name__)
-app.config.from_object(Config)
-app.wsgi_app = ProxyFix(app.wsgi_app)
-app.config['SESSION_PERMANENT'] = False
-app.config['SESSION_TYPE'] = 'filesystem'
-Session(app)
-
-# Ensure secret key is set
-if not app.secret_key:
-    app.secret_key = 'dev-secret-key-change-in-production'  # For development only
-
-# Initialize SQLAlchemy for sessions
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///sessions.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+
+# Log levels that can be selected at runtime
+DEBUG_LEVELS = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
+
+# Seconds an in-flight request stays registered, longer than the Ollama call timeout
+INFLIGHT_TTL = 60
+
+# Malformed records listed in a history import response
+IMPORT_ERRORS_SHOWN = 20
+
+# Seconds between progress events streamed for a queued pull
+PULL_EVENT_INTERVAL = 0.5
+
+# Extensions are bound to the app in create_app()
+db = SQLAlchemy()
+csrf = CSRFProtect()
+bp = Blueprint('main', __name__)
 
 # Session model
 class Session(db.Model):
@@ -46,9 +67,17 @@ class Session(db.Model):
     data = db.Column(db.String(1024))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Fair-share weight, rate limit token bucket and GPU time used in the current quota window
+    weight = db.Column(db.Float, default=1.0)
+    rate_tokens = db.Column(db.Float)
+    rate_updated = db.Column(db.Float)
+    gpu_seconds = db.Column(db.Float, default=0.0)
+    gpu_window_start = db.Column(db.Float)
+    gpu_total_seconds = db.Column(db.Float, default=0.0)
 
     @classmethod
     def get_or_create(cls, session_id=None):
+        ensure_tables()
         if not session_id:
             session_id = secrets.token_hex(32)
         sess = cls.query.get(session_id)
@@ -67,21 +96,552 @@ class Session(db.Model):
     def get_data(self):
         return self.data
 
-# Create tables
-with app.app_context():
-    db.create_all()
+    @classmethod
+    def take_token(cls, session_id, rate=None, burst=None, now=None):
+        """Take one request from a session's token bucket.
+
+        The bucket refills at rate requests per minute, up to burst. Refill
+        and take are one UPDATE, so concurrent requests in any worker cannot
+        overdraw it.
+
+        Returns:
+            0 if the request may go ahead, else seconds until a token is available
+        """
+        rate = (Config.RATE_LIMIT_PER_MINUTE if rate is None else rate) / 60
+        burst = Config.RATE_LIMIT_BURST if burst is None else burst
+        if rate <= 0:
+            return 0
+        now = time.time() if now is None else now
+        refilled = func.coalesce(cls.rate_tokens, burst) + (now - func.coalesce(cls.rate_updated, now)) * rate
+        level = case((refilled > burst, burst), else_=refilled)
+        result = db.session.execute(
+            update(cls).where(cls.id == session_id, level >= 1)
+            .values(rate_tokens=level - 1, rate_updated=now)
+            .execution_options(synchronize_session=False))
+        db.session.commit()
+        if result.rowcount:
+            return 0
+        tokens, updated = db.session.execute(
+            select(cls.rate_tokens, cls.rate_updated).where(cls.id == session_id)).one()
+        level = min(burst, (burst if tokens is None else tokens) + (now - (updated or now)) * rate)
+        return max((1 - level) / rate, 0.0)
+
+    @classmethod
+    def charge_gpu(cls, session_id, seconds, now=None):
+        """Add an Ollama call's GPU seconds to a session, starting a new quota window if the last one ended."""
+        now = time.time() if now is None else now
+        expired = or_(cls.gpu_window_start.is_(None), cls.gpu_window_start <= now - Config.GPU_QUOTA_WINDOW)
+        db.session.execute(
+            update(cls).where(cls.id == session_id).values(
+                gpu_seconds=case((expired, seconds), else_=func.coalesce(cls.gpu_seconds, 0) + seconds),
+                gpu_window_start=case((expired, now), else_=cls.gpu_window_start),
+                gpu_total_seconds=func.coalesce(cls.gpu_total_seconds, 0) + seconds)
+            .execution_options(synchronize_session=False))
+        db.session.commit()
+
+    def gpu_used(self, now=None):
+        """GPU seconds used in the current quota window."""
+        now = time.time() if now is None else now
+        if self.gpu_window_start is None or now - self.gpu_window_start >= Config.GPU_QUOTA_WINDOW:
+            return 0.0
+        return self.gpu_seconds or 0.0
+
+    def quota_retry_after(self, now=None):
+        """Seconds until the session's GPU quota window ends, 0 while it is within quota."""
+        now = time.time() if now is None else now
+        if Config.GPU_QUOTA_SECONDS <= 0 or self.gpu_used(now) < Config.GPU_QUOTA_SECONDS:
+            return 0
+        return self.gpu_window_start + Config.GPU_QUOTA_WINDOW - now
+
+    def quota(self, now=None):
+        """Report the session's weight, GPU time and quota."""
+        now = time.time() if now is None else now
+        used = self.gpu_used(now)
+        return {
+            'weight': self.weight or 1.0,
+            'gpu_seconds': round(used, 3),
+            'gpu_quota_seconds': Config.GPU_QUOTA_SECONDS or None,
+            'gpu_window_resets': self.gpu_window_start + Config.GPU_QUOTA_WINDOW if used else None,
+            'gpu_total_seconds': round(self.gpu_total_seconds or 0.0, 3),
+            'rate_limit_per_minute': Config.RATE_LIMIT_PER_MINUTE or None,
+        }
+
+_tables_ready = False
+_tables_lock = threading.Lock()
+
+def ensure_tables():
+    """Create the session tables on first use instead of at import."""
+    global _tables_ready
+    if _tables_ready:
+        return
+    with _tables_lock:
+        if not _tables_ready:
+            with timed('lazy:session_tables'):
+                db.create_all()
+                add_missing_columns(Session)
+                if db.engine.dialect.name == 'sqlite':
+                    # Let several worker processes read while one writes
+                    with db.engine.connect() as conn:
+                        conn.exec_driver_sql('PRAGMA journal_mode=WAL')
+            _tables_ready = True
+
+def add_missing_columns(model):
+    """Add columns a model gained since its table was created, which create_all() leaves out."""
+    table = model.__table__
+    existing = {column['name'] for column in inspect(db.engine).get_columns(table.name)}
+    missing = [column for column in table.columns if column.name not in existing]
+    if missing:
+        with db.engine.begin() as conn:
+            for column in missing:
+                conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} '
+                                     f'{column.type.compile(db.engine.dialect)}')
+        logger.info(f"Added columns to {table.name}: {', '.join(column.name for column in missing)}")
+
+def create_state_store():
+    """Create the store shared by all worker processes, see Config.STATE_URL."""
+    from state_store import create_state_store as create_store
+    return create_store(Config.STATE_URL)
+
+def create_embedding_manager():
+    """Create the embedding client; numpy is imported on first use."""
+    from embedding_manager import EmbeddingManager
+    return EmbeddingManager(fetch_manager)
+
+def create_vector_collections():
+    """Create the vector index collections."""
+    from vector_index import VectorCollections
+    return VectorCollections(store=state_store)
+
+def create_semantic_cache():
+    """Create the semantic answer cache."""
+    from semantic_cache import SemanticCache
+    return SemanticCache(embedding_manager, state_store,
+                         ready=lambda: model_metadata.get(Config.EMBED_MODEL) is not None)
+
+def create_history_services():
+    """Create the history manager, its search index and derived views.
+
+    These are created together because the listeners are seeded from the
+    index the history manager populates. numpy is imported here and in
+    the embedding and vector factories, on first use.
+    """
+    from history_index import HistoryIndex, IndexFollower
+    from analytics_manager import AnalyticsManager
+    from suggestion_manager import SuggestionManager
+
+    index = HistoryIndex(Config.HISTORY_INDEX_FILE)
+    manager = HistoryManager(Config.HISTORY_FILE, Config.MAX_HISTORY_ENTRIES, index=index, store=state_store)
+
+    # Analytics and suggestions start from the indexed history, then follow
+    # the index so they include entries written by other worker processes
+    analytics = AnalyticsManager()
+    suggestions = SuggestionManager(get_model_type)
+    follower = IndexFollower(index, [analytics, suggestions], lambda: state_store.get(GENERATION_KEY))
+    last_id = index.max_id()
+    analytics.rebuild(index.iter_entries(until_id=last_id))
+    suggestions.add_entries(index.iter_entries(columns=('timestamp', 'model', 'prompt', 'success'), until_id=last_id))
+    follower.start_at(last_id)
+
+    # Entries are embedded in the background once the embedding model is pulled
+    vectors = embedder = None
+    if Config.HISTORY_EMBEDDINGS:
+        from history_embedder import HistoryEmbedder, HISTORY_COLLECTION
+        vectors = vector_collections.get(HISTORY_COLLECTION, dtype='float16')
+        embedder = HistoryEmbedder(index, embedding_manager, vectors, store=state_store,
+                                   ready=lambda: model_metadata.get(Config.EMBED_MODEL) is not None)
+        manager.add_listener(embedder)
+        embedder.start()
+
+    return SimpleNamespace(index=index, manager=manager, analytics=analytics, suggestions=suggestions,
+                           follower=follower, vectors=vectors, embedder=embedder)
+
+def create_pull_queue():
+    """Create the pull queue and start this worker's dispatcher."""
+    # Room is made when a pull starts, not when it is queued, as it may wait for the window or a slot
+    queue = PullQueue(fetch_manager, prepare=lambda model: storage_manager.prepare_pull(model))
+    queue.start()
+    return queue
+
+def create_tracer():
+    """Create the request tracer with the exporters listed in TRACE_EXPORTER."""
+    exporters = []
+    for name in Config.TRACE_EXPORTER.split(','):
+        name = name.strip().lower()
+        if name == 'memory':
+            exporters.append(MemoryExporter())
+        elif name == 'file':
+            exporters.append(FileExporter())
+        elif name:
+            logger.warning(f"Unknown trace exporter: {name}")
+    return Tracer(exporters)
+
+_pulls_resumed = False
+
+def resume_pulls():
+    """Start the pull dispatcher on this worker's first request if pulls were ever queued, so a restart resumes them."""
+    global _pulls_resumed
+    if not _pulls_resumed:
+        _pulls_resumed = True
+        if os.path.exists(Config.PULL_QUEUE_FILE):
+            pull_queue.start()
+
+def sync_history():
+    """Bring this process's analytics and suggestions up to date with the shared index."""
+    try:
+        history_services.follower.sync()
+    except Exception as e:
+        logger.error(f"Error syncing history: {e}")
+
+# Managers are created on first use, separately in each worker process
+state_store = LazyObject(create_state_store, 'state_store')
+fetch_manager = LazyObject(lambda: FetchManager(Config.OLLAMA_HOST), 'fetch_manager')
+model_manager = LazyObject(ModelManager, 'model_manager')
+conversation_manager = LazyObject(lambda: ConversationManager(store=state_store), 'conversation_manager')
+model_metadata = LazyObject(lambda: ModelMetadataCache(fetch_manager, store=state_store), 'model_metadata')
+profile_manager = LazyObject(ProfileManager, 'profile_manager')
+budget_manager = LazyObject(lambda: BudgetManager(fetch_manager, metadata=model_metadata, profiles=profile_manager),
+                            'budget_manager')
+library_catalog = LazyObject(lambda: LibraryCatalog(fetch_manager, store=state_store), 'library_catalog')
+storage_manager = LazyObject(lambda: ModelStorageManager(fetch_manager, history_index, store=state_store,
+                                                         library_catalog=library_catalog),
+                             'storage_manager')
+embedding_manager = LazyObject(create_embedding_manager, 'embedding_manager')
+vector_collections = LazyObject(create_vector_collections, 'vector_collections')
+scheduler = LazyObject(FairScheduler, 'scheduler')
+semantic_cache = LazyObject(create_semantic_cache, 'semantic_cache')
+pull_queue = LazyObject(create_pull_queue, 'pull_queue')
+request_profiles = LazyObject(ProfileStore, 'request_profiles')
+sampling_profiler = LazyObject(SamplingProfiler, 'sampling_profiler')
+tracer = LazyObject(create_tracer, 'tracer')
+model_benchmark = LazyObject(lambda: ModelBenchmark(fetch_manager, BenchmarkStore(), state_store=state_store),
+                             'model_benchmark')
+history_services = LazyObject(create_history_services, 'history_services')
+history_index = LazyObject(lambda: history_services.index, 'history_index')
+history_manager = LazyObject(lambda: history_services.manager, 'history_manager')
+analytics_manager = LazyObject(lambda: history_services.analytics, 'analytics_manager')
+suggestion_manager = LazyObject(lambda: history_services.suggestions, 'suggestion_manager')
+
+# Ollama calls running in this process, by request id
+active_requests = {}
+
+class ActiveRequest:
+    """An in-flight Ollama call that /abort can cancel.
+
+    The request is also registered in the shared store, so an abort sent to
+    any worker reaches the worker running it.
+    """
+
+    def __init__(self, request_id, session_id, model):
+        self.request_id = request_id
+        self.session_id = session_id
+        self.model = model
+        self.aborted = threading.Event()
+
+    def close(self):
+        self.aborted.set()
+
+    def is_aborted(self):
+        return self.aborted.is_set() or state_store.get(f'abort:{self.request_id}') is not None
+
+@contextmanager
+def track_request(session_id, model):
+    """Register an Ollama call as in flight for its duration."""
+    handle = ActiveRequest(secrets.token_hex(8), session_id, model)
+    active_requests[handle.request_id] = handle
+    state_store.set(f'inflight:{handle.request_id}',
+                    {'pid': os.getpid(), 'session_id': session_id, 'model': model, 'started': time.time()},
+                    ttl=INFLIGHT_TTL)
+    try:
+        yield handle
+    finally:
+        active_requests.pop(handle.request_id, None)
+        state_store.delete(f'inflight:{handle.request_id}', f'abort:{handle.request_id}')
+
+def admin_required(f):
+    """Restrict a route to admins.
+
+    When ADMIN_TOKEN is set the request must send it in the X-Admin-Token
+    header; otherwise only requests made directly from the local machine
+    are allowed, not ones forwarded by a reverse proxy.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        error = admin_error()
+        if error:
+            return jsonify({'status': 'error', 'message': error}), 403
+        return f(*args, **kwargs)
+    return decorated
+
+def peer_address():
+    """Get the address of the connection's peer.
+
+    ProxyFix replaces remote_addr with the client-supplied X-Forwarded-For,
+    so the address the connection came from is read from the original
+    environ it saved.
+    """
+    original = request.environ.get('werkzeug.proxy_fix.orig') or {}
+    return original.get('REMOTE_ADDR', request.environ.get('REMOTE_ADDR'))
+
+def admin_error():
+    """Get why the current request is not an admin's, None for an admin."""
+    if Config.ADMIN_TOKEN:
+        if not secrets.compare_digest(request.headers.get('X-Admin-Token', ''), Config.ADMIN_TOKEN):
+            return 'Admin token required'
+    elif peer_address() not in ('127.0.0.1', '::1'):
+        return 'Admin routes are local-only without ADMIN_TOKEN'
+    elif 'X-Forwarded-For' in request.headers or 'Forwarded' in request.headers:
+        # Behind a proxy on this host every client connects from localhost
+        return 'Admin routes need ADMIN_TOKEN behind a proxy'
+    return None
+
+@bp.route('/admin/startup')
+@admin_required
+def admin_startup():
+    """Report startup and lazy initialization timings."""
+    lazies = {name: obj.initialized for name, obj in (
+        ('state_store', state_store),
+        ('fetch_manager', fetch_manager),
+        ('model_manager', model_manager),
+        ('conversation_manager', conversation_manager),
+        ('model_metadata', model_metadata),
+        ('profile_manager', profile_manager),
+        ('budget_manager', budget_manager),
+        ('library_catalog', library_catalog),
+        ('storage_manager', storage_manager),
+        ('embedding_manager', embedding_manager),
+        ('vector_collections', vector_collections),
+        ('scheduler', scheduler),
+        ('semantic_cache', semantic_cache),
+        ('model_benchmark', model_benchmark),
+        ('pull_queue', pull_queue),
+        ('request_profiles', request_profiles),
+        ('sampling_profiler', sampling_profiler),
+        ('tracer', tracer),
+        ('history_services', history_services),
+    )}
+    return jsonify({
+        'pid': os.getpid(),
+        'timings_ms': {phase: round(seconds * 1000, 2) for phase, seconds in startup_timings.items()},
+        'initialized': lazies
+    })
+
+@bp.route('/admin/log-level', methods=['GET', 'POST'])
+@csrf.exempt
+@admin_required
+def admin_log_level():
+    """Get or change the log level at runtime."""
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or request.form
+        level = (data.get('level') or '').upper()
+        if level not in DEBUG_LEVELS:
+            return jsonify({'status': 'error', 'message': f'Invalid level, expected one of {DEBUG_LEVELS}'}), 400
+        set_level(level)
+        logger.warning("Log level changed to %s", level)
+    return jsonify({'status': 'success', 'level': get_level(), 'levels': DEBUG_LEVELS,
+                    'dropped': get_dropped()})
+
+@bp.route('/admin/models/storage', methods=['GET', 'POST'])
+@csrf.exempt
+@admin_required
+def admin_model_storage():
+    """Report local model storage, or evict least recently used models over the budget.
+
+    GET only reports what would be evicted. POST evicts, unless dry_run is
+    set in the request or MODEL_EVICTION_DRY_RUN is on.
+    """
+    try:
+        if request.method == 'GET':
+            return jsonify(storage_manager.enforce(dry_run=True))
+        data = request.get_json(silent=True) or request.form
+        dry_run = data.get('dry_run', request.args.get('dry_run'))
+        if dry_run is not None:
+            dry_run = str(dry_run).lower() in ('true', '1', 't')
+        return jsonify(storage_manager.enforce(dry_run=dry_run))
+    except Exception as e:
+        logger.error(f"Error managing model storage: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/admin/profiles')
+@admin_required
+def admin_profiles():
+    """List the stored single request profiles, newest first."""
+    try:
+        return jsonify({'profiles': request_profiles.list()})
+    except Exception as e:
+        logger.error(f"Error listing profiles: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/admin/profiles/<profile_id>')
+@admin_required
+def admin_profile(profile_id):
+    """Download a request's cProfile file, or with format=text its top functions (sort, limit)."""
+    try:
+        path = request_profiles.path(profile_id)
+        if path is None:
+            return jsonify({'error': 'Profile not found'}), 404
+        if request.args.get('format') == 'text':
+            text = request_profiles.text(profile_id, sort=request.args.get('sort', 'cumulative'),
+                                         limit=request.args.get('limit', 40, type=int))
+            return Response(text, mimetype='text/plain')
+        return send_file(os.path.abspath(path), mimetype='application/octet-stream', as_attachment=True,
+                         download_name=f'{profile_id}.prof')
+    except KeyError as e:
+        return jsonify({'error': f'Invalid sort key: {e}'}), 400
+    except Exception as e:
+        logger.error(f"Error getting profile: {e}")
+        return jsonify({'error': str(e)}), 500
 
-# Initialize CSRF protection
-csrf = CSRFProtect(app)
+@bp.route('/admin/profiler', methods=['GET', 'DELETE'])
+@csrf.exempt
+@admin_required
+def admin_profiler():
+    """Get this worker's sampled stacks as folded lines for a flame graph, or its stats with format=json.
+
+    DELETE forgets the stacks counted so far.
+    """
+    if not Config.PROFILE_SAMPLING:
+        return jsonify({'error': 'Sampling profiler is off, set PROFILE_SAMPLING=1'}), 404
+    if request.method == 'DELETE':
+        sampling_profiler.reset()
+        return jsonify({'status': 'success'})
+    if request.args.get('format') == 'json':
+        return jsonify({'pid': os.getpid(), **sampling_profiler.stats(top=request.args.get('top', 20, type=int))})
+    return Response(sampling_profiler.folded(), mimetype='text/plain')
+
+@bp.route('/admin/traces', methods=['GET', 'DELETE'])
+@csrf.exempt
+@admin_required
+def admin_traces():
+    """Show this worker's slow traces, slowest first, and where each route's slowest requests spend their time.
 
-# Initialize fetch manager
-fetch_manager = FetchManager()
+    GET takes min_ms (default TRACE_SLOW_MS), route, limit and pct, the
+    percentile from which requests count in the breakdown (default 99),
+    and format=text for the traces as waterfalls. DELETE forgets the kept
+    traces.
+    """
+    exporter = tracer.exporter(MemoryExporter) if Config.TRACING else None
+    if exporter is None:
+        return jsonify({'error': 'In-memory tracing is off, set TRACING=1 and TRACE_EXPORTER=memory'}), 404
+    if request.method == 'DELETE':
+        exporter.clear()
+        return jsonify({'status': 'success'})
+    traces = exporter.slow(min_ms=request.args.get('min_ms', type=float), name=request.args.get('route') or None,
+                           limit=request.args.get('limit', 20, type=int))
+    if request.args.get('format') == 'text':
+        return Response('\n'.join(format_waterfall(trace) for trace in traces), mimetype='text/plain')
+    return jsonify({
+        'pid': os.getpid(),
+        'slow_ms': exporter.slow_ms,
+        'breakdown': exporter.breakdown(request.args.get('pct', 99, type=float)),
+        'traces': [trace.to_dict() for trace in traces]
+    })
 
-# Initialize model manager
-model_manager = ModelManager()
+@bp.route('/admin/traces/<trace_id>')
+@admin_required
+def admin_trace(trace_id):
+    """Get one of this worker's kept traces, as a waterfall with format=text or as OTLP/JSON with format=otlp."""
+    exporter = tracer.exporter(MemoryExporter) if Config.TRACING else None
+    trace = exporter.get(trace_id) if exporter is not None else None
+    if trace is None:
+        return jsonify({'error': 'Trace not found'}), 404
+    if request.args.get('format') == 'text':
+        return Response(format_waterfall(trace), mimetype='text/plain')
+    if request.args.get('format') == 'otlp':
+        return jsonify(trace.to_otlp())
+    return jsonify(trace.to_dict())
+
+@bp.route('/admin/scheduler')
+@admin_required
+def admin_scheduler():
+    """Report this worker's Ollama slots and the sessions running or waiting for them."""
+    return jsonify({'pid': os.getpid(), **scheduler.stats()})
+
+@bp.route('/admin/benchmarks', methods=['GET', 'POST'])
+@csrf.exempt
+@admin_required
+def admin_benchmarks():
+    """Show the model benchmark leaderboard, or start a benchmark run in the background.
+
+    GET takes workload and history (runs shown per model, default 5), and
+    format=text for a plain text table. POST takes the models and workloads
+    to run, all local models and workloads if not given.
+    """
+    try:
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            run_id = model_benchmark.start(data.get('models'), data.get('workloads'))
+            if run_id is None:
+                return jsonify({'error': 'A benchmark is already running', 'running': model_benchmark.running()}), 409
+            return jsonify({'run_id': run_id}), 202
+        rows = model_benchmark.store.leaderboard(request.args.get('workload') or None,
+                                                 history=request.args.get('history', 5, type=int))
+        if request.args.get('format') == 'text':
+            return Response(format_leaderboard(rows) + '\n', mimetype='text/plain')
+        return jsonify({'running': model_benchmark.running(), 'leaderboard': rows})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error running model benchmarks: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/admin/sessions/<session_id>/quota', methods=['GET', 'POST'])
+@csrf.exempt
+@admin_required
+def admin_session_quota(session_id):
+    """Get a session's quota, or set its fair-share weight and reset its GPU time with reset=1."""
+    try:
+        ensure_tables()
+        sess = Session.query.get(session_id)
+        if not sess:
+            return jsonify({'error': 'Session not found'}), 404
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or request.form
+            if 'weight' in data:
+                weight = float(data['weight'])
+                if weight <= 0:
+                    raise ValueError('weight must be positive')
+                sess.weight = weight
+            if str(data.get('reset', '')).lower() in ('true', '1', 't'):
+                sess.gpu_seconds = 0.0
+                sess.gpu_window_start = None
+            sess.updated_at = datetime.utcnow()
+            db.session.commit()
+            logger.info(f"Updated quota of session {session_id[:8]}: {sess.quota()}")
+        return jsonify(sess.quota())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error updating session quota: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/generation-profile')
+def api_generation_profile():
+    """Get the generation options used for a model and the bounds for per-request overrides."""
+    try:
+        model = request.args.get('model', '').strip()
+        if not model:
+            return jsonify({'error': 'No model specified'}), 400
+        return jsonify({'model': model, **profile_manager.resolve(model), 'bounds': profile_manager.bounds})
+    except Exception as e:
+        logger.error(f"Error getting generation profile: {e}")
+        return jsonify({'error': str(e)}), 500
 
 # Session handling routes
-@app.route('/api/select-model', methods=['POST'])
+@bp.route('/api/quota')
+def api_quota():
+    """Report the current session's GPU time, quota and rate limit."""
+    try:
+        session_id = request.cookies.get('session_id')
+        ensure_tables()
+        sess = Session.query.get(session_id) if session_id else None
+        if not sess:
+            return jsonify({'error': 'No session found'}), 400
+        return jsonify(sess.quota())
+    except Exception as e:
+        logger.error(f"Error getting quota: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/select-model', methods=['POST'])
 def api_select_model():
     """Select a model and store in session."""
     try:
@@ -104,7 +664,7 @@ def api_select_model():
         logger.error(f'Error in api_select_model: {e}')
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-@app.route('/api/current-model', methods=['GET'])
+@bp.route('/api/current-model', methods=['GET'])
 def get_current_model():
     """Get currently selected model from session."""
     try:
@@ -113,65 +673,100 @@ def get_current_model():
             sess = Session.query.get(session_id)
             if sess:
                 model = sess.get_data()
-                logger.info(f"Getting current model from session: {model}")
+                logger.debug("Getting current model from session: %s", model)
                 return jsonify({'model': model})
         return jsonify({'model': None})
     except Exception as e:
         logger.error(f"Error getting current model: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/pull-model', methods=['POST'])
+def pull_event(job):
+    """Progress event of a pull job, in the form the pull component shows."""
+    event = {'job': job['id'], 'model': job['model'], 'status': job['status'], 'detail': job['detail']}
+    if job['status'] == 'queued':
+        event['position'] = job['position']
+    elif job['status'] == 'running':
+        event.update(status='downloading', progress=job['progress'],
+                     completed_mb=round(job['completed'] / 1024 / 1024, 1),
+                     total_mb=round(job['total'] / 1024 / 1024, 1))
+    elif job['status'] == 'done':
+        event['progress'] = 100
+    else:
+        event['error'] = job['error'] or f"Pull {job['status']}"
+    return event
+
+@bp.route('/api/pull-model', methods=['POST'])
 @csrf.exempt
 def pull_model():
-    """Pull a model from Ollama library."""
+    """Queue a pull of a model from the Ollama library.
+
+    Streams the job's queue position and progress as server-sent events,
+    or with wait=false answers 202 with the job straight away.
+    """
     try:
         data = request.get_json()
         if not data or 'model' not in data:
             return jsonify({'error': 'No model specified'}), 400
 
         model_name = data['model']
-        logger.info(f"Starting model pull for {model_name}")
+        job = pull_queue.enqueue(model_name)
+        logger.info(f"Queued pull of {model_name} as job {job['id']} at position {job['position']}")
+        if str(data.get('wait', '1')).lower() in ('0', 'false', 'no'):
+            return jsonify(job), 202
 
         def generate():
-            # Send request to Ollama pull endpoint
-            response = requests.post(
-                f"{Config.OLLAMA_HOST}/api/pull",
-                json={"name": model_name},
-                stream=True
-            )
-            
-            for line in response.iter_lines():
-                if line:
-                    try:
-                        progress_data = json.loads(line)
-                        # Calculate progress percentage
-                        if 'total' in progress_data and progress_data['total'] > 0:
-                            completed = progress_data.get('completed', 0)
-                            total = progress_data['total']
-                            progress = int((completed / total) * 100)
-                            progress_data['progress'] = progress
-                            
-                            # Convert bytes to MB for display
-                            progress_data['completed_mb'] = round(completed / 1024 / 1024, 1)
-                            progress_data['total_mb'] = round(total / 1024 / 1024, 1)
-                        
-                        # Send progress update
-                        yield f"data: {json.dumps(progress_data)}\n\n"
-                        
-                        if progress_data.get('status') == 'success':
-                            logger.info(f"Successfully pulled model {model_name}")
-                            yield f"data: {json.dumps({'status': 'done', 'progress': 100})}\n\n"
-                            break
-                    except json.JSONDecodeError as e:
-                        logger.error(f"Error parsing progress data: {e}")
-                        continue
+            last = None
+            while True:
+                current = pull_queue.get(job['id'])
+                event = pull_event(current)
+                if event != last:
+                    yield f"data: {json.dumps(event)}\n\n"
+                    last = event
+                if current['status'] not in ('queued', 'running'):
+                    break
+                time.sleep(PULL_EVENT_INTERVAL)
 
         return Response(generate(), mimetype='text/event-stream')
     except Exception as e:
         logger.error(f"Error in pull_model: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/ollama-status')
+@bp.route('/api/pull-jobs')
+def pull_jobs():
+    """List running and queued pulls in queue order, then the latest finished ones."""
+    try:
+        return jsonify({'jobs': pull_queue.jobs(limit=min(request.args.get('limit', 20, type=int), 100))})
+    except Exception as e:
+        logger.error(f"Error listing pull jobs: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/pull-jobs/<int:job_id>')
+def pull_job(job_id):
+    """Get a pull job with its queue position."""
+    try:
+        job = pull_queue.get(job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(job)
+    except Exception as e:
+        logger.error(f"Error getting pull job: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/admin/pull-jobs/<int:job_id>', methods=['DELETE'])
+@csrf.exempt
+@admin_required
+def cancel_pull_job(job_id):
+    """Cancel a queued or running pull."""
+    try:
+        if not pull_queue.cancel(job_id):
+            return jsonify({'error': 'No queued or running job with this id'}), 404
+        logger.info(f"Cancelled pull job {job_id}")
+        return jsonify(pull_queue.get(job_id))
+    except Exception as e:
+        logger.error(f"Error cancelling pull job: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/ollama-status')
 def check_ollama_status():
     """Check if Ollama is running."""
     try:
@@ -181,77 +776,40 @@ def check_ollama_status():
         logger.error(f"Error checking Ollama status: {e}")
         return jsonify({'running': False})
 
-@app.route('/api/models')
+@bp.route('/api/models')
 def get_models_api():
-    """Get list of available models."""
+    """Get list of available models, answering 304 when unchanged."""
     try:
-        models = get_available_models()
-        return jsonify({'models': models})
+        data = get_models_data()
+        models = [model['name'] for model in data.get('models', [])]
+        modified = [m['modified_at'] for m in data.get('models', []) if m.get('modified_at')]
+        last_modified = max(map(parse_timestamp, modified)) if modified else None
+        return cached_json({'models': models}, last_modified=last_modified)
     except Exception as e:
         logger.error(f"Error getting models: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/library-models')
+@bp.route('/api/library-models')
 def get_library_models():
-    """Get list of available models from Ollama library."""
-    try:
-        # Common models that are available in Ollama
-        common_models = [
-            {
-                'name': 'llama2',
-                'description': 'Meta\'s Llama 2 LLM, fine-tuned for chat'
-            },
-            {
-                'name': 'llama2:13b',
-                'description': 'Meta\'s Llama 2 13B parameter variant'
-            },
-            {
-                'name': 'llama2:70b',
-                'description': 'Meta\'s Llama 2 70B parameter variant'
-            },
-            {
-                'name': 'codellama',
-                'description': 'Meta\'s Llama 2 model optimized for code completion and generation'
-            },
-            {
-                'name': 'mistral',
-                'description': 'Mistral AI\'s 7B parameter model with strong performance'
-            },
-            {
-                'name': 'mixtral',
-                'description': 'Mistral AI\'s Mixture of Experts model'
-            },
-            {
-                'name': 'dolphin-mixtral',
-                'description': 'Mixtral fine-tuned by Ehartford'
-            },
-            {
-                'name': 'neural-chat',
-                'description': 'Intel\'s neural chat model'
-            },
-            {
-                'name': 'starling-lm',
-                'description': 'Starling LM model fine-tuned on conversation data'
-            },
-            {
-                'name': 'openchat',
-                'description': 'OpenChat\'s model fine-tuned for conversation'
-            },
-            {
-                'name': 'phi',
-                'description': 'Microsoft\'s Phi model'
-            },
-            {
-                'name': 'orca-mini',
-                'description': 'Small but capable model based on Orca architecture'
-            }
-        ]
-        return jsonify({'models': common_models})
+    """Search the Ollama library catalog.
+
+    Query parameters: q (name, family or size prefixes), family, size,
+    capability and limit.
+    """
+    try:
+        models = library_catalog.search(request.args.get('q', ''),
+                                        family=request.args.get('family'),
+                                        size=request.args.get('size'),
+                                        capability=request.args.get('capability'))
+        limit = request.args.get('limit', type=int)
+        return cached_json({'models': models[:limit] if limit else models, 'total': len(models),
+                            'updated': library_catalog.updated.isoformat()},
+                           last_modified=library_catalog.updated, max_age=Config.LIBRARY_CACHE_MAX_AGE)
     except Exception as e:
         logger.error(f"Error getting library models: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/fetch/models', methods=['POST'])
+@bp.route('/fetch/models', methods=['POST'])
 @csrf.exempt
 def fetch_models():
     """Fetch list of available models."""
@@ -259,13 +817,13 @@ def fetch_models():
         models_data = fetch_manager.fetch_models_list()
         if models_data is None:
             return jsonify({'error': 'Failed to fetch models'}), 500
-        logger.info(f"Returning models data: {models_data}")
+        logger.debug("Returning %d models", len(models_data.get('models', [])))
         return jsonify(models_data)
     except Exception as e:
         logger.error(f"Error in fetch_models: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/analyze', methods=['POST'])
+@bp.route('/analyze', methods=['POST'])
 @csrf.exempt
 def analyze():
     """Analyze text using selected model."""
@@ -284,7 +842,7 @@ def analyze():
         if not session_id:
             return jsonify({'error': 'No session found'}), 400
             
-        sess = Session.query.get(session_id)
+        sess = find_session(session_id)
         if not sess:
             return jsonify({'error': 'No session found'}), 400
             
@@ -292,105 +850,780 @@ def analyze():
         if not model:
             return jsonify({'error': 'No model selected'}), 400
 
+        # Images as base64 strings in JSON, or an uploaded file in form data
+        images = list(data.get('images') or []) if request.is_json else []
+        upload = request.files.get('file')
+        if upload and upload.filename:
+            images.append(base64.b64encode(upload.read()).decode('ascii'))
+        with span('model.resolve', model=model):
+            error = check_capabilities(model, images=bool(images))
+            if error:
+                return jsonify({'error': error}), 400
+            try:
+                overrides = generation_overrides(data)
+                generation = profile_manager.resolve(model, overrides)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        # Answers to the same or a reworded prompt are served from the semantic cache,
+        # unless the request asks for its own generation options
+        use_cache = (Config.SEMANTIC_CACHE and not overrides
+                     and str(data.get('cache', '1')).lower() not in ('0', 'false', 'no'))
+        cache_key = images_hash(images) if use_cache else None
+        cached = lookup_cached_answer(model, data['prompt'], cache_key) if use_cache else None
+        if cached and cached['hit']:
+            hit = cached['hit']
+            logger.info("Serving cached answer for model %s (similarity %.3f)", model, hit['similarity'],
+                        extra=SAMPLED)
+            return jsonify({
+                'response': hit['response'],
+                'model': model,
+                'cached': {'prompt': hit['prompt'], 'similarity': hit['similarity'], 'created': hit['created']}
+            })
+
+        # Only requests that reach Ollama use up the rate limit
+        rejected = admit_request(sess)
+        if rejected:
+            return rejected
+
+        with span('prompt.resolve'):
+            prompt = budget_manager.fit_prompt(data['prompt'], model, generation['options'].get('num_ctx'))
+        logger.info("Analyzing prompt with model %s: %s", model, prompt, extra=SAMPLED)
+
+        start_time = time.time()
+        try:
+            with scheduler.slot(session_id, sess.weight) as ticket:
+                with track_request(session_id, model) as handle:
+                    payload = {
+                        'model': model,
+                        'prompt': prompt,
+                        'stream': False
+                    }
+                    if images:
+                        payload['images'] = images
+                    profile_manager.apply(payload, generation)
+                    response = post_ollama('/api/generate', payload)
+                    aborted = handle.is_aborted()
+                response.raise_for_status()
+                result = response.json()
+                trace_ollama_timings(result)
+                ticket.gpu_seconds = charge_gpu_time(session_id, result)
+        except requests.exceptions.RequestException as e:
+            record_history(model, data['prompt'], str(e), time.time() - start_time, False)
+            raise
+
+        if aborted:
+            record_history(model, data['prompt'], 'Aborted', time.time() - start_time, False)
+            return jsonify({'error': 'Analysis aborted'}), 409
+
+        record_history(model, data['prompt'], result.get('response', ''), time.time() - start_time, True,
+                       **ollama_metrics(result))
+        if use_cache and result.get('response'):
+            store_cached_answer(model, data['prompt'], result['response'], cache_key,
+                                cached['vector'] if cached else None)
+        with span('response.serialize'):
+            return jsonify({
+                'response': result.get('response', ''),
+                'model': model
+            })
+    except SchedulerBusy as e:
+        logger.warning(f"Analysis not scheduled: {e}")
+        return jsonify({'error': str(e)}), 503
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error calling Ollama API: {e}")
+        return jsonify({'error': 'Failed to connect to Ollama API'}), 500
+    except Exception as e:
+        logger.error(f"Error in analyze: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/abort', methods=['POST'])
+@csrf.exempt
+def abort():
+    """Abort the caller's in-flight Ollama calls, in this or any other worker process.
+
+    Only calls made for the caller's session are aborted. The Ollama call
+    itself runs to completion; its result is discarded and the waiting
+    request returns an error instead.
+    """
+    try:
+        session_id = request.cookies.get('session_id')
+        count = 0
+        for request_id, handle in list(active_requests.items()):
+            if session_id and handle.session_id == session_id and active_requests.pop(request_id, None):
+                handle.close()
+                state_store.delete(f'inflight:{request_id}')
+                count += 1
+        # Requests running in other workers see the abort flag when their call returns
+        for key in state_store.keys('inflight:') if session_id else []:
+            record = state_store.get(key)
+            if not isinstance(record, dict) or record.get('session_id') != session_id:
+                continue
+            request_id = key.split(':', 1)[1]
+            state_store.set(f'abort:{request_id}', True, ttl=INFLIGHT_TTL)
+            state_store.delete(key)
+            count += 1
+        if not count:
+            return jsonify({'status': 'error', 'message': 'No active request to abort'}), 404
+        logger.info(f"Aborted {count} in-flight request(s)")
+        return jsonify({'status': 'success', 'message': 'Analysis aborted'})
+    except Exception as e:
+        logger.error(f"Error in abort: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+def find_session(session_id):
+    """Look up a session by id, None if there is no such session."""
+    with span('session.lookup'):
+        return Session.query.get(session_id)
+
+def post_ollama(path, payload, timeout=30):
+    """Make a non-streaming call to the Ollama API, traced as ollama.call.
+
+    Its ollama.first_byte span lasts until the response headers arrive,
+    connecting included; Ollama sends them once generation is done. The
+    ollama.stream span covers reading the body. The trace context is
+    passed on in a traceparent header.
+    """
+    with span('ollama.call', kind='CLIENT', **{'http.url': path, 'model': payload.get('model')}) as call:
+        with span('ollama.first_byte'):
+            response = requests.post(f"{Config.OLLAMA_HOST}{path}", json=payload, timeout=timeout,
+                                     headers=inject(), stream=True)
+        call.set_attribute('http.status_code', response.status_code)
+        with span('ollama.stream'):
+            # Reads the whole body, so the connection goes back to the pool
+            response.content
+        return response
+
+def trace_ollama_timings(result):
+    """Add the time Ollama reports spending on loading, the prompt and generation to the current span."""
+    current_span().set_attributes({
+        f'ollama.{key}_ms': result[key] / 1e6
+        for key in ('total_duration', 'load_duration', 'prompt_eval_duration', 'eval_duration')
+        if isinstance(result.get(key), (int, float))
+    })
+
+def ollama_metrics(result):
+    """Extract throughput metrics from an Ollama generate/chat response."""
+    metrics = {}
+    eval_count = result.get('eval_count')
+    eval_duration = result.get('eval_duration')
+    if eval_count and eval_duration:
+        metrics['tokens_per_second'] = eval_count / (eval_duration / 1e9)
+    for key in ('eval_count', 'prompt_eval_count', 'total_duration'):
+        if result.get(key) is not None:
+            metrics[key] = result[key]
+    return metrics
+
+def record_history(model, prompt, result, duration, success, **metrics):
+    """Add an analysis to history without failing the request if the write fails."""
+    try:
+        with span('history.write', success=success):
+            history_manager.add_entry(model=model, prompt=prompt, result=result,
+                                      duration=duration, success=success, **metrics)
+    except Exception as e:
+        logger.error(f"Error recording history: {e}")
+
+def generation_overrides(data):
+    """Get a request's own generation options, from its JSON 'options' and 'keep_alive'."""
+    options = data.get('options') if request.is_json else None
+    if options is not None and not isinstance(options, dict):
+        raise ValueError('options must be an object')
+    overrides = dict(options or {})
+    if data.get('keep_alive') is not None:
+        overrides['keep_alive'] = data['keep_alive']
+    return overrides
+
+def admit_request(sess):
+    """Check a session's GPU quota and rate limit before it calls Ollama.
+
+    Returns:
+        None if the call may go ahead, else a 429 response with Retry-After
+    """
+    retry_after = sess.quota_retry_after()
+    message = 'GPU time quota used up'
+    if not retry_after:
+        retry_after = Session.take_token(sess.id)
+        message = 'Rate limit exceeded'
+    if not retry_after:
+        return None
+    retry_after = math.ceil(retry_after)
+    logger.info(f"{message} for session {sess.id[:8]}, retry after {retry_after}s")
+    response = jsonify({'error': message, 'retry_after': retry_after})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+def charge_gpu_time(session_id, result):
+    """Charge an Ollama call's total_duration to the session.
+
+    Returns:
+        The GPU seconds charged, None if Ollama did not report them
+    """
+    if not result.get('total_duration'):
+        return None
+    seconds = result['total_duration'] / 1e9
+    try:
+        Session.charge_gpu(session_id, seconds)
+    except Exception as e:
+        logger.error(f"Error charging GPU time: {e}")
+    return seconds
+
+def lookup_cached_answer(model, prompt, image_hash):
+    """Look up the semantic cache, treating any failure as a miss."""
+    try:
+        return semantic_cache.lookup(model, prompt, image_hash)
+    except Exception as e:
+        logger.error(f"Error looking up semantic cache: {e}")
+        return None
+
+def store_cached_answer(model, prompt, response, image_hash, vector):
+    """Add an answer to the semantic cache without failing the request if the write fails."""
+    try:
+        semantic_cache.store_answer(model, prompt, response, image_hash, vector=vector)
+    except Exception as e:
+        logger.error(f"Error storing answer in semantic cache: {e}")
+
+@bp.route('/chat', methods=['POST'])
+@csrf.exempt
+def chat():
+    """Continue the session's conversation using the selected model."""
+    try:
+        data = request.get_json() if request.is_json else request.form
+        if not data or 'prompt' not in data:
+            return jsonify({'error': 'No prompt provided'}), 400
+
+        session_id = request.cookies.get('session_id')
+        if not session_id:
+            return jsonify({'error': 'No session found'}), 400
+
+        sess = find_session(session_id)
+        if not sess:
+            return jsonify({'error': 'No session found'}), 400
+
+        model = sess.get_data()
+        if not model:
+            return jsonify({'error': 'No model selected'}), 400
+
+        with span('model.resolve', model=model):
+            error = check_capabilities(model)
+            if error:
+                return jsonify({'error': error}), 400
+            try:
+                generation = profile_manager.resolve(model, generation_overrides(data))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        rejected = admit_request(sess)
+        if rejected:
+            return rejected
+
         prompt = data['prompt']
-        logger.info(f"Analyzing prompt with model {model}: {prompt}")
+        with span('prompt.resolve'):
+            messages = conversation_manager.build_messages(session_id, model, prompt)
+            messages = fit_conversation(session_id, model, messages, generation['options'].get('num_ctx'))
+        logger.info("Chat turn %d with model %s", len(messages) // 2 + 1, model, extra=SAMPLED)
+
+        start_time = time.time()
+        try:
+            with scheduler.slot(session_id, sess.weight) as ticket:
+                with track_request(session_id, model) as handle:
+                    payload = profile_manager.apply({
+                        'model': model,
+                        'messages': messages,
+                        'stream': False
+                    }, generation)
+                    payload.setdefault('keep_alive', Config.CHAT_KEEP_ALIVE)
+                    response = post_ollama('/api/chat', payload)
+                    aborted = handle.is_aborted()
+                response.raise_for_status()
+                result = response.json()
+                trace_ollama_timings(result)
+                ticket.gpu_seconds = charge_gpu_time(session_id, result)
+        except requests.exceptions.RequestException as e:
+            record_history(model, prompt, str(e), time.time() - start_time, False)
+            raise
+
+        if aborted:
+            record_history(model, prompt, 'Aborted', time.time() - start_time, False)
+            return jsonify({'error': 'Chat aborted'}), 409
 
-        response = requests.post(
-            f"{Config.OLLAMA_HOST}/api/generate",
-            json={
+        content = result.get('message', {}).get('content', '')
+        conversation_manager.record_turn(session_id, model, prompt, content)
+        record_history(model, prompt, content, time.time() - start_time, True, **ollama_metrics(result))
+
+        messages = len(conversation_manager.get_messages(session_id))
+        with span('response.serialize'):
+            return jsonify({
+                'response': content,
                 'model': model,
-                'prompt': prompt,
-                'stream': False
-            },
-            timeout=30
-        )
-        response.raise_for_status()
-        result = response.json()
-        
-        return jsonify({
-            'response': result.get('response', ''),
-            'model': model
-        })
+                'messages': messages,
+                'prompt_eval_count': result.get('prompt_eval_count'),
+                'eval_count': result.get('eval_count')
+            })
+    except SchedulerBusy as e:
+        logger.warning(f"Chat turn not scheduled: {e}")
+        return jsonify({'error': str(e)}), 503
     except requests.exceptions.RequestException as e:
         logger.error(f"Error calling Ollama API: {e}")
         return jsonify({'error': 'Failed to connect to Ollama API'}), 500
     except Exception as e:
-        logger.error(f"Error in analyze: {e}")
+        logger.error(f"Error in chat: {e}")
+        return jsonify({'error': str(e)}), 500
+
+def fit_conversation(session_id, model, messages, num_ctx=None):
+    """Keep a conversation within the model's context, compacting old turns into a summary."""
+    kept, dropped = budget_manager.fit_messages(messages, model, num_ctx)
+    if not dropped:
+        return kept
+
+    summary = None
+    if Config.CONTEXT_SUMMARIZE:
+        previous = conversation_manager.get_summary(session_id, SUMMARY_PREFIX)
+        summary = budget_manager.summarize(model, dropped, previous)
+    logger.info(f"Compacting {len(dropped)} messages for model {model} (summary: {summary is not None})")
+    conversation_manager.compact(session_id, model, len(dropped), summary, SUMMARY_PREFIX)
+
+    messages = conversation_manager.build_messages(session_id, model, messages[-1]['content'])
+    kept, _ = budget_manager.fit_messages(messages, model, num_ctx)
+    return kept
+
+@bp.route('/chat/history', methods=['GET'])
+def chat_history():
+    """Get the messages in the session's conversation."""
+    session_id = request.cookies.get('session_id')
+    if not session_id:
+        return jsonify({'model': None, 'messages': []})
+    return jsonify({
+        'model': conversation_manager.get_model(session_id),
+        'messages': conversation_manager.get_messages(session_id)
+    })
+
+@bp.route('/chat/reset', methods=['POST'])
+@csrf.exempt
+def chat_reset():
+    """Discard the session's conversation."""
+    session_id = request.cookies.get('session_id')
+    if session_id:
+        conversation_manager.reset(session_id)
+    return jsonify({'status': 'success'})
+
+@bp.route('/embed', methods=['POST'])
+@csrf.exempt
+def embed():
+    """Embed many texts, optionally adding them to a vector collection.
+
+    JSON body: input (text or list of texts), model, collection, ids and
+    return_embeddings. Embeddings are returned unless a collection is given.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        texts = data.get('input', data.get('texts'))
+        if isinstance(texts, str):
+            texts = [texts]
+        if not texts or not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+            return jsonify({'error': 'input must be a text or a list of texts'}), 400
+        if len(texts) > Config.EMBED_MAX_TEXTS:
+            return jsonify({'error': f'At most {Config.EMBED_MAX_TEXTS} texts per request'}), 400
+        name = data.get('collection')
+        index = vector_collections.get(name) if name else None
+        ids = data.get('ids')
+        if ids is not None and (not isinstance(ids, list) or len(ids) != len(texts)):
+            return jsonify({'error': 'ids must be a list with one id per text'}), 400
+
+        model = embedding_model(data, index)
+        vectors = embedding_manager.embed(texts, model)
+        result = {'model': model, 'count': len(vectors), 'dimensions': vectors.shape[1]}
+        if index is not None:
+            result['collection'] = name
+            result['ids'] = index.add(ids, vectors, model=model)
+        if data.get('return_embeddings', index is None):
+            result['embeddings'] = vectors.tolist()
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error embedding texts: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/embed/search', methods=['POST'])
+@csrf.exempt
+def embed_search():
+    """Find the texts in a collection most similar to one or more queries.
+
+    JSON body: query (text or list of texts), collection, k, probes and model.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        queries = data.get('query')
+        single = isinstance(queries, str)
+        if single:
+            queries = [queries]
+        if not queries or not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+            return jsonify({'error': 'query must be a text or a list of texts'}), 400
+        k = max(1, min(int(data.get('k', 10)), 1000))
+        index = vector_collections.get(data.get('collection') or 'default')
+        if index.count == 0:
+            return jsonify({'error': f'Collection {index.name} is empty'}), 404
+
+        model = embedding_model(data, index)
+        matches = index.search(embedding_manager.embed(queries, model), k=k, probes=data.get('probes'))
+        results = [[{'id': id, 'score': round(score, 6)} for id, score in row] for row in matches]
+        return jsonify({'model': model, 'collection': index.name, 'results': results[0] if single else results})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error searching embeddings: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/admin/semantic-cache', methods=['GET', 'DELETE'])
+@csrf.exempt
+@admin_required
+def admin_semantic_cache():
+    """Report semantic cache hit rate and lookup latency, or drop every cached answer."""
+    try:
+        if request.method == 'DELETE':
+            return jsonify({'status': 'success', 'cleared': semantic_cache.clear()})
+        return jsonify({'enabled': Config.SEMANTIC_CACHE, **semantic_cache.stats()})
+    except Exception as e:
+        logger.error(f"Error in semantic cache admin: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/')
+@bp.route('/admin/vectors', methods=['GET'])
+@admin_required
+def admin_vectors():
+    """List vector collections with their size, model and search mode."""
+    return jsonify({name: vector_collections.get(name).info() for name in vector_collections.names()})
+
+@bp.route('/admin/vectors/<name>/train', methods=['POST'])
+@csrf.exempt
+@admin_required
+def admin_vectors_train(name):
+    """Build the IVF lists of a collection, or go back to exact search with lists=0."""
+    try:
+        index = vector_collections.get(name)
+        data = request.get_json(silent=True) or request.form
+        lists = int(data.get('lists', round(index.count ** 0.5)))
+        return jsonify({'collection': name, 'lists': index.train(lists), 'count': index.count})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error training vector index {name}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/history/search')
+def search_history():
+    """Full-text search over history prompts, results and models."""
+    try:
+        query = request.args.get('q', '')
+        model = request.args.get('model') or None
+        page = request.args.get('page', 1, type=int)
+        per_page = request.args.get('per_page', 20, type=int)
+        return jsonify(history_index.search(query, model=model, page=page, per_page=per_page))
+    except Exception as e:
+        logger.error(f"Error searching history: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/history/similar')
+def similar_history():
+    """Find history entries similar in meaning to an entry (id) or a text (q)."""
+    try:
+        vectors = history_services.vectors
+        if vectors is None:
+            return jsonify({'error': 'History embeddings are disabled'}), 404
+        k = max(1, min(request.args.get('k', 10, type=int), 100))
+        model = request.args.get('model') or None
+        entry_id = request.args.get('id', type=int)
+        if entry_id is not None:
+            query = vectors.vector(entry_id)
+            if query is None:
+                return jsonify({'error': 'Entry not found or not embedded yet'}), 404
+        else:
+            text = request.args.get('q', '').strip()
+            if not text:
+                return jsonify({'error': 'Give an entry id or a q text'}), 400
+            if vectors.count == 0:
+                return jsonify({'results': [], 'embedded': 0})
+            query = embedding_manager.embed([text], vectors.model)[0]
+
+        # Fetch extra matches to leave enough after removing the entry itself and other models
+        matches = vectors.search(query, k=k * 5 if model else k + 1)[0]
+        summaries = history_index.get_summaries([id for id, _ in matches])
+        results = [dict(summaries[id], score=round(score, 6)) for id, score in matches
+                   if id != entry_id and id in summaries and (not model or summaries[id]['model'] == model)]
+        return jsonify({'results': results[:k], 'embedded': vectors.count})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error finding similar history: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/history/entry/<int:entry_id>')
+def get_history_entry(entry_id):
+    """Get a full history entry found through search."""
+    entry = history_index.get_entry(entry_id)
+    if entry is None:
+        return jsonify({'error': 'Entry not found'}), 404
+    return jsonify(entry)
+
+def parse_date_arg(name):
+    """Get an optional ISO date/time query argument, raising ValueError if malformed."""
+    value = request.args.get(name) or None
+    if value is not None:
+        datetime.fromisoformat(value)
+    return value
+
+@bp.route('/history/export')
+def export_history():
+    """Stream all indexed history as NDJSON or CSV, optionally filtered by model and date."""
+    try:
+        fmt = check_format(request.args.get('format'))
+        entries = history_index.iter_entries(EXPORT_COLUMNS[1:], batch_size=Config.HISTORY_BATCH_SIZE,
+                                             model=request.args.get('model') or None,
+                                             since=parse_date_arg('since'), until=parse_date_arg('until'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error exporting history: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    response = Response(stream_with_context(export_lines(entries, fmt)), mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename=history.{fmt}'
+    return response
+
+@bp.route('/history/import', methods=['POST'])
+@csrf.exempt
+@admin_required
+def import_history():
+    """Bulk import history from an NDJSON or CSV export, as an upload or the raw request body."""
+    try:
+        fmt = request.args.get('format')
+        if request.mimetype == 'multipart/form-data':
+            upload = request.files.get('file')
+            if upload is None:
+                return jsonify({'error': 'No file provided'}), 400
+            stream = upload.stream
+            fmt = fmt or os.path.splitext(upload.filename or '')[1].lstrip('.') or None
+        else:
+            stream = request.stream
+            fmt = fmt or ('csv' if request.mimetype == 'text/csv' else 'ndjson')
+        fmt = check_format(fmt)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Count every malformed record but only report the first few
+    skipped = {'count': 0, 'errors': []}
+    def on_error(line, message):
+        skipped['count'] += 1
+        if len(skipped['errors']) < IMPORT_ERRORS_SHOWN:
+            skipped['errors'].append({'line': line, 'error': message})
+
+    try:
+        count = history_manager.import_entries(read_entries(stream, fmt, on_error))
+        if skipped['count']:
+            logger.warning(f"Skipped {skipped['count']} malformed records during history import")
+        return jsonify({'status': 'success', 'imported': count, 'skipped': skipped['count'],
+                        'errors': skipped['errors']})
+    except Exception as e:
+        logger.error(f"Error importing history: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/clear_history', methods=['POST'])
+def clear_history():
+    """Clear the analysis history."""
+    try:
+        history_manager.clear_history()
+        return jsonify({'status': 'success'})
+    except Exception as e:
+        logger.error(f"Error clearing history: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/analytics')
+def get_analytics():
+    """Per-model counts, success rate and latency/throughput percentiles."""
+    try:
+        model = request.args.get('model') or None
+        since = request.args.get('since')
+        since = datetime.fromisoformat(since) if since else None
+        resolution = request.args.get('resolution', type=int)
+        sync_history()
+        return jsonify(analytics_manager.summary(model=model, since=since, resolution=resolution))
+    except ValueError as e:
+        return jsonify({'error': f'Invalid parameter: {e}'}), 400
+    except Exception as e:
+        logger.error(f"Error getting analytics: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/prompt-suggestions')
+def get_prompt_suggestions():
+    """Get history-ranked prompt suggestions for a model."""
+    try:
+        model_type = get_model_type(request.args.get('model', ''))
+        limit = request.args.get('limit', Config.SUGGESTION_LIMIT, type=int)
+        prompt_manager = PromptManager.load_prompts(model_type)
+        sync_history()
+        return jsonify({
+            'model_type': model_type,
+            'default_prompt': prompt_manager.get_default_prompt(),
+            'suggestions': suggestion_manager.get_suggestions(
+                model_type, prompt_manager.get_prompt_suggestions(), limit=limit)
+        })
+    except Exception as e:
+        logger.error(f"Error getting prompt suggestions: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/api/prompt-autocomplete')
+def prompt_autocomplete():
+    """Complete a prompt prefix from history and configured suggestions."""
+    try:
+        model_type = get_model_type(request.args.get('model', ''))
+        prefix = request.args.get('prefix', '')
+        limit = min(request.args.get('limit', 10, type=int), 50)
+        prompt_manager = PromptManager.load_prompts(model_type)
+        sync_history()
+        return jsonify({
+            'model_type': model_type,
+            'completions': suggestion_manager.autocomplete(
+                model_type, prefix, prompt_manager.get_prompt_suggestions(), limit=limit)
+        })
+    except Exception as e:
+        logger.error(f"Error completing prompt: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/')
 def index():
     models = get_available_models()
     history = history_manager.load_history()
 
     # Determine model type based on selected model
     model = request.args.get('model', models[0] if models else '')
-    model_type = 'vision' if 'llava' in model else 'text'
+    model_type = get_model_type(model)
     
     # Load prompts using PromptManager
     prompt_manager = PromptManager.load_prompts(model_type)
+    sync_history()
     
     return render_template('index.html',
                          models=models,
                          model=model,
                          history=history,
                          default_prompt=prompt_manager.get_default_prompt(),
-                         prompt_suggestions=prompt_manager.get_prompt_suggestions(),
-                         prompts=load_prompts())
+                         prompt_suggestions=suggestion_manager.get_suggestions(
+                             model_type, prompt_manager.get_prompt_suggestions()))
 
-# ... rest of the code remains the same ...
+def get_model_type(model):
+    """Get the prompt set ('vision' or 'text') for a model from its cached capabilities."""
+    return model_metadata.model_type(model)
 
-def get_available_models():
-    """Get list of available models from Ollama API."""
+def update_model_metadata(models):
+    """Start caching metadata for new models in the list, without failing the caller."""
+    try:
+        model_metadata.update_models(models)
+    except Exception as e:
+        logger.error(f"Error updating model metadata: {e}")
+
+def check_capabilities(model, images=False):
+    """Check a request against the model's cached capabilities.
+
+    Models whose metadata is not cached yet are let through, Ollama will
+    report the error itself.
+
+    Returns:
+        An error message, or None when the request can go ahead
+    """
+    if model_metadata.supports(model, 'completion') is False:
+        return f'Model {model} does not support text generation'
+    if images and model_metadata.supports(model, 'vision') is False:
+        return f'Model {model} does not support images'
+    return None
+
+def embedding_model(data, index=None):
+    """Pick the embedding model for a request.
+
+    The request's model, else the model the collection was built with, else
+    the selected model when it is an embedding model, else EMBED_MODEL.
+    """
+    if data.get('model'):
+        return data['model']
+    if index is not None and index.model:
+        return index.model
+    session_id = request.cookies.get('session_id')
+    sess = Session.query.get(session_id) if session_id else None
+    model = sess.get_data() if sess else None
+    if model and model_metadata.supports(model, 'embedding'):
+        return model
+    return Config.EMBED_MODEL
+
+def get_models_data():
+    """Get the local model list from the Ollama API, empty on failure."""
     try:
         response = requests.get(f"{Config.OLLAMA_HOST}/api/tags")
         if response.status_code == 200:
             data = response.json()
-            # Extract model names from the 'models' list, which contains objects with 'name' field
-            return [model['name'] for model in data.get('models', [])]
+            update_model_metadata(data.get('models', []))
+            return data
         logger.error(f"Failed to get models: {response.status_code}")
-        return []
+        return {}
     except Exception as e:
         logger.error(f"Error getting models: {e}")
-        return []
+        return {}
 
-def load_prompts():
-    """Load prompts from JSON file."""
-    try:
-        with open('prompts.json', 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"Error loading prompts.json: {e}")
-        return {
-            'vision_models': {
-                'default': 'What do you see in this image?',
-                'suggestions': [
-                    'What do you see in this image?',
-                    'Describe this image in detail',
-                    'What objects are present in this image?',
-                    'Analyze the composition of this image',
-                    'What is the main subject of this image?'
-                ]
-            },
-            'text_models': {
-                'default': 'How can I help you today?',
-                'suggestions': [
-                    'How can I help you today?',
-                    'Tell me about yourself',
-                    'What can you do?',
-                    'Help me with a task',
-                    'Give me some information'
-                ]
-            }
-        }
+def get_available_models():
+    """Get list of available models from Ollama API."""
+    # Extract model names from the 'models' list, which contains objects with 'name' field
+    return [model['name'] for model in get_models_data().get('models', [])]
+
+def create_app(config_object=Config):
+    """Create and configure the Flask application.
+
+    Only configuration, extensions and routes are set up here. Managers,
+    the history index and the session tables are created on first use, so
+    pre-forked workers boot quickly and build their own connections.
+    """
+    with timed('create_app'):
+        with timed('config'):
+            flask_app = Flask(__name__)
+            flask_app.config.from_object(config_object)
+            config_object.init_app(flask_app)
+            flask_app.wsgi_app = ProxyFix(flask_app.wsgi_app)
+            flask_app.config['SESSION_PERMANENT'] = False
+
+            # Ensure secret key is set
+            if not flask_app.secret_key:
+                flask_app.secret_key = 'dev-secret-key-change-in-production'  # For development only
+
+            # SQLAlchemy for sessions
+            flask_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///sessions.db'
+            flask_app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+            flask_app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
+
+        with timed('extensions'):
+            # Server-side sessions live in the shared store, so any worker can serve any request
+            from state_store import StoreSessionInterface
+            flask_app.session_interface = StoreSessionInterface(flask_app, state_store)
+            db.init_app(flask_app)
+            csrf.init_app(flask_app)
+
+        with timed('routes'):
+            flask_app.register_blueprint(bp)
+            init_http_cache(flask_app)
+            # Registered first, so profiles include the other hooks
+            init_profiling(flask_app, lambda: request_profiles, lambda: sampling_profiler, lambda: admin_error() is None)
+            init_tracing(flask_app, lambda: tracer)
+            flask_app.before_request(ensure_tables)
+            flask_app.before_request(resume_pulls)
+
+    if hasattr(os, 'register_at_fork'):
+        def dispose_engines():
+            # Pooled SQLite connections must not be shared with the parent
+            with flask_app.app_context():
+                for engine in db.engines.values():
+                    engine.dispose(close=False)
+        os.register_at_fork(after_in_child=dispose_engines)
+
+    logger.info(f"Application created:\n{startup_report()}")
+    return flask_app
 
-# Initialize history manager
-history_manager = HistoryManager(Config.HISTORY_FILE, Config.MAX_HISTORY_ENTRIES)
+app = create_app()
 
 if __name__ == '__main__':
     # Set logging level from environment
-    log_level = os.getenv('LOG_LEVEL', 'INFO')
-    logger.setLevel(log_level)
+    set_level(os.getenv('LOG_LEVEL', Config.LOG_LEVEL))
     
     # Get port from Config, which reads from .env
     port = int(os.getenv('FLASK_PORT', Config.PORT))
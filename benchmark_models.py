@@ -0,0 +1,52 @@
+import argparse
+import logging
+import os
+import sys
+
+
+def main(argv=None):
+    """Run the fixed workloads against local Ollama models and print the leaderboard"""
+    sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+    import requests
+    from config import Config
+    from fetch_manager import FetchManager
+    from model_benchmark import ModelBenchmark, BenchmarkStore, WORKLOADS, format_leaderboard
+
+    parser = argparse.ArgumentParser(description='Benchmark model throughput on this machine')
+    parser.add_argument('-m', dest='models', action='append',
+                        help='Only benchmark this model (repeatable)')
+    parser.add_argument('-w', dest='workloads', action='append', choices=sorted(WORKLOADS),
+                        help='Only run this workload (repeatable)')
+    parser.add_argument('--repeat', type=int, default=Config.BENCHMARK_REPEAT,
+                        help='Calls per model and workload, the first one loading the model')
+    parser.add_argument('--results', default=Config.BENCHMARK_RESULTS_FILE,
+                        help='Results database, kept across runs')
+    parser.add_argument('--history', type=int, default=5,
+                        help='Runs shown per model in the leaderboard')
+    parser.add_argument('--report', action='store_true',
+                        help='Only print the leaderboard of earlier runs')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s    %(message)s')
+
+    store = BenchmarkStore(args.results)
+    success = True
+    if not args.report:
+        benchmark = ModelBenchmark(FetchManager(Config.OLLAMA_HOST), store, repeat=args.repeat)
+        try:
+            results = benchmark.run(args.models, args.workloads)
+            success = all(not result.get('error') for result in results)
+        except (ConnectionError, requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            print(f'Ollama stopped answering: {e}')
+            success = False
+
+    rows = store.leaderboard(history=args.history)
+    if args.workloads:
+        rows = [row for row in rows if row['workload'] in args.workloads]
+    print(format_leaderboard(rows))
+    return success
+
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
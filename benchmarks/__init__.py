@@ -0,0 +1 @@
+"""Micro-benchmarks for the storage and manager hot paths."""
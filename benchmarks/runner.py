@@ -0,0 +1,132 @@
+import json
+import logging
+import os
+import platform
+import statistics
+import time
+from datetime import datetime
+from typing import Callable, Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 0.20
+
+# Registered benchmark cases, in registration order
+BENCHMARKS: List[Dict[str, Any]] = []
+
+
+def benchmark(name: str, repeat: int = 5, setup: Optional[Callable[[], Any]] = None,
+              teardown: Optional[Callable[[Any], None]] = None):
+    """Register a benchmark case.
+
+    Args:
+        name (str): Unique name used as the key in the results file
+        repeat (int): Number of timed runs
+        setup (callable): Called once before the timed runs, its return value
+            is passed to the benchmark function and to teardown
+        teardown (callable): Called once after the timed runs
+    """
+    def decorator(func):
+        BENCHMARKS.append({
+            'name': name,
+            'func': func,
+            'repeat': repeat,
+            'setup': setup,
+            'teardown': teardown,
+        })
+        return func
+    return decorator
+
+
+def time_case(case: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one benchmark case and return its timing statistics in seconds."""
+    state = case['setup']() if case['setup'] else None
+    timings = []
+    try:
+        for _ in range(case['repeat']):
+            start = time.perf_counter()
+            case['func'](state)
+            timings.append(time.perf_counter() - start)
+    finally:
+        if case['teardown']:
+            case['teardown'](state)
+    return {
+        'repeat': len(timings),
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.mean(timings),
+        'max': max(timings),
+    }
+
+
+def run_benchmarks(selected: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Run registered benchmarks, optionally filtered by name substring."""
+    results = {}
+    for case in BENCHMARKS:
+        if selected and not any(s in case['name'] for s in selected):
+            continue
+        logger.info(f"Running benchmark {case['name']}")
+        results[case['name']] = time_case(case)
+    return {
+        'created_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+
+
+def save_results(results: Dict[str, Any], path: str):
+    """Save benchmark results to a JSON file."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def load_results(path: str) -> Optional[Dict[str, Any]]:
+    """Load benchmark results from a JSON file, or None if it does not exist."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any],
+                    threshold: float = DEFAULT_THRESHOLD) -> List[Dict[str, Any]]:
+    """Compare current results against a baseline using median timings.
+
+    A case regresses when its median is more than ``threshold`` (a fraction,
+    0.2 == 20%) slower than the baseline median. Cases missing from either
+    side are skipped.
+
+    Returns:
+        One row per compared case with baseline, current, change and a
+        'regressed' flag.
+    """
+    rows = []
+    for name, stats in current.get('results', {}).items():
+        base = baseline.get('results', {}).get(name)
+        if not base or not base.get('median'):
+            continue
+        change = (stats['median'] - base['median']) / base['median']
+        rows.append({
+            'name': name,
+            'baseline': base['median'],
+            'current': stats['median'],
+            'change': change,
+            'regressed': change > threshold,
+        })
+    return rows
+
+
+def format_comparison(rows: List[Dict[str, Any]]) -> str:
+    """Render comparison rows as a plain-text table."""
+    lines = [f"{'benchmark':<45} {'baseline':>12} {'current':>12} {'change':>9}"]
+    for row in rows:
+        flag = '  REGRESSED' if row['regressed'] else ''
+        lines.append(
+            f"{row['name']:<45} {row['baseline'] * 1000:>10.3f}ms "
+            f"{row['current'] * 1000:>10.3f}ms {row['change'] * 100:>+8.1f}%{flag}"
+        )
+    return '\n'.join(lines)
@@ -0,0 +1,133 @@
+import os
+import json
+import secrets
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from unittest.mock import patch, MagicMock
+
+from benchmarks.runner import benchmark
+from history_manager import HistoryManager
+from prompt_manager import PromptManager
+
+HISTORY_SIZES = [100, 10_000, 100_000]
+SESSION_THREADS = 8
+SESSION_OPS_PER_THREAD = 25
+MODEL_LIST_SIZE = 500
+
+
+def _make_entry(i):
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'model': f'model-{i % 10}',
+        'prompt': f'benchmark prompt number {i}',
+        'result': 'benchmark result ' * 8,
+        'duration': 1.0,
+        'success': True,
+    }
+
+
+def _history_setup(size):
+    def setup():
+        tmpdir = tempfile.mkdtemp(prefix='bench-history-')
+        history_file = os.path.join(tmpdir, 'history.json')
+        with open(history_file, 'w') as f:
+            json.dump([_make_entry(i) for i in range(size)], f, indent=2)
+        return {
+            'tmpdir': tmpdir,
+            'manager': HistoryManager(history_file=history_file, max_entries=size),
+        }
+    return setup
+
+
+def _history_teardown(state):
+    shutil.rmtree(state['tmpdir'], ignore_errors=True)
+
+
+def _register_history_benchmarks(size):
+    # Full-file rewrites get expensive fast, keep the large cases short
+    repeat = 3 if size >= 100_000 else 5
+
+    @benchmark(f'history.add_entry[{size}]', repeat=repeat,
+               setup=_history_setup(size), teardown=_history_teardown)
+    def bench_add_entry(state):
+        state['manager'].add_entry(model='bench-model', prompt='bench prompt',
+                                   result='bench result', duration=1.0, success=True)
+
+    @benchmark(f'history.load_history[{size}]', repeat=repeat,
+               setup=_history_setup(size), teardown=_history_teardown)
+    def bench_load_history(state):
+        state['manager'].load_history()
+
+    @benchmark(f'history.get_history[{size}]', repeat=repeat,
+               setup=_history_setup(size), teardown=_history_teardown)
+    def bench_get_history(state):
+        state['manager'].get_history(limit=10)
+
+
+for _size in HISTORY_SIZES:
+    _register_history_benchmarks(_size)
+
+
+@benchmark('prompts.load_prompts', repeat=50)
+def bench_load_prompts(state):
+    PromptManager.load_prompts('text')
+    PromptManager.load_prompts('vision')
+
+
+def _session_setup():
+    from app import app
+    return {'app': app, 'ids': []}
+
+
+def _session_teardown(state):
+    from app import db, Session
+    with state['app'].app_context():
+        Session.query.filter(Session.id.in_(state['ids'])).delete(synchronize_session=False)
+        db.session.commit()
+
+
+def _session_worker(state):
+    from app import Session
+    with state['app'].app_context():
+        for _ in range(SESSION_OPS_PER_THREAD):
+            session_id = secrets.token_hex(32)
+            state['ids'].append(session_id)
+            sess, _ = Session.get_or_create(session_id)
+            sess.set_data('bench-model')
+
+
+@benchmark(f'session.get_or_create+set_data[{SESSION_THREADS}x{SESSION_OPS_PER_THREAD}]',
+           repeat=3, setup=_session_setup, teardown=_session_teardown)
+def bench_session_concurrent(state):
+    with ThreadPoolExecutor(max_workers=SESSION_THREADS) as executor:
+        futures = [executor.submit(_session_worker, state) for _ in range(SESSION_THREADS)]
+        for future in futures:
+            future.result()
+
+
+def _models_setup():
+    import app
+    response = MagicMock()
+    response.status_code = 200
+    response.json.return_value = {
+        'models': [
+            {'name': f'model-{i}:latest', 'model': f'model-{i}:latest', 'size': 4_000_000_000,
+             'details': {'family': 'llama', 'parameter_size': '7B'}}
+            for i in range(MODEL_LIST_SIZE)
+        ]
+    }
+    patcher = patch('app.requests.get', return_value=response)
+    patcher.start()
+    return {'app': app, 'patcher': patcher}
+
+
+def _models_teardown(state):
+    state['patcher'].stop()
+
+
+@benchmark(f'models.get_available_models[{MODEL_LIST_SIZE}]', repeat=50,
+           setup=_models_setup, teardown=_models_teardown)
+def bench_get_available_models(state):
+    state['app'].get_available_models()
@@ -0,0 +1,186 @@
+import math
+import logging
+import threading
+import requests
+from typing import List, Dict, Optional, Tuple
+from config import Config
+from model_metadata import parse_num_ctx
+
+logger = logging.getLogger(__name__)
+
+# Average characters per token by model family, measured on English text.
+# Longer names come first so 'codellama' matches before 'llama'.
+CHARS_PER_TOKEN = [
+    ('codellama', 3.2),
+    ('deepseek', 3.4),
+    ('mixtral', 3.6),
+    ('mistral', 3.6),
+    ('gemma', 4.0),
+    ('llama', 3.8),
+    ('llava', 3.8),
+    ('qwen', 3.3),
+    ('phi', 3.7),
+]
+DEFAULT_CHARS_PER_TOKEN = 3.5
+
+# Tokens added by the chat template around each message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = 'Summary of the earlier conversation:\n'
+
+SUMMARY_PROMPT = (
+    'Summarize the following conversation in a few sentences. Keep names, '
+    'numbers, decisions and open questions. Reply with the summary only.\n\n{conversation}'
+)
+
+class BudgetManager:
+    """Keeps prompts and conversations within a model's context window.
+
+    Token counts are estimated locally from a characters-per-token ratio for
+    the model family, which is fast and slightly conservative. The context
+    size comes from the model's /api/show data and is cached per model.
+    """
+
+    def __init__(self, fetch_manager=None, default_num_ctx=None, reserve_tokens=None, summary_tokens=None,
+                 metadata=None, profiles=None):
+        """Initialize the budget manager.
+
+        Args:
+            fetch_manager (FetchManager): Client used to read /api/show
+            default_num_ctx (int): Context size when the model does not set num_ctx
+            reserve_tokens (int): Tokens kept free for the model's reply
+            summary_tokens (int): Maximum tokens generated for a rolling summary
+            metadata (ModelMetadataCache): Cached /api/show data, used instead of fetch_manager
+            profiles (ProfileManager): Generation profiles, whose num_ctx replaces the model's
+        """
+        self.fetch_manager = fetch_manager
+        self.metadata = metadata
+        self.profiles = profiles
+        self.default_num_ctx = default_num_ctx or Config.DEFAULT_NUM_CTX
+        self.reserve_tokens = reserve_tokens or Config.CONTEXT_RESERVE_TOKENS
+        self.summary_tokens = summary_tokens or Config.CONTEXT_SUMMARY_TOKENS
+        self._num_ctx = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def chars_per_token(model: str) -> float:
+        """Get the characters-per-token ratio for a model's family."""
+        name = (model or '').lower().split('/')[-1]
+        for family, ratio in CHARS_PER_TOKEN:
+            if family in name:
+                return ratio
+        return DEFAULT_CHARS_PER_TOKEN
+
+    def estimate_tokens(self, text: str, model: str) -> int:
+        """Estimate the number of tokens in a text for a model."""
+        if not text:
+            return 0
+        return math.ceil(len(text) / self.chars_per_token(model))
+
+    def estimate_messages(self, messages: List[Dict[str, str]], model: str) -> int:
+        """Estimate the number of tokens in a chat message list."""
+        return sum(self.estimate_tokens(m.get('content', ''), model) + MESSAGE_OVERHEAD_TOKENS
+                   for m in messages)
+
+    # Kept here for callers that parse /api/show themselves
+    parse_num_ctx = staticmethod(parse_num_ctx)
+
+    def get_num_ctx(self, model: str) -> int:
+        """Get the context size Ollama will use for a model."""
+        if self.profiles is not None:
+            num_ctx = self.profiles.resolve(model)['options'].get('num_ctx')
+            if num_ctx:
+                return int(num_ctx)
+        if self.metadata is not None:
+            # Cached by model digest, so a re-pulled model gets its new settings
+            metadata = self.metadata.get(model, fetch=True)
+            sizes = (metadata['num_ctx'], metadata['context_length']) if metadata else None
+        else:
+            with self._lock:
+                if model in self._num_ctx:
+                    return self._num_ctx[model]
+            info = self.fetch_manager.fetch_model_info(model) if self.fetch_manager else None
+            sizes = self.parse_num_ctx(info) if info else None
+
+        num_ctx = self.default_num_ctx
+        if sizes:
+            model_num_ctx, context_length = sizes
+            num_ctx = model_num_ctx or num_ctx
+            if context_length:
+                num_ctx = min(num_ctx, context_length)
+            if self.metadata is None:
+                with self._lock:
+                    self._num_ctx[model] = num_ctx
+        logger.debug(f'Context size for {model}: {num_ctx}')
+        return num_ctx
+
+    def get_budget(self, model: str, num_ctx: int = None) -> int:
+        """Get the number of prompt tokens available for a model, or for a context of num_ctx."""
+        num_ctx = int(num_ctx or self.get_num_ctx(model))
+        return max(num_ctx - min(self.reserve_tokens, num_ctx // 2), 1)
+
+    def fit_prompt(self, prompt: str, model: str, num_ctx: int = None) -> str:
+        """Truncate a single prompt so it fits the model's budget."""
+        budget = self.get_budget(model, num_ctx) - MESSAGE_OVERHEAD_TOKENS
+        if self.estimate_tokens(prompt, model) <= budget:
+            return prompt
+        max_chars = int(budget * self.chars_per_token(model))
+        logger.warning(f'Truncating prompt for {model} from {len(prompt)} to {max_chars} characters')
+        return prompt[:max_chars]
+
+    def fit_messages(self, messages: List[Dict[str, str]], model: str,
+                     num_ctx: int = None) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+        """Drop the oldest messages until the conversation fits the budget.
+
+        A leading system message is kept as long as anything older is. The
+        final message is always kept and is truncated if it cannot fit.
+
+        Returns:
+            (kept, dropped) message lists
+        """
+        budget = self.get_budget(model, num_ctx)
+        if self.estimate_messages(messages, model) <= budget:
+            return list(messages), []
+
+        head = [messages[0]] if messages and messages[0].get('role') == 'system' else []
+        body = list(messages[len(head):])
+        dropped = []
+        while len(body) > 1 and self.estimate_messages(head + body, model) > budget:
+            dropped.append(body.pop(0))
+
+        kept = head + body
+        if self.estimate_messages(kept, model) > budget:
+            # Only the latest message is left, make it fit alone
+            last = dict(body[-1])
+            last['content'] = self.fit_prompt(last['content'], model, num_ctx)
+            kept = [last]
+        return kept, dropped
+
+    def summarize(self, model: str, messages: List[Dict[str, str]], previous: str = '') -> Optional[str]:
+        """Summarize dropped messages, folding in the previous summary.
+
+        Returns None if the summary request fails, so callers can fall back
+        to plain truncation.
+        """
+        lines = [f'Earlier summary: {previous}'] if previous else []
+        lines += [f"{m['role']}: {m['content']}" for m in messages]
+        conversation = self.fit_prompt('\n'.join(lines), model)
+        payload = {
+            'model': model,
+            'prompt': SUMMARY_PROMPT.format(conversation=conversation),
+            'stream': False,
+            'options': {'num_predict': self.summary_tokens}
+        }
+        if self.profiles is not None:
+            self.profiles.apply(payload)
+        try:
+            response = requests.post(
+                f"{Config.OLLAMA_HOST}/api/generate",
+                json=payload,
+                timeout=30
+            )
+            response.raise_for_status()
+            return response.json().get('response', '').strip() or None
+        except requests.exceptions.RequestException as e:
+            logger.error(f'Error summarizing conversation: {e}')
+            return None
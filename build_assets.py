@@ -0,0 +1,189 @@
+import argparse
+import os
+import sys
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+
+# Bundle sources in load order: the shared state store first, page wiring last
+BUNDLE_SOURCES = [
+    'js/app-state.js',
+    'js/ollama-status.js',
+    'js/model-selector.js',
+    'js/model-pull.js',
+    'js/fetch-button.js',
+    'js/prompt-manager.js',
+    'js/main.js',
+]
+
+BUNDLE_OUTPUT = 'dist/app.min.js'
+
+# A '/' after one of these (or at the start) begins a regex literal, not a division
+REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+REGEX_KEYWORDS = ('return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void', 'throw')
+
+
+def _regex_allowed(out):
+    """Check whether a '/' at the end of the output so far starts a regex literal."""
+    text = ''.join(out[-20:]).rstrip()
+    if not text:
+        return True
+    if text[-1] in REGEX_PRECEDERS:
+        return True
+    return any(text.endswith(kw) and (len(text) == len(kw) or not (text[-len(kw) - 1].isalnum() or text[-len(kw) - 1] in '_$'))
+               for kw in REGEX_KEYWORDS)
+
+
+def minify_js(source: str) -> str:
+    """Conservatively minify JavaScript.
+
+    Comments, indentation, blank lines and repeated spaces are removed
+    outside strings, template literals and regex literals. Line breaks are
+    kept so automatic semicolon insertion behaves as in the source.
+    """
+    out = []
+    i, n = 0, len(source)
+    # Template literal nesting: each entry counts open braces inside a ${...}
+    templates = []
+    line_start = True
+
+    def copy_quoted(i, quote):
+        start = i
+        i += 1
+        while i < n and source[i] != quote:
+            i += 2 if source[i] == '\\' else 1
+        out.append(source[start:i + 1])
+        return i + 1
+
+    while i < n:
+        c = source[i]
+        nxt = source[i + 1] if i + 1 < n else ''
+
+        if templates and templates[-1] == 0 and c == '}':
+            # End of ${...}, back inside the template literal
+            templates.pop()
+            out.append(c)
+            i += 1
+            c = '`'
+            i = _copy_template(source, i, out, templates)
+            continue
+        if templates and c == '{':
+            templates[-1] += 1
+        elif templates and c == '}':
+            templates[-1] -= 1
+
+        if c == '/' and nxt == '*':
+            end = source.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+            continue
+        if c == '/' and nxt == '/':
+            end = source.find('\n', i)
+            i = n if end == -1 else end
+            continue
+        if c == '\n':
+            while out and out[-1] in (' ', '\t'):
+                out.pop()
+            if out and out[-1] != '\n':
+                out.append('\n')
+            line_start = True
+            i += 1
+            continue
+        if c in ' \t\r':
+            if not line_start and out and out[-1] not in (' ', '\n'):
+                out.append(' ')
+            i += 1
+            continue
+
+        line_start = False
+        if c in '\'"':
+            i = copy_quoted(i, c)
+        elif c == '`':
+            out.append(c)
+            i = _copy_template(source, i + 1, out, templates)
+        elif c == '/' and _regex_allowed(out):
+            start = i
+            i += 1
+            in_class = False
+            while i < n and (in_class or source[i] != '/'):
+                if source[i] == '\\':
+                    i += 1
+                elif source[i] == '[':
+                    in_class = True
+                elif source[i] == ']':
+                    in_class = False
+                i += 1
+            i += 1
+            while i < n and source[i].isalpha():
+                i += 1
+            out.append(source[start:i])
+        else:
+            out.append(c)
+            i += 1
+
+    return ''.join(out).strip() + '\n'
+
+
+def _copy_template(source, i, out, templates):
+    """Copy template literal text verbatim up to its end or the next ${."""
+    n = len(source)
+    start = i
+    while i < n:
+        if source[i] == '\\':
+            i += 2
+        elif source[i] == '`':
+            out.append(source[start:i + 1])
+            return i + 1
+        elif source[i] == '$' and i + 1 < n and source[i + 1] == '{':
+            out.append(source[start:i + 2])
+            templates.append(0)
+            return i + 2
+        else:
+            i += 1
+    out.append(source[start:])
+    return n
+
+
+def build_bundle(sources=BUNDLE_SOURCES, static_dir=STATIC_DIR) -> str:
+    """Concatenate and minify the bundle sources.
+
+    Each file runs in its own function scope so top-level helpers cannot
+    collide; anything shared is attached to window explicitly.
+    """
+    parts = ['/* Generated by build_assets.py from static/js, do not edit */\n']
+    for name in sources:
+        with open(os.path.join(static_dir, name), encoding='utf-8') as f:
+            parts.append(f'/* {name} */\n(() => {{\n{minify_js(f.read())}}})();\n')
+    return ''.join(parts)
+
+
+def main(argv=None):
+    """Build static/dist/app.min.js, or check that it is up to date"""
+    parser = argparse.ArgumentParser(description='Bundle and minify the frontend scripts')
+    parser.add_argument('--check', action='store_true',
+                        help='Exit non-zero if the bundle is out of date instead of writing it')
+    args = parser.parse_args(argv)
+
+    bundle = build_bundle()
+    output = os.path.join(STATIC_DIR, BUNDLE_OUTPUT)
+    current = None
+    if os.path.exists(output):
+        with open(output, encoding='utf-8') as f:
+            current = f.read()
+
+    if args.check:
+        if current != bundle:
+            print(f'{BUNDLE_OUTPUT} is out of date, run: python build_assets.py')
+            return False
+        print(f'{BUNDLE_OUTPUT} is up to date')
+        return True
+
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        f.write(bundle)
+    size = sum(os.path.getsize(os.path.join(STATIC_DIR, name)) for name in BUNDLE_SOURCES)
+    print(f'Wrote {BUNDLE_OUTPUT}: {len(bundle.encode())} bytes from {size} bytes in {len(BUNDLE_SOURCES)} files')
+    return True
+
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
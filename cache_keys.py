@@ -0,0 +1,15 @@
+import hashlib
+from typing import List
+
+# Kept apart from semantic_cache so request handlers can build cache keys without importing numpy
+
+
+def images_hash(images: List[str]) -> str:
+    """Hash the base64 images sent with a prompt, '' for none."""
+    if not images:
+        return ''
+    digest = hashlib.sha256()
+    for image in images:
+        digest.update(image.encode('ascii') if isinstance(image, str) else image)
+        digest.update(b'\0')
+    return digest.hexdigest()
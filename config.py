@@ -26,13 +26,131 @@ class Config:
     HISTORY_FILE = os.getenv('HISTORY_FILE', 'query_history.json')
     MAX_HISTORY_ENTRIES = int(os.getenv('MAX_HISTORY_ENTRIES', '100'))
     HISTORY_PROMPT_LIMIT = int(os.getenv('HISTORY_PROMPT_LIMIT', '3'))
+    HISTORY_INDEX_FILE = os.getenv('HISTORY_INDEX_FILE', 'history_index.db')
+    HISTORY_BATCH_SIZE = int(os.getenv('HISTORY_BATCH_SIZE', '5000'))
+    
+    # Shared State Configuration (sqlite:///file, redis://host:port/db or fakeredis://)
+    STATE_URL = os.getenv('STATE_URL', 'sqlite:///state.db')
+    STATE_KEY_PREFIX = os.getenv('STATE_KEY_PREFIX', 'ollama-web:')
+    
+    # HTTP Compression and Caching Configuration
+    COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '500'))
+    COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', '6'))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv('COMPRESS_BROTLI_QUALITY', '5'))
+    STATIC_MAX_AGE = int(os.getenv('STATIC_MAX_AGE', str(365 * 24 * 3600)))
+    LIBRARY_CACHE_MAX_AGE = int(os.getenv('LIBRARY_CACHE_MAX_AGE', '3600'))
+    
+    # Library Catalog Configuration (an empty LIBRARY_URL never refreshes, for air-gapped hosts)
+    LIBRARY_URL = os.getenv('LIBRARY_URL', 'https://ollama.com/library/models')
+    LIBRARY_SNAPSHOT_FILE = os.getenv('LIBRARY_SNAPSHOT_FILE', 'library_catalog.json')
+    LIBRARY_REFRESH_SECONDS = int(os.getenv('LIBRARY_REFRESH_SECONDS', '86400'))
+    LIBRARY_TIMEOUT = float(os.getenv('LIBRARY_TIMEOUT', '10'))
+    
+    # Analytics Configuration
+    ANALYTICS_BUCKET_SECONDS = int(os.getenv('ANALYTICS_BUCKET_SECONDS', '3600'))
+    ANALYTICS_MAX_BUCKETS = int(os.getenv('ANALYTICS_MAX_BUCKETS', '720'))
+    ANALYTICS_RELATIVE_ACCURACY = float(os.getenv('ANALYTICS_RELATIVE_ACCURACY', '0.01'))
+    
+    # Prompt Suggestion Configuration
+    SUGGESTION_LIMIT = int(os.getenv('SUGGESTION_LIMIT', '15'))
+    SUGGESTION_HALF_LIFE_HOURS = float(os.getenv('SUGGESTION_HALF_LIFE_HOURS', '168'))
+    SUGGESTION_MAX_PROMPTS = int(os.getenv('SUGGESTION_MAX_PROMPTS', '1000'))
     
     # Ollama Configuration
     OLLAMA_HOST = os.getenv('OLLAMA_HOST', 'http://localhost:11434')
     
+    # Model Storage Configuration (a budget of 0 never evicts; OLLAMA_MODELS_DIR only when Ollama runs on this host)
+    MODEL_DISK_BUDGET_GB = float(os.getenv('MODEL_DISK_BUDGET_GB', '0'))
+    MODEL_PINNED = [name.strip() for name in os.getenv('MODEL_PINNED', '').split(',') if name.strip()]
+    OLLAMA_MODELS_DIR = os.getenv('OLLAMA_MODELS_DIR', '')
+    MODEL_MIN_FREE_GB = float(os.getenv('MODEL_MIN_FREE_GB', '5'))
+    MODEL_DEFAULT_PULL_GB = float(os.getenv('MODEL_DEFAULT_PULL_GB', '5'))
+    MODEL_EVICTION_DRY_RUN = os.getenv('MODEL_EVICTION_DRY_RUN', '0').lower() in ('true', '1', 't')
+    
+    # Pull Queue Configuration (a bandwidth of 0 is unlimited; an empty window allows pulls at any time)
+    PULL_QUEUE_FILE = os.getenv('PULL_QUEUE_FILE', 'pull_queue.db')
+    PULL_MAX_CONCURRENT = int(os.getenv('PULL_MAX_CONCURRENT', '1'))
+    PULL_BANDWIDTH_MB = float(os.getenv('PULL_BANDWIDTH_MB', '0'))
+    PULL_WINDOW = os.getenv('PULL_WINDOW', '')
+    
+    # Embedding Configuration
+    EMBED_MODEL = os.getenv('EMBED_MODEL', 'nomic-embed-text')
+    EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', '64'))
+    EMBED_CONCURRENCY = int(os.getenv('EMBED_CONCURRENCY', '4'))
+    EMBED_TIMEOUT = float(os.getenv('EMBED_TIMEOUT', '60'))
+    EMBED_MAX_TEXTS = int(os.getenv('EMBED_MAX_TEXTS', '10000'))
+    VECTOR_INDEX_DIR = os.getenv('VECTOR_INDEX_DIR', 'vector_index')
+    VECTOR_IVF_PROBES = int(os.getenv('VECTOR_IVF_PROBES', '8'))
+    HISTORY_EMBEDDINGS = os.getenv('HISTORY_EMBEDDINGS', '1').lower() in ('true', '1', 't')
+    HISTORY_EMBED_BATCH_SIZE = int(os.getenv('HISTORY_EMBED_BATCH_SIZE', '256'))
+    HISTORY_EMBED_INTERVAL = float(os.getenv('HISTORY_EMBED_INTERVAL', '60'))
+    HISTORY_EMBED_MAX_CHARS = int(os.getenv('HISTORY_EMBED_MAX_CHARS', '2000'))
+    HISTORY_EMBED_IVF_THRESHOLD = int(os.getenv('HISTORY_EMBED_IVF_THRESHOLD', '20000'))
+    
+    # Semantic Cache Configuration
+    SEMANTIC_CACHE = os.getenv('SEMANTIC_CACHE', '0').lower() in ('true', '1', 't')
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.95'))
+    SEMANTIC_CACHE_TTL = int(os.getenv('SEMANTIC_CACHE_TTL', '86400'))
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', '50'))
+    SEMANTIC_CACHE_EMBED_TIMEOUT = float(os.getenv('SEMANTIC_CACHE_EMBED_TIMEOUT', '2'))
+    
+    # Quota Configuration
+    RATE_LIMIT_PER_MINUTE = float(os.getenv('RATE_LIMIT_PER_MINUTE', '30'))
+    RATE_LIMIT_BURST = float(os.getenv('RATE_LIMIT_BURST', '10'))
+    GPU_QUOTA_SECONDS = float(os.getenv('GPU_QUOTA_SECONDS', '0'))
+    GPU_QUOTA_WINDOW = int(os.getenv('GPU_QUOTA_WINDOW', '86400'))
+    SCHEDULER_SLOTS = int(os.getenv('SCHEDULER_SLOTS', '2'))
+    SCHEDULER_MAX_WAIT = float(os.getenv('SCHEDULER_MAX_WAIT', '120'))
+    
+    # Chat Configuration
+    CHAT_MAX_CONVERSATIONS = int(os.getenv('CHAT_MAX_CONVERSATIONS', '500'))
+    CHAT_MAX_MESSAGES = int(os.getenv('CHAT_MAX_MESSAGES', '40'))
+    CHAT_MAX_CHARS = int(os.getenv('CHAT_MAX_CHARS', '32000'))
+    CHAT_IDLE_TIMEOUT = int(os.getenv('CHAT_IDLE_TIMEOUT', '3600'))
+    CHAT_KEEP_ALIVE = os.getenv('CHAT_KEEP_ALIVE', '10m')
+    
+    # Context Window Configuration
+    DEFAULT_NUM_CTX = int(os.getenv('DEFAULT_NUM_CTX', '2048'))
+    CONTEXT_RESERVE_TOKENS = int(os.getenv('CONTEXT_RESERVE_TOKENS', '512'))
+    CONTEXT_SUMMARY_TOKENS = int(os.getenv('CONTEXT_SUMMARY_TOKENS', '256'))
+    CONTEXT_SUMMARIZE = os.getenv('CONTEXT_SUMMARIZE', '1').lower() in ('true', '1', 't')
+    
     # Prompts Configuration
     PROMPTS_FILE = os.getenv('PROMPTS_FILE', 'prompts.json')
     
+    # Generation Profiles Configuration
+    GENERATION_PROFILES_FILE = os.getenv('GENERATION_PROFILES_FILE', 'generation_profiles.json')
+    TUNING_RESULTS_FILE = os.getenv('TUNING_RESULTS_FILE', 'tuning_results.json')
+    
+    # Model Benchmark Configuration
+    BENCHMARK_RESULTS_FILE = os.getenv('BENCHMARK_RESULTS_FILE', 'benchmark_results.db')
+    BENCHMARK_REPEAT = int(os.getenv('BENCHMARK_REPEAT', '3'))
+    
+    # Profiling Configuration
+    PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+    PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', '50'))
+    PROFILE_SAMPLING = os.getenv('PROFILE_SAMPLING', '0').lower() in ('true', '1', 't')
+    PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.02'))
+    PROFILE_MAX_OVERHEAD = float(os.getenv('PROFILE_MAX_OVERHEAD', '0.01'))
+    PROFILE_MAX_STACKS = int(os.getenv('PROFILE_MAX_STACKS', '5000'))
+    
+    # Tracing Configuration
+    TRACING = os.getenv('TRACING', '1').lower() in ('true', '1', 't')
+    TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', 'memory')
+    TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+    TRACE_SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '1.0'))
+    TRACE_MAX_TRACES = int(os.getenv('TRACE_MAX_TRACES', '500'))
+    TRACE_SLOW_MS = float(os.getenv('TRACE_SLOW_MS', '1000'))
+    
+    # Logging Configuration
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+    LOG_MAX_MESSAGE_LENGTH = int(os.getenv('LOG_MAX_MESSAGE_LENGTH', '2000'))
+    LOG_SAMPLE_RATE = int(os.getenv('LOG_SAMPLE_RATE', '10'))
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+    
+    # Admin Configuration
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+    
     # Test configuration
     TEST_MODEL = os.getenv('TEST_MODEL', 'tinyllama')
     TEST_PROMPT = os.getenv('TEST_PROMPT', 'What is the capital of France?')
@@ -64,14 +182,14 @@ class Config:
     def init_app(cls, app):
         """Initialize application configuration"""
         # Set secret key
-        app.secret_key = cls.SECRET_KEY = os.getenv('FLASK_SECRET_KEY', 'your-secret-key')
+        app.secret_key = cls.SECRET_KEY = os.getenv('FLASK_SECRET_KEY', cls.SECRET_KEY)
         
         # Ensure instance path exists
         os.makedirs(app.instance_path, exist_ok=True)
         
         # Set up file paths
-        cls.HISTORY_FILE = os.path.join(app.instance_path, 'history.json')
-        cls.MAX_HISTORY_ENTRIES = 100
+        cls.HISTORY_FILE = os.getenv('HISTORY_FILE', cls.HISTORY_FILE)
+        cls.MAX_HISTORY_ENTRIES = int(os.getenv('MAX_HISTORY_ENTRIES', str(cls.MAX_HISTORY_ENTRIES)))
         
         # Set configuration values from environment or use defaults
         cls.DEBUG = os.getenv('FLASK_DEBUG', '0').lower() in ('true', '1', 't')
@@ -0,0 +1,174 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+from typing import List, Dict, Any, Optional
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class ConversationManager:
+    """Keeps per-session chat conversations in memory for /api/chat.
+
+    Each session holds one conversation for one model. The full message list
+    is replayed to Ollama on every turn; because the prefix is unchanged
+    between turns, Ollama reuses its cached prompt evaluation for a loaded
+    model and only the new tokens are processed. Memory is bounded by the
+    number of conversations, messages and characters per conversation, and
+    idle conversations are evicted.
+
+    With a shared StateStore, conversations are kept in the store instead
+    so every worker process sees the same conversation; idle conversations
+    then expire through the store's TTL.
+    """
+
+    def __init__(self, max_conversations=None, max_messages=None, max_chars=None, idle_timeout=None,
+                 store=None):
+        """Initialize the conversation manager.
+
+        Args:
+            max_conversations (int): Maximum number of sessions kept in memory
+            max_messages (int): Maximum number of messages per conversation
+            max_chars (int): Maximum total characters per conversation
+            idle_timeout (int): Seconds of inactivity before a conversation is evicted
+            store (StateStore): Optional shared store to keep conversations in
+        """
+        self.max_conversations = max_conversations or Config.CHAT_MAX_CONVERSATIONS
+        self.max_messages = max_messages or Config.CHAT_MAX_MESSAGES
+        self.max_chars = max_chars or Config.CHAT_MAX_CHARS
+        self.idle_timeout = idle_timeout or Config.CHAT_IDLE_TIMEOUT
+        self.store = store
+        self._conversations = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _locked(self, session_id: str):
+        """Lock held while a session's conversation is read, changed and saved."""
+        if self.store is not None:
+            return self.store.lock(f'chat:{session_id}')
+        return self._lock
+
+    def _reading(self):
+        """Lock held while a conversation is only read; store reads need none."""
+        return self._lock if self.store is None else nullcontext()
+
+    def _load(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Get a session's conversation without creating it."""
+        if self.store is not None:
+            return self.store.get(f'chat:{session_id}')
+        return self._conversations.get(session_id)
+
+    def _save(self, session_id: str, conv: Dict[str, Any]):
+        """Store a changed conversation. Caller holds the lock."""
+        conv['updated_at'] = time.time()
+        if self.store is not None:
+            self.store.set(f'chat:{session_id}', conv, ttl=self.idle_timeout)
+            return
+        self._conversations[session_id] = conv
+        self._conversations.move_to_end(session_id)
+        self._evict()
+
+    def _get(self, session_id: str, model: str) -> Dict[str, Any]:
+        """Get the conversation for a session, or a new one not stored until saved. Caller holds the lock."""
+        conv = self._load(session_id)
+        if conv is None or conv['model'] != model:
+            # A different model cannot reuse the cached prefix, start fresh
+            conv = {'model': model, 'messages': [], 'chars': 0, 'updated_at': time.time()}
+        return conv
+
+    def _trim(self, conv: Dict[str, Any]):
+        """Drop the oldest turns until the conversation fits its bounds."""
+        messages = conv['messages']
+        start = 1 if messages and messages[0]['role'] == 'system' else 0
+        while len(messages) > start + 1 and (
+                len(messages) > self.max_messages or conv['chars'] > self.max_chars):
+            removed = messages.pop(start)
+            conv['chars'] -= len(removed['content'])
+
+    def _evict(self):
+        """Evict idle conversations and the least recently used over the limit. Caller holds the lock."""
+        cutoff = time.time() - self.idle_timeout
+        expired = [sid for sid, conv in self._conversations.items() if conv['updated_at'] < cutoff]
+        for sid in expired:
+            del self._conversations[sid]
+        while len(self._conversations) > self.max_conversations:
+            self._conversations.popitem(last=False)
+
+    def build_messages(self, session_id: str, model: str, content: str) -> List[Dict[str, str]]:
+        """Return the message list to send for a new user turn.
+
+        The user message is not stored until record_turn is called, so a
+        failed upstream call leaves the conversation unchanged.
+        """
+        with self._reading():
+            conv = self._get(session_id, model)
+            return [dict(m) for m in conv['messages']] + [{'role': 'user', 'content': content}]
+
+    def record_turn(self, session_id: str, model: str, user_content: str, assistant_content: str):
+        """Append a completed user/assistant exchange to the conversation."""
+        with self._locked(session_id):
+            conv = self._get(session_id, model)
+            for role, content in (('user', user_content), ('assistant', assistant_content)):
+                conv['messages'].append({'role': role, 'content': content})
+                conv['chars'] += len(content)
+            self._trim(conv)
+            self._save(session_id, conv)
+
+    def compact(self, session_id: str, model: str, count: int, summary: Optional[str], prefix: str = ''):
+        """Replace the oldest messages with a rolling summary.
+
+        Args:
+            session_id (str): Session whose conversation is compacted
+            model (str): Model the conversation is bound to
+            count (int): Number of oldest non-system messages to remove
+            summary (str): Summary of the removed messages, or None to just drop them
+            prefix (str): Text placed before the summary in the system message
+        """
+        with self._locked(session_id):
+            conv = self._get(session_id, model)
+            messages = conv['messages']
+            start = 1 if messages and messages[0]['role'] == 'system' else 0
+            removed = messages[start:start + count]
+            del messages[start:start + count]
+            conv['chars'] -= sum(len(m['content']) for m in removed)
+            if summary:
+                if start:
+                    conv['chars'] -= len(messages.pop(0)['content'])
+                content = prefix + summary
+                messages.insert(0, {'role': 'system', 'content': content})
+                conv['chars'] += len(content)
+            self._save(session_id, conv)
+
+    def get_summary(self, session_id: str, prefix: str = '') -> str:
+        """Get the rolling summary of a session's conversation, if any."""
+        with self._reading():
+            conv = self._load(session_id)
+            if conv and conv['messages'] and conv['messages'][0]['role'] == 'system':
+                content = conv['messages'][0]['content']
+                return content[len(prefix):] if content.startswith(prefix) else content
+            return ''
+
+    def get_messages(self, session_id: str) -> List[Dict[str, str]]:
+        """Get a copy of the messages in a session's conversation."""
+        with self._reading():
+            conv = self._load(session_id)
+            return [dict(m) for m in conv['messages']] if conv else []
+
+    def get_model(self, session_id: str) -> Optional[str]:
+        """Get the model a session's conversation is bound to."""
+        with self._reading():
+            conv = self._load(session_id)
+            return conv['model'] if conv else None
+
+    def reset(self, session_id: str):
+        """Discard a session's conversation."""
+        if self.store is not None:
+            self.store.delete(f'chat:{session_id}')
+            return
+        with self._lock:
+            self._conversations.pop(session_id, None)
+
+    def __len__(self):
+        if self.store is not None:
+            return len(self.store.keys('chat:'))
+        return len(self._conversations)
@@ -0,0 +1,55 @@
+import logging
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingManager:
+    """Embeds texts through Ollama's /api/embed in batches.
+
+    Texts are split into batches of batch_size, sent as one /api/embed call
+    each. Batches run on a thread pool shared by all requests of the
+    process, so at most ``concurrency`` calls are in flight to Ollama.
+    """
+
+    def __init__(self, fetch_manager, batch_size=None, concurrency=None, timeout=None):
+        """Initialize the embedding manager.
+
+        Args:
+            fetch_manager (FetchManager): Client used to call /api/embed
+            batch_size (int): Texts per /api/embed call
+            concurrency (int): Calls in flight at once
+            timeout (float): Seconds to wait for each call
+        """
+        self.fetch_manager = fetch_manager
+        self.batch_size = batch_size or Config.EMBED_BATCH_SIZE
+        self.timeout = timeout or Config.EMBED_TIMEOUT
+        self._executor = ThreadPoolExecutor(max_workers=concurrency or Config.EMBED_CONCURRENCY,
+                                            thread_name_prefix='embed')
+
+    def _embed_batch(self, model: str, texts: List[str], timeout: float = None) -> List[List[float]]:
+        return self.fetch_manager.embed(model, texts, timeout=timeout or self.timeout)
+
+    def embed(self, texts: List[str], model: str, timeout: float = None) -> np.ndarray:
+        """Embed texts, one row per text in the same order.
+
+        Args:
+            texts (List[str]): Texts to embed
+            model (str): Embedding model name
+            timeout (float): Seconds to wait for each call, instead of the default
+
+        Returns:
+            Array of shape (len(texts), dimensions)
+        """
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        logger.debug(f'Embedding {len(texts)} texts with {model} in {len(batches)} batches')
+        if len(batches) == 1:
+            results = [self._embed_batch(model, batches[0], timeout)]
+        else:
+            results = self._executor.map(lambda batch: self._embed_batch(model, batch, timeout), batches)
+        return np.asarray([vector for batch in results for vector in batch], dtype=np.float32)
@@ -0,0 +1,154 @@
+import time
+import logging
+import threading
+import itertools
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+from config import Config
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+# GPU seconds assumed for a session's first call, before its average is known
+DEFAULT_COST = 1.0
+
+# Weight of the latest call in a session's average GPU seconds per call
+COST_SMOOTHING = 0.3
+
+# Lowest session weight, so a weight of 0 cannot stall a session forever
+MIN_WEIGHT = 0.01
+
+
+class SchedulerBusy(Exception):
+    """Raised when a request waits longer than max_wait for an Ollama slot."""
+
+
+class Ticket:
+    """A granted slot; set gpu_seconds to the call's measured GPU time."""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.gpu_seconds: Optional[float] = None
+
+
+class FairScheduler:
+    """Weighted fair queue in front of Ollama, for one worker process.
+
+    At most ``slots`` calls run at once. A freed slot goes to the waiting
+    request whose session has the lowest virtual finish time: the GPU
+    seconds it has used divided by its weight, counted from no earlier than
+    the scheduler's virtual time (start-time fair queueing). A session that
+    sends an occasional prompt is served ahead of one with a backlog, and
+    the backlog gets the capacity left over. Requests of one session run in
+    arrival order.
+
+    A call's cost is unknown until it returns, so a session is charged its
+    average GPU seconds per call when a slot is granted, corrected to the
+    measured time when the slot is released.
+    """
+
+    def __init__(self, slots: int = None, max_wait: float = None):
+        """Initialize the scheduler.
+
+        Args:
+            slots (int): Ollama calls run at once, 0 for no limit
+            max_wait (float): Seconds a request may wait for a slot
+        """
+        self.slots = Config.SCHEDULER_SLOTS if slots is None else slots
+        self.max_wait = max_wait or Config.SCHEDULER_MAX_WAIT
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._waiting = []
+        self._running: Dict[str, int] = {}
+        self._finish: Dict[str, float] = {}
+        self._cost: Dict[str, float] = {}
+        self._vtime = 0.0
+
+    def _tag(self, session_id: str) -> float:
+        return max(self._vtime, self._finish.get(session_id, 0.0))
+
+    def _next(self):
+        return min(self._waiting, key=lambda waiter: (self._tag(waiter[1]), waiter[0]))
+
+    def _prune(self):
+        """Forget idle sessions no further ahead than the virtual time, they would start from it anyway."""
+        waiting = {session_id for _, session_id in self._waiting}
+        for session_id in list(self._finish):
+            if (not self._running.get(session_id) and session_id not in waiting
+                    and self._finish[session_id] <= self._vtime):
+                self._running.pop(session_id, None)
+                self._finish.pop(session_id, None)
+                self._cost.pop(session_id, None)
+
+    @contextmanager
+    def slot(self, session_id: str, weight: float = 1.0):
+        """Wait for this session's turn at an Ollama slot and hold it.
+
+        Args:
+            session_id (str): Session the call is charged to
+            weight (float): Session's share of GPU time relative to weight 1
+
+        Yields:
+            A Ticket whose gpu_seconds should be set to the call's GPU time
+
+        Raises:
+            SchedulerBusy: If no slot was granted within max_wait seconds
+        """
+        ticket = Ticket(session_id)
+        if self.slots <= 0:
+            yield ticket
+            return
+        weight = max(weight or 1.0, MIN_WEIGHT)
+        waiter = (next(self._seq), session_id)
+        deadline = time.monotonic() + self.max_wait
+        with span('scheduler.wait'), self._cond:
+            self._waiting.append(waiter)
+            try:
+                while sum(self._running.values()) >= self.slots or self._next() is not waiter:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise SchedulerBusy(f'No Ollama slot free within {self.max_wait:g} seconds')
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting.remove(waiter)
+                # Another slot may be free for the next waiter, or this one gave up its turn
+                self._cond.notify_all()
+            start = self._tag(session_id)
+            self._vtime = start
+            estimate = self._cost.get(session_id, DEFAULT_COST)
+            self._finish[session_id] = start + estimate / weight
+            self._running[session_id] = self._running.get(session_id, 0) + 1
+        try:
+            yield ticket
+        finally:
+            with self._cond:
+                self._running[session_id] -= 1
+                if ticket.gpu_seconds is not None:
+                    self._finish[session_id] += (ticket.gpu_seconds - estimate) / weight
+                    self._cost[session_id] = ((1 - COST_SMOOTHING) * self._cost.get(session_id, DEFAULT_COST)
+                                              + COST_SMOOTHING * ticket.gpu_seconds)
+                self._prune()
+                self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """Report running and waiting calls, and each active session's place in the queue."""
+        with self._cond:
+            waiting = {}
+            for _, session_id in self._waiting:
+                waiting[session_id] = waiting.get(session_id, 0) + 1
+            sessions = {session_id for session_id, count in self._running.items() if count} | set(waiting)
+            return {
+                'slots': self.slots,
+                'running': sum(self._running.values()),
+                'waiting': len(self._waiting),
+                'virtual_time': round(self._vtime, 3),
+                'sessions': {
+                    session_id[:8]: {
+                        'running': self._running.get(session_id, 0),
+                        'waiting': waiting.get(session_id, 0),
+                        'lag': round(self._tag(session_id) - self._vtime, 3),
+                        'avg_gpu_seconds': round(self._cost.get(session_id, DEFAULT_COST), 3),
+                    }
+                    for session_id in sorted(sessions)
+                },
+            }
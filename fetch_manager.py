@@ -1,7 +1,7 @@
 import logging
 import requests
 import json
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -12,9 +12,9 @@ class FetchManager:
     def fetch_model_info(self, model_name: str) -> Optional[Dict[str, Any]]:
         """Fetch information about a specific model."""
         try:
-            response = requests.get(f"{self.base_url}/api/show", 
-                                  params={"name": model_name},
-                                  timeout=5)
+            response = requests.post(f"{self.base_url}/api/show",
+                                   json={"model": model_name},
+                                   timeout=5)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -31,75 +31,126 @@ class FetchManager:
             logger.error(f"Error fetching models list: {e}")
             return None
 
-    def get_library_models(self) -> Optional[Dict[str, Any]]:
-        """Get available models from Ollama library."""
+    def fetch_running_models(self) -> Optional[Dict[str, Any]]:
+        """Fetch the models loaded in memory, with their size and VRAM use, from /api/ps."""
+        try:
+            response = requests.get(f"{self.base_url}/api/ps", timeout=5)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error fetching running models: {e}")
+            return None
+
+    def embed(self, model_name: str, texts: List[str], timeout: float = 60) -> List[List[float]]:
+        """Embed texts in one /api/embed call, one vector per text."""
+        response = requests.post(f"{self.base_url}/api/embed",
+                                 json={"model": model_name, "input": texts},
+                                 timeout=timeout)
+        response.raise_for_status()
+        embeddings = response.json().get('embeddings') or []
+        if len(embeddings) != len(texts):
+            raise ValueError(f"Expected {len(texts)} embeddings from {model_name}, got {len(embeddings)}")
+        return embeddings
+
+    def generate(self, model_name: str, prompt: str, options: Optional[Dict[str, Any]] = None,
+                 keep_alive=None, timeout: float = 300) -> Dict[str, Any]:
+        """Run one non-streaming /api/generate call and return Ollama's response with its timings."""
+        payload = {"model": model_name, "prompt": prompt, "stream": False}
+        if options:
+            payload["options"] = options
+        if keep_alive is not None:
+            payload["keep_alive"] = keep_alive
+        response = requests.post(f"{self.base_url}/api/generate", json=payload, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def chat_stream(self, model_name: str, messages: List[Dict[str, Any]],
+                    options: Optional[Dict[str, Any]] = None, timeout: float = 300):
+        """Stream an /api/chat call, yielding each parsed chunk; the last one has the timings."""
+        payload = {"model": model_name, "messages": messages, "stream": True}
+        if options:
+            payload["options"] = options
+        with requests.post(f"{self.base_url}/api/chat", json=payload, stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+
+    def unload_model(self, model_name: str) -> bool:
+        """Unload a model from memory, so its next call loads it again."""
+        try:
+            response = requests.post(f"{self.base_url}/api/generate",
+                                     json={"model": model_name, "keep_alive": 0},
+                                     timeout=60)
+            response.raise_for_status()
+            return True
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error unloading model {model_name}: {e}")
+            return False
+
+    def delete_model(self, model_name: str) -> bool:
+        """Delete a local model, True if Ollama removed it."""
+        try:
+            response = requests.delete(f"{self.base_url}/api/delete",
+                                       json={"model": model_name},
+                                       timeout=30)
+            response.raise_for_status()
+            return True
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error deleting model {model_name}: {e}")
+            return False
+
+    def get_library_models(self, url: str = "https://ollama.com/library/models",
+                           timeout: float = 10) -> Optional[Dict[str, Any]]:
+        """Get available models from the Ollama library, None on failure."""
         try:
-            # Fetch models from Ollama library API
             logger.info("Fetching models from Ollama library")
-            response = requests.get("https://ollama.com/library/models")
+            response = requests.get(url, timeout=timeout)
             response.raise_for_status()
-            
-            # Parse response
             library_data = response.json()
-            logger.info(f"Received library data: {library_data}")
             
             # Transform to our format
             models = []
-            if 'models' in library_data:
-                for model in library_data['models']:
-                    name = model['name'].split(':')[0]  # Remove version tag
-                    models.append({
-                        'name': name,
-                        'description': model.get('description', ''),
-                        'details': {
-                            'format': model.get('format', ''),
-                            'family': model.get('family', ''),
-                            'parameter_size': model.get('parameter_size', ''),
-                            'quantization': model.get('quantization', '')
-                        }
-                    })
+            for model in library_data.get('models', []):
+                models.append({
+                    'name': model['name'],
+                    'description': model.get('description', ''),
+                    'capabilities': model.get('capabilities', []),
+                    'sizes': model.get('sizes', []),
+                    'details': {
+                        'format': model.get('format', ''),
+                        'family': model.get('family', ''),
+                        'parameter_size': model.get('parameter_size', ''),
+                        'quantization': model.get('quantization', '')
+                    }
+                })
             
-            logger.info(f"Transformed library models: {models}")
+            logger.debug("Received %d library models", len(models))
             return {"models": models}
         except Exception as e:
             logger.error(f"Error getting library models: {e}")
-            # Fallback to curated list if API fails
-            models = [
-                {"name": "llama2", "description": "Meta's Llama 2 model"},
-                {"name": "mistral", "description": "Mistral 7B model"},
-                {"name": "codellama", "description": "Code specialized Llama model"},
-                {"name": "llama2-uncensored", "description": "Uncensored version of Llama 2"},
-                {"name": "neural-chat", "description": "Intel's neural chat model"},
-                {"name": "starling-lm", "description": "Starling LM model"},
-                {"name": "dolphin-phi", "description": "Dolphin Phi model"},
-                {"name": "llava", "description": "Multimodal model supporting vision"},
-                {"name": "orca-mini", "description": "Lightweight Orca model"},
-                {"name": "vicuna", "description": "Vicuna model based on LLaMA"},
-                {"name": "falcon", "description": "TII's Falcon model"},
-                {"name": "stable-beluga", "description": "Stable Beluga model"}
-            ]
-            return {"models": models}
+            return None
 
     def pull_model(self, model_name: str) -> Dict[str, Any]:
         """Pull a model from Ollama library."""
         try:
-            # Pull the model using Ollama API
-            response = requests.post(
+            # Pull the model using Ollama API; closing the generator disconnects, which cancels the pull
+            with requests.post(
                 f"{self.base_url}/api/pull",
                 json={"name": model_name},
                 stream=True,
                 timeout=None
-            )
-            response.raise_for_status()
-            
-            # Stream the response
-            for line in response.iter_lines():
-                if line:
-                    data = json.loads(line)
-                    # Add status field if not present
-                    if 'status' not in data:
-                        data['status'] = 'downloading'
-                    yield data
+            ) as response:
+                response.raise_for_status()
+
+                # Stream the response
+                for line in response.iter_lines():
+                    if line:
+                        data = json.loads(line)
+                        # Add status field if not present
+                        if 'status' not in data:
+                            data['status'] = 'downloading'
+                        yield data
                     
         except requests.exceptions.RequestException as e:
             logger.error(f"Error pulling model {model_name}: {e}")
@@ -0,0 +1,151 @@
+import math
+import logging
+import threading
+import contextlib
+from itertools import islice
+from typing import Dict, Any
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Vector collection holding one embedding per history entry, keyed by entry id
+HISTORY_COLLECTION = 'history'
+
+# Lock held while a batch is embedded, so one worker embeds at a time
+EMBED_LOCK = 'history:embed'
+
+
+def entry_text(entry: Dict[str, Any], max_chars: int = None) -> str:
+    """Text embedded for a history entry: its prompt and the start of its result."""
+    text = f"{entry.get('prompt') or ''}\n\n{entry.get('result') or ''}".strip()
+    return text[:max_chars or Config.HISTORY_EMBED_MAX_CHARS]
+
+
+class HistoryEmbedder:
+    """Embeds history entries into a vector index in a background thread.
+
+    It is a HistoryManager listener whose add_entry only wakes the thread,
+    so requests never wait for Ollama. The thread catches up from the
+    history index by entry id, which also covers entries written by other
+    workers, bulk imports and anything written while the embedding model
+    was unavailable.
+    """
+
+    def __init__(self, history_index, embeddings, vectors, model=None, ready=None, batch_size=None,
+                 interval=None, store=None):
+        """Initialize the embedder.
+
+        Args:
+            history_index (HistoryIndex): Index the entries are read from
+            embeddings (EmbeddingManager): Client used to embed entry texts
+            vectors (VectorIndex): Index the embeddings are added to
+            model (str): Embedding model
+            ready (callable): Returns False while the model cannot be used, e.g. is not pulled
+            batch_size (int): Entries embedded per batch
+            interval (float): Seconds between checks for entries without embeddings
+            store (StateStore): Optional shared store, so one worker embeds at a time
+        """
+        self.history_index = history_index
+        self.embeddings = embeddings
+        self.vectors = vectors
+        self.model = model or Config.EMBED_MODEL
+        self.ready = ready or (lambda: True)
+        self.batch_size = batch_size or Config.HISTORY_EMBED_BATCH_SIZE
+        self.interval = interval or Config.HISTORY_EMBED_INTERVAL
+        self.store = store
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _embed_lock(self):
+        if self.store is None:
+            return contextlib.nullcontext()
+        return self.store.lock(EMBED_LOCK, timeout=Config.EMBED_TIMEOUT * 2)
+
+    def start(self):
+        """Start the background thread, once."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='history-embedder', daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Stop the background thread after its current batch."""
+        self._stop.set()
+        self._wake.set()
+
+    def add_entry(self, entry: Dict[str, Any]):
+        """Wake the thread to embed a new entry."""
+        self._wake.set()
+
+    def clear(self):
+        """Drop all embeddings, after history was cleared."""
+        with self._embed_lock():
+            self.vectors.clear()
+
+    def embed_batch(self) -> int:
+        """Embed the next batch of entries without embeddings.
+
+        Returns:
+            The number of entries embedded, 0 when all are done
+        """
+        with self._embed_lock():
+            # Entry ids only grow, so the largest embedded id marks the progress
+            entries = list(islice(self.history_index.iter_entries(
+                ('prompt', 'result'), batch_size=self.batch_size, after_id=self.vectors.max_id()),
+                self.batch_size))
+            if not entries:
+                return 0
+            vectors = self.embeddings.embed([entry_text(entry) for entry in entries], self.model)
+            self.vectors.add([entry['id'] for entry in entries], vectors, model=self.model)
+        return len(entries)
+
+    def train_if_needed(self) -> int:
+        """Build the IVF index once history is large, and rebuild it as it grows.
+
+        Flat search converts every float16 vector per query; past
+        HISTORY_EMBED_IVF_THRESHOLD entries the index is trained with about
+        sqrt(count) lists, and retrained once that number has doubled.
+
+        Returns:
+            The number of lists trained, 0 when nothing was done
+        """
+        count = self.vectors.count
+        lists = int(math.sqrt(count))
+        if count < Config.HISTORY_EMBED_IVF_THRESHOLD or (self.vectors.lists and lists < 2 * self.vectors.lists):
+            return 0
+        with self._embed_lock():
+            return self.vectors.train(lists)
+
+    def catch_up(self) -> int:
+        """Embed every entry without an embedding.
+
+        Returns:
+            The number of entries embedded
+        """
+        if not self.ready():
+            return 0
+        total = 0
+        while not self._stop.is_set():
+            count = self.embed_batch()
+            if count == 0:
+                break
+            total += count
+        if total:
+            logger.info(f'Embedded {total} history entries with {self.model}')
+            self.train_if_needed()
+        return total
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            try:
+                self.catch_up()
+            except Exception as e:
+                logger.error(f'Error embedding history: {e}')
+                # Back off instead of retrying on every new entry
+                self._stop.wait(self.interval)
+                continue
+            self._wake.wait(self.interval)
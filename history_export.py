@@ -0,0 +1,128 @@
+import io
+import csv
+import json
+import codecs
+import logging
+from datetime import datetime
+from typing import Dict, Any, Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Columns written on export, in CSV header order: every field a history entry stores
+EXPORT_COLUMNS = ('id', 'timestamp', 'model', 'prompt', 'result', 'duration', 'success', 'tokens_per_second',
+                  'eval_count', 'prompt_eval_count', 'total_duration')
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def check_format(fmt: str) -> str:
+    """Validate an export/import format name.
+
+    Raises:
+        ValueError: If the format is not supported
+    """
+    fmt = (fmt or 'ndjson').lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format '{fmt}', expected one of: {', '.join(FORMATS)}")
+    return fmt
+
+
+def export_lines(entries: Iterable[Dict[str, Any]], fmt: str = 'ndjson') -> Iterator[str]:
+    """Serialize entries one line (record) at a time.
+
+    Nothing is buffered beyond the current record, so exports of any size
+    run in constant memory when entries come from a lazy iterator.
+    """
+    fmt = check_format(fmt)
+    if fmt == 'ndjson':
+        for entry in entries:
+            yield json.dumps({column: entry.get(column) for column in EXPORT_COLUMNS}) + '\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for entry in entries:
+        writer.writerow(['' if entry.get(column) is None else entry[column] for column in EXPORT_COLUMNS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def check_timestamp(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Check that an entry's timestamp, if it has one, is an ISO 8601 string.
+
+    Analytics, suggestions and the history index parse every timestamp,
+    so one unparsable value would break them for all entries.
+
+    Raises:
+        ValueError: If the timestamp cannot be parsed
+    """
+    timestamp = entry.get('timestamp')
+    if timestamp is None:
+        return entry
+    if not isinstance(timestamp, str):
+        raise ValueError(f'invalid timestamp {timestamp!r}')
+    try:
+        datetime.fromisoformat(timestamp)
+    except ValueError:
+        raise ValueError(f'invalid timestamp {timestamp!r}')
+    return entry
+
+
+def _parse_csv_row(row: Dict[str, str]) -> Dict[str, Any]:
+    """Turn a CSV row's strings back into typed entry values."""
+    entry = {key: value for key, value in row.items() if key and value != ''}
+    for key in ('id', 'eval_count', 'prompt_eval_count', 'total_duration'):
+        if key in entry:
+            entry[key] = int(entry[key])
+    for key in ('duration', 'tokens_per_second'):
+        if key in entry:
+            entry[key] = float(entry[key])
+    entry['success'] = str(entry.get('success', '')).lower() in ('true', '1', 't')
+    return check_timestamp(entry)
+
+
+def read_entries(stream, fmt: str = 'ndjson', on_error=None) -> Iterator[Dict[str, Any]]:
+    """Read entries from a binary stream lazily, one record at a time.
+
+    Records that cannot be parsed, or whose timestamp is not ISO 8601, are
+    skipped and reported to on_error.
+
+    Args:
+        stream: Binary file-like object yielding lines
+        fmt (str): 'ndjson' or 'csv'
+        on_error (callable): Called with (line number, message) for skipped records
+    """
+    fmt = check_format(fmt)
+    lines = codecs.iterdecode(stream, 'utf-8-sig')
+    if fmt == 'ndjson':
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                if not isinstance(entry, dict):
+                    raise ValueError('expected a JSON object')
+                check_timestamp(entry)
+            except ValueError as e:
+                if on_error is not None:
+                    on_error(number, str(e))
+                continue
+            yield entry
+        return
+
+    reader = csv.DictReader(lines)
+    for row in reader:
+        try:
+            entry = _parse_csv_row(row)
+        except ValueError as e:
+            if on_error is not None:
+                on_error(reader.line_num, str(e))
+            continue
+        yield entry
@@ -0,0 +1,322 @@
+import re
+import sqlite3
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Iterable
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    timestamp TEXT,
+    model TEXT,
+    prompt TEXT,
+    result TEXT,
+    duration REAL,
+    success INTEGER,
+    tokens_per_second REAL,
+    eval_count INTEGER,
+    prompt_eval_count INTEGER,
+    total_duration INTEGER
+);
+CREATE INDEX IF NOT EXISTS entries_model ON entries(model);
+CREATE INDEX IF NOT EXISTS entries_model_timestamp ON entries(model, timestamp);
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+    model, prompt, result,
+    content='entries', content_rowid='id', tokenize='unicode61'
+);
+"""
+
+# bm25 column weights for (model, prompt, result)
+RANK_WEIGHTS = (0.5, 2.0, 1.0)
+
+SNIPPET_TOKENS = 12
+
+# Characters of prompt and result in entries listed by id
+SUMMARY_CHARS = 200
+
+# Columns added after the first release, with their types, added to older index files
+ADDED_COLUMNS = (('tokens_per_second', 'REAL'), ('eval_count', 'INTEGER'),
+                 ('prompt_eval_count', 'INTEGER'), ('total_duration', 'INTEGER'))
+
+class HistoryIndex:
+    """SQLite FTS5 full-text index over history entries.
+
+    Entries are indexed as HistoryManager adds them, so searching never
+    reads the history file. The index keeps every entry it is given, even
+    after the history file trims to MAX_HISTORY_ENTRIES.
+    """
+
+    def __init__(self, index_file=None):
+        """Initialize the history index.
+
+        Args:
+            index_file (str): Path to the SQLite index database
+        """
+        self.index_file = index_file or Config.HISTORY_INDEX_FILE
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.index_file, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        self._migrate()
+        logger.info(f'Initialized HistoryIndex with file: {self.index_file}')
+
+    def _migrate(self):
+        """Add columns introduced after the index file was created."""
+        columns = {row['name'] for row in self._conn.execute('PRAGMA table_info(entries)')}
+        for name, column_type in ADDED_COLUMNS:
+            if name not in columns:
+                self._conn.execute(f'ALTER TABLE entries ADD COLUMN {name} {column_type}')
+        self._conn.commit()
+
+    @staticmethod
+    def _row(entry: Dict[str, Any]):
+        return (
+            entry.get('timestamp'),
+            entry.get('model', ''),
+            entry.get('prompt', ''),
+            entry.get('result', ''),
+            entry.get('duration'),
+            1 if entry.get('success') else 0,
+            entry.get('tokens_per_second'),
+            entry.get('eval_count'),
+            entry.get('prompt_eval_count'),
+            entry.get('total_duration'),
+        )
+
+    def add_entries(self, entries: Iterable[Dict[str, Any]]) -> int:
+        """Index a batch of history entries in one transaction."""
+        count = 0
+        with self._lock, self._conn:
+            for entry in entries:
+                cursor = self._conn.execute(
+                    'INSERT INTO entries (timestamp, model, prompt, result, duration, success, tokens_per_second, '
+                    'eval_count, prompt_eval_count, total_duration) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    self._row(entry))
+                self._conn.execute(
+                    'INSERT INTO entries_fts (rowid, model, prompt, result) VALUES (?, ?, ?, ?)',
+                    (cursor.lastrowid, entry.get('model', ''), entry.get('prompt', ''), entry.get('result', '')))
+                count += 1
+        return count
+
+    def add_entry(self, entry: Dict[str, Any]):
+        """Index a single history entry."""
+        self.add_entries([entry])
+
+    def count(self) -> int:
+        """Get the number of indexed entries."""
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+
+    def clear(self):
+        """Remove all entries from the index."""
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM entries')
+            self._conn.execute("INSERT INTO entries_fts (entries_fts) VALUES ('delete-all')")
+
+    @staticmethod
+    def build_query(text: str) -> Optional[str]:
+        """Turn free text into an FTS5 query.
+
+        Every word must match and the last word matches as a prefix, so the
+        query works while the user is still typing. Quoting each term keeps
+        FTS5 operators in user input from being interpreted.
+        """
+        terms = re.findall(r'\w+', text or '')
+        if not terms:
+            return None
+        quoted = [f'"{term}"' for term in terms]
+        quoted[-1] += '*'
+        return ' '.join(quoted)
+
+    def search(self, text: str, model: str = None, page: int = 1, per_page: int = 20) -> Dict[str, Any]:
+        """Search indexed history, best matches first.
+
+        Args:
+            text (str): Words to search for in prompt, result and model
+            model (str): Only return entries for this model
+            page (int): 1-based page number
+            per_page (int): Results per page
+
+        Returns:
+            Dictionary with 'results', 'total', 'page' and 'per_page'
+        """
+        page = max(page, 1)
+        per_page = max(min(per_page, 100), 1)
+        query = self.build_query(text)
+        if query is None:
+            return {'results': [], 'total': 0, 'page': page, 'per_page': per_page}
+
+        where = 'entries_fts MATCH ?'
+        params = [query]
+        if model:
+            where += ' AND e.model = ?'
+            params.append(model)
+
+        with self._lock:
+            total = self._conn.execute(
+                f'SELECT COUNT(*) FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid WHERE {where}',
+                params).fetchone()[0]
+            rows = self._conn.execute(
+                f"""SELECT e.id, e.timestamp, e.model, e.duration, e.success,
+                           snippet(entries_fts, 1, '[', ']', '...', {SNIPPET_TOKENS}) AS prompt_snippet,
+                           snippet(entries_fts, 2, '[', ']', '...', {SNIPPET_TOKENS}) AS result_snippet,
+                           bm25(entries_fts, ?, ?, ?) AS score
+                    FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid
+                    WHERE {where}
+                    ORDER BY score
+                    LIMIT ? OFFSET ?""",
+                [*RANK_WEIGHTS, *params, per_page, (page - 1) * per_page]).fetchall()
+
+        results = []
+        for row in rows:
+            result = dict(row)
+            result['success'] = bool(result['success'])
+            # bm25 is lower-is-better, flip it so callers can sort descending
+            result['score'] = -result['score']
+            results.append(result)
+        return {'results': results, 'total': total, 'page': page, 'per_page': per_page}
+
+    def get_entry(self, entry_id: int) -> Optional[Dict[str, Any]]:
+        """Get a full indexed entry by id."""
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM entries WHERE id = ?', (entry_id,)).fetchone()
+        if row is None:
+            return None
+        entry = dict(row)
+        entry['success'] = bool(entry['success'])
+        return entry
+
+    def get_summaries(self, entry_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Get entries by id with the start of their prompt and result, like search results."""
+        if not entry_ids:
+            return {}
+        with self._lock:
+            rows = self._conn.execute(
+                f"""SELECT id, timestamp, model, duration, success,
+                           substr(prompt, 1, {SUMMARY_CHARS}) AS prompt_snippet,
+                           substr(result, 1, {SUMMARY_CHARS}) AS result_snippet
+                    FROM entries WHERE id IN ({', '.join('?' * len(entry_ids))})""",
+                list(entry_ids)).fetchall()
+        summaries = {}
+        for row in rows:
+            summary = dict(row)
+            summary['success'] = bool(summary['success'])
+            summaries[summary['id']] = summary
+        return summaries
+
+    def max_id(self) -> int:
+        """Get the id of the newest indexed entry, 0 when empty."""
+        with self._lock:
+            return self._conn.execute('SELECT COALESCE(MAX(id), 0) FROM entries').fetchone()[0]
+
+    def last_used(self) -> Dict[str, str]:
+        """Get the newest entry timestamp of each model."""
+        with self._lock:
+            rows = self._conn.execute('SELECT model, MAX(timestamp) FROM entries GROUP BY model').fetchall()
+        return {model: timestamp for model, timestamp in rows if model and timestamp}
+
+    def iter_entries(self, columns=('timestamp', 'model', 'duration', 'success', 'tokens_per_second'),
+                     batch_size: int = 10000, after_id: int = 0, until_id: int = None,
+                     model: str = None, since: str = None, until: str = None):
+        """Iterate over indexed entries in insertion order, reading in batches.
+
+        Args:
+            columns (tuple): Columns to read besides the id
+            batch_size (int): Rows read per query
+            after_id (int): Only entries with a larger id
+            until_id (int): Only entries with this id or smaller
+            model (str): Only entries for this model
+            since (str): Only entries with an ISO timestamp at or after this
+            until (str): Only entries with an ISO timestamp before this
+        """
+        where = ['id > ?']
+        filters = []
+        if until_id is not None:
+            where.append('id <= ?')
+            filters.append(until_id)
+        if model:
+            where.append('model = ?')
+            filters.append(model)
+        if since:
+            where.append('timestamp >= ?')
+            filters.append(since)
+        if until:
+            where.append('timestamp < ?')
+            filters.append(until)
+        sql = f"SELECT id, {', '.join(columns)} FROM entries WHERE {' AND '.join(where)} ORDER BY id LIMIT ?"
+
+        last_id = after_id
+        while True:
+            with self._lock:
+                rows = self._conn.execute(sql, (last_id, *filters, batch_size)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                entry = dict(row)
+                if 'success' in entry:
+                    entry['success'] = bool(entry['success'])
+                yield entry
+            last_id = rows[-1]['id']
+
+    def close(self):
+        """Close the index database."""
+        with self._lock:
+            self._conn.close()
+
+
+class IndexFollower:
+    """Keeps in-process listeners up to date with the shared index.
+
+    Every worker process writes the entries it handles to the shared index,
+    so following the index gives each process's analytics and suggestions
+    the entries added by all workers. ``sync`` reads only entries newer than
+    the last one seen, and starts over when the history generation changes
+    because some worker cleared the history.
+    """
+
+    COLUMNS = ('timestamp', 'model', 'prompt', 'duration', 'success', 'tokens_per_second')
+
+    def __init__(self, index: HistoryIndex, listeners, generation=None):
+        """Initialize the follower.
+
+        Args:
+            index (HistoryIndex): Shared index to follow
+            listeners (list): Objects with add_entry(entry) and clear() methods
+            generation (callable): Returns a value that changes when history is cleared
+        """
+        self.index = index
+        self.listeners = list(listeners)
+        self.generation = generation or (lambda: None)
+        self.last_id = 0
+        self._generation = self.generation()
+        self._lock = threading.Lock()
+
+    def start_at(self, last_id: int):
+        """Skip entries up to last_id, e.g. after the listeners were bulk loaded."""
+        self.last_id = last_id
+
+    def sync(self) -> int:
+        """Feed entries added since the last sync to the listeners.
+
+        Returns:
+            The number of entries fed
+        """
+        with self._lock:
+            generation = self.generation()
+            if generation != self._generation:
+                logger.info('History was cleared, resetting followers')
+                for listener in self.listeners:
+                    listener.clear()
+                self.last_id = 0
+                self._generation = generation
+            count = 0
+            for entry in self.index.iter_entries(self.COLUMNS, after_id=self.last_id):
+                for listener in self.listeners:
+                    listener.add_entry(entry)
+                self.last_id = entry['id']
+                count += 1
+            return count
@@ -1,32 +1,100 @@
 import json
 import os
 import logging
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable
 from config import Config
+from tracing import span
+from history_export import check_timestamp
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 logger = logging.getLogger(__name__)
 
+# Keys used when history is kept in a shared StateStore
+HISTORY_KEY = 'history'
+GENERATION_KEY = 'history:generation'
+
 class HistoryManager:
     """Manages the history of queries and results."""
     
-    def __init__(self, history_file='query_history.json', max_entries=100):
+    def __init__(self, history_file='query_history.json', max_entries=100, index=None, store=None):
         """Initialize the history manager.
         
         Args:
             history_file (str): Path to the history file
             max_entries (int): Maximum number of entries to keep in history
+            index (HistoryIndex): Optional search index updated as entries are added
+            store (StateStore): Optional shared store to keep history in instead of
+                the file, so several worker processes can append safely
         """
         self.history_file = history_file or Config.HISTORY_FILE
         self.max_entries = max_entries or Config.MAX_HISTORY_ENTRIES
+        self.index = index
+        self.store = store
+        self.listeners = []
         logger.info(f'Initialized HistoryManager with file: {self.history_file}, max_entries: {self.max_entries}')
         
+        if self.store is not None:
+            with self.store.lock('history:init'):
+                self._import_file()
+                self._seed_index()
+            return
+
         # Create history file if it doesn't exist
         if not os.path.exists(self.history_file):
             logger.info(f'History file not found, creating new one at: {self.history_file}')
             self.save_history([])
-    
+
+        self._seed_index()
+
+    def _import_file(self):
+        """Move an existing history file into the store, once."""
+        if not os.path.exists(self.history_file) or not self.store.set(f'{HISTORY_KEY}:imported', True, nx=True):
+            return
+        history = self._load_file()
+        if history:
+            logger.info(f'Importing {len(history)} history entries from {self.history_file}')
+            for entry in history:
+                self.store.append(HISTORY_KEY, entry, self.max_entries)
+
+    def _seed_index(self):
+        """Seed an empty index from the existing history."""
+        if self.index is not None and self.index.count() == 0:
+            history = self.load_history()
+            if history:
+                logger.info(f'Indexing {len(history)} existing history entries')
+                self.index.add_entries(history)
+
+    @contextmanager
+    def _file_lock(self):
+        """Hold an exclusive lock on the history file across processes."""
+        if fcntl is None:
+            yield
+            return
+        with open(f'{self.history_file}.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
     def load_history(self) -> List[Dict[str, Any]]:
+        """Load history from the store or file."""
+        if self.store is not None:
+            try:
+                return self.store.range(HISTORY_KEY, -self.max_entries, -1)
+            except Exception as e:
+                logger.error(f'Error loading history: {e}', exc_info=True)
+                return []
+        return self._load_file()
+
+    def _load_file(self) -> List[Dict[str, Any]]:
         """Load history from file."""
         try:
             if os.path.exists(self.history_file):
@@ -42,16 +110,32 @@ class HistoryManager:
             return []
     
     def save_history(self, history: List[Dict[str, Any]]):
-        """Save history to file."""
+        """Replace the saved history."""
         try:
+            if self.store is not None:
+                with self.store.lock('history:write'):
+                    self.store.delete(HISTORY_KEY)
+                    for entry in history:
+                        self.store.append(HISTORY_KEY, entry, self.max_entries)
+                return
             logger.debug(f'Saving history to: {self.history_file}')
-            with open(self.history_file, 'w') as f:
+            # Write a temporary file and rename it so readers never see a partial file
+            tmp_file = f'{self.history_file}.{os.getpid()}.tmp'
+            with open(tmp_file, 'w') as f:
                 json.dump(history, f, indent=2)
+            os.replace(tmp_file, self.history_file)
         except Exception as e:
             logger.error(f'Error saving history: {e}', exc_info=True)
             raise
     
-    def add_entry(self, model: str, prompt: str, result: str, duration: float, success: bool):
+    def add_listener(self, listener):
+        """Register an object notified of history changes.
+
+        The listener must provide add_entry(entry) and clear() methods.
+        """
+        self.listeners.append(listener)
+
+    def add_entry(self, model: str, prompt: str, result: str, duration: float, success: bool, **metrics):
         """Add a new entry to history.
         
         Args:
@@ -60,10 +144,10 @@ class HistoryManager:
             result (str): The response from the model
             duration (float): Time taken in seconds
             success (bool): Whether the analysis was successful
+            **metrics: Extra values stored with the entry, e.g. tokens_per_second
         """
         try:
-            logger.info(f'Adding history entry for model: {model}')
-            history = self.load_history()
+            logger.debug('Adding history entry for model: %s', model)
             
             # Create new entry
             entry = {
@@ -74,22 +158,92 @@ class HistoryManager:
                 'duration': duration,
                 'success': success
             }
+            entry.update(metrics)
             
-            # Add to end of list
-            history.append(entry)
-            
-            # Trim to max entries
-            if len(history) > self.max_entries:
-                logger.debug(f'Trimming history to {self.max_entries} entries')
-                history = history[-self.max_entries:]
-            
-            # Save updated history
-            self.save_history(history)
+            if self.store is not None:
+                # Append and trim in one atomic store operation
+                self.store.append(HISTORY_KEY, entry, self.max_entries)
+                history = self.load_history()
+            else:
+                with self._file_lock():
+                    history = self._load_file()
+
+                    # Add to end of list
+                    history.append(entry)
+
+                    # Trim to max entries
+                    if len(history) > self.max_entries:
+                        logger.debug(f'Trimming history to {self.max_entries} entries')
+                        history = history[-self.max_entries:]
+
+                    # Save updated history
+                    self.save_history(history)
+
+            if self.index is not None:
+                with span('history.index'):
+                    self.index.add_entry(entry)
+            with span('history.listeners', listeners=len(self.listeners)):
+                for listener in self.listeners:
+                    listener.add_entry(entry)
             return history
         except Exception as e:
             logger.error(f'Error adding history entry: {e}', exc_info=True)
             raise
 
+    def import_entries(self, entries: Iterable[Dict[str, Any]], batch_size: int = None) -> int:
+        """Add many existing entries, e.g. from an export of another instance.
+
+        Entries are read lazily and indexed in one transaction per batch, so
+        imports of any size run in constant memory. Only the newest
+        max_entries of them also go into the recent history. Entries with a
+        timestamp that is not ISO 8601 are skipped.
+
+        Args:
+            entries (iterable): Entry dictionaries, in chronological order
+            batch_size (int): Entries indexed per transaction
+
+        Returns:
+            The number of entries imported
+        """
+        batch_size = batch_size or Config.HISTORY_BATCH_SIZE
+        recent = deque(maxlen=self.max_entries)
+        count = 0
+
+        def flush(batch):
+            if self.index is not None:
+                self.index.add_entries(batch)
+            for entry in batch:
+                for listener in self.listeners:
+                    listener.add_entry(entry)
+
+        batch = []
+        for entry in entries:
+            entry = {key: value for key, value in entry.items() if key != 'id'}
+            try:
+                check_timestamp(entry)
+            except ValueError as e:
+                logger.warning(f'Skipping imported history entry: {e}')
+                continue
+            entry.setdefault('timestamp', datetime.now().isoformat())
+            entry['success'] = bool(entry.get('success'))
+            batch.append(entry)
+            recent.append(entry)
+            count += 1
+            if len(batch) >= batch_size:
+                flush(batch)
+                batch = []
+        flush(batch)
+
+        if self.store is not None:
+            for entry in recent:
+                self.store.append(HISTORY_KEY, entry, self.max_entries)
+        elif recent:
+            with self._file_lock():
+                history = self._load_file() + list(recent)
+                self.save_history(history[-self.max_entries:])
+        logger.info(f'Imported {count} history entries')
+        return count
+
     def get_history(self, limit: int = None) -> List[Dict[str, Any]]:
         """Get history entries, optionally limited to the last N entries"""
         history = self.load_history()
@@ -100,4 +254,14 @@ class HistoryManager:
     def clear_history(self):
         """Clear all history."""
         logger.info('Clearing history')
-        self.save_history([])
+        if self.store is not None:
+            self.store.delete(HISTORY_KEY)
+            # Tells other workers to rebuild what they derived from history
+            self.store.incr(GENERATION_KEY)
+        else:
+            with self._file_lock():
+                self.save_history([])
+        if self.index is not None:
+            self.index.clear()
+        for listener in self.listeners:
+            listener.clear()
@@ -0,0 +1,191 @@
+import os
+import gzip
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+from flask import Flask, current_app, jsonify, request
+from config import Config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_TYPES = {
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+}
+
+# Compressed static files kept in memory, by (path, fingerprint, encoding)
+STATIC_CACHE_SIZE = 64
+
+# Static files larger than this are sent uncompressed
+MAX_STATIC_COMPRESS_SIZE = 1024 * 1024
+
+_fingerprints = {}
+_static_cache = OrderedDict()
+_static_lock = threading.Lock()
+
+
+def is_compressible(mimetype: Optional[str]) -> bool:
+    """Check whether a response type is worth compressing."""
+    return bool(mimetype) and (mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES)
+
+
+def choose_encoding(accept_encoding) -> Optional[str]:
+    """Pick the best encoding the client accepts: br when available, then gzip."""
+    if brotli is not None and accept_encoding['br']:
+        return 'br'
+    if accept_encoding['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress a body with the given content encoding."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=Config.COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=Config.COMPRESS_LEVEL, mtime=0)
+
+
+def fingerprint(static_folder: str, filename: str) -> Optional[str]:
+    """Get a short content hash of a static file, cached until the file changes."""
+    path = os.path.join(static_folder, filename)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    cached = _fingerprints.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'rb') as f:
+            cached = (mtime, hashlib.sha256(f.read()).hexdigest()[:12])
+        _fingerprints[path] = cached
+    return cached[1]
+
+
+def add_static_fingerprint(endpoint: str, values: dict):
+    """url_defaults hook: add the content hash to static URLs as ?v=..."""
+    if endpoint != 'static' or 'filename' not in values or 'v' in values:
+        return
+    version = fingerprint(current_app.static_folder, values['filename'])
+    if version:
+        values['v'] = version
+
+
+def static_version() -> Optional[str]:
+    """Get the fingerprint of the static file requested, when the URL's ?v= is its current one.
+
+    Any other ?v= value is client-chosen, so the response is not treated
+    as fingerprinted.
+    """
+    version = request.args.get('v')
+    filename = (request.view_args or {}).get('filename')
+    if not version or not filename or request.endpoint != 'static':
+        return None
+    return version if version == fingerprint(current_app.static_folder, filename) else None
+
+
+def cached_json(payload, last_modified: datetime = None, max_age: int = 0):
+    """JSON response with a weak ETag, answering conditional GETs with 304.
+
+    The ETag is weak because the same representation is also sent gzip or
+    brotli encoded. With max_age 0 clients revalidate every time, which
+    still saves the body when nothing changed.
+
+    Args:
+        payload: JSON-serializable response data
+        last_modified (datetime): When the data last changed, if known
+        max_age (int): Seconds the client may reuse the response without asking
+    """
+    response = jsonify(payload)
+    response.set_etag(hashlib.sha256(response.get_data()).hexdigest()[:32], weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.max_age = max_age
+    if not max_age:
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def _compress_static(response, encoding: str):
+    """Compress a static file response, reusing earlier results for fingerprinted files."""
+    version = static_version()
+    key = (request.path, version, encoding)
+    with _static_lock:
+        body = _static_cache.get(key) if version else None
+        if body is not None:
+            _static_cache.move_to_end(key)
+    if body is not None:
+        response.close()
+    else:
+        body = compress(response.get_data(), encoding)
+        if version:
+            with _static_lock:
+                _static_cache[key] = body
+                while len(_static_cache) > STATIC_CACHE_SIZE:
+                    _static_cache.popitem(last=False)
+    return body
+
+
+def compress_response(response):
+    """after_request hook: compress responses the client can decode.
+
+    Streamed responses (SSE, NDJSON) are left alone so events are not
+    held back in a compression buffer.
+    """
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.is_streamed and not response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or not is_compressible(response.mimetype)):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.direct_passthrough:
+        # send_file responses: only static assets, and not huge ones
+        if request.endpoint != 'static' or (response.content_length or 0) > MAX_STATIC_COMPRESS_SIZE:
+            return response
+        response.direct_passthrough = False
+        body = _compress_static(response, encoding)
+    else:
+        data = response.get_data()
+        if len(data) < Config.COMPRESS_MIN_SIZE:
+            return response
+        body = compress(data, encoding)
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    # The encoded bytes differ from the identity representation
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def cache_static(response):
+    """after_request hook: fingerprinted static URLs never change, cache them for good."""
+    if response.status_code == 200 and static_version():
+        response.cache_control.public = True
+        response.cache_control.max_age = Config.STATIC_MAX_AGE
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+    return response
+
+
+def init_http_cache(app: Flask):
+    """Register compression, static fingerprinting and static caching on an app."""
+    app.url_defaults(add_static_fingerprint)
+    # after_request hooks run in reverse order: set cache headers, then compress
+    app.after_request(compress_response)
+    app.after_request(cache_static)
+    logger.debug('HTTP compression enabled (brotli: %s)', brotli is not None)
@@ -0,0 +1,263 @@
+import os
+import re
+import json
+import time
+import bisect
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import List, Dict, Any
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Catalog used before the first successful refresh, or when offline
+DEFAULT_MODELS = [
+    {'name': 'llama2', 'description': "Meta's Llama 2 LLM, fine-tuned for chat",
+     'family': 'llama', 'sizes': ['7b', '13b', '70b']},
+    {'name': 'codellama', 'description': "Meta's Llama 2 model optimized for code completion and generation",
+     'family': 'llama', 'sizes': ['7b', '13b', '34b', '70b']},
+    {'name': 'llama3.2', 'description': "Meta's Llama 3.2 small models",
+     'family': 'llama', 'sizes': ['1b', '3b'], 'capabilities': ['tools']},
+    {'name': 'llama3.2-vision', 'description': "Meta's Llama 3.2 image reasoning model",
+     'family': 'mllama', 'sizes': ['11b', '90b'], 'capabilities': ['vision']},
+    {'name': 'llava', 'description': 'Multimodal model combining a vision encoder and Vicuna',
+     'family': 'llama', 'sizes': ['7b', '13b', '34b'], 'capabilities': ['vision']},
+    {'name': 'mistral', 'description': "Mistral AI's 7B parameter model with strong performance",
+     'family': 'llama', 'sizes': ['7b'], 'capabilities': ['tools']},
+    {'name': 'mixtral', 'description': "Mistral AI's Mixture of Experts model",
+     'family': 'llama', 'sizes': ['8x7b', '8x22b'], 'capabilities': ['tools']},
+    {'name': 'dolphin-mixtral', 'description': 'Mixtral fine-tuned by Ehartford',
+     'family': 'llama', 'sizes': ['8x7b', '8x22b']},
+    {'name': 'neural-chat', 'description': "Intel's neural chat model",
+     'family': 'llama', 'sizes': ['7b']},
+    {'name': 'starling-lm', 'description': 'Starling LM model fine-tuned on conversation data',
+     'family': 'llama', 'sizes': ['7b']},
+    {'name': 'openchat', 'description': "OpenChat's model fine-tuned for conversation",
+     'family': 'llama', 'sizes': ['7b']},
+    {'name': 'phi', 'description': "Microsoft's Phi model",
+     'family': 'phi2', 'sizes': ['2.7b']},
+    {'name': 'orca-mini', 'description': 'Small but capable model based on Orca architecture',
+     'family': 'llama', 'sizes': ['3b', '7b', '13b', '70b']},
+    {'name': 'nomic-embed-text', 'description': 'Text embedding model with a large context window',
+     'family': 'nomic-bert', 'sizes': ['137m'], 'capabilities': ['embedding']},
+]
+
+# The default catalog is part of this module, so it changes with the file
+DEFAULT_UPDATED = datetime.fromtimestamp(int(os.path.getmtime(__file__)), timezone.utc)
+
+# Tags such as 7b, 2.7b, 137m or 8x7b name a model size
+SIZE_PATTERN = re.compile(r'(\d+x)?\d+(\.\d+)?[kmbt]')
+
+# Name separators, 'llama3.2-vision' is found by 'llama3.2' and 'vision'
+NAME_SEPARATORS = re.compile(r'[-_:/\s]+')
+
+# Seconds to wait before retrying a failed refresh
+RETRY_SECONDS = 300
+
+
+def normalize_models(models: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Merge library entries into one per model with its sizes, sorted by name.
+
+    Entries may carry a size tag ('llama2:13b'), a sizes list or a
+    parameter_size, at the top level or under details.
+    """
+    merged = {}
+    for model in models:
+        base, _, tag = (model.get('name') or '').partition(':')
+        if not base:
+            continue
+        details = model.get('details') or {}
+        entry = merged.setdefault(base.lower(), {'name': base, 'description': '', 'family': '',
+                                                 'sizes': [], 'capabilities': []})
+        entry['description'] = entry['description'] or model.get('description') or ''
+        entry['family'] = entry['family'] or (model.get('family') or details.get('family') or '').lower()
+        sizes = list(model.get('sizes') or [])
+        sizes.append(tag)
+        sizes.append(model.get('parameter_size') or details.get('parameter_size') or '')
+        for size in sizes:
+            size = size.lower()
+            if SIZE_PATTERN.fullmatch(size) and size not in entry['sizes']:
+                entry['sizes'].append(size)
+        for capability in model.get('capabilities') or []:
+            if capability not in entry['capabilities']:
+                entry['capabilities'].append(capability)
+    return sorted(merged.values(), key=lambda entry: entry['name'].lower())
+
+
+class LibraryCatalog:
+    """Searchable catalog of models in the Ollama library.
+
+    The catalog is served from memory and saved to a local snapshot file,
+    so it is available at startup without network access. When it is older
+    than the refresh interval it is refreshed from the remote library in a
+    background thread; requests never wait for the network. With several
+    workers one of them refreshes and the others pick up the new snapshot.
+    """
+
+    def __init__(self, fetch_manager, snapshot_file=None, url=None, refresh_seconds=None,
+                 timeout=None, store=None):
+        """Initialize the catalog from the snapshot, or the built-in list.
+
+        Args:
+            fetch_manager (FetchManager): Client used to fetch the remote library
+            snapshot_file (str): Path of the local snapshot
+            url (str): Remote library URL, empty to never refresh (air-gapped)
+            refresh_seconds (int): Age after which the catalog is refreshed
+            timeout (float): Seconds to wait for the remote library
+            store (StateStore): Optional shared store, so one worker refreshes at a time
+        """
+        self.fetch_manager = fetch_manager
+        self.snapshot_file = snapshot_file or Config.LIBRARY_SNAPSHOT_FILE
+        self.url = Config.LIBRARY_URL if url is None else url
+        self.refresh_seconds = refresh_seconds or Config.LIBRARY_REFRESH_SECONDS
+        self.timeout = timeout or Config.LIBRARY_TIMEOUT
+        self.store = store
+        self._lock = threading.Lock()
+        self._worker = None
+        self._snapshot_mtime = None
+        self._set(normalize_models(DEFAULT_MODELS), DEFAULT_UPDATED, 'default')
+        self._next_refresh = 0
+        self._load_snapshot()
+
+    def _set(self, models: List[Dict[str, Any]], updated: datetime, source: str):
+        """Replace the catalog and rebuild the search index."""
+        tokens = []
+        for position, model in enumerate(models):
+            words = {model['name'].lower(), model['family'], *model['sizes']}
+            words.update(NAME_SEPARATORS.split(model['name'].lower()))
+            tokens.extend((word, position) for word in words if word)
+        tokens.sort()
+        with self._lock:
+            self.models = models
+            self.updated = updated
+            self.source = source
+            self._tokens = tokens
+            self._next_refresh = updated.timestamp() + self.refresh_seconds
+
+    def _load_snapshot(self) -> bool:
+        """Load the snapshot file if it exists and changed since it was last read."""
+        try:
+            mtime = os.path.getmtime(self.snapshot_file)
+        except OSError:
+            return False
+        if mtime == self._snapshot_mtime:
+            return False
+        try:
+            with open(self.snapshot_file, 'r') as f:
+                snapshot = json.load(f)
+            self._set(snapshot['models'], datetime.fromisoformat(snapshot['updated']), 'snapshot')
+            self._snapshot_mtime = mtime
+            logger.info(f"Loaded {len(self.models)} library models from {self.snapshot_file}")
+            return True
+        except Exception as e:
+            logger.error(f"Error loading library snapshot: {e}")
+            self._snapshot_mtime = mtime
+            return False
+
+    def _save_snapshot(self):
+        """Write the snapshot atomically so other workers never read a partial file."""
+        tmp_file = f'{self.snapshot_file}.{os.getpid()}.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({'updated': self.updated.isoformat(), 'models': self.models}, f)
+        os.replace(tmp_file, self.snapshot_file)
+        self._snapshot_mtime = os.path.getmtime(self.snapshot_file)
+
+    def refresh(self) -> bool:
+        """Fetch the remote library now and save it to the snapshot.
+
+        Returns:
+            True if the catalog was updated
+        """
+        data = self.fetch_manager.get_library_models(self.url, timeout=self.timeout)
+        models = normalize_models(data.get('models', [])) if data else []
+        if not models:
+            with self._lock:
+                self._next_refresh = time.time() + RETRY_SECONDS
+            return False
+        self._set(models, datetime.now(timezone.utc), 'remote')
+        try:
+            self._save_snapshot()
+        except OSError as e:
+            logger.error(f"Error saving library snapshot: {e}")
+        logger.info(f"Refreshed library catalog: {len(models)} models")
+        return True
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            logger.error(f"Error refreshing library catalog: {e}")
+            with self._lock:
+                self._next_refresh = time.time() + RETRY_SECONDS
+
+    def maybe_refresh(self):
+        """Pick up a snapshot written by another worker, or start a refresh when stale."""
+        self._load_snapshot()
+        if not self.url or time.time() < self._next_refresh:
+            return
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            # Only one worker refreshes; the others see its snapshot afterwards
+            if self.store is not None and not self.store.set('library:refresh', os.getpid(),
+                                                             ttl=self.timeout * 3, nx=True):
+                self._next_refresh = time.time() + self.timeout * 3
+                return
+            self._next_refresh = time.time() + RETRY_SECONDS
+            self._worker = threading.Thread(target=self._refresh_in_background,
+                                            name='library-refresh', daemon=True)
+            self._worker.start()
+
+    @staticmethod
+    def _matching(tokens: List[tuple], term: str) -> set:
+        """Positions of models with a word starting with term."""
+        positions = set()
+        for index in range(bisect.bisect_left(tokens, (term,)), len(tokens)):
+            word, position = tokens[index]
+            if not word.startswith(term):
+                break
+            positions.add(position)
+        return positions
+
+    def search(self, query: str = '', family: str = None, size: str = None,
+               capability: str = None) -> List[Dict[str, Any]]:
+        """Find models by name, family or size prefix and optional exact filters.
+
+        Args:
+            query (str): Words that must each start a word of the model's
+                name, its family or one of its sizes
+            family (str): Only models of this family
+            size (str): Only models available in this size, e.g. '7b'
+            capability (str): Only models with this capability, e.g. 'vision'
+
+        Returns:
+            Matching models sorted by name
+        """
+        self.maybe_refresh()
+        with self._lock:
+            models, tokens = self.models, self._tokens
+        terms = NAME_SEPARATORS.split((query or '').lower().strip())
+        positions = None
+        for term in filter(None, terms):
+            matches = self._matching(tokens, term)
+            positions = matches if positions is None else positions & matches
+        candidates = models if positions is None else [models[p] for p in sorted(positions)]
+
+        family = (family or '').lower()
+        size = (size or '').lower()
+        return [model for model in candidates
+                if (not family or model['family'] == family)
+                and (not size or size in model['sizes'])
+                and (not capability or capability in model['capabilities'])]
+
+    def sizes(self, name: str) -> List[str]:
+        """Get the sizes the library lists for a model name, empty if it is not listed."""
+        name = (name or '').lower()
+        with self._lock:
+            models = self.models
+        return next((list(model['sizes']) for model in models if model['name'].lower() == name), [])
+
+    def families(self) -> List[str]:
+        """Get the model families in the catalog."""
+        return sorted({model['family'] for model in self.models if model['family']})
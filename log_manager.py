@@ -0,0 +1,146 @@
+import os
+import copy
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+from config import Config
+from tracing import TraceContextFilter
+
+LOG_FORMAT = '%(levelname)s    %(name)s:%(filename)s:%(lineno)d trace_id=%(trace_id)s %(message)s'
+
+# Pass as extra= on hot-path log calls to have them sampled
+SAMPLED = {'sampled': True}
+
+class TruncatingFormatter(logging.Formatter):
+    """Formatter that cuts long messages, e.g. logged payloads, to a maximum length."""
+
+    def __init__(self, fmt=None, max_length=None):
+        super().__init__(fmt)
+        self.max_length = max_length or Config.LOG_MAX_MESSAGE_LENGTH
+
+    def format(self, record):
+        message = record.getMessage()
+        if len(message) > self.max_length:
+            record = copy.copy(record)
+            record.msg = f'{message[:self.max_length]}... [{len(message) - self.max_length} more chars]'
+            record.args = None
+        return super().format(record)
+
+
+class SamplingFilter(logging.Filter):
+    """Let through one in every N records logged with extra=SAMPLED, per call site.
+
+    Records without the 'sampled' attribute always pass.
+    """
+
+    def __init__(self, rate=None):
+        super().__init__()
+        self.rate = max(rate or Config.LOG_SAMPLE_RATE, 1)
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if not getattr(record, 'sampled', False) or self.rate == 1:
+            return True
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        return count % self.rate == 0
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Queue handler that never blocks or formats on the logging thread.
+
+    Records are handed to the listener thread unformatted, so message
+    formatting happens off the request thread. When the queue is full the
+    record is dropped and counted instead of blocking.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+_output_handler: Optional[logging.Handler] = None
+
+
+def configure_logging(level=None, stream_handler=None):
+    """Route all logging through a background queue listener.
+
+    Args:
+        level (str): Initial log level name, defaults to Config.LOG_LEVEL
+        stream_handler (logging.Handler): Output handler, defaults to stderr
+
+    Returns:
+        The queue handler installed on the root logger
+    """
+    global _listener, _queue_handler, _output_handler
+    shutdown_logging()
+
+    handler = _output_handler = stream_handler or logging.StreamHandler()
+    handler.setFormatter(TruncatingFormatter(LOG_FORMAT))
+
+    _queue_handler = NonBlockingQueueHandler(queue.Queue(Config.LOG_QUEUE_SIZE))
+    _queue_handler.addFilter(SamplingFilter())
+    # Stamped here, on the logging thread, as the listener thread has no request context
+    _queue_handler.addFilter(TraceContextFilter())
+    _listener = QueueListener(_queue_handler.queue, handler, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    for existing in [h for h in root.handlers if isinstance(h, NonBlockingQueueHandler)]:
+        root.removeHandler(existing)
+    root.addHandler(_queue_handler)
+    set_level(level or Config.LOG_LEVEL)
+    return _queue_handler
+
+
+def shutdown_logging():
+    """Stop the listener thread after flushing queued records."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def set_level(level: str):
+    """Change the log level at runtime."""
+    logging.getLogger().setLevel(level.upper())
+
+
+def get_level() -> str:
+    """Get the current root log level name."""
+    return logging.getLevelName(logging.getLogger().getEffectiveLevel())
+
+
+def get_dropped() -> int:
+    """Get the number of records dropped because the queue was full."""
+    return _queue_handler.dropped if _queue_handler else 0
+
+
+def _restart_after_fork():
+    """Start a new listener in a forked child, the parent's thread does not exist there."""
+    global _listener
+    if _listener is not None:
+        _listener = None
+        configure_logging(get_level(), _output_handler)
+
+
+atexit.register(shutdown_logging)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_after_fork)
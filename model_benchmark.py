@@ -0,0 +1,328 @@
+import os
+import time
+import zlib
+import base64
+import struct
+import sqlite3
+import logging
+import secrets
+import statistics
+import threading
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+import requests
+from config import Config
+from model_metadata import canonical_name, parse_capabilities
+from model_tuner import measure
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT,
+    timestamp TEXT,
+    model TEXT,
+    digest TEXT,
+    workload TEXT,
+    runs INTEGER,
+    ttft_seconds REAL,
+    prompt_tps REAL,
+    decode_tps REAL,
+    load_seconds REAL,
+    memory_bytes INTEGER,
+    vram_bytes INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS results_model_workload ON results(model, workload, id);
+"""
+
+COLUMNS = ('run_id', 'timestamp', 'model', 'digest', 'workload', 'runs', 'ttft_seconds', 'prompt_tps',
+           'decode_tps', 'load_seconds', 'memory_bytes', 'vram_bytes', 'error')
+
+# Options sent with every benchmark call, so models are compared on the same work
+BENCHMARK_OPTIONS = {'num_predict': 128, 'temperature': 0, 'seed': 0}
+
+# Store key held while a benchmark runs, so only one worker runs one at a time
+RUNNING_KEY = 'benchmark:running'
+
+
+def benchmark_image(size: int = 128) -> str:
+    """A fixed base64 PNG for the vision workload: a red disc on a blue-green gradient."""
+    rows = []
+    for y in range(size):
+        row = bytearray(b'\x00')
+        for x in range(size):
+            if (x - size / 2) ** 2 + (y - size / 2) ** 2 < (size / 4) ** 2:
+                row += bytes((220, 30, 30))
+            else:
+                row += bytes((0, 255 * x // size, 255 * y // size))
+        rows.append(bytes(row))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    png = (b'\x89PNG\r\n\x1a\n'
+           + chunk(b'IHDR', struct.pack('>IIBBBBB', size, size, 8, 2, 0, 0, 0))
+           + chunk(b'IDAT', zlib.compress(b''.join(rows), 9))
+           + chunk(b'IEND', b''))
+    return base64.b64encode(png).decode('ascii')
+
+
+# Fixed workloads, run as a chat turn like llama_vision.py; vision ones only for vision models
+WORKLOADS = {
+    'text': {
+        'prompt': 'Write a short paragraph explaining how a hash table handles collisions.',
+        'vision': False,
+    },
+    'vision': {
+        'prompt': 'What shapes and colors are in this image?',
+        'vision': True,
+    },
+}
+
+
+class BenchmarkStore:
+    """SQLite store of benchmark results, kept across runs for comparison."""
+
+    def __init__(self, path: str = None):
+        """Initialize the store.
+
+        Args:
+            path (str): Path to the SQLite database
+        """
+        self.path = path or Config.BENCHMARK_RESULTS_FILE
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+
+    def add(self, result: Dict[str, Any]):
+        """Save one model's result for one workload."""
+        with self._lock, self._conn:
+            self._conn.execute(f'INSERT INTO results ({", ".join(COLUMNS)}) VALUES ({", ".join("?" * len(COLUMNS))})',
+                               tuple(result.get(column) for column in COLUMNS))
+
+    def leaderboard(self, workload: str = None, history: int = 5) -> List[Dict[str, Any]]:
+        """Get the latest result of each model and workload, fastest decoding first.
+
+        Args:
+            workload (str): Only this workload
+            history (int): Decode speeds of this many runs to include, latest first
+
+        Returns:
+            Result rows by workload, each with a 'history' list of earlier runs'
+            run_id, timestamp and decode_tps, failed runs last
+        """
+        sql = 'SELECT * FROM results'
+        params = ()
+        if workload:
+            sql += ' WHERE workload = ?'
+            params = (workload,)
+        with self._lock:
+            rows = self._conn.execute(sql + ' ORDER BY id DESC', params).fetchall()
+
+        latest = {}
+        for row in rows:
+            key = (row['workload'], row['model'])
+            if key not in latest:
+                latest[key] = {**dict(row), 'history': []}
+            runs = latest[key]['history']
+            if len(runs) < history:
+                runs.append({'run_id': row['run_id'], 'timestamp': row['timestamp'], 'decode_tps': row['decode_tps']})
+        return sorted(latest.values(), key=lambda row: (row['workload'], row['error'] is not None,
+                                                         -(row['decode_tps'] or 0), row['model']))
+
+
+def format_leaderboard(rows: List[Dict[str, Any]]) -> str:
+    """Render leaderboard rows as a plain text table."""
+    header = (f"{'workload':<8} {'model':<28} {'decode':>9} {'prompt':>9} {'ttft':>7} {'load':>7} "
+              f"{'memory':>8} {'vram':>8}  history (tok/s, latest first)")
+    lines = [header, '-' * len(header)]
+    for row in rows:
+        if row['error']:
+            lines.append(f"{row['workload']:<8} {row['model']:<28} failed: {row['error']}")
+            continue
+        history = ' '.join(f"{run['decode_tps']:.1f}" if run['decode_tps'] is not None else '-'
+                           for run in row['history'])
+        lines.append(f"{row['workload']:<8} {row['model']:<28} {row['decode_tps']:>9.1f} {row['prompt_tps']:>9.1f} "
+                     f"{row['ttft_seconds']:>6.2f}s {row['load_seconds']:>6.2f}s "
+                     f"{(row['memory_bytes'] or 0) / 1e9:>6.2f}GB {(row['vram_bytes'] or 0) / 1e9:>6.2f}GB  {history}")
+    return '\n'.join(lines)
+
+
+class ModelBenchmark:
+    """Run the fixed workloads against local models and record the results.
+
+    Each model is unloaded before its workloads, so the first call measures
+    the load time. Time to first token and speeds are the medians of the
+    calls after it, and the memory footprint is read from /api/ps once the
+    model is loaded. Benchmarks share the GPU with other Ollama calls, so
+    run them while the server is idle.
+    """
+
+    def __init__(self, fetch_manager, store: BenchmarkStore, repeat: int = None, state_store=None,
+                 timeout: float = 600):
+        """Initialize the benchmark.
+
+        Args:
+            fetch_manager (FetchManager): Client for the Ollama server
+            store (BenchmarkStore): Where results are saved
+            repeat (int): Calls per model and workload, the first one loading the model
+            state_store (StateStore): Shared store, so one benchmark runs at a time across workers
+            timeout (float): Seconds to wait for one call, model load included
+        """
+        self.fetch_manager = fetch_manager
+        self.store = store
+        self.repeat = max(1, repeat or Config.BENCHMARK_REPEAT)
+        self.state_store = state_store
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+
+    def local_models(self) -> List[Dict[str, Any]]:
+        """Get the local models that can generate text, with their digests and capabilities."""
+        models = (self.fetch_manager.fetch_models_list() or {}).get('models')
+        if models is None:
+            raise ConnectionError(f'Could not list the models of {self.fetch_manager.base_url}')
+        local = []
+        for model in models:
+            capabilities = parse_capabilities(self.fetch_manager.fetch_model_info(model['name']) or {})
+            if 'embedding' not in capabilities:
+                local.append({'name': canonical_name(model['name']), 'digest': model.get('digest'),
+                              'capabilities': capabilities})
+        return local
+
+    def _call(self, model: str, workload: Dict[str, Any]) -> Dict[str, Any]:
+        """Make one streamed chat call and time its first token."""
+        message = {'role': 'user', 'content': workload['prompt']}
+        if workload['vision']:
+            message['images'] = [benchmark_image()]
+        start = time.perf_counter()
+        ttft = None
+        final = {}
+        for chunk in self.fetch_manager.chat_stream(model, [message], options=BENCHMARK_OPTIONS,
+                                                    timeout=self.timeout):
+            if ttft is None and (chunk.get('message') or {}).get('content'):
+                ttft = time.perf_counter() - start
+            if chunk.get('done'):
+                final = chunk
+        return {'ttft_seconds': ttft if ttft is not None else time.perf_counter() - start, **measure([final])}
+
+    def _memory(self, model: str) -> Dict[str, Optional[int]]:
+        for running in (self.fetch_manager.fetch_running_models() or {}).get('models', []):
+            if canonical_name(running.get('name') or running.get('model')) == model:
+                return {'memory_bytes': running.get('size'), 'vram_bytes': running.get('size_vram')}
+        return {'memory_bytes': None, 'vram_bytes': None}
+
+    def run_workload(self, model: str, workload_name: str) -> Dict[str, Any]:
+        """Benchmark one model on one workload.
+
+        Returns:
+            The result, with 'error' set if Ollama refused the calls
+
+        Raises:
+            requests.exceptions.ConnectionError, requests.exceptions.Timeout: If Ollama stops answering
+        """
+        self.fetch_manager.unload_model(model)
+        try:
+            calls = [self._call(model, WORKLOADS[workload_name]) for _ in range(self.repeat)]
+        except requests.exceptions.HTTPError as e:
+            logger.warning(f'Benchmark {workload_name} failed for {model}: {e}')
+            return {'model': model, 'workload': workload_name, 'runs': 0, 'error': str(e)}
+        warm = calls[1:] or calls
+        return {
+            'model': model,
+            'workload': workload_name,
+            'runs': len(calls),
+            'ttft_seconds': round(statistics.median(call['ttft_seconds'] for call in warm), 3),
+            'prompt_tps': round(statistics.median(call['prompt_tps'] for call in warm), 2),
+            'decode_tps': round(statistics.median(call['decode_tps'] for call in warm), 2),
+            'load_seconds': calls[0]['load_seconds'],
+            **self._memory(model),
+        }
+
+    def run(self, models: List[str] = None, workloads: List[str] = None, run_id: str = None) -> List[Dict[str, Any]]:
+        """Benchmark local models and save each result as it completes.
+
+        Args:
+            models (list): Only these models, all local text models if not given
+            workloads (list): Names from WORKLOADS, all of them if not given
+            run_id (str): Identifier shared by the run's results
+
+        Returns:
+            The run's results
+
+        Raises:
+            ValueError: If a workload is unknown
+        """
+        workloads = workloads or list(WORKLOADS)
+        unknown = set(workloads) - set(WORKLOADS)
+        if unknown:
+            raise ValueError(f'Unknown workloads: {", ".join(sorted(unknown))}')
+        run_id = run_id or secrets.token_hex(4)
+        timestamp = datetime.now().isoformat(timespec='seconds')
+        selected = {canonical_name(model) for model in models or []}
+
+        results = []
+        for model in self.local_models():
+            if selected and model['name'] not in selected:
+                continue
+            for workload_name in workloads:
+                if WORKLOADS[workload_name]['vision'] and 'vision' not in model['capabilities']:
+                    continue
+                logger.info(f"Benchmarking {model['name']} on the {workload_name} workload")
+                result = {**self.run_workload(model['name'], workload_name),
+                          'run_id': run_id, 'timestamp': timestamp, 'digest': model['digest']}
+                self.store.add(result)
+                results.append(result)
+        return results
+
+    def running(self) -> Optional[Dict[str, Any]]:
+        """Get the benchmark running in any worker, None if there is none."""
+        if self.state_store is not None:
+            return self.state_store.get(RUNNING_KEY)
+        with self._lock:
+            return {'run_id': self._worker.name} if self._worker is not None and self._worker.is_alive() else None
+
+    def start(self, models: List[str] = None, workloads: List[str] = None) -> Optional[str]:
+        """Run a benchmark in the background.
+
+        Returns:
+            The run's id, None if a benchmark is already running
+
+        Raises:
+            ValueError: If a workload is unknown
+        """
+        unknown = set(workloads or []) - set(WORKLOADS)
+        if unknown:
+            raise ValueError(f'Unknown workloads: {", ".join(sorted(unknown))}')
+        run_id = secrets.token_hex(4)
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return None
+            if self.state_store is not None and not self.state_store.set(
+                    RUNNING_KEY, {'run_id': run_id, 'pid': os.getpid(), 'started': time.time()},
+                    ttl=self.timeout * 10, nx=True):
+                return None
+            self._worker = threading.Thread(target=self._run_in_background, args=(models, workloads, run_id),
+                                            name=run_id, daemon=True)
+            self._worker.start()
+        return run_id
+
+    def _run_in_background(self, models, workloads, run_id):
+        try:
+            results = self.run(models, workloads, run_id=run_id)
+            logger.info(f'Benchmark {run_id} finished with {len(results)} results')
+        except Exception as e:
+            logger.error(f'Benchmark {run_id} stopped: {e}')
+        finally:
+            if self.state_store is not None:
+                self.state_store.delete(RUNNING_KEY)
+
+    def wait(self, timeout: float = None):
+        """Wait for a benchmark started in this process to finish."""
+        worker = self._worker
+        if worker is not None:
+            worker.join(timeout)
@@ -0,0 +1,241 @@
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Store keys: metadata by digest never goes stale, the name map follows /api/tags
+METADATA_KEY = 'models:meta:{digest}'
+DIGESTS_KEY = 'models:digests'
+
+# Cache key prefix for models fetched before their digest was known, kept per process
+NAME_KEY_PREFIX = 'name:'
+
+# Used only for models whose /api/show data has not been cached yet
+VISION_NAME_HINTS = ('llava', 'vision', 'moondream', 'minicpm-v')
+
+# model_info keys that only multimodal or embedding models have
+VISION_INFO_MARKERS = ('.vision.', 'clip.')
+EMBEDDING_INFO_MARKERS = ('.pooling_type',)
+
+# Memoized model types kept; names come from requests, so the memo is bounded
+MAX_CACHED_TYPES = 1024
+
+
+def canonical_name(model: str) -> str:
+    """Add the implicit ':latest' tag so 'llava' and 'llava:latest' match."""
+    model = (model or '').strip()
+    return model if not model or ':' in model else f'{model}:latest'
+
+
+def parse_timestamp(value):
+    """Parse an Ollama RFC 3339 timestamp, which may have nanoseconds."""
+    value = value.replace('Z', '+00:00')
+    if '.' in value:
+        head, tail = value.split('.', 1)
+        digits = len(tail) - len(tail.lstrip('0123456789'))
+        value = f"{head}.{tail[:digits][:6].ljust(6, '0')}{tail[digits:]}"
+    return datetime.fromisoformat(value)
+
+
+def parse_num_ctx(info: Dict[str, Any]) -> Tuple[Optional[int], Optional[int]]:
+    """Extract (num_ctx, context_length) from an /api/show response."""
+    num_ctx = None
+    for line in (info.get('parameters') or '').splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[0] == 'num_ctx':
+            try:
+                num_ctx = int(parts[1])
+            except ValueError:
+                pass
+    context_length = None
+    for key, value in (info.get('model_info') or {}).items():
+        if key.endswith('.context_length'):
+            context_length = int(value)
+            break
+    return num_ctx, context_length
+
+
+def parse_capabilities(info: Dict[str, Any]) -> List[str]:
+    """Get a model's capabilities from an /api/show response.
+
+    Ollama 0.6.4+ reports them directly. For older servers they are
+    inferred from the model's families and architecture keys.
+    """
+    if info.get('capabilities'):
+        return list(info['capabilities'])
+    details = info.get('details') or {}
+    families = {family.lower() for family in (details.get('families') or [])}
+    keys = list((info.get('model_info') or {}).keys()) + list((info.get('projector_info') or {}).keys())
+    if 'bert' in families or any(marker in key for key in keys for marker in EMBEDDING_INFO_MARKERS):
+        return ['embedding']
+    capabilities = ['completion']
+    if (info.get('projector_info') or families & {'clip', 'mllama'}
+            or any(marker in key for key in keys for marker in VISION_INFO_MARKERS)):
+        capabilities.append('vision')
+    return capabilities
+
+
+def parse_show(info: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce an /api/show response to the metadata the app uses."""
+    details = info.get('details') or {}
+    num_ctx, context_length = parse_num_ctx(info)
+    return {
+        'capabilities': parse_capabilities(info),
+        'context_length': context_length,
+        'num_ctx': num_ctx,
+        'family': details.get('family'),
+        'parameter_size': details.get('parameter_size'),
+        'quantization_level': details.get('quantization_level'),
+    }
+
+
+class ModelMetadataCache:
+    """Model capabilities and sizes from /api/show, cached by model digest.
+
+    A digest identifies the model's content, so its metadata never changes
+    and is shared with all workers through the state store. When the local
+    model list changes, metadata for new digests is fetched in a background
+    thread, so requests only read the cache. Lookups for a model not seen
+    yet fall back to guessing from its name.
+    """
+
+    def __init__(self, fetch_manager, store=None):
+        """Initialize the metadata cache.
+
+        Args:
+            fetch_manager (FetchManager): Client used to call /api/show
+            store (StateStore): Optional store shared by worker processes
+        """
+        self.fetch_manager = fetch_manager
+        self.store = store
+        self._digests = {}
+        self._metadata = {}
+        self._types = OrderedDict()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def _digest(self, model: str) -> Optional[str]:
+        """Get a model's digest from the last model list seen by any worker."""
+        name = canonical_name(model)
+        with self._lock:
+            digest = self._digests.get(name)
+        if digest is None and self.store is not None:
+            digests = self.store.get(DIGESTS_KEY) or {}
+            with self._lock:
+                self._digests.update(digests)
+            digest = digests.get(name)
+        return digest
+
+    def _shared(self, key: str) -> bool:
+        return self.store is not None and not key.startswith(NAME_KEY_PREFIX)
+
+    def _cached(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            metadata = self._metadata.get(key)
+        if metadata is None and self._shared(key):
+            metadata = self.store.get(METADATA_KEY.format(digest=key))
+            if metadata is not None:
+                with self._lock:
+                    self._metadata[key] = metadata
+        return metadata
+
+    def _load(self, model: str, key: str) -> Optional[Dict[str, Any]]:
+        """Fetch and cache a model's metadata."""
+        info = self.fetch_manager.fetch_model_info(model)
+        if not info:
+            return None
+        metadata = parse_show(info)
+        metadata['name'] = canonical_name(model)
+        with self._lock:
+            self._metadata[key] = metadata
+            self._types.clear()
+        if self._shared(key):
+            self.store.set(METADATA_KEY.format(digest=key), metadata)
+        logger.debug(f'Cached metadata for {model}: {metadata}')
+        return metadata
+
+    def update_models(self, models: List[Dict[str, Any]], background: bool = True):
+        """Record the current local model list from /api/tags.
+
+        Metadata for models not cached yet is fetched, in a background
+        thread unless background is False. Fetches that failed are retried
+        the next time the list is seen.
+        """
+        digests = {canonical_name(m['name']): m['digest'] for m in models if m.get('name') and m.get('digest')}
+        with self._lock:
+            changed = digests != self._digests
+            self._digests = dict(digests)
+            if changed:
+                self._types.clear()
+        if changed and self.store is not None:
+            self.store.set(DIGESTS_KEY, digests)
+
+        missing = [(name, digest) for name, digest in digests.items() if self._cached(digest) is None]
+        if not missing:
+            return
+        if not background:
+            self._populate(missing)
+            return
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._populate, args=(missing,),
+                                            name='model-metadata', daemon=True)
+            self._worker.start()
+
+    def _populate(self, missing):
+        logger.info(f'Fetching metadata for {len(missing)} models')
+        for name, digest in missing:
+            try:
+                self._load(name, digest)
+            except Exception as e:
+                logger.error(f'Error caching metadata for {name}: {e}')
+
+    def get(self, model: str, fetch: bool = False) -> Optional[Dict[str, Any]]:
+        """Get a model's cached metadata.
+
+        Args:
+            model (str): Model name, with or without a tag
+            fetch (bool): Call /api/show on a cache miss instead of returning None
+        """
+        if not model:
+            return None
+        key = self._digest(model) or f'{NAME_KEY_PREFIX}{canonical_name(model)}'
+        metadata = self._cached(key)
+        if metadata is None and fetch:
+            metadata = self._load(model, key)
+        return metadata
+
+    def supports(self, model: str, capability: str) -> Optional[bool]:
+        """Check a capability, or None when the model's metadata is not cached."""
+        metadata = self.get(model)
+        if metadata is None:
+            return None
+        return capability in metadata['capabilities']
+
+    def model_type(self, model: str) -> str:
+        """Get the prompt set ('vision' or 'text') for a model.
+
+        Results are memoized until the model list or metadata changes, as
+        this is called for every history entry when suggestions are rebuilt.
+        Only the most recently used MAX_CACHED_TYPES names are kept.
+        """
+        with self._lock:
+            model_type = self._types.get(model)
+            if model_type is not None:
+                self._types.move_to_end(model)
+        if model_type is not None:
+            return model_type
+        vision = self.supports(model, 'vision')
+        if vision is None:
+            name = (model or '').lower()
+            vision = any(hint in name for hint in VISION_NAME_HINTS)
+        model_type = 'vision' if vision else 'text'
+        with self._lock:
+            self._types[model] = model_type
+            while len(self._types) > MAX_CACHED_TYPES:
+                self._types.popitem(last=False)
+        return model_type
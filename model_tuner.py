@@ -0,0 +1,236 @@
+import os
+import json
+import logging
+import itertools
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+import requests
+from config import Config
+from model_metadata import canonical_name, parse_capabilities
+
+logger = logging.getLogger(__name__)
+
+# Prompts run for every option combination: a short question and a long
+# input, so both prompt evaluation and decoding are measured
+TUNING_PROMPTS = [
+    'Explain in three sentences why the sky is blue.',
+    'Summarize the following notes in one paragraph.\n\n' + ' '.join(
+        f'Note {i}: the build on branch {i % 7} failed at step {i % 5} and was retried after {i % 11} minutes.'
+        for i in range(60)),
+]
+
+# Options sent with every tuning call, so runs are comparable
+TUNING_OPTIONS = {'num_predict': 128, 'temperature': 0, 'seed': 0}
+
+# Combinations within this fraction of the best decode speed count as equally fast
+DEFAULT_TOLERANCE = 0.1
+
+# Options tuned; the best values are written to the model's generation profile
+TUNED_OPTIONS = ('num_ctx', 'num_batch', 'num_thread')
+
+
+def default_grid() -> Dict[str, List[int]]:
+    """Option values tried by default, the thread counts depending on this host."""
+    cpus = os.cpu_count() or 4
+    return {
+        'num_ctx': [2048, 4096, 8192],
+        'num_batch': [256, 512],
+        'num_thread': sorted({max(1, cpus // 2), cpus}),
+    }
+
+
+def combo_key(options: Dict[str, Any]) -> str:
+    """Key of an option combination in the results file, e.g. 'num_batch=256,num_ctx=2048'."""
+    return ','.join(f'{name}={options[name]}' for name in sorted(options))
+
+
+def grid_combinations(grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Every combination of the grid's option values, in a stable order."""
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def measure(responses: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Compute speeds from Ollama's timing fields, which are in nanoseconds.
+
+    Args:
+        responses (list): /api/generate responses for the prompt set, in order
+
+    Returns:
+        {'prompt_tps', 'decode_tps', 'load_seconds'}, load time being that of the first call
+    """
+    prompt_tokens = sum(response.get('prompt_eval_count') or 0 for response in responses)
+    prompt_ns = sum(response.get('prompt_eval_duration') or 0 for response in responses)
+    decode_tokens = sum(response.get('eval_count') or 0 for response in responses)
+    decode_ns = sum(response.get('eval_duration') or 0 for response in responses)
+    return {
+        'prompt_tps': round(prompt_tokens / (prompt_ns / 1e9), 2) if prompt_ns else 0.0,
+        'decode_tps': round(decode_tokens / (decode_ns / 1e9), 2) if decode_ns else 0.0,
+        'load_seconds': round((responses[0].get('load_duration') or 0) / 1e9, 3) if responses else 0.0,
+    }
+
+
+def pick_best(trials: Dict[str, Dict[str, Any]], tolerance: float = DEFAULT_TOLERANCE) -> Optional[Dict[str, Any]]:
+    """Choose the best trial of a model.
+
+    Among the trials within ``tolerance`` of the fastest decode speed, the
+    one with the largest num_ctx wins, then the fastest. A larger context
+    costs little when it decodes about as fast, and saves trimming prompts.
+
+    Args:
+        trials (dict): Trials by combination key, each with 'options' and speeds or 'error'
+        tolerance (float): Fraction of the best decode speed that may be given up
+
+    Returns:
+        The best trial, None if every trial failed
+    """
+    succeeded = [trial for trial in trials.values() if 'error' not in trial and trial.get('decode_tps')]
+    if not succeeded:
+        return None
+    fastest = max(trial['decode_tps'] for trial in succeeded)
+    candidates = [trial for trial in succeeded if trial['decode_tps'] >= fastest * (1 - tolerance)]
+    return max(candidates, key=lambda trial: (trial['options'].get('num_ctx', 0),
+                                              trial['decode_tps'], trial['prompt_tps']))
+
+
+class ModelTuner:
+    """Benchmark local models over a grid of Ollama options.
+
+    Each combination of options runs the prompt set once. Its results are
+    saved to the results file straight away, so an interrupted run resumes
+    where it stopped. A model's results are discarded when its digest
+    changes. The best options of each model are written to its full name's
+    entry in the generation profiles file, where they are layered on top of
+    the model's other profiles.
+    """
+
+    def __init__(self, fetch_manager, results_file: str = None, profiles_file: str = None,
+                 grid: Dict[str, List[Any]] = None, prompts: List[str] = None,
+                 tolerance: float = DEFAULT_TOLERANCE, timeout: float = 600):
+        """Initialize the tuner.
+
+        Args:
+            fetch_manager (FetchManager): Client for the Ollama server
+            results_file (str): JSON file with the trials run so far
+            profiles_file (str): Generation profiles file to write the best options to
+            grid (dict): Option values to try by option name, default_grid() if not given
+            prompts (list): Prompt set, TUNING_PROMPTS if not given
+            tolerance (float): See pick_best
+            timeout (float): Seconds to wait for one generate call, model load included
+        """
+        self.fetch_manager = fetch_manager
+        self.results_file = results_file or Config.TUNING_RESULTS_FILE
+        self.profiles_file = profiles_file or Config.GENERATION_PROFILES_FILE
+        self.grid = grid or default_grid()
+        self.prompts = prompts or TUNING_PROMPTS
+        self.tolerance = tolerance
+        self.timeout = timeout
+        self.results = self._read_json(self.results_file)
+
+    def _read_json(self, path: str) -> Dict[str, Any]:
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def _write_json(self, path: str, data: Dict[str, Any]):
+        """Write atomically, so an interrupted run or a reading worker never sees a partial file."""
+        tmp_file = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_file, path)
+
+    def local_models(self) -> List[Dict[str, Any]]:
+        """Get the local models that can generate text, with their digests.
+
+        Raises:
+            ConnectionError: If Ollama cannot be reached
+        """
+        models = (self.fetch_manager.fetch_models_list() or {}).get('models')
+        if models is None:
+            raise ConnectionError(f'Could not list the models of {self.fetch_manager.base_url}')
+        local = []
+        for model in models:
+            info = self.fetch_manager.fetch_model_info(model['name']) or {}
+            if 'embedding' in parse_capabilities(info):
+                logger.info(f"Skipping embedding model {model['name']}")
+                continue
+            local.append({'name': canonical_name(model['name']), 'digest': model.get('digest')})
+        return local
+
+    def tune_model(self, name: str, digest: str = None, force: bool = False) -> Dict[str, Any]:
+        """Run the combinations a model has no results for yet.
+
+        Args:
+            name (str): Model name
+            digest (str): Model digest, earlier results are dropped when it differs
+            force (bool): Run every combination again
+
+        Returns:
+            The model's results: {'digest', 'trials'}
+
+        Raises:
+            requests.exceptions.ConnectionError, requests.exceptions.Timeout: If Ollama
+                stops answering; the results so far are saved
+        """
+        entry = self.results.get(name)
+        if force or not entry or entry.get('digest') != digest:
+            entry = self.results[name] = {'digest': digest, 'trials': {}}
+        trials = entry['trials']
+
+        for options in grid_combinations(self.grid):
+            key = combo_key(options)
+            if key in trials:
+                continue
+            logger.info(f'Tuning {name} with {key}')
+            try:
+                responses = [
+                    self.fetch_manager.generate(name, prompt, options={**TUNING_OPTIONS, **options},
+                                                timeout=self.timeout)
+                    for prompt in self.prompts
+                ]
+                trials[key] = {'options': options, **measure(responses)}
+            except requests.exceptions.HTTPError as e:
+                # Ollama refuses options it cannot run, such as a context that does not fit in memory
+                logger.warning(f'Tuning {name} with {key} failed: {e}')
+                trials[key] = {'options': options, 'error': str(e)}
+            self._write_json(self.results_file, self.results)
+        return entry
+
+    def write_profile(self, name: str, best: Dict[str, Any]):
+        """Set a model's tuned options in the generation profiles file, keeping its other settings."""
+        profiles = self._read_json(self.profiles_file)
+        profile = profiles.setdefault('models', {}).setdefault(name, {})
+        profile.setdefault('options', {}).update(
+            {option: value for option, value in best['options'].items() if option in TUNED_OPTIONS})
+        profile['tuned'] = {
+            'at': datetime.now().isoformat(timespec='seconds'),
+            'prompt_tps': best['prompt_tps'],
+            'decode_tps': best['decode_tps'],
+            'load_seconds': best['load_seconds'],
+        }
+        self._write_json(self.profiles_file, profiles)
+
+    def run(self, models: List[str] = None, force: bool = False, write: bool = True) -> Dict[str, Any]:
+        """Tune the local models and write the best options of each.
+
+        Args:
+            models (list): Only tune these models
+            force (bool): Run combinations that already have results again
+            write (bool): Write the best options to the generation profiles file
+
+        Returns:
+            The best trial by model name, None for a model whose every trial failed
+        """
+        selected = {canonical_name(model) for model in models or []}
+        best = {}
+        for model in self.local_models():
+            if selected and model['name'] not in selected:
+                continue
+            entry = self.tune_model(model['name'], model['digest'], force=force)
+            best[model['name']] = pick_best(entry['trials'], self.tolerance)
+            if best[model['name']] is None:
+                logger.error(f"Every combination failed for {model['name']}, its profile is unchanged")
+            elif write:
+                self.write_profile(model['name'], best[model['name']])
+        return best
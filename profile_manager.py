@@ -0,0 +1,147 @@
+import os
+import re
+import json
+import logging
+import threading
+from typing import Dict, Any, Optional
+from config import Config
+from model_metadata import canonical_name
+
+logger = logging.getLogger(__name__)
+
+# keep_alive durations such as '30s', '5m', '1.5h' or a number of seconds
+DURATION_PATTERN = re.compile(r'^(-?\d+(?:\.\d+)?)([smh]?)$')
+DURATION_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600}
+
+
+def parse_duration(value) -> float:
+    """Parse an Ollama keep_alive value into seconds, negative meaning forever."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    match = DURATION_PATTERN.match(str(value).strip().lower())
+    if not match:
+        raise ValueError(f'Invalid duration: {value!r}')
+    return float(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+class ProfileManager:
+    """Per-model generation options for Ollama generate and chat calls.
+
+    Profiles are read from GENERATION_PROFILES_FILE, which has a default
+    profile, profiles by model name and the bounds for per-request
+    overrides::
+
+        {"default": {"options": {"num_predict": 2048}, "keep_alive": "5m"},
+         "models": {"llava": {"options": {"num_ctx": 4096}}},
+         "bounds": {"num_ctx": [512, 16384], "keep_alive": [0, 3600]}}
+
+    A model's options are the default profile, overlaid by the profile of
+    its name without the tag ('llava'), then of its full name ('llava:13b',
+    as written by the tuner). A request
+    may only override the options that have bounds, and its values are
+    clamped into them. The file is read again when it changes.
+    """
+
+    def __init__(self, path: str = None):
+        """Initialize the profile manager.
+
+        Args:
+            path (str): Profiles file, missing for no profiles
+        """
+        self.path = path or Config.GENERATION_PROFILES_FILE
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._profiles: Dict[str, Any] = {}
+
+    def _load(self) -> Dict[str, Any]:
+        """Get the profiles, reading the file again if it changed."""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        with self._lock:
+            if mtime != self._mtime:
+                self._mtime = mtime
+                self._profiles = {}
+                if mtime is not None:
+                    try:
+                        with open(self.path, 'r') as f:
+                            profiles = json.load(f)
+                        self._profiles = {
+                            'default': profiles.get('default') or {},
+                            'models': {canonical_name(name) if ':' in name else name: profile
+                                       for name, profile in (profiles.get('models') or {}).items()},
+                            'bounds': profiles.get('bounds') or {},
+                        }
+                        logger.info(f'Loaded {len(self._profiles["models"])} generation profiles from {self.path}')
+                    except (OSError, ValueError, AttributeError) as e:
+                        logger.error(f'Error loading generation profiles from {self.path}: {e}')
+            return self._profiles
+
+    @property
+    def bounds(self) -> Dict[str, Any]:
+        """Options a request may override, with their [min, max]."""
+        return dict(self._load().get('bounds', {}))
+
+    def _layers(self, profiles: Dict[str, Any], model: str):
+        models = profiles.get('models', {})
+        name = canonical_name(model)
+        return (profiles.get('default', {}), models.get(name.split(':', 1)[0]) or {}, models.get(name) or {})
+
+    def resolve(self, model: str, overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Get the options and keep_alive for a call to a model.
+
+        Args:
+            model (str): Model name
+            overrides (dict): Request's options, keep_alive included, each clamped into its bounds
+
+        Returns:
+            {'options': {...}, 'keep_alive': value or None}
+
+        Raises:
+            ValueError: If an override has no bounds or is not a number
+        """
+        profiles = self._load()
+        options = {}
+        keep_alive = None
+        for profile in self._layers(profiles, model):
+            options.update(profile.get('options') or {})
+            keep_alive = profile.get('keep_alive', keep_alive)
+
+        bounds = profiles.get('bounds', {})
+        for name, value in (overrides or {}).items():
+            if name not in bounds:
+                raise ValueError(f'Option {name} cannot be set per request')
+            low, high = bounds[name]
+            if name == 'keep_alive':
+                # Negative means keep the model loaded forever, the longest allowed is the most
+                seconds = parse_duration(value)
+                keep_alive = high if seconds < 0 else min(max(seconds, low), high)
+                continue
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f'Option {name} must be a number')
+            clamped = min(max(value, low), high)
+            if clamped != value:
+                logger.debug(f'Clamped {name} for {model} from {value} to {clamped}')
+            options[name] = clamped
+        return {'options': options, 'keep_alive': keep_alive}
+
+    def apply(self, payload: Dict[str, Any], profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Add a model's options and keep_alive to an Ollama generate or chat payload.
+
+        Options and keep_alive already in the payload take precedence.
+
+        Args:
+            payload (dict): Request body for /api/generate or /api/chat
+            profile (dict): Result of resolve() with the request's overrides, else the model's profile
+
+        Returns:
+            The payload
+        """
+        profile = profile or self.resolve(payload['model'])
+        options = {**profile['options'], **(payload.get('options') or {})}
+        if options:
+            payload['options'] = options
+        if profile['keep_alive'] is not None and 'keep_alive' not in payload:
+            payload['keep_alive'] = profile['keep_alive']
+        return payload
@@ -0,0 +1,346 @@
+import os
+import time
+import sqlite3
+import logging
+import secrets
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Callable
+from config import Config
+from model_metadata import canonical_name
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    model TEXT,
+    status TEXT,
+    created REAL,
+    started REAL,
+    finished REAL,
+    completed INTEGER DEFAULT 0,
+    total INTEGER DEFAULT 0,
+    detail TEXT,
+    error TEXT,
+    owner TEXT,
+    heartbeat REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, id);
+"""
+
+ACTIVE = ('queued', 'running')
+
+# Seconds of bandwidth budget a pull may use at once before it is paused
+BURST_SECONDS = 5
+
+# Seconds between progress writes and cancellation checks of a running pull
+PROGRESS_INTERVAL = 1.0
+
+
+class PullError(Exception):
+    """Raised when Ollama reports an error for a pull or ends it unfinished."""
+
+
+def parse_window(window: str) -> Optional[tuple]:
+    """Parse a time-of-day window such as '01:00-06:30' into minutes after midnight.
+
+    Returns:
+        (start, end) in minutes, None for an empty window meaning always open
+
+    Raises:
+        ValueError: If the window is not HH:MM-HH:MM
+    """
+    if not window or not window.strip():
+        return None
+    try:
+        start, end = (datetime.strptime(part.strip(), '%H:%M') for part in window.split('-'))
+    except ValueError:
+        raise ValueError(f'Invalid pull window {window!r}, expected HH:MM-HH:MM')
+    return start.hour * 60 + start.minute, end.hour * 60 + end.minute
+
+
+def in_window(window: Optional[tuple], now: datetime = None) -> bool:
+    """Check if a local time is inside a window from parse_window; windows may wrap past midnight."""
+    if window is None:
+        return True
+    now = now or datetime.now()
+    minute = now.hour * 60 + now.minute
+    start, end = window
+    if start <= end:
+        return start <= minute < end
+    return minute >= start or minute < end
+
+
+class PullQueue:
+    """Persistent FIFO queue of model pulls with a concurrency limit.
+
+    Jobs are rows in a SQLite file shared by all worker processes. Each
+    worker runs a dispatcher thread that claims the oldest queued job in an
+    immediate transaction while fewer than ``max_concurrent`` pulls run, so
+    the limit holds across workers. Dispatchers mark their running jobs
+    alive; a job whose worker stopped, as in a server restart, goes back to
+    the queue at its original position.
+
+    Before a claimed pull starts, ``prepare`` makes room for the model, so
+    models are only evicted for pulls that are about to run; a pull that
+    cannot fit fails with the reason. Pulls only start inside the
+    time-of-day ``window``. A pull still
+    running when the window closes goes back to the queue. Ollama
+    downloads on its own, so the ``bandwidth`` budget is kept by closing a
+    pull's progress stream, which cancels the download, once it is ahead of
+    its share of the budget, and pulling again after the pause. Ollama
+    resumes from the parts it already has.
+    """
+
+    def __init__(self, fetch_manager, path: str = None, max_concurrent: int = None, bandwidth: float = None,
+                 window: str = None, poll_interval: float = 1.0, stale_after: float = 30,
+                 prepare: Callable[[str], Optional[str]] = None):
+        """Initialize the queue.
+
+        Args:
+            fetch_manager (FetchManager): Client whose pull_model streams Ollama's progress
+            path (str): SQLite file of the jobs
+            max_concurrent (int): Pulls running at once across workers
+            bandwidth (float): Bytes per second shared by running pulls, 0 for no limit
+            window (str): Local time-of-day window for pulls, e.g. '01:00-06:00', empty for any time
+            poll_interval (float): Seconds between dispatcher checks
+            stale_after (float): Seconds without a heartbeat before a running job is queued again
+            prepare (callable): Called with the model before its pull starts, returns None or why it cannot
+        """
+        self.fetch_manager = fetch_manager
+        self.path = path or Config.PULL_QUEUE_FILE
+        self.max_concurrent = max(1, max_concurrent or Config.PULL_MAX_CONCURRENT)
+        self.bandwidth = Config.PULL_BANDWIDTH_MB * 1e6 if bandwidth is None else bandwidth
+        self.window = parse_window(Config.PULL_WINDOW if window is None else window)
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.prepare = prepare
+        self.owner = f'{os.getpid()}-{secrets.token_hex(4)}'
+        self.clock: Callable[[], datetime] = datetime.now
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._dispatcher: Optional[threading.Thread] = None
+        self._workers: Dict[int, threading.Thread] = {}
+
+    @contextmanager
+    def _transaction(self):
+        """Run statements in one write transaction. Takes the thread lock."""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._conn
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def _job(self, conn, row) -> Dict[str, Any]:
+        job = dict(row)
+        job.pop('owner', None)
+        job.pop('heartbeat', None)
+        job['position'] = None
+        if job['status'] == 'queued':
+            job['position'] = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND id <= ?",
+                                           (job['id'],)).fetchone()[0]
+        job['progress'] = int(job['completed'] * 100 / job['total']) if job['total'] else 0
+        return job
+
+    def enqueue(self, model: str) -> Dict[str, Any]:
+        """Add a pull to the end of the queue, or get the queued or running pull of the model."""
+        model = canonical_name(model)
+        with self._transaction() as conn:
+            row = conn.execute(f"SELECT * FROM jobs WHERE model = ? AND status IN {ACTIVE}", (model,)).fetchone()
+            if row is None:
+                cursor = conn.execute("INSERT INTO jobs (model, status, created) VALUES (?, 'queued', ?)",
+                                      (model, time.time()))
+                row = conn.execute('SELECT * FROM jobs WHERE id = ?', (cursor.lastrowid,)).fetchone()
+                logger.info(f'Queued pull {row["id"]} of {model}')
+            job = self._job(conn, row)
+        self._wake.set()
+        return job
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Get a job with its queue position, None if there is no such job."""
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            return self._job(self._conn, row) if row else None
+
+    def jobs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Get the running and queued jobs in queue order, then the latest finished ones."""
+        with self._lock:
+            active = self._conn.execute(
+                f"SELECT * FROM jobs WHERE status IN {ACTIVE} ORDER BY status = 'queued', id").fetchall()
+            finished = self._conn.execute(
+                f"SELECT * FROM jobs WHERE status NOT IN {ACTIVE} ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+            return [self._job(self._conn, row) for row in list(active) + list(finished)]
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancel a queued or running job; a running pull stops at its next progress update."""
+        with self._transaction() as conn:
+            cursor = conn.execute(f"UPDATE jobs SET status = 'cancelled', finished = ? "
+                                  f"WHERE id = ? AND status IN {ACTIVE}", (time.time(), job_id))
+        return cursor.rowcount > 0
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        """Start the oldest queued job if a slot is free and the window is open."""
+        if not in_window(self.window, self.clock()):
+            return None
+        now = time.time()
+        with self._transaction() as conn:
+            # Jobs of a worker that stopped go back to the queue, keeping their place
+            conn.execute("UPDATE jobs SET status = 'queued', owner = NULL WHERE status = 'running' AND heartbeat < ?",
+                         (now - self.stale_after,))
+            conn.execute("UPDATE jobs SET heartbeat = ? WHERE status = 'running' AND owner = ?", (now, self.owner))
+            running = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'running'").fetchone()[0]
+            if running >= self.max_concurrent:
+                return None
+            row = conn.execute("SELECT * FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE jobs SET status = 'running', owner = ?, heartbeat = ?, "
+                         "started = COALESCE(started, ?), detail = NULL WHERE id = ?",
+                         (self.owner, now, now, row['id']))
+            return row
+
+    def dispatch(self) -> int:
+        """Start as many queued pulls as the limit allows in this worker.
+
+        Returns:
+            Number of pulls started
+        """
+        started = 0
+        while True:
+            row = self._claim()
+            if row is None:
+                return started
+            logger.info(f"Starting pull {row['id']} of {row['model']}")
+            worker = threading.Thread(target=self._run, args=(row['id'], row['model']),
+                                      name=f"pull-{row['id']}", daemon=True)
+            self._workers[row['id']] = worker
+            worker.start()
+            started += 1
+
+    def start(self):
+        """Start this worker's dispatcher thread, which resumes the queue left by a restart."""
+        with self._lock:
+            if self._dispatcher is not None and self._dispatcher.is_alive():
+                return
+            self._stop.clear()
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name='pull-dispatcher', daemon=True)
+            self._dispatcher.start()
+
+    def stop(self):
+        """Stop the dispatcher; running pulls finish first."""
+        self._stop.set()
+        self._wake.set()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+        for worker in list(self._workers.values()):
+            worker.join()
+
+    def _dispatch_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.dispatch()
+            except Exception as e:
+                logger.error(f'Error dispatching pulls: {e}')
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _update(self, job_id: int, **fields) -> Optional[str]:
+        """Save a running job's fields and get its status, which is 'cancelled' once cancelled."""
+        with self._transaction() as conn:
+            assignments = ', '.join(f'{name} = ?' for name in fields)
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ? AND status = 'running'",
+                         (*fields.values(), job_id))
+            row = conn.execute('SELECT status FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            return row['status'] if row else None
+
+    def _running_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'running'").fetchone()[0]
+
+    def _pull(self, job_id: int, model: str, layers: Dict[str, tuple]) -> Any:
+        """Follow one pull stream until it finishes or must pause.
+
+        Returns:
+            'success', 'cancelled', 'window', or the seconds to pause for the bandwidth budget
+        """
+        baseline = {}
+        start = last_update = time.monotonic()
+        share = self.bandwidth / max(1, self._running_count()) if self.bandwidth else 0
+        stream = self.fetch_manager.pull_model(model)
+        try:
+            for progress in stream:
+                if progress.get('error'):
+                    raise PullError(progress['error'])
+                if progress.get('status') == 'success':
+                    return 'success'
+                digest = progress.get('digest')
+                if digest and progress.get('total'):
+                    layers[digest] = (progress.get('completed') or 0, progress['total'])
+                    baseline.setdefault(digest, layers[digest][0])
+
+                now = time.monotonic()
+                if now - last_update >= PROGRESS_INTERVAL:
+                    last_update = now
+                    status = self._update(job_id, heartbeat=time.time(), detail=progress.get('status'),
+                                          completed=sum(done for done, _ in layers.values()),
+                                          total=sum(total for _, total in layers.values()))
+                    if status != 'running':
+                        return 'cancelled'
+                    if not in_window(self.window, self.clock()):
+                        return 'window'
+                if share:
+                    downloaded = sum(layers[digest][0] - baseline[digest] for digest in baseline)
+                    elapsed = now - start
+                    if downloaded > share * (elapsed + BURST_SECONDS):
+                        return downloaded / share - elapsed
+            raise PullError('Pull ended before it finished')
+        finally:
+            # Closing the stream disconnects, which makes Ollama stop the download
+            stream.close()
+
+    def _run(self, job_id: int, model: str):
+        """Run a claimed pull to the end, pausing as the bandwidth budget requires."""
+        layers: Dict[str, tuple] = {}
+        try:
+            error = self.prepare(model) if self.prepare is not None else None
+            if error:
+                raise PullError(error)
+            while True:
+                outcome = self._pull(job_id, model, layers)
+                if outcome == 'success':
+                    total = sum(total for _, total in layers.values())
+                    self._update(job_id, status='done', finished=time.time(), completed=total, total=total,
+                                 detail='success')
+                    logger.info(f'Pulled {model} (job {job_id})')
+                    return
+                if outcome == 'cancelled':
+                    logger.info(f'Cancelled pull {job_id} of {model}')
+                    return
+                if outcome == 'window':
+                    self._update(job_id, status='queued', owner=None, detail='waiting for the pull window')
+                    logger.info(f'Pull window closed, queued {model} (job {job_id}) again')
+                    return
+                logger.debug(f'Pausing pull of {model} for {outcome:.1f}s to stay within the bandwidth budget')
+                if self._update(job_id, heartbeat=time.time(), detail='paused for bandwidth') != 'running':
+                    return
+                deadline = time.monotonic() + outcome
+                while time.monotonic() < deadline:
+                    time.sleep(min(PROGRESS_INTERVAL, max(0.0, deadline - time.monotonic())))
+                    if self._update(job_id, heartbeat=time.time()) != 'running':
+                        return
+        except Exception as e:
+            logger.error(f'Pull {job_id} of {model} failed: {e}')
+            self._update(job_id, status='failed', finished=time.time(), error=str(e))
+        finally:
+            self._workers.pop(job_id, None)
+            self._wake.set()
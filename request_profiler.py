@@ -0,0 +1,281 @@
+import os
+import io
+import re
+import sys
+import json
+import time
+import pstats
+import cProfile
+import logging
+import secrets
+import threading
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Callable
+from flask import Flask, g, request
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# An admin asks for a profile of one request with this header or query parameter
+PROFILE_HEADER = 'X-Profile'
+PROFILE_PARAM = 'profile'
+
+PROFILE_ID_PATTERN = re.compile(r'^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$')
+
+# Stack label used once a sampler holds max_stacks distinct stacks
+TRUNCATED_FRAME = '[other]'
+
+
+def frame_label(frame) -> str:
+    """Label of a stack frame in folded stacks, e.g. 'app.py:analyze'."""
+    return f'{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}'
+
+
+class ProfileStore:
+    """cProfile results of single requests, kept as .prof files for download.
+
+    Each profile has a .json file next to it with the request it came from.
+    Only the newest ``max_files`` profiles are kept.
+    """
+
+    def __init__(self, directory: str = None, max_files: int = None):
+        """Initialize the store.
+
+        Args:
+            directory (str): Directory of the profile files
+            max_files (int): Profiles kept, oldest removed first
+        """
+        self.directory = directory or Config.PROFILE_DIR
+        self.max_files = max_files or Config.PROFILE_MAX_FILES
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, profile_id: str, extension: str = 'prof') -> Optional[str]:
+        """Get a profile's file, None if the id is malformed or there is no such profile."""
+        if not PROFILE_ID_PATTERN.match(profile_id or ''):
+            return None
+        path = os.path.join(self.directory, f'{profile_id}.{extension}')
+        return path if os.path.exists(path) else None
+
+    def save(self, profile: cProfile.Profile, meta: Dict[str, Any]) -> str:
+        """Save a finished profile with its request details and return its id."""
+        profile_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{secrets.token_hex(4)}"
+        profile.dump_stats(os.path.join(self.directory, f'{profile_id}.prof'))
+        with open(os.path.join(self.directory, f'{profile_id}.json'), 'w') as f:
+            json.dump({'id': profile_id, **meta}, f)
+        self._trim()
+        return profile_id
+
+    def _trim(self):
+        ids = sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith('.prof'))
+        for profile_id in ids[:-self.max_files]:
+            for extension in ('prof', 'json'):
+                try:
+                    os.remove(os.path.join(self.directory, f'{profile_id}.{extension}'))
+                except OSError:
+                    pass
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Get the stored profiles' request details, newest first."""
+        profiles = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if name.endswith('.json'):
+                try:
+                    with open(os.path.join(self.directory, name)) as f:
+                        profiles.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return profiles
+
+    def text(self, profile_id: str, sort: str = 'cumulative', limit: int = 40) -> Optional[str]:
+        """Render a profile as pstats text, None if there is no such profile.
+
+        Raises:
+            KeyError: If sort is not a pstats sort key
+        """
+        path = self.path(profile_id)
+        if path is None:
+            return None
+        out = io.StringIO()
+        pstats.Stats(path, stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+
+class SamplingProfiler:
+    """Low-rate sampling profiler of the threads serving requests.
+
+    A background thread reads the stacks of tracked request threads every
+    ``interval`` seconds and counts them as folded stacks, the input format
+    of flamegraph.pl and speedscope, with the request's route as the root
+    frame. Sampling slows down when it would take more than
+    ``max_overhead`` of the time, and at most ``max_stacks`` distinct
+    stacks are kept; further stacks count under their route.
+    """
+
+    def __init__(self, interval: float = None, max_overhead: float = None, max_stacks: int = None):
+        """Initialize the profiler.
+
+        Args:
+            interval (float): Seconds between samples
+            max_overhead (float): Largest fraction of time spent sampling
+            max_stacks (int): Distinct stacks kept
+        """
+        self.interval = interval or Config.PROFILE_SAMPLE_INTERVAL
+        self.max_overhead = max_overhead or Config.PROFILE_MAX_OVERHEAD
+        self.max_stacks = max_stacks or Config.PROFILE_MAX_STACKS
+        self._lock = threading.Lock()
+        self._threads: Dict[int, str] = {}
+        self._stacks: Dict[str, int] = {}
+        self._samples = 0
+        self._cost = 0.0
+        self._started: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start the sampling thread if it is not running."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._started = time.monotonic()
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+
+    def track(self, label: str, thread_id: int = None):
+        """Sample a thread under a route label until untrack is called."""
+        self.start()
+        with self._lock:
+            self._threads[thread_id or threading.get_ident()] = label
+
+    def untrack(self, thread_id: int = None):
+        """Stop sampling a thread, when its request is done."""
+        with self._lock:
+            self._threads.pop(thread_id or threading.get_ident(), None)
+
+    def sample(self):
+        """Count the current stack of each tracked thread."""
+        start = time.perf_counter()
+        frames = sys._current_frames()
+        with self._lock:
+            for thread_id, label in self._threads.items():
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                stack.append(label)
+                key = ';'.join(reversed(stack))
+                if key not in self._stacks and len(self._stacks) >= self.max_stacks:
+                    key = f'{label};{TRUNCATED_FRAME}'
+                self._stacks[key] = self._stacks.get(key, 0) + 1
+                self._samples += 1
+            self._cost += time.perf_counter() - start
+
+    def _run(self):
+        while True:
+            start = time.perf_counter()
+            try:
+                self.sample()
+            except Exception as e:
+                logger.error(f'Error sampling stacks: {e}')
+            cost = time.perf_counter() - start
+            # Wait long enough that sampling stays within its share of the time
+            time.sleep(max(self.interval, cost / self.max_overhead - cost))
+
+    def folded(self) -> str:
+        """Get the counted stacks as folded lines, 'root;caller;callee count', most frequent first."""
+        with self._lock:
+            stacks = sorted(self._stacks.items(), key=lambda item: -item[1])
+        return ''.join(f'{stack} {count}\n' for stack, count in stacks)
+
+    def stats(self, top: int = 20) -> Dict[str, Any]:
+        """Report sample counts, measured overhead and the most frequent stacks."""
+        with self._lock:
+            elapsed = time.monotonic() - self._started if self._started else 0.0
+            return {
+                'running': self._thread is not None and self._thread.is_alive(),
+                'interval': self.interval,
+                'samples': self._samples,
+                'stacks': len(self._stacks),
+                'tracked_threads': len(self._threads),
+                'overhead': round(self._cost / elapsed, 5) if elapsed else 0.0,
+                'top': [{'stack': stack, 'count': count}
+                        for stack, count in sorted(self._stacks.items(), key=lambda item: -item[1])[:top]],
+            }
+
+    def reset(self):
+        """Forget the counted stacks."""
+        with self._lock:
+            self._stacks.clear()
+            self._samples = 0
+            self._cost = 0.0
+            self._started = time.monotonic()
+
+
+# cProfile can only run for one request at a time
+_profile_lock = threading.Lock()
+
+
+def profile_requested() -> bool:
+    value = request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_PARAM)
+    return bool(value) and value.lower() not in ('0', 'false', 'no')
+
+
+def init_profiling(app: Flask, get_store: Callable[[], ProfileStore], get_sampler: Callable[[], SamplingProfiler],
+                   is_admin: Callable[[], bool]):
+    """Register the per-request profiling and sampling hooks on an app.
+
+    Args:
+        app (Flask): The application
+        get_store (callable): Get the store single request profiles are saved in
+        get_sampler (callable): Get the sampling profiler, used when PROFILE_SAMPLING is on
+        is_admin (callable): Whether the current request may ask for a profile
+    """
+
+    def start_profiling():
+        if Config.PROFILE_SAMPLING:
+            get_sampler().track(f'{request.method} {request.url_rule.rule if request.url_rule else request.path}')
+        if not profile_requested() or not is_admin():
+            return
+        if not _profile_lock.acquire(blocking=False):
+            g.profile_busy = True
+            return
+        g.profile = cProfile.Profile()
+        g.profile_start = time.perf_counter()
+        g.profile.enable()
+
+    def finish_profiling(response):
+        profile = g.pop('profile', None)
+        if profile is not None:
+            profile.disable()
+            _profile_lock.release()
+            duration = time.perf_counter() - g.pop('profile_start')
+            try:
+                profile_id = get_store().save(profile, {
+                    'method': request.method,
+                    'path': request.full_path.rstrip('?'),
+                    'status': response.status_code,
+                    'duration_ms': round(duration * 1000, 2),
+                    'pid': os.getpid(),
+                    'created': datetime.now().isoformat(timespec='seconds'),
+                })
+                response.headers['X-Profile-Id'] = profile_id
+                logger.info(f'Profiled {request.method} {request.path} in {duration * 1000:.1f}ms as {profile_id}')
+            except OSError as e:
+                logger.error(f'Error saving request profile: {e}')
+        elif g.pop('profile_busy', False):
+            response.headers['X-Profile-Id'] = 'busy'
+        return response
+
+    def stop_profiling(exc):
+        # The request failed before its response, or the response hooks did not run
+        profile = g.pop('profile', None)
+        if profile is not None:
+            profile.disable()
+            _profile_lock.release()
+        if Config.PROFILE_SAMPLING:
+            get_sampler().untrack()
+
+    app.before_request(start_profiling)
+    app.after_request(finish_profiling)
+    app.teardown_request(stop_profiling)
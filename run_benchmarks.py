@@ -0,0 +1,50 @@
+import argparse
+import logging
+import os
+import sys
+
+DEFAULT_BASELINE = os.path.join('benchmarks', 'results', 'baseline.json')
+
+
+def main(argv=None):
+    """Run the benchmark suite, optionally saving or comparing a JSON baseline"""
+    sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+    from benchmarks.runner import (DEFAULT_THRESHOLD, run_benchmarks, save_results,
+                                   load_results, compare_results, format_comparison)
+
+    parser = argparse.ArgumentParser(description='Run micro-benchmarks')
+    parser.add_argument('-k', dest='selected', action='append',
+                        help='Only run benchmarks whose name contains this string')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help='Baseline results file to compare against')
+    parser.add_argument('--save', metavar='PATH',
+                        help='Save results to PATH (use --baseline path to refresh the baseline)')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Allowed slowdown as a fraction before failing (default: 0.2)')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s    %(message)s')
+
+    import benchmarks.suite  # noqa: F401  registers the benchmark cases
+    results = run_benchmarks(args.selected)
+
+    for name, stats in results['results'].items():
+        print(f"{name:<45} median {stats['median'] * 1000:>10.3f}ms  min {stats['min'] * 1000:>10.3f}ms")
+
+    if args.save:
+        save_results(results, args.save)
+        print(f'Saved results to {args.save}')
+
+    baseline = load_results(args.baseline)
+    if baseline is None or args.save == args.baseline:
+        return True
+
+    rows = compare_results(baseline, results, args.threshold)
+    print()
+    print(format_comparison(rows))
+    return not any(row['regressed'] for row in rows)
+
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
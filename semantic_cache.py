@@ -0,0 +1,186 @@
+import time
+import base64
+import hashlib
+import logging
+import threading
+from typing import Dict, Any, List, Optional
+import numpy as np
+from config import Config
+from analytics_manager import QuantileSketch, QUANTILES
+from vector_index import normalize
+
+logger = logging.getLogger(__name__)
+
+# Store keys: cached answers grouped by model and images, shared hit counters
+GROUP_KEY_PREFIX = 'semcache:group:'
+STATS_KEY_PREFIX = 'semcache:stats:'
+STATS = ('hits', 'exact_hits', 'misses', 'skipped', 'errors', 'stores')
+
+
+def group_key(model: str, image_hash: str = '') -> str:
+    """Store key of the answers cached for a model and set of images."""
+    return GROUP_KEY_PREFIX + hashlib.sha256(f'{model}\0{image_hash}'.encode()).hexdigest()[:32]
+
+
+def encode_vector(vector: np.ndarray) -> str:
+    """Pack a unit vector as base64 float16, a quarter of its JSON list size."""
+    return base64.b64encode(np.asarray(vector, dtype=np.float16).tobytes()).decode('ascii')
+
+
+def decode_vectors(encoded: List[str]) -> np.ndarray:
+    """Unpack base64 float16 vectors into float32 rows."""
+    return np.asarray([np.frombuffer(base64.b64decode(value), dtype=np.float16) for value in encoded],
+                      dtype=np.float32)
+
+
+class SemanticCache:
+    """Answers to earlier /analyze prompts, served again for reworded prompts.
+
+    Answers are cached per model and image hash in the shared state store,
+    at most max_entries per group, each with the embedding of its prompt.
+    A lookup first checks the group for the same prompt, which needs no
+    embedding, then embeds the prompt once with EMBED_MODEL and compares it
+    with the group's embeddings. The closest answer at or above threshold
+    is a hit. Embedding failures and timeouts are misses, never errors.
+
+    Hit counts are shared by all workers; latencies are per process.
+    """
+
+    def __init__(self, embeddings, store, model=None, threshold=None, ttl=None, max_entries=None,
+                 timeout=None, ready=None):
+        """Initialize the cache.
+
+        Args:
+            embeddings (EmbeddingManager): Client used to embed prompts
+            store (StateStore): Store shared by worker processes
+            model (str): Embedding model
+            threshold (float): Cosine similarity needed to serve a cached answer
+            ttl (float): Seconds a group of answers is kept after its last write
+            max_entries (int): Answers kept per model and image hash, oldest dropped first
+            timeout (float): Seconds to wait for the prompt embedding
+            ready (callable): Returns False while the embedding model cannot be used
+        """
+        self.embeddings = embeddings
+        self.store = store
+        self.model = model or Config.EMBED_MODEL
+        self.threshold = threshold if threshold is not None else Config.SEMANTIC_CACHE_THRESHOLD
+        self.ttl = ttl or Config.SEMANTIC_CACHE_TTL
+        self.max_entries = max_entries or Config.SEMANTIC_CACHE_MAX_ENTRIES
+        self.timeout = timeout or Config.SEMANTIC_CACHE_EMBED_TIMEOUT
+        self.ready = ready or (lambda: True)
+        self._lock = threading.Lock()
+        self._lookup_ms = QuantileSketch(Config.ANALYTICS_RELATIVE_ACCURACY)
+        self._embed_ms = QuantileSketch(Config.ANALYTICS_RELATIVE_ACCURACY)
+
+    def _count(self, stat: str):
+        try:
+            self.store.incr(STATS_KEY_PREFIX + stat)
+        except Exception as e:
+            logger.warning(f'Error counting semantic cache {stat}: {e}')
+
+    def _embed(self, prompt: str) -> Optional[np.ndarray]:
+        """Embed a prompt as a unit vector, or None if the model is unavailable."""
+        if not self.ready():
+            self._count('skipped')
+            return None
+        start = time.perf_counter()
+        try:
+            vector = normalize(self.embeddings.embed([prompt], self.model, timeout=self.timeout))[0]
+        except Exception as e:
+            logger.warning(f'Error embedding prompt for the semantic cache: {e}')
+            self._count('errors')
+            return None
+        with self._lock:
+            self._embed_ms.add((time.perf_counter() - start) * 1000)
+        return vector
+
+    def lookup(self, model: str, prompt: str, image_hash: str = '') -> Dict[str, Any]:
+        """Find a cached answer to the prompt, or a similar one.
+
+        Args:
+            model (str): Model the prompt is sent to
+            prompt (str): Prompt text
+            image_hash (str): images_hash() of the images sent with it
+
+        Returns:
+            {'hit': {response, prompt, similarity, created} or None, 'vector': prompt embedding or None},
+            the vector is passed on to store_answer() after a miss so the prompt is embedded once
+        """
+        start = time.perf_counter()
+        vector = None
+        hit = None
+        entries = self.store.get(group_key(model, image_hash)) or []
+        for entry in entries:
+            if entry['prompt'] == prompt:
+                hit = dict(entry, similarity=1.0)
+                self._count('exact_hits')
+                break
+        else:
+            vector = self._embed(prompt)
+            # Entries embedded before EMBED_MODEL changed are never similar
+            entries = [entry for entry in entries if entry.get('model') == self.model]
+            if vector is not None and entries:
+                scores = decode_vectors([entry['vector'] for entry in entries]) @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    hit = dict(entries[best], similarity=round(float(scores[best]), 6))
+        self._count('hits' if hit else 'misses')
+        with self._lock:
+            self._lookup_ms.add((time.perf_counter() - start) * 1000)
+        if hit:
+            hit.pop('vector', None)
+            hit.pop('model', None)
+        return {'hit': hit, 'vector': vector}
+
+    def store_answer(self, model: str, prompt: str, response: str, image_hash: str = '',
+                     vector: Optional[np.ndarray] = None):
+        """Cache an answer.
+
+        Concurrent writes to one group may drop an entry, which only costs a
+        later miss.
+
+        Args:
+            model (str): Model that answered
+            prompt (str): Prompt text
+            response (str): The model's answer
+            image_hash (str): images_hash() of the images sent with the prompt
+            vector (ndarray): Prompt embedding from lookup(), embedded again if missing
+        """
+        if vector is None:
+            vector = self._embed(prompt)
+            if vector is None:
+                return
+        key = group_key(model, image_hash)
+        entries = [entry for entry in self.store.get(key) or [] if entry['prompt'] != prompt]
+        entries.append({'prompt': prompt, 'response': response, 'vector': encode_vector(vector),
+                        'model': self.model, 'created': time.time()})
+        self.store.set(key, entries[-self.max_entries:], ttl=self.ttl)
+        self._count('stores')
+
+    def clear(self) -> int:
+        """Drop every cached answer and reset the counters.
+
+        Returns:
+            The number of groups dropped
+        """
+        keys = self.store.keys(GROUP_KEY_PREFIX)
+        if keys:
+            self.store.delete(*keys)
+        self.store.delete(*(STATS_KEY_PREFIX + stat for stat in STATS))
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit counts for all workers, and lookup and embedding latency for this process."""
+        counts = {stat: int(self.store.get(STATS_KEY_PREFIX + stat) or 0) for stat in STATS}
+        lookups = counts['hits'] + counts['misses']
+        with self._lock:
+            latency = {name: {label: sketch.quantile(q) for label, q in QUANTILES.items()}
+                       for name, sketch in (('lookup_ms', self._lookup_ms), ('embed_ms', self._embed_ms))}
+        return {
+            **counts,
+            'lookups': lookups,
+            'hit_rate': round(counts['hits'] / lookups, 4) if lookups else None,
+            'threshold': self.threshold,
+            'model': self.model,
+            **latency,
+        }
@@ -0,0 +1,94 @@
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+# Seconds spent in each startup phase and lazy initialization, in order
+startup_timings: Dict[str, float] = {}
+
+_lazy_objects = []
+
+
+@contextmanager
+def timed(phase: str):
+    """Record how long a startup phase takes."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings[phase] = time.perf_counter() - start
+
+
+def startup_report() -> str:
+    """Format the recorded startup timings as one line per phase."""
+    return '\n'.join(f'{phase:<30} {seconds * 1000:8.1f}ms' for phase, seconds in startup_timings.items())
+
+
+class LazyObject:
+    """Proxy that creates its target on first use.
+
+    Module-level managers are wrapped in a LazyObject so importing the app
+    stays cheap and each pre-forked worker builds its own instances.
+    Attribute access, truth testing, len() and iteration are forwarded to the target.
+    Targets are discarded in a forked child so nothing created in the
+    parent (SQLite connections, locks, threads) is shared.
+    """
+
+    def __init__(self, factory: Callable[[], Any], name: str):
+        self._factory = factory
+        self._name = name
+        self._instance = None
+        self._lock = threading.RLock()
+        _lazy_objects.append(self)
+
+    def _resolve(self):
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                if self._instance is None:
+                    with timed(f'lazy:{self._name}'):
+                        self._instance = self._factory()
+                    logger.info(f'Initialized {self._name} in '
+                                f'{startup_timings[f"lazy:{self._name}"] * 1000:.1f}ms')
+                instance = self._instance
+        return instance
+
+    def _reset(self):
+        self._instance = None
+        self._lock = threading.RLock()
+
+    @property
+    def initialized(self) -> bool:
+        return self._instance is not None
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._resolve(), name)
+
+    def __bool__(self):
+        return bool(self._resolve())
+
+    def __len__(self):
+        return len(self._resolve())
+
+    def __iter__(self):
+        return iter(self._resolve())
+
+    def __repr__(self):
+        state = 'initialized' if self._instance is not None else 'pending'
+        return f'<LazyObject {self._name} ({state})>'
+
+
+def reset_lazy_objects():
+    """Discard every lazily created instance."""
+    for obj in _lazy_objects:
+        obj._reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_lazy_objects)
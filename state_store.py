@@ -0,0 +1,323 @@
+import abc
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Any, List, Optional
+from flask_session.base import ServerSideSession, ServerSideSessionInterface
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    key TEXT PRIMARY KEY,
+    value TEXT,
+    expires_at REAL
+);
+CREATE TABLE IF NOT EXISTS list_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS list_items_key ON list_items(key, id);
+"""
+
+# Expired keys are purged from SQLite once every this many writes
+PURGE_INTERVAL = 1000
+
+LOCK_POLL_SECONDS = 0.01
+
+
+class StateStore(abc.ABC):
+    """Key-value and list storage shared by every worker process.
+
+    The operations map one-to-one onto Redis commands (GET, SET EX NX, DEL,
+    INCRBY, RPUSH+LTRIM, LRANGE, SCAN), so SQLiteStateStore and
+    RedisStateStore are interchangeable. Values are stored as JSON.
+    """
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Any:
+        """Get a value, or None if it is missing or expired."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def set(self, key: str, value: Any, ttl: Optional[float] = None, nx: bool = False) -> bool:
+        """Set a value, optionally expiring after ttl seconds.
+
+        Returns:
+            False if nx is set and the key already exists, True otherwise
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def delete(self, *keys: str):
+        """Delete values and lists."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def incr(self, key: str, amount: int = 1) -> int:
+        """Atomically increment an integer value, returning the new value."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def append(self, key: str, value: Any, max_len: Optional[int] = None) -> int:
+        """Atomically append to a list, keeping only the last max_len items.
+
+        Returns:
+            The length of the list after appending and trimming
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def range(self, key: str, start: int = 0, end: int = -1) -> List[Any]:
+        """Get list items from start to end inclusive; negative indexes count from the end."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def keys(self, prefix: str) -> List[str]:
+        """Get the live value keys starting with a prefix."""
+        raise NotImplementedError
+
+    @contextmanager
+    def lock(self, name: str, timeout: float = 10):
+        """Hold a lock across all processes sharing the store.
+
+        The lock expires after timeout seconds so a crashed worker cannot
+        hold it forever.
+        """
+        key = f'lock:{name}'
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        while not self.set(key, token, ttl=timeout, nx=True):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f'Timed out waiting for lock {name}')
+            time.sleep(LOCK_POLL_SECONDS)
+        try:
+            yield
+        finally:
+            if self.get(key) == token:
+                self.delete(key)
+
+    def close(self):
+        """Release connections held by the store."""
+
+
+class SQLiteStateStore(StateStore):
+    """StateStore in a local SQLite database in WAL mode.
+
+    Safe for several worker processes on one machine: every write runs in
+    an immediate transaction, so concurrent appends and increments are
+    serialized by SQLite instead of racing.
+    """
+
+    def __init__(self, path: str):
+        """Initialize the store.
+
+        Args:
+            path (str): Path to the SQLite database file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(SCHEMA)
+        logger.info(f'Initialized SQLiteStateStore with file: {path}')
+
+    @contextmanager
+    def _transaction(self):
+        """Run statements in one write transaction. Takes the thread lock."""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._conn
+                self._writes += 1
+                if self._writes % PURGE_INTERVAL == 0:
+                    self._conn.execute('DELETE FROM kv WHERE expires_at <= ?', (time.time(),))
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+                (key, time.time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl=None, nx=False):
+        now = time.time()
+        expires_at = now + ttl if ttl else None
+        with self._transaction() as conn:
+            if nx:
+                exists = conn.execute(
+                    'SELECT 1 FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+                    (key, now)).fetchone()
+                if exists:
+                    return False
+            conn.execute('INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)',
+                         (key, json.dumps(value), expires_at))
+        return True
+
+    def delete(self, *keys):
+        with self._transaction() as conn:
+            for key in keys:
+                conn.execute('DELETE FROM kv WHERE key = ?', (key,))
+                conn.execute('DELETE FROM list_items WHERE key = ?', (key,))
+
+    def incr(self, key, amount=1):
+        with self._transaction() as conn:
+            row = conn.execute(
+                'SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+                (key, time.time())).fetchone()
+            value = (json.loads(row[0]) if row else 0) + amount
+            conn.execute('INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, NULL)',
+                         (key, json.dumps(value)))
+        return value
+
+    def append(self, key, value, max_len=None):
+        with self._transaction() as conn:
+            conn.execute('INSERT INTO list_items (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+            if max_len:
+                conn.execute(
+                    'DELETE FROM list_items WHERE key = ? AND id <= '
+                    '(SELECT id FROM list_items WHERE key = ? ORDER BY id DESC LIMIT 1 OFFSET ?)',
+                    (key, key, max_len))
+            return conn.execute('SELECT COUNT(*) FROM list_items WHERE key = ?', (key,)).fetchone()[0]
+
+    def range(self, key, start=0, end=-1):
+        with self._lock:
+            length = self._conn.execute('SELECT COUNT(*) FROM list_items WHERE key = ?', (key,)).fetchone()[0]
+            start = max(start + length if start < 0 else start, 0)
+            end = min(end + length if end < 0 else end, length - 1)
+            if start > end:
+                return []
+            rows = self._conn.execute(
+                'SELECT value FROM list_items WHERE key = ? ORDER BY id LIMIT ? OFFSET ?',
+                (key, end - start + 1, start)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def keys(self, prefix):
+        pattern = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key FROM kv WHERE key LIKE ? ESCAPE '\\' AND (expires_at IS NULL OR expires_at > ?)",
+                (pattern, time.time())).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RedisStateStore(StateStore):
+    """StateStore on a Redis-compatible server.
+
+    Works with any redis-py compatible client, including fakeredis as a
+    local stand-in.
+    """
+
+    def __init__(self, client, prefix: str = ''):
+        """Initialize the store.
+
+        Args:
+            client: redis.Redis compatible client
+            prefix (str): Prefix added to every key, to share one server between apps
+        """
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None, nx=False):
+        px = int(ttl * 1000) if ttl else None
+        return bool(self.client.set(self.prefix + key, json.dumps(value), px=px, nx=nx))
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.prefix + key for key in keys])
+
+    def incr(self, key, amount=1):
+        return self.client.incrby(self.prefix + key, amount)
+
+    def append(self, key, value, max_len=None):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.rpush(self.prefix + key, json.dumps(value))
+        if max_len:
+            pipe.ltrim(self.prefix + key, -max_len, -1)
+        pipe.llen(self.prefix + key)
+        return pipe.execute()[-1]
+
+    def range(self, key, start=0, end=-1):
+        return [json.loads(value) for value in self.client.lrange(self.prefix + key, start, end)]
+
+    def keys(self, prefix):
+        keys = []
+        for key in self.client.scan_iter(match=self.prefix + prefix + '*'):
+            key = key.decode() if isinstance(key, bytes) else key
+            keys.append(key[len(self.prefix):])
+        return keys
+
+    def close(self):
+        self.client.close()
+
+
+class StoreSessionInterface(ServerSideSessionInterface):
+    """Flask-Session interface keeping server-side sessions in a StateStore.
+
+    Session data is stored as JSON under the session key prefix and expires
+    with the session lifetime, so any worker can serve any request.
+    """
+
+    def __init__(self, app, store: StateStore):
+        self.store = store
+        super().__init__(
+            app,
+            key_prefix=app.config.get('SESSION_KEY_PREFIX', 'session:'),
+            permanent=app.config.get('SESSION_PERMANENT', True),
+            sid_length=app.config.get('SESSION_ID_LENGTH', 32),
+        )
+
+    def _retrieve_session_data(self, store_id: str) -> Optional[dict]:
+        return self.store.get(store_id)
+
+    def _delete_session(self, store_id: str):
+        self.store.delete(store_id)
+
+    def _upsert_session(self, session_lifetime: timedelta, session: ServerSideSession, store_id: str):
+        self.store.set(store_id, dict(session), ttl=session_lifetime.total_seconds())
+
+
+def create_state_store(url: str = None) -> StateStore:
+    """Create the shared state store for a URL.
+
+    Supported URLs:
+        sqlite:///path/to/state.db  Local SQLite file shared by workers on one machine
+        redis://host:6379/0         Redis server (also rediss:// and unix://)
+        fakeredis://                In-process Redis stand-in, for development and tests
+
+    Args:
+        url (str): Store URL, defaults to Config.STATE_URL
+    """
+    url = url or Config.STATE_URL
+    if url.startswith('sqlite:///'):
+        return SQLiteStateStore(url[len('sqlite:///'):])
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        import redis
+        logger.info(f'Using Redis state store at {url}')
+        return RedisStateStore(redis.Redis.from_url(url), Config.STATE_KEY_PREFIX)
+    if url.startswith('fakeredis://'):
+        import fakeredis
+        logger.warning('Using in-process fakeredis state store, state is not shared between processes')
+        return RedisStateStore(fakeredis.FakeRedis(), Config.STATE_KEY_PREFIX)
+    raise ValueError(f'Unsupported STATE_URL: {url}')
@@ -0,0 +1,811 @@
+/* Generated by build_assets.py from static/js, do not edit */
+/* js/app-state.js */
+(() => {
+const POLL_INTERVAL = 30000;
+function csrfToken() {
+const input = document.querySelector('input[name="csrf_token"]');
+return input ? input.value : '';
+}
+class AppState extends EventTarget {
+constructor(interval = POLL_INTERVAL) {
+super();
+this.interval = interval;
+this.state = {
+ollamaRunning: null,
+models: [],
+currentModel: ''
+};
+this.pending = {};
+this.lastFetch = {};
+this.timer = null;
+}
+get(key) {
+return this.state[key];
+}
+set(key, value) {
+if (JSON.stringify(this.state[key]) === JSON.stringify(value)) return;
+this.state[key] = value;
+this.dispatchEvent(new CustomEvent(key, { detail: value }));
+}
+subscribe(key, fn) {
+const listener = (e) => fn(e.detail);
+this.addEventListener(key, listener);
+fn(this.state[key]);
+return () => this.removeEventListener(key, listener);
+}
+request(key, fn, force = false) {
+if (this.pending[key]) return this.pending[key];
+if (!force && Date.now() - (this.lastFetch[key] || 0) < this.interval) {
+return Promise.resolve(this.state[key]);
+}
+this.pending[key] = fn().finally(() => {
+this.lastFetch[key] = Date.now();
+delete this.pending[key];
+});
+return this.pending[key];
+}
+refreshStatus({ force = false } = {}) {
+return this.request('ollamaRunning', async () => {
+try {
+const response = await fetch('/api/ollama-status');
+const data = response.ok ? await response.json() : {};
+this.set('ollamaRunning', Boolean(data.running));
+} catch (error) {
+this.set('ollamaRunning', false);
+}
+}, force);
+}
+refreshModels({ force = false } = {}) {
+return this.request('models', async () => {
+const response = await fetch('/api/models');
+if (!response.ok) {
+throw new Error('Failed to fetch models');
+}
+const data = await response.json();
+this.set('models', data.models || []);
+}, force);
+}
+async loadCurrentModel() {
+try {
+const response = await fetch('/api/current-model');
+const data = response.ok ? await response.json() : {};
+if (data.model) {
+this.set('currentModel', data.model);
+}
+} catch (error) {
+console.error('Error loading current model:', error);
+}
+}
+async selectModel(model) {
+const response = await fetch('/api/select-model', {
+method: 'POST',
+headers: {
+'Content-Type': 'application/json',
+'X-CSRFToken': csrfToken()
+},
+body: JSON.stringify({ model: model })
+});
+const data = await response.json();
+if (!response.ok || data.status === 'error') {
+throw new Error(data.message || 'Failed to select model');
+}
+this.set('currentModel', model);
+}
+poll(force = true) {
+this.refreshStatus({ force }).catch(() => {});
+this.refreshModels({ force }).catch((error) => {
+console.error('Error fetching models:', error);
+});
+}
+schedule() {
+clearInterval(this.timer);
+this.timer = setInterval(() => this.poll(), this.interval);
+}
+start() {
+this.poll();
+this.loadCurrentModel();
+this.schedule();
+document.addEventListener('visibilitychange', () => {
+if (document.hidden) {
+clearInterval(this.timer);
+this.timer = null;
+} else {
+this.poll(false);
+this.schedule();
+}
+});
+document.addEventListener('refresh-models', () => {
+this.refreshModels({ force: true }).catch(() => {});
+});
+}
+}
+window.csrfToken = csrfToken;
+window.appState = new AppState();
+})();
+/* js/ollama-status.js */
+(() => {
+class OllamaStatus extends HTMLElement {
+constructor() {
+super();
+this.unsubscribe = null;
+}
+connectedCallback() {
+this.render();
+this.unsubscribe = window.appState.subscribe('ollamaRunning', (running) => this.update(running));
+}
+disconnectedCallback() {
+if (this.unsubscribe) {
+this.unsubscribe();
+}
+}
+render() {
+this.innerHTML = `
+            <div class="flex items-center">
+                <span class="relative flex h-3 w-3">
+                    <span class="animate-ping absolute inline-flex h-full w-full rounded-full bg-gray-400 opacity-75"></span>
+                    <span class="relative inline-flex rounded-full h-3 w-3 bg-gray-500"></span>
+                </span>
+                <span class="ml-2 text-sm text-gray-500">Checking Ollama...</span>
+            </div>
+        `;
+}
+update(running) {
+if (running === null) return;
+const statusDot = this.querySelector('.relative.flex.h-3.w-3');
+const statusText = this.querySelector('span.text-sm');
+const color = running ? 'green' : 'red';
+statusDot.innerHTML = `
+            <span class="animate-ping absolute inline-flex h-full w-full rounded-full bg-${color}-400 opacity-75"></span>
+            <span class="relative inline-flex rounded-full h-3 w-3 bg-${color}-500"></span>
+        `;
+statusText.textContent = running ? 'Ollama Running' : 'Ollama Not Running';
+statusText.classList.remove('text-gray-500', 'text-green-500', 'text-red-500');
+statusText.classList.add(`text-${color}-500`);
+}
+}
+customElements.define('ollama-status', OllamaStatus);
+})();
+/* js/model-selector.js */
+(() => {
+class ModelSelector extends HTMLElement {
+constructor() {
+super();
+this.models = [];
+this.currentModel = '';
+}
+connectedCallback() {
+this.render();
+this.setupEventListeners();
+this.unsubscribe = [
+window.appState.subscribe('models', (models) => this.renderModels(models)),
+window.appState.subscribe('currentModel', (model) => {
+this.currentModel = model;
+this.querySelector('#modelSelector').value = model;
+})
+];
+}
+disconnectedCallback() {
+(this.unsubscribe || []).forEach(unsubscribe => unsubscribe());
+}
+render() {
+this.innerHTML = `
+            <div class="flex flex-col">
+                <div class="flex items-center space-x-4 mb-3">
+                    <div class="flex-grow">
+                        <label for="modelSelector" class="block text-sm font-medium text-gray-700">Current Model</label>
+                        <select id="modelSelector" class="mt-1 block w-full pl-3 pr-10 py-2 text-base border-gray-300 focus:outline-none focus:ring-blue-500 focus:border-blue-500 sm:text-sm rounded-md">
+                            <option value="">Select a model</option>
+                        </select>
+                    </div>
+                    <div class="flex-none pt-6">
+                        <button id="refreshModels" class="px-2 py-1 text-xs bg-blue-500 text-white rounded hover:bg-blue-600">
+                            Refresh Models
+                        </button>
+                    </div>
+                </div>
+                <div id="errorMessage" class="hidden text-red-600 text-sm"></div>
+            </div>
+        `;
+}
+setupEventListeners() {
+const modelSelector = this.querySelector('#modelSelector');
+const refreshButton = this.querySelector('#refreshModels');
+if (modelSelector) {
+modelSelector.addEventListener('change', async (event) => {
+const model = event.target.value;
+if (!model) return;
+try {
+await window.appState.selectModel(model);
+this.dispatchEvent(new CustomEvent('model-changed', {
+bubbles: true,
+detail: { model: model }
+}));
+this.showError(null);
+} catch (error) {
+console.error('Error selecting model:', error);
+this.showError(error);
+}
+});
+}
+if (refreshButton) {
+refreshButton.addEventListener('click', async (event) => {
+event.preventDefault();
+try {
+await window.appState.refreshModels({ force: true });
+this.showError(null);
+} catch (error) {
+console.error('Error fetching models:', error);
+this.showError(error);
+}
+});
+}
+}
+renderModels(models) {
+this.models = models;
+const modelSelector = this.querySelector('#modelSelector');
+modelSelector.innerHTML = `
+            <option value="">Select a model</option>
+            ${this.models.map(model => `
+                <option value="${model}" ${model === this.currentModel ? 'selected' : ''}>
+                    ${model}
+                </option>
+            `).join('')}
+        `;
+}
+showError(error) {
+const errorMessage = this.querySelector('#errorMessage');
+if (error) {
+errorMessage.textContent = `Error: ${error.message}`;
+errorMessage.classList.remove('hidden');
+} else {
+errorMessage.classList.add('hidden');
+}
+}
+getCurrentModel() {
+return this.currentModel;
+}
+}
+customElements.define('model-selector', ModelSelector);
+})();
+/* js/model-pull.js */
+(() => {
+class ModelPull extends HTMLElement {
+constructor() {
+super();
+this.isPulling = false;
+this.libraryModels = [];
+}
+connectedCallback() {
+this.render();
+this.setupEventListeners();
+this.fetchLibraryModels();
+}
+render() {
+this.innerHTML = `
+            <div class="mt-4">
+                <!-- Model Input -->
+                <div class="flex space-x-2 mb-3">
+                    <div class="flex-1">
+                        <input type="text" name="modelName" id="modelName"
+                            class="focus:ring-indigo-500 focus:border-indigo-500 block w-full rounded-md sm:text-sm border-gray-300"
+                            placeholder="Enter model name (e.g., llama2) or select below">
+                    </div>
+                    <button type="button" id="pullButton"
+                        class="inline-flex items-center px-4 py-2 border border-transparent text-sm font-medium rounded-md shadow-sm text-white bg-indigo-600 hover:bg-indigo-700 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-indigo-500">
+                        <svg class="animate-spin -ml-1 mr-3 h-5 w-5 text-white hidden" xmlns="http://www.w3.org/2000/svg" fill="none" viewBox="0 0 24 24" id="loading">
+                            <circle class="opacity-25" cx="12" cy="12" r="10" stroke="currentColor" stroke-width="4"></circle>
+                            <path class="opacity-75" fill="currentColor" d="M4 12a8 8 0 018-8V0C5.373 0 0 5.373 0 12h4zm2 5.291A7.962 7.962 0 014 12H0c0 3.042 1.135 5.824 3 7.938l3-2.647z"></path>
+                        </svg>
+                        Pull
+                    </button>
+                </div>
+
+                <!-- Library Models -->
+                <div class="mt-3">
+                    <h3 class="text-sm font-medium text-gray-700 mb-2">Available Models</h3>
+                    <div class="bg-white overflow-hidden shadow rounded-md divide-y divide-gray-200 max-h-60 overflow-y-auto" id="libraryModelsList">
+                        <div class="p-4 text-sm text-gray-500">Loading models...</div>
+                    </div>
+                </div>
+                
+                <!-- Progress Bar -->
+                <div class="hidden mt-3" id="progressContainer">
+                    <div class="w-full bg-gray-200 rounded-full h-2">
+                        <div class="bg-indigo-600 h-2 rounded-full" id="progressBar" style="width: 0%"></div>
+                    </div>
+                    <p class="mt-1 text-sm text-gray-600" id="progressText">Initializing...</p>
+                </div>
+            </div>
+        `;
+}
+async fetchLibraryModels(query = '') {
+const modelsList = this.querySelector('#libraryModelsList');
+try {
+const params = query ? `?q=${encodeURIComponent(query)}` : '';
+const response = await fetch(`/api/library-models${params}`);
+if (!response.ok) {
+throw new Error('Failed to fetch library models');
+}
+const data = await response.json();
+this.libraryModels = data.models || [];
+modelsList.innerHTML = this.libraryModels.length > 0
+? this.libraryModels.map(model => `
+                    <div class="p-4 hover:bg-gray-50 cursor-pointer model-item" data-model="${model.name}">
+                        <div class="flex items-center justify-between">
+                            <div>
+                                <h4 class="text-sm font-medium text-gray-900">${model.name}</h4>
+                                ${model.description ? `<p class="mt-1 text-xs text-gray-500">${model.description}</p>` : ''}
+                                ${(model.sizes || []).length > 0 ? `<div class="mt-1 flex flex-wrap gap-1">${model.sizes.map(size => `
+                                    <span class="px-1.5 py-0.5 text-xs rounded bg-gray-100 text-gray-600 hover:bg-indigo-100 model-size" data-model="${model.name}:${size}">${size}</span>`).join('')}
+                                </div>` : ''}
+                            </div>
+                            <button class="ml-4 inline-flex items-center px-2.5 py-1.5 border border-transparent text-xs font-medium rounded text-indigo-700 bg-indigo-100 hover:bg-indigo-200 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-indigo-500">
+                                Select
+                            </button>
+                        </div>
+                    </div>
+                `).join('')
+: '<div class="p-4 text-sm text-gray-500">No models available</div>';
+modelsList.querySelectorAll('.model-item, .model-size').forEach(item => {
+item.addEventListener('click', (event) => {
+event.stopPropagation();
+const modelInput = this.querySelector('#modelName');
+if (modelInput) {
+modelInput.value = item.dataset.model;
+}
+});
+});
+} catch (error) {
+console.error('Error fetching library models:', error);
+modelsList.innerHTML = `
+                <div class="p-4 text-sm text-red-500">
+                    Failed to load models: ${error.message}
+                </div>
+            `;
+}
+}
+setupEventListeners() {
+const pullButton = this.querySelector('#pullButton');
+const modelInput = this.querySelector('#modelName');
+const loading = this.querySelector('#loading');
+const progressContainer = this.querySelector('#progressContainer');
+const progressBar = this.querySelector('#progressBar');
+const progressText = this.querySelector('#progressText');
+if (modelInput) {
+let searchTimer = null;
+modelInput.addEventListener('input', () => {
+clearTimeout(searchTimer);
+searchTimer = setTimeout(() => this.fetchLibraryModels(modelInput.value.trim()), 250);
+});
+}
+if (pullButton && modelInput) {
+pullButton.addEventListener('click', async () => {
+if (this.isPulling) return;
+const modelName = modelInput.value.trim();
+if (!modelName) {
+alert('Please enter a model name or select one from the list');
+return;
+}
+this.isPulling = true;
+loading.classList.remove('hidden');
+progressContainer.classList.remove('hidden');
+pullButton.disabled = true;
+try {
+const response = await fetch('/api/pull-model', {
+method: 'POST',
+headers: {
+'Content-Type': 'application/json',
+'X-CSRFToken': window.csrfToken()
+},
+body: JSON.stringify({ model: modelName })
+});
+if (!response.ok) {
+throw new Error('Failed to start model pull');
+}
+const reader = response.body.getReader();
+const decoder = new TextDecoder();
+while (true) {
+const { value, done } = await reader.read();
+if (done) break;
+const text = decoder.decode(value);
+const lines = text.split('\n');
+for (const line of lines) {
+if (line.trim() && line.startsWith('data: ')) {
+try {
+const data = JSON.parse(line.slice(6));
+if (data.error) {
+progressText.textContent = `Error: ${data.error}`;
+break;
+}
+if (data.status === 'queued') {
+progressBar.style.width = '0%';
+progressText.textContent = `Queued: position ${data.position}`;
+} else if (data.status === 'downloading') {
+const completed = data.completed_mb || 0;
+const total = data.total_mb || 0;
+const percent = data.progress || 0;
+progressBar.style.width = `${percent}%`;
+progressText.textContent = data.detail && data.detail.startsWith('paused')
+? `Paused: ${completed}MB / ${total}MB (${percent}%)`
+: `Downloading: ${completed}MB / ${total}MB (${percent}%)`;
+} else if (data.status === 'verifying') {
+progressBar.style.width = `100%`;
+progressText.textContent = 'Verifying download...';
+} else if (data.status === 'success' || data.status === 'done') {
+progressBar.style.width = `100%`;
+progressText.textContent = 'Download complete!';
+setTimeout(() => {
+progressContainer.classList.add('hidden');
+document.dispatchEvent(new CustomEvent('refresh-models'));
+}, 2000);
+break;
+}
+} catch (e) {
+console.error('Error parsing progress:', e);
+}
+}
+}
+}
+} catch (error) {
+console.error('Pull failed:', error);
+alert(`Pull failed: ${error.message}`);
+progressText.textContent = `Error: ${error.message}`;
+} finally {
+this.isPulling = false;
+loading.classList.add('hidden');
+pullButton.disabled = false;
+}
+});
+}
+}
+}
+customElements.define('model-pull', ModelPull);
+})();
+/* js/fetch-button.js */
+(() => {
+class FetchButton extends HTMLElement {
+constructor() {
+super();
+this.attachShadow({ mode: 'open' });
+const style = document.createElement('style');
+style.textContent = `
+            .fetch-button {
+                background-color: #4f46e5;
+                color: white;
+                padding: 0.5rem 1rem;
+                border-radius: 0.375rem;
+                border: none;
+                font-size: 0.875rem;
+                cursor: pointer;
+                transition: background-color 0.2s;
+            }
+            
+            .fetch-button:hover {
+                background-color: #4338ca;
+            }
+            
+            .fetch-button:disabled {
+                background-color: #9ca3af;
+                cursor: not-allowed;
+            }
+            
+            .loading {
+                opacity: 0.7;
+            }
+        `;
+const button = document.createElement('button');
+button.className = 'fetch-button';
+button.textContent = 'Fetch Models';
+this.shadowRoot.appendChild(style);
+this.shadowRoot.appendChild(button);
+this.button = button;
+this.button.addEventListener('click', () => this.fetchModels());
+}
+async fetchModels() {
+try {
+this.setLoading(true);
+const response = await fetch('/fetch/models', {
+method: 'POST',
+headers: {
+'Content-Type': 'application/json',
+'X-CSRFToken': window.csrfToken()
+}
+});
+if (!response.ok) {
+throw new Error('Failed to fetch models');
+}
+const data = await response.json();
+window.appState.set('models', (data.models || []).map(model => model.name));
+const event = new CustomEvent('modelsFetched', {
+detail: data,
+bubbles: true,
+composed: true
+});
+this.dispatchEvent(event);
+} catch (error) {
+console.error('Error fetching models:', error);
+const event = new CustomEvent('fetchError', {
+detail: error.message,
+bubbles: true,
+composed: true
+});
+this.dispatchEvent(event);
+} finally {
+this.setLoading(false);
+}
+}
+setLoading(isLoading) {
+this.button.disabled = isLoading;
+this.button.classList.toggle('loading', isLoading);
+this.button.textContent = isLoading ? 'Fetching...' : 'Fetch Models';
+}
+}
+customElements.define('fetch-button', FetchButton);
+})();
+/* js/prompt-manager.js */
+(() => {
+class PromptManager extends HTMLElement {
+constructor() {
+super();
+this.defaultPrompt = '';
+this.promptSuggestions = [];
+this.isAnalyzing = false;
+}
+connectedCallback() {
+this.render();
+this.setupEventListeners();
+}
+render() {
+this.innerHTML = `
+            <div class="mb-6 bg-white shadow-lg rounded-lg p-6">
+                <h2 class="text-xl font-bold mb-4 text-gray-800">Prompt Manager</h2>
+                
+                <!-- Prompt Input -->
+                <div class="mb-4">
+                    <label for="prompt" class="block text-sm font-medium text-gray-700">Enter your prompt</label>
+                    <div class="mt-1">
+                        <textarea id="prompt" name="prompt" rows="4"
+                            class="shadow-sm focus:ring-indigo-500 focus:border-indigo-500 block w-full sm:text-sm border-gray-300 rounded-md"
+                            placeholder="Enter your prompt here">${this.defaultPrompt}</textarea>
+                    </div>
+                </div>
+                
+                <!-- Prompt Suggestions -->
+                <div class="relative inline-block text-left mt-4">
+                    <button type="button" id="promptDropdownButton"
+                        class="inline-flex justify-center rounded-md border border-gray-300 shadow-sm px-4 py-2 bg-white text-sm font-medium text-gray-700 hover:bg-gray-50 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-indigo-500">
+                        Suggested Prompts
+                        <svg class="-mr-1 ml-2 h-5 w-5" xmlns="http://www.w3.org/2000/svg" viewBox="0 0 20 20" fill="currentColor">
+                            <path fill-rule="evenodd" d="M5.293 7.293a1 1 0 011.414 0L10 10.586l3.293-3.293a1 1 0 111.414 1.414l-4 4a1 1 0 01-1.414 0l-4-4a1 1 0 010-1.414z" clip-rule="evenodd" />
+                        </svg>
+                    </button>
+                    <div id="promptDropdown"
+                        class="hidden origin-top-right absolute left-0 mt-2 w-full rounded-md shadow-lg bg-white ring-1 ring-black ring-opacity-5 divide-y divide-gray-100 focus:outline-none z-10">
+                        <div class="py-1 max-h-60 overflow-auto" id="promptSuggestionsList">
+                        </div>
+                    </div>
+                </div>
+
+                <!-- Action Buttons -->
+                <div class="mt-4 flex justify-end">
+                    <button type="button" id="analyzeButton"
+                        class="inline-flex items-center px-4 py-2 border border-transparent text-sm font-medium rounded-md shadow-sm text-white bg-indigo-600 hover:bg-indigo-700 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-indigo-500">
+                        <svg class="animate-spin -ml-1 mr-3 h-5 w-5 text-white hidden" xmlns="http://www.w3.org/2000/svg" fill="none" viewBox="0 0 24 24" id="loading">
+                            <circle class="opacity-25" cx="12" cy="12" r="10" stroke="currentColor" stroke-width="4"></circle>
+                            <path class="opacity-75" fill="currentColor" d="M4 12a8 8 0 018-8V0C5.373 0 0 5.373 0 12h4zm2 5.291A7.962 7.962 0 014 12H0c0 3.042 1.135 5.824 3 7.938l3-2.647z"></path>
+                        </svg>
+                        Analyze
+                    </button>
+                    <button type="button" id="abortButton"
+                        class="hidden ml-3 inline-flex items-center px-4 py-2 border border-transparent text-sm font-medium rounded-md shadow-sm text-white bg-red-600 hover:bg-red-700 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-red-500">
+                        Abort
+                    </button>
+                </div>
+            </div>
+        `;
+}
+setupEventListeners() {
+const promptDropdownButton = this.querySelector('#promptDropdownButton');
+const promptDropdown = this.querySelector('#promptDropdown');
+const promptInput = this.querySelector('#prompt');
+const analyzeButton = this.querySelector('#analyzeButton');
+const abortButton = this.querySelector('#abortButton');
+const loading = this.querySelector('#loading');
+if (promptDropdownButton && promptDropdown) {
+promptDropdownButton.addEventListener('click', (e) => {
+e.preventDefault();
+e.stopPropagation();
+promptDropdown.classList.toggle('hidden');
+});
+document.addEventListener('click', (event) => {
+if (!promptDropdownButton.contains(event.target) && !promptDropdown.contains(event.target)) {
+promptDropdown.classList.add('hidden');
+}
+});
+}
+if (analyzeButton) {
+analyzeButton.addEventListener('click', () => {
+if (this.isAnalyzing) return;
+const prompt = promptInput.value.trim();
+if (!prompt) {
+alert('Please enter a prompt');
+return;
+}
+this.dispatchEvent(new CustomEvent('analyze', {
+detail: {
+prompt: prompt
+}
+}));
+});
+}
+if (abortButton) {
+abortButton.addEventListener('click', () => {
+this.dispatchEvent(new CustomEvent('abort'));
+});
+}
+}
+setPromptSuggestions(suggestions) {
+this.promptSuggestions = suggestions;
+const suggestionsList = this.querySelector('#promptSuggestionsList');
+if (suggestionsList) {
+suggestionsList.innerHTML = this.promptSuggestions.map(suggestion => `
+                <button type="button"
+                    class="text-gray-700 block w-full text-left px-4 py-2 text-sm hover:bg-gray-100 hover:text-gray-900"
+                    role="menuitem">${suggestion}</button>
+            `).join('');
+suggestionsList.querySelectorAll('button').forEach(button => {
+button.addEventListener('click', () => {
+const promptInput = this.querySelector('#prompt');
+if (promptInput) {
+promptInput.value = button.textContent.trim();
+this.querySelector('#promptDropdown').classList.add('hidden');
+}
+});
+});
+}
+}
+setDefaultPrompt(prompt) {
+this.defaultPrompt = prompt;
+const promptInput = this.querySelector('#prompt');
+if (promptInput && !promptInput.value) {
+promptInput.value = prompt;
+}
+}
+setAnalyzing(analyzing) {
+this.isAnalyzing = analyzing;
+const analyzeButton = this.querySelector('#analyzeButton');
+const abortButton = this.querySelector('#abortButton');
+const loading = this.querySelector('#loading');
+if (analyzing) {
+analyzeButton.disabled = true;
+loading.classList.remove('hidden');
+abortButton.classList.remove('hidden');
+} else {
+analyzeButton.disabled = false;
+loading.classList.add('hidden');
+abortButton.classList.add('hidden');
+}
+}
+getPrompt() {
+const promptInput = this.querySelector('#prompt');
+return promptInput ? promptInput.value.trim() : '';
+}
+}
+customElements.define('prompt-manager', PromptManager);
+})();
+/* js/main.js */
+(() => {
+function readPageData() {
+const element = document.getElementById('page-data');
+return element ? JSON.parse(element.textContent) : {};
+}
+async function postJSON(url, body) {
+const response = await fetch(url, {
+method: 'POST',
+headers: {
+'Content-Type': 'application/json',
+'X-Requested-With': 'XMLHttpRequest',
+'X-CSRFToken': window.csrfToken()
+},
+body: body === undefined ? undefined : JSON.stringify(body)
+});
+const data = await response.json();
+if (!response.ok) {
+throw new Error(data.error || data.message || 'Request failed');
+}
+return data;
+}
+async function loadSuggestions(promptManager, model) {
+try {
+const response = await fetch(`/api/prompt-suggestions?model=${encodeURIComponent(model)}`);
+if (!response.ok) {
+throw new Error('Failed to load prompt suggestions');
+}
+const data = await response.json();
+promptManager.setPromptSuggestions(data.suggestions || []);
+} catch (error) {
+console.error('Error loading prompt suggestions:', error);
+}
+}
+function setupAnalysis(pageData) {
+const promptManager = document.querySelector('prompt-manager');
+const modelInput = document.getElementById('model');
+const resultDiv = document.getElementById('result');
+if (!promptManager) return;
+promptManager.setDefaultPrompt(pageData.default_prompt || '');
+promptManager.setPromptSuggestions(pageData.prompt_suggestions || []);
+promptManager.addEventListener('analyze', async (e) => {
+promptManager.setAnalyzing(true);
+try {
+const result = await postJSON('/analyze', { prompt: e.detail.prompt });
+if (resultDiv) {
+resultDiv.textContent = result.response;
+resultDiv.title = result.cached
+? `Cached answer to a similar prompt (${Math.round(result.cached.similarity * 100)}% similar): ${result.cached.prompt}`
+: '';
+}
+} catch (error) {
+console.error('Analysis failed:', error);
+if (resultDiv) {
+resultDiv.textContent = `Error: ${error.message}`;
+}
+} finally {
+promptManager.setAnalyzing(false);
+}
+});
+promptManager.addEventListener('abort', async () => {
+try {
+await postJSON('/abort');
+} catch (error) {
+console.error('Error aborting analysis:', error);
+} finally {
+promptManager.setAnalyzing(false);
+}
+});
+window.appState.subscribe('currentModel', (model) => {
+if (!model) return;
+if (modelInput) {
+modelInput.value = model;
+}
+loadSuggestions(promptManager, model);
+});
+}
+window.clearHistory = async function() {
+if (!confirm('Clear all analysis history?')) return;
+try {
+await postJSON('/clear_history');
+const section = document.querySelector('.history-section');
+if (section) {
+section.remove();
+}
+} catch (error) {
+console.error('Error clearing history:', error);
+}
+};
+window.reusePrompt = function(prompt, model) {
+const promptInput = document.getElementById('prompt');
+if (promptInput) {
+promptInput.value = prompt;
+promptInput.focus();
+}
+if (model && model !== window.appState.get('currentModel')) {
+window.appState.selectModel(model).catch((error) => {
+console.error('Error selecting model:', error);
+});
+}
+};
+window.toggleHistoryItem = function(index) {
+const content = document.getElementById(`history-content-${index}`);
+const button = document.getElementById(`history-toggle-${index}`);
+if (!content || !button) return;
+const expanded = button.getAttribute('aria-expanded') === 'true';
+content.classList.toggle('h-32', expanded);
+content.classList.toggle('overflow-hidden', expanded);
+button.setAttribute('aria-expanded', String(!expanded));
+button.textContent = expanded ? 'Show More' : 'Show Less';
+};
+document.addEventListener('DOMContentLoaded', () => {
+setupAnalysis(readPageData());
+window.appState.start();
+});
+})();
@@ -0,0 +1,139 @@
+// Shared client state: one poller for Ollama status and the model list
+const POLL_INTERVAL = 30000;
+
+function csrfToken() {
+    const input = document.querySelector('input[name="csrf_token"]');
+    return input ? input.value : '';
+}
+
+class AppState extends EventTarget {
+    constructor(interval = POLL_INTERVAL) {
+        super();
+        this.interval = interval;
+        this.state = {
+            ollamaRunning: null,
+            models: [],
+            currentModel: ''
+        };
+        this.pending = {};
+        this.lastFetch = {};
+        this.timer = null;
+    }
+
+    get(key) {
+        return this.state[key];
+    }
+
+    set(key, value) {
+        if (JSON.stringify(this.state[key]) === JSON.stringify(value)) return;
+        this.state[key] = value;
+        this.dispatchEvent(new CustomEvent(key, { detail: value }));
+    }
+
+    // Call fn now with the current value and again on every change
+    subscribe(key, fn) {
+        const listener = (e) => fn(e.detail);
+        this.addEventListener(key, listener);
+        fn(this.state[key]);
+        return () => this.removeEventListener(key, listener);
+    }
+
+    // Share one in-flight request per key and skip fresh ones unless forced
+    request(key, fn, force = false) {
+        if (this.pending[key]) return this.pending[key];
+        if (!force && Date.now() - (this.lastFetch[key] || 0) < this.interval) {
+            return Promise.resolve(this.state[key]);
+        }
+        this.pending[key] = fn().finally(() => {
+            this.lastFetch[key] = Date.now();
+            delete this.pending[key];
+        });
+        return this.pending[key];
+    }
+
+    refreshStatus({ force = false } = {}) {
+        return this.request('ollamaRunning', async () => {
+            try {
+                const response = await fetch('/api/ollama-status');
+                const data = response.ok ? await response.json() : {};
+                this.set('ollamaRunning', Boolean(data.running));
+            } catch (error) {
+                this.set('ollamaRunning', false);
+            }
+        }, force);
+    }
+
+    refreshModels({ force = false } = {}) {
+        return this.request('models', async () => {
+            const response = await fetch('/api/models');
+            if (!response.ok) {
+                throw new Error('Failed to fetch models');
+            }
+            const data = await response.json();
+            this.set('models', data.models || []);
+        }, force);
+    }
+
+    async loadCurrentModel() {
+        try {
+            const response = await fetch('/api/current-model');
+            const data = response.ok ? await response.json() : {};
+            if (data.model) {
+                this.set('currentModel', data.model);
+            }
+        } catch (error) {
+            console.error('Error loading current model:', error);
+        }
+    }
+
+    async selectModel(model) {
+        const response = await fetch('/api/select-model', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': csrfToken()
+            },
+            body: JSON.stringify({ model: model })
+        });
+        const data = await response.json();
+        if (!response.ok || data.status === 'error') {
+            throw new Error(data.message || 'Failed to select model');
+        }
+        this.set('currentModel', model);
+    }
+
+    poll(force = true) {
+        this.refreshStatus({ force }).catch(() => {});
+        this.refreshModels({ force }).catch((error) => {
+            console.error('Error fetching models:', error);
+        });
+    }
+
+    schedule() {
+        clearInterval(this.timer);
+        this.timer = setInterval(() => this.poll(), this.interval);
+    }
+
+    start() {
+        this.poll();
+        this.loadCurrentModel();
+        this.schedule();
+
+        // Stop polling in background tabs; catch up when the tab is shown again
+        document.addEventListener('visibilitychange', () => {
+            if (document.hidden) {
+                clearInterval(this.timer);
+                this.timer = null;
+            } else {
+                this.poll(false);
+                this.schedule();
+            }
+        });
+        document.addEventListener('refresh-models', () => {
+            this.refreshModels({ force: true }).catch(() => {});
+        });
+    }
+}
+
+window.csrfToken = csrfToken;
+window.appState = new AppState();
@@ -53,7 +53,7 @@ class FetchButton extends HTMLElement {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
-                    'X-CSRFToken': document.querySelector('input[name="csrf_token"]').value
+                    'X-CSRFToken': window.csrfToken()
                 }
             });
             
@@ -62,6 +62,8 @@ class FetchButton extends HTMLElement {
             }
             
             const data = await response.json();
+            // Share the fresh list with every subscriber instead of polling again
+            window.appState.set('models', (data.models || []).map(model => model.name));
             
             // Dispatch custom event with the fetched data
             const event = new CustomEvent('modelsFetched', {
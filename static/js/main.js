@@ -0,0 +1,128 @@
+// Page wiring: connects the components to the shared app state and the analysis routes
+function readPageData() {
+    const element = document.getElementById('page-data');
+    return element ? JSON.parse(element.textContent) : {};
+}
+
+async function postJSON(url, body) {
+    const response = await fetch(url, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'X-Requested-With': 'XMLHttpRequest',
+            'X-CSRFToken': window.csrfToken()
+        },
+        body: body === undefined ? undefined : JSON.stringify(body)
+    });
+    const data = await response.json();
+    if (!response.ok) {
+        throw new Error(data.error || data.message || 'Request failed');
+    }
+    return data;
+}
+
+async function loadSuggestions(promptManager, model) {
+    try {
+        const response = await fetch(`/api/prompt-suggestions?model=${encodeURIComponent(model)}`);
+        if (!response.ok) {
+            throw new Error('Failed to load prompt suggestions');
+        }
+        const data = await response.json();
+        promptManager.setPromptSuggestions(data.suggestions || []);
+    } catch (error) {
+        console.error('Error loading prompt suggestions:', error);
+    }
+}
+
+function setupAnalysis(pageData) {
+    const promptManager = document.querySelector('prompt-manager');
+    const modelInput = document.getElementById('model');
+    const resultDiv = document.getElementById('result');
+    if (!promptManager) return;
+
+    promptManager.setDefaultPrompt(pageData.default_prompt || '');
+    promptManager.setPromptSuggestions(pageData.prompt_suggestions || []);
+
+    promptManager.addEventListener('analyze', async (e) => {
+        promptManager.setAnalyzing(true);
+        try {
+            const result = await postJSON('/analyze', { prompt: e.detail.prompt });
+            if (resultDiv) {
+                resultDiv.textContent = result.response;
+                // Answers from the semantic cache were given to an earlier, similar prompt
+                resultDiv.title = result.cached
+                    ? `Cached answer to a similar prompt (${Math.round(result.cached.similarity * 100)}% similar): ${result.cached.prompt}`
+                    : '';
+            }
+        } catch (error) {
+            console.error('Analysis failed:', error);
+            if (resultDiv) {
+                resultDiv.textContent = `Error: ${error.message}`;
+            }
+        } finally {
+            promptManager.setAnalyzing(false);
+        }
+    });
+
+    promptManager.addEventListener('abort', async () => {
+        try {
+            await postJSON('/abort');
+        } catch (error) {
+            console.error('Error aborting analysis:', error);
+        } finally {
+            promptManager.setAnalyzing(false);
+        }
+    });
+
+    // Keep the form model and the suggestions in step with the selected model
+    window.appState.subscribe('currentModel', (model) => {
+        if (!model) return;
+        if (modelInput) {
+            modelInput.value = model;
+        }
+        loadSuggestions(promptManager, model);
+    });
+}
+
+// History actions used by the inline handlers in the history list
+window.clearHistory = async function() {
+    if (!confirm('Clear all analysis history?')) return;
+    try {
+        await postJSON('/clear_history');
+        const section = document.querySelector('.history-section');
+        if (section) {
+            section.remove();
+        }
+    } catch (error) {
+        console.error('Error clearing history:', error);
+    }
+};
+
+window.reusePrompt = function(prompt, model) {
+    const promptInput = document.getElementById('prompt');
+    if (promptInput) {
+        promptInput.value = prompt;
+        promptInput.focus();
+    }
+    if (model && model !== window.appState.get('currentModel')) {
+        window.appState.selectModel(model).catch((error) => {
+            console.error('Error selecting model:', error);
+        });
+    }
+};
+
+window.toggleHistoryItem = function(index) {
+    const content = document.getElementById(`history-content-${index}`);
+    const button = document.getElementById(`history-toggle-${index}`);
+    if (!content || !button) return;
+    const expanded = button.getAttribute('aria-expanded') === 'true';
+    content.classList.toggle('h-32', expanded);
+    content.classList.toggle('overflow-hidden', expanded);
+    button.setAttribute('aria-expanded', String(!expanded));
+    button.textContent = expanded ? 'Show More' : 'Show Less';
+};
+
+document.addEventListener('DOMContentLoaded', () => {
+    setupAnalysis(readPageData());
+    window.appState.start();
+});
@@ -50,10 +50,11 @@ class ModelPull extends HTMLElement {
         `;
     }
 
-    async fetchLibraryModels() {
+    async fetchLibraryModels(query = '') {
         const modelsList = this.querySelector('#libraryModelsList');
         try {
-            const response = await fetch('/api/library-models');
+            const params = query ? `?q=${encodeURIComponent(query)}` : '';
+            const response = await fetch(`/api/library-models${params}`);
             if (!response.ok) {
                 throw new Error('Failed to fetch library models');
             }
@@ -61,7 +62,7 @@ class ModelPull extends HTMLElement {
             const data = await response.json();
             this.libraryModels = data.models || [];
 
-            // Update the list
+            // Update the list, each size selects that tag of the model
             modelsList.innerHTML = this.libraryModels.length > 0 
                 ? this.libraryModels.map(model => `
                     <div class="p-4 hover:bg-gray-50 cursor-pointer model-item" data-model="${model.name}">
@@ -69,6 +70,9 @@ class ModelPull extends HTMLElement {
                             <div>
                                 <h4 class="text-sm font-medium text-gray-900">${model.name}</h4>
                                 ${model.description ? `<p class="mt-1 text-xs text-gray-500">${model.description}</p>` : ''}
+                                ${(model.sizes || []).length > 0 ? `<div class="mt-1 flex flex-wrap gap-1">${model.sizes.map(size => `
+                                    <span class="px-1.5 py-0.5 text-xs rounded bg-gray-100 text-gray-600 hover:bg-indigo-100 model-size" data-model="${model.name}:${size}">${size}</span>`).join('')}
+                                </div>` : ''}
                             </div>
                             <button class="ml-4 inline-flex items-center px-2.5 py-1.5 border border-transparent text-xs font-medium rounded text-indigo-700 bg-indigo-100 hover:bg-indigo-200 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-indigo-500">
                                 Select
@@ -79,12 +83,12 @@ class ModelPull extends HTMLElement {
                 : '<div class="p-4 text-sm text-gray-500">No models available</div>';
 
             // Add click handlers
-            modelsList.querySelectorAll('.model-item').forEach(item => {
-                item.addEventListener('click', () => {
-                    const modelName = item.dataset.model;
+            modelsList.querySelectorAll('.model-item, .model-size').forEach(item => {
+                item.addEventListener('click', (event) => {
+                    event.stopPropagation();
                     const modelInput = this.querySelector('#modelName');
                     if (modelInput) {
-                        modelInput.value = modelName;
+                        modelInput.value = item.dataset.model;
                     }
                 });
             });
@@ -107,6 +111,15 @@ class ModelPull extends HTMLElement {
         const progressBar = this.querySelector('#progressBar');
         const progressText = this.querySelector('#progressText');
 
+        if (modelInput) {
+            // Typing filters the library list by name, family or size
+            let searchTimer = null;
+            modelInput.addEventListener('input', () => {
+                clearTimeout(searchTimer);
+                searchTimer = setTimeout(() => this.fetchLibraryModels(modelInput.value.trim()), 250);
+            });
+        }
+
         if (pullButton && modelInput) {
             pullButton.addEventListener('click', async () => {
                 if (this.isPulling) return;
@@ -126,7 +139,8 @@ class ModelPull extends HTMLElement {
                     const response = await fetch('/api/pull-model', {
                         method: 'POST',
                         headers: {
-                            'Content-Type': 'application/json'
+                            'Content-Type': 'application/json',
+                            'X-CSRFToken': window.csrfToken()
                         },
                         body: JSON.stringify({ model: modelName })
                     });
@@ -151,16 +165,22 @@ class ModelPull extends HTMLElement {
                                     const data = JSON.parse(line.slice(6));
                                     
                                     if (data.error) {
-                                        throw new Error(data.error);
+                                        progressText.textContent = `Error: ${data.error}`;
+                                        break;
                                     }
 
                                     // Update progress
-                                    if (data.status === 'downloading') {
+                                    if (data.status === 'queued') {
+                                        progressBar.style.width = '0%';
+                                        progressText.textContent = `Queued: position ${data.position}`;
+                                    } else if (data.status === 'downloading') {
                                         const completed = data.completed_mb || 0;
                                         const total = data.total_mb || 0;
                                         const percent = data.progress || 0;
                                         progressBar.style.width = `${percent}%`;
-                                        progressText.textContent = `Downloading: ${completed}MB / ${total}MB (${percent}%)`;
+                                        progressText.textContent = data.detail && data.detail.startsWith('paused')
+                                            ? `Paused: ${completed}MB / ${total}MB (${percent}%)`
+                                            : `Downloading: ${completed}MB / ${total}MB (${percent}%)`;
                                     } else if (data.status === 'verifying') {
                                         progressBar.style.width = `100%`;
                                         progressText.textContent = 'Verifying download...';
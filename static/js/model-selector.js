@@ -8,7 +8,18 @@ class ModelSelector extends HTMLElement {
     connectedCallback() {
         this.render();
         this.setupEventListeners();
-        this.fetchModels();
+        // The model list is fetched once for the page by the shared app state
+        this.unsubscribe = [
+            window.appState.subscribe('models', (models) => this.renderModels(models)),
+            window.appState.subscribe('currentModel', (model) => {
+                this.currentModel = model;
+                this.querySelector('#modelSelector').value = model;
+            })
+        ];
+    }
+
+    disconnectedCallback() {
+        (this.unsubscribe || []).forEach(unsubscribe => unsubscribe());
     }
 
     render() {
@@ -35,7 +46,6 @@ class ModelSelector extends HTMLElement {
     setupEventListeners() {
         const modelSelector = this.querySelector('#modelSelector');
         const refreshButton = this.querySelector('#refreshModels');
-        const errorMessage = this.querySelector('#errorMessage');
 
         if (modelSelector) {
             modelSelector.addEventListener('change', async (event) => {
@@ -43,74 +53,54 @@ class ModelSelector extends HTMLElement {
                 if (!model) return;
 
                 try {
-                    const response = await fetch('/api/select-model', {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/json'
-                        },
-                        body: JSON.stringify({ model: model })
-                    });
-
-                    if (!response.ok) {
-                        throw new Error('Failed to select model');
-                    }
-
-                    const data = await response.json();
-                    if (data.error) {
-                        throw new Error(data.error);
-                    }
-
-                    this.currentModel = model;
+                    await window.appState.selectModel(model);
                     // Dispatch event for other components
                     this.dispatchEvent(new CustomEvent('model-changed', {
                         bubbles: true,
                         detail: { model: model }
                     }));
-
+                    this.showError(null);
                 } catch (error) {
                     console.error('Error selecting model:', error);
-                    errorMessage.textContent = `Error: ${error.message}`;
-                    errorMessage.classList.remove('hidden');
+                    this.showError(error);
                 }
             });
         }
 
         if (refreshButton) {
-            refreshButton.addEventListener('click', () => {
-                this.fetchModels();
+            refreshButton.addEventListener('click', async (event) => {
+                event.preventDefault();
+                try {
+                    await window.appState.refreshModels({ force: true });
+                    this.showError(null);
+                } catch (error) {
+                    console.error('Error fetching models:', error);
+                    this.showError(error);
+                }
             });
         }
     }
 
-    async fetchModels() {
+    renderModels(models) {
+        this.models = models;
         const modelSelector = this.querySelector('#modelSelector');
-        const errorMessage = this.querySelector('#errorMessage');
-
-        try {
-            const response = await fetch('/api/models');
-            if (!response.ok) {
-                throw new Error('Failed to fetch models');
-            }
-
-            const data = await response.json();
-            this.models = data.models || [];
-
-            // Update selector options
-            modelSelector.innerHTML = `
-                <option value="">Select a model</option>
-                ${this.models.map(model => `
-                    <option value="${model}" ${model === this.currentModel ? 'selected' : ''}>
-                        ${model}
-                    </option>
-                `).join('')}
-            `;
-
-            errorMessage.classList.add('hidden');
+        modelSelector.innerHTML = `
+            <option value="">Select a model</option>
+            ${this.models.map(model => `
+                <option value="${model}" ${model === this.currentModel ? 'selected' : ''}>
+                    ${model}
+                </option>
+            `).join('')}
+        `;
+    }
 
-        } catch (error) {
-            console.error('Error fetching models:', error);
+    showError(error) {
+        const errorMessage = this.querySelector('#errorMessage');
+        if (error) {
             errorMessage.textContent = `Error: ${error.message}`;
             errorMessage.classList.remove('hidden');
+        } else {
+            errorMessage.classList.add('hidden');
         }
     }
 
@@ -1,17 +1,18 @@
 class OllamaStatus extends HTMLElement {
     constructor() {
         super();
-        this.checkInterval = null;
+        this.unsubscribe = null;
     }
 
     connectedCallback() {
         this.render();
-        this.startChecking();
+        // Status is polled once for the page by the shared app state
+        this.unsubscribe = window.appState.subscribe('ollamaRunning', (running) => this.update(running));
     }
 
     disconnectedCallback() {
-        if (this.checkInterval) {
-            clearInterval(this.checkInterval);
+        if (this.unsubscribe) {
+            this.unsubscribe();
         }
     }
 
@@ -27,49 +28,19 @@ class OllamaStatus extends HTMLElement {
         `;
     }
 
-    async checkStatus() {
+    update(running) {
+        if (running === null) return;
         const statusDot = this.querySelector('.relative.flex.h-3.w-3');
         const statusText = this.querySelector('span.text-sm');
-        
-        try {
-            const response = await fetch('/api/ollama-status');
-            if (response.ok) {
-                const data = await response.json();
-                if (data.running) {
-                    // Update to green for running
-                    statusDot.innerHTML = `
-                        <span class="animate-ping absolute inline-flex h-full w-full rounded-full bg-green-400 opacity-75"></span>
-                        <span class="relative inline-flex rounded-full h-3 w-3 bg-green-500"></span>
-                    `;
-                    statusText.textContent = 'Ollama Running';
-                    statusText.classList.remove('text-gray-500', 'text-red-500');
-                    statusText.classList.add('text-green-500');
-                } else {
-                    throw new Error('Ollama not running');
-                }
-            } else {
-                throw new Error('Status check failed');
-            }
-        } catch (error) {
-            // Update to red for not running
-            statusDot.innerHTML = `
-                <span class="animate-ping absolute inline-flex h-full w-full rounded-full bg-red-400 opacity-75"></span>
-                <span class="relative inline-flex rounded-full h-3 w-3 bg-red-500"></span>
-            `;
-            statusText.textContent = 'Ollama Not Running';
-            statusText.classList.remove('text-gray-500', 'text-green-500');
-            statusText.classList.add('text-red-500');
-        }
-    }
+        const color = running ? 'green' : 'red';
 
-    startChecking() {
-        // Check immediately
-        this.checkStatus();
-        
-        // Then check every 30 seconds
-        this.checkInterval = setInterval(() => {
-            this.checkStatus();
-        }, 30000);
+        statusDot.innerHTML = `
+            <span class="animate-ping absolute inline-flex h-full w-full rounded-full bg-${color}-400 opacity-75"></span>
+            <span class="relative inline-flex rounded-full h-3 w-3 bg-${color}-500"></span>
+        `;
+        statusText.textContent = running ? 'Ollama Running' : 'Ollama Not Running';
+        statusText.classList.remove('text-gray-500', 'text-green-500', 'text-red-500');
+        statusText.classList.add(`text-${color}-500`);
     }
 }
 
@@ -0,0 +1,242 @@
+import re
+import shutil
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterable
+from config import Config
+from model_metadata import canonical_name, parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+GB = 1024 ** 3
+
+# Size tags such as 7b, 0.5b, 137m or 8x7b in a model tag
+PARAMETER_TAG = re.compile(r'(?:(\d+)x)?(\d+(?:\.\d+)?)([mb])\b')
+
+# Bytes per parameter of a 4-bit quantized model (the library default), rounded up
+BYTES_PER_PARAMETER = 0.6
+
+
+def _parameters(tag: str) -> float:
+    """Parameter count named by a size tag, 0 if it names none."""
+    match = PARAMETER_TAG.search(tag.lower())
+    if not match:
+        return 0.0
+    experts, count, unit = match.groups()
+    return float(count) * (1e9 if unit == 'b' else 1e6) * int(experts or 1)
+
+
+def estimate_pull_size(model: str, sizes: Iterable[str] = ()) -> int:
+    """Estimate a model's download size in bytes, 0 if unknown.
+
+    The size comes from the model's tag. An untagged or ':latest' name has
+    none, so the smallest of the library sizes given is used instead, as
+    the default tag is usually the smallest size.
+    """
+    _, _, tag = (model or '').partition(':')
+    parameters = _parameters(tag)
+    if not parameters:
+        parameters = min(filter(None, map(_parameters, sizes)), default=0.0)
+    return int(parameters * BYTES_PER_PARAMETER)
+
+
+def _seconds(timestamp: Optional[str]) -> float:
+    """Seconds since the epoch of a history or Ollama timestamp, 0 if missing."""
+    if not timestamp:
+        return 0.0
+    try:
+        return parse_timestamp(timestamp).timestamp()
+    except ValueError:
+        return 0.0
+
+
+class ModelStorageManager:
+    """Keeps local models within a disk budget by deleting the least recently used.
+
+    Model sizes come from /api/tags and the last use of each model from the
+    history index; a model never used since it was pulled counts as used
+    when it was pulled. Pinned models are never deleted. With dry_run set,
+    evictions are only reported.
+    """
+
+    def __init__(self, fetch_manager, history_index, budget_bytes=None, pinned=None,
+                 models_dir=None, min_free_bytes=None, dry_run=None, store=None,
+                 library_catalog=None, default_pull_bytes=None):
+        """Initialize the storage manager.
+
+        Args:
+            fetch_manager (FetchManager): Client used for /api/tags and /api/delete
+            history_index (HistoryIndex): Index used to find when models were last used
+            budget_bytes (int): Total size allowed for local models, 0 for no budget
+            pinned (Iterable[str]): Models never deleted; a name without a tag pins every tag
+            models_dir (str): Ollama's model directory, when on this host, to check free space
+            min_free_bytes (int): Free space to keep in models_dir after a pull
+            dry_run (bool): Report evictions without deleting models
+            store (StateStore): Optional shared store, so one worker evicts at a time
+            library_catalog (LibraryCatalog): Optional catalog, for the sizes of untagged models
+            default_pull_bytes (int): Space reserved for a pull whose size cannot be estimated
+        """
+        self.fetch_manager = fetch_manager
+        self.history_index = history_index
+        self.budget_bytes = int(Config.MODEL_DISK_BUDGET_GB * GB) if budget_bytes is None else budget_bytes
+        pinned = Config.MODEL_PINNED if pinned is None else pinned
+        self.pinned = {name.strip() for name in pinned if name.strip()}
+        self.models_dir = Config.OLLAMA_MODELS_DIR if models_dir is None else models_dir
+        self.min_free_bytes = int(Config.MODEL_MIN_FREE_GB * GB) if min_free_bytes is None else min_free_bytes
+        self.dry_run = Config.MODEL_EVICTION_DRY_RUN if dry_run is None else dry_run
+        self.store = store
+        self.library_catalog = library_catalog
+        self.default_pull_bytes = (int(Config.MODEL_DEFAULT_PULL_GB * GB) if default_pull_bytes is None
+                                   else default_pull_bytes)
+        self._lock = threading.Lock()
+
+    def is_pinned(self, model: str, keep: Iterable[str] = ()) -> bool:
+        """Check whether a model is pinned or in keep."""
+        name = canonical_name(model)
+        protected = self.pinned | set(keep)
+        return name in {canonical_name(p) for p in protected} or name.split(':')[0] in protected
+
+    def free_bytes(self) -> Optional[int]:
+        """Free space in the model directory, None when it is not on this host."""
+        if not self.models_dir:
+            return None
+        try:
+            return shutil.disk_usage(self.models_dir).free
+        except OSError as e:
+            logger.error(f"Error reading free space of {self.models_dir}: {e}")
+            return None
+
+    def usage(self) -> List[Dict[str, Any]]:
+        """Get local models with their size and last use, least recently used first."""
+        data = self.fetch_manager.fetch_models_list()
+        if data is None:
+            raise RuntimeError('Could not get the local model list from Ollama')
+        history = {}
+        for model, timestamp in self.history_index.last_used().items():
+            name = canonical_name(model)
+            history[name] = max(history.get(name, 0.0), _seconds(timestamp))
+
+        models = []
+        for model in data.get('models', []):
+            name = canonical_name(model.get('name'))
+            last_used = max(history.get(name, 0.0), _seconds(model.get('modified_at')))
+            models.append((last_used, name, model.get('size') or 0))
+        return [{
+            'name': name,
+            'size': size,
+            'last_used': datetime.fromtimestamp(last_used).isoformat() if last_used else None,
+            'used_in_history': name in history,
+            'pinned': self.is_pinned(name),
+        } for last_used, name, size in sorted(models)]
+
+    def plan(self, reserve_bytes: int = 0, keep: Iterable[str] = ()) -> Dict[str, Any]:
+        """Work out which models to delete to fit the budget and free space.
+
+        Args:
+            reserve_bytes (int): Extra space needed, e.g. for a model about to be pulled
+            keep (Iterable[str]): Models not to delete besides the pinned ones
+
+        Returns:
+            The local models, the models to evict and the projected savings
+        """
+        keep = set(keep)
+        models = self.usage()
+        total = sum(m['size'] for m in models)
+        over_budget = total + reserve_bytes - self.budget_bytes if self.budget_bytes else 0
+        free = self.free_bytes()
+        disk_short = self.min_free_bytes + reserve_bytes - free if free is not None else 0
+        needed = max(over_budget, disk_short, 0)
+
+        evict, savings = [], 0
+        for model in models:
+            if savings >= needed:
+                break
+            if model['pinned'] or self.is_pinned(model['name'], keep):
+                continue
+            evict.append(model)
+            savings += model['size']
+
+        return {
+            'models': models,
+            'total_bytes': total,
+            'budget_bytes': self.budget_bytes or None,
+            'free_bytes': free,
+            'reserve_bytes': reserve_bytes,
+            'needed_bytes': needed,
+            'disk_short_bytes': max(disk_short, 0),
+            'evict': [m['name'] for m in evict],
+            'projected_savings_bytes': savings,
+            'fits': savings >= needed,
+        }
+
+    def _evict(self, reserve_bytes, keep, dry_run):
+        report = self.plan(reserve_bytes, keep)
+        report['dry_run'] = dry_run
+        report['deleted'] = []
+        report['freed_bytes'] = 0
+        if dry_run:
+            return report
+        sizes = {m['name']: m['size'] for m in report['models']}
+        for name in report['evict']:
+            if self.fetch_manager.delete_model(name):
+                logger.info(f"Evicted model {name} ({sizes[name] / GB:.1f} GB)")
+                report['deleted'].append(name)
+        report['freed_bytes'] = sum(sizes[name] for name in report['deleted'])
+        return report
+
+    def enforce(self, reserve_bytes: int = 0, keep: Iterable[str] = (), dry_run: bool = None) -> Dict[str, Any]:
+        """Delete least recently used models until the budget and free space are met.
+
+        Args:
+            reserve_bytes (int): Extra space needed, e.g. for a model about to be pulled
+            keep (Iterable[str]): Models not to delete besides the pinned ones
+            dry_run (bool): Only report, defaults to the manager's dry_run setting
+
+        Returns:
+            The plan, with the models actually deleted
+        """
+        dry_run = self.dry_run if dry_run is None else dry_run
+        with self._lock:
+            if self.store is None or dry_run:
+                return self._evict(reserve_bytes, keep, dry_run)
+            with self.store.lock('models:evict', timeout=60):
+                return self._evict(reserve_bytes, keep, dry_run)
+
+    def pull_size(self, model: str) -> int:
+        """Space to reserve for pulling a model.
+
+        Uses the size in the tag, else the library catalog's sizes for the
+        model, else the default reserve.
+        """
+        sizes = self.library_catalog.sizes(model.partition(':')[0]) if self.library_catalog is not None else []
+        return estimate_pull_size(model, sizes) or self.default_pull_bytes
+
+    def prepare_pull(self, model: str) -> Optional[str]:
+        """Make room for a model before pulling it.
+
+        Returns:
+            None when the pull can start, otherwise why it cannot
+        """
+        if not self.budget_bytes and not self.models_dir:
+            return None
+        try:
+            installed = {m['name'] for m in self.usage()}
+            # Pulling an installed model again only downloads changed layers
+            reserve = 0 if canonical_name(model) in installed else self.pull_size(model)
+            report = self.enforce(reserve, keep=[model])
+        except Exception as e:
+            # Ollama reports its own errors for the pull; storage checks should not block it
+            logger.error(f"Error checking storage before pulling {model}: {e}")
+            return None
+        if report['dry_run']:
+            if report['evict']:
+                logger.info(f"Dry run: pulling {model} would evict {', '.join(report['evict'])} "
+                            f"({report['projected_savings_bytes'] / GB:.1f} GB)")
+            if report['disk_short_bytes'] > 0:
+                return f"Not enough free space to pull {model} ({report['disk_short_bytes'] / GB:.1f} GB short)"
+            return None
+        if report['freed_bytes'] < report['needed_bytes']:
+            short = report['needed_bytes'] - report['freed_bytes']
+            return f"Not enough model storage to pull {model} ({short / GB:.1f} GB short, pinned models kept)"
+        return None
@@ -0,0 +1,225 @@
+import math
+import time
+import heapq
+import logging
+import threading
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Callable, Iterable
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Prompts longer than this are not worth suggesting
+MAX_PROMPT_LENGTH = 500
+
+# Rebase decayed scores before exp() gets close to overflowing
+MAX_EXPONENT = 500
+
+class PromptTrie:
+    """Prefix tree over lowercased prompts for autocomplete."""
+
+    def __init__(self):
+        self.root = {}
+
+    def insert(self, prompt: str):
+        """Add a prompt to the trie."""
+        node = self.root
+        for char in prompt.lower():
+            node = node.setdefault(char, {})
+        node.setdefault(None, set()).add(prompt)
+
+    def remove(self, prompt: str):
+        """Remove a prompt from the trie, pruning empty branches."""
+        path = [self.root]
+        for char in prompt.lower():
+            node = path[-1].get(char)
+            if node is None:
+                return
+            path.append(node)
+        prompts = path[-1].get(None)
+        if not prompts or prompt not in prompts:
+            return
+        prompts.discard(prompt)
+        if not prompts:
+            del path[-1][None]
+        chars = prompt.lower()
+        for i in range(len(chars), 0, -1):
+            if path[i]:
+                break
+            del path[i - 1][chars[i - 1]]
+
+    def complete(self, prefix: str) -> List[str]:
+        """Get every prompt starting with a prefix (case-insensitive)."""
+        node = self.root
+        for char in prefix.lower():
+            node = node.get(char)
+            if node is None:
+                return []
+        found = []
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for key, child in node.items():
+                if key is None:
+                    found.extend(child)
+                else:
+                    stack.append(child)
+        return found
+
+
+class SuggestionManager:
+    """History-ranked prompt suggestions per model type.
+
+    Each successful history entry bumps its prompt's score in O(1). Scores
+    decay exponentially with a configurable half-life using forward decay:
+    an entry at time t adds exp(rate * (t - landmark)), so older scores
+    never need rescaling and comparing scores compares decayed counts.
+    """
+
+    def __init__(self, model_type_for: Callable[[str], str], half_life=None, max_prompts=None):
+        """Initialize the suggestion manager.
+
+        Args:
+            model_type_for (callable): Maps a model name to 'text' or 'vision'
+            half_life (float): Hours after which a use counts half as much
+            max_prompts (int): Maximum number of prompts tracked per model type
+        """
+        self.model_type_for = model_type_for
+        half_life = half_life or Config.SUGGESTION_HALF_LIFE_HOURS
+        self.rate = math.log(2) / (half_life * 3600)
+        self.max_prompts = max_prompts or Config.SUGGESTION_MAX_PROMPTS
+        self.landmark = time.time()
+        self._lock = threading.Lock()
+        self._scores: Dict[str, Dict[str, float]] = {}
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._tries: Dict[str, PromptTrie] = {}
+        self._top_cache: Dict[str, List[str]] = {}
+
+    @staticmethod
+    def normalize(prompt: str) -> Optional[str]:
+        """Collapse whitespace, returning None for prompts not worth suggesting."""
+        prompt = ' '.join((prompt or '').split())
+        if not prompt or len(prompt) > MAX_PROMPT_LENGTH:
+            return None
+        return prompt
+
+    def _weight(self, seconds: float) -> float:
+        """Forward-decay weight of a use at the given time. Caller holds the lock."""
+        exponent = self.rate * (seconds - self.landmark)
+        if exponent > MAX_EXPONENT:
+            self._rebase(seconds)
+            exponent = 0.0
+        return math.exp(exponent)
+
+    def _rebase(self, seconds: float):
+        """Move the landmark forward and rescale every score. Caller holds the lock."""
+        factor = math.exp(-self.rate * (seconds - self.landmark))
+        for scores in self._scores.values():
+            for prompt in scores:
+                scores[prompt] *= factor
+        self.landmark = seconds
+
+    def _evict(self, model_type: str):
+        """Drop the lowest-scored prompts beyond max_prompts. Caller holds the lock."""
+        scores = self._scores[model_type]
+        if len(scores) <= self.max_prompts * 1.1:
+            return
+        keep = set(heapq.nlargest(self.max_prompts, scores, key=scores.get))
+        for prompt in [p for p in scores if p not in keep]:
+            del scores[prompt]
+            self._counts[model_type].pop(prompt, None)
+            self._tries[model_type].remove(prompt)
+
+    def record(self, model: str, prompt: str, timestamp: Optional[str] = None):
+        """Count one use of a prompt with a model, at the current time if the timestamp is missing or invalid."""
+        prompt = self.normalize(prompt)
+        if prompt is None:
+            return
+        model_type = self.model_type_for(model or '')
+        try:
+            seconds = datetime.fromisoformat(timestamp).timestamp() if timestamp else time.time()
+        except (TypeError, ValueError):
+            # A bad history timestamp must not stop rebuilds or the index follower
+            logger.warning(f'Invalid timestamp {timestamp!r} for prompt use, counting it as now')
+            seconds = time.time()
+        with self._lock:
+            scores = self._scores.setdefault(model_type, {})
+            counts = self._counts.setdefault(model_type, {})
+            if prompt not in scores:
+                self._tries.setdefault(model_type, PromptTrie()).insert(prompt)
+                scores[prompt] = 0.0
+            scores[prompt] += self._weight(seconds)
+            counts[prompt] = counts.get(prompt, 0) + 1
+            self._top_cache.pop(model_type, None)
+            self._evict(model_type)
+
+    def add_entry(self, entry: Dict[str, Any]):
+        """HistoryManager listener hook: count successful prompts."""
+        if entry.get('success'):
+            self.record(entry.get('model'), entry.get('prompt'), entry.get('timestamp'))
+
+    def add_entries(self, entries: Iterable[Dict[str, Any]]):
+        """Count a batch of history entries, e.g. when seeding at startup."""
+        for entry in entries:
+            self.add_entry(entry)
+
+    def clear(self):
+        """Forget all prompt usage."""
+        with self._lock:
+            self._scores = {}
+            self._counts = {}
+            self._tries = {}
+            self._top_cache = {}
+
+    def top_prompts(self, model_type: str, limit: int) -> List[str]:
+        """Get the highest-scored prompts for a model type."""
+        with self._lock:
+            cached = self._top_cache.get(model_type)
+            if cached is None or len(cached) < limit:
+                scores = self._scores.get(model_type, {})
+                cached = heapq.nlargest(max(limit, Config.SUGGESTION_LIMIT), scores, key=scores.get)
+                self._top_cache[model_type] = cached
+            return cached[:limit]
+
+    def get_suggestions(self, model_type: str, defaults: List[str], history_limit: int = None,
+                        limit: int = None) -> List[str]:
+        """Merge history-ranked prompts ahead of the configured suggestions.
+
+        Args:
+            model_type (str): 'text' or 'vision'
+            defaults (list): Suggestions from PromptManager
+            history_limit (int): Maximum number of history prompts to put first
+            limit (int): Maximum total number of suggestions
+        """
+        history_limit = Config.HISTORY_PROMPT_LIMIT if history_limit is None else history_limit
+        limit = limit or Config.SUGGESTION_LIMIT
+        merged = []
+        seen = set()
+        for prompt in self.top_prompts(model_type, history_limit) + list(defaults):
+            key = prompt.lower()
+            if key not in seen:
+                seen.add(key)
+                merged.append(prompt)
+        return merged[:limit]
+
+    def autocomplete(self, model_type: str, prefix: str, defaults: List[str] = (), limit: int = 10) -> List[Dict[str, Any]]:
+        """Complete a prefix from history prompts and configured suggestions.
+
+        History prompts are ranked by decayed score, configured suggestions
+        that were never used follow in their configured order.
+        """
+        prefix = prefix.lower().lstrip()
+        with self._lock:
+            scores = self._scores.get(model_type, {})
+            counts = self._counts.get(model_type, {})
+            trie = self._tries.get(model_type)
+            used = heapq.nlargest(limit, trie.complete(prefix) if trie else [], key=scores.get)
+            results = [{'prompt': p, 'count': counts.get(p, 0), 'source': 'history'} for p in used]
+        seen = {r['prompt'].lower() for r in results}
+        for prompt in defaults:
+            if len(results) >= limit:
+                break
+            if prompt.lower().startswith(prefix) and prompt.lower() not in seen:
+                seen.add(prompt.lower())
+                results.append({'prompt': prompt, 'count': 0, 'source': 'default'})
+        return results
@@ -1,7 +1,20 @@
 import os
+import atexit
+import shutil
 import pytest
 import tempfile
 
+# Keep the files the app writes at runtime out of the working tree; set before config is imported
+RUNTIME_DIR = tempfile.mkdtemp(prefix='ollama-web-tests-')
+atexit.register(shutil.rmtree, RUNTIME_DIR, ignore_errors=True)
+for name, filename in (('HISTORY_FILE', 'query_history.json'), ('HISTORY_INDEX_FILE', 'history_index.db'),
+                       ('LIBRARY_SNAPSHOT_FILE', 'library_catalog.json'), ('PULL_QUEUE_FILE', 'pull_queue.db'),
+                       ('VECTOR_INDEX_DIR', 'vector_index'), ('TUNING_RESULTS_FILE', 'tuning_results.json'),
+                       ('BENCHMARK_RESULTS_FILE', 'benchmark_results.db'), ('PROFILE_DIR', 'profiles'),
+                       ('TRACE_FILE', 'traces.jsonl'), ('UPLOAD_FOLDER', 'uploads')):
+    os.environ[name] = os.path.join(RUNTIME_DIR, filename)
+os.environ['STATE_URL'] = f"sqlite:///{os.path.join(RUNTIME_DIR, 'state.db')}"
+
 @pytest.fixture
 def app():
     from app import app
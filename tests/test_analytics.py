@@ -0,0 +1,137 @@
+import json
+import random
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+import numpy as np
+from analytics_manager import AnalyticsManager, QuantileSketch
+from app import app
+
+
+def make_entry(model, timestamp, duration, success=True, tokens_per_second=None):
+    return {'model': model, 'timestamp': timestamp.isoformat(), 'duration': duration,
+            'success': success, 'tokens_per_second': tokens_per_second}
+
+
+class TestQuantileSketch(unittest.TestCase):
+    def test_relative_accuracy(self):
+        """Test that quantiles are within the configured relative error"""
+        rng = random.Random(0)
+        values = [rng.lognormvariate(0, 1) for _ in range(5000)]
+        sketch = QuantileSketch(0.01)
+        for v in values:
+            sketch.add(v)
+        for q in (0.5, 0.95, 0.99):
+            exact = float(np.quantile(values, q, method='lower'))
+            self.assertAlmostEqual(sketch.quantile(q) / exact, 1.0, delta=0.03)
+
+    def test_merge_and_empty(self):
+        """Test merging sketches and an empty sketch"""
+        a, b = QuantileSketch(), QuantileSketch()
+        self.assertIsNone(a.quantile(0.5))
+        a.add(1.0)
+        b.add(0.0)
+        b.add(100.0)
+        a.merge(b)
+        self.assertEqual(a.count, 3)
+        self.assertEqual(a.quantile(0.0), 0.0)
+        self.assertAlmostEqual(a.quantile(1.0), 100.0, delta=1.0)
+
+
+class TestAnalyticsManager(unittest.TestCase):
+    def setUp(self):
+        self.analytics = AnalyticsManager(bucket_seconds=3600, max_buckets=48, relative_accuracy=0.01)
+        self.start = datetime(2024, 1, 1, 10, 0, 0)
+
+    def _entries(self):
+        entries = []
+        for i in range(200):
+            entries.append(make_entry('llama2', self.start + timedelta(minutes=i), 1.0 + i % 10,
+                                      success=i % 4 != 0, tokens_per_second=20.0 + i % 5))
+        for i in range(50):
+            entries.append(make_entry('mistral', self.start + timedelta(minutes=i * 3), 2.0))
+        return entries
+
+    def test_incremental_totals(self):
+        """Test that each added entry updates its model total and bucket"""
+        for entry in self._entries():
+            self.analytics.add_entry(entry)
+        summary = self.analytics.summary()
+        llama = summary['models']['llama2']
+        self.assertEqual(llama['count'], 200)
+        self.assertAlmostEqual(llama['success_rate'], 0.75)
+        self.assertAlmostEqual(llama['duration']['p50'], 5.0, delta=0.2)
+        self.assertAlmostEqual(llama['tokens_per_second']['p99'], 24.0, delta=0.5)
+        self.assertIsNone(summary['models']['mistral']['tokens_per_second']['p50'])
+        llama_buckets = [b for b in summary['buckets'] if b['model'] == 'llama2']
+        self.assertEqual(len(llama_buckets), 4)
+        self.assertEqual(sum(b['count'] for b in llama_buckets), 200)
+
+    def test_rebuild_matches_incremental(self):
+        """Test that the vectorized rebuild matches incremental updates"""
+        entries = self._entries()
+        for entry in entries:
+            self.analytics.add_entry(entry)
+        rebuilt = AnalyticsManager(bucket_seconds=3600, max_buckets=48, relative_accuracy=0.01)
+        rebuilt.rebuild(entries)
+        self.assertEqual(rebuilt.summary(), self.analytics.summary())
+
+    def test_rebuild_in_batches(self):
+        """Test that rebuilding in small batches with bucket retention matches incremental updates"""
+        entries = self._entries()
+        analytics = AnalyticsManager(bucket_seconds=3600, max_buckets=2, relative_accuracy=0.01)
+        for entry in entries:
+            analytics.add_entry(entry)
+        rebuilt = AnalyticsManager(bucket_seconds=3600, max_buckets=2, relative_accuracy=0.01)
+        rebuilt.rebuild(iter(entries), batch_size=7)
+        self.assertEqual(rebuilt.summary(), analytics.summary())
+        self.assertEqual(rebuilt.summary()['models']['llama2']['count'], 200)
+
+    def test_rebuild_skips_bad_timestamps(self):
+        """Test that an unparsable timestamp is skipped by the rebuild, as by incremental updates"""
+        entries = self._entries()
+        bad = dict(entries[0], timestamp='yesterday')
+        for entry in [bad] + entries:
+            self.analytics.add_entry(entry)
+        rebuilt = AnalyticsManager(bucket_seconds=3600, max_buckets=48, relative_accuracy=0.01)
+        rebuilt.rebuild([bad] + entries)
+        self.assertEqual(rebuilt.summary(), self.analytics.summary())
+
+    def test_resolution_and_since(self):
+        """Test merging buckets into wider windows and filtering by time"""
+        self.analytics.rebuild(self._entries())
+        daily = self.analytics.summary(model='llama2', resolution=86400)
+        self.assertEqual(len(daily['buckets']), 1)
+        self.assertEqual(daily['buckets'][0]['count'], 200)
+
+        recent = self.analytics.summary(model='llama2', since=self.start + timedelta(hours=2))
+        self.assertEqual(recent['models']['llama2']['count'], 80)
+
+    def test_bucket_retention(self):
+        """Test that only the most recent buckets are kept"""
+        analytics = AnalyticsManager(bucket_seconds=3600, max_buckets=2, relative_accuracy=0.01)
+        for hour in range(5):
+            analytics.add_entry(make_entry('llama2', self.start + timedelta(hours=hour), 1.0))
+        summary = analytics.summary()
+        self.assertEqual(len(summary['buckets']), 2)
+        self.assertEqual(summary['models']['llama2']['count'], 5)
+
+
+class TestAnalyticsRoute(unittest.TestCase):
+    def test_analytics_endpoint(self):
+        """Test the analytics endpoint and its parameter validation"""
+        client = app.test_client()
+        analytics = AnalyticsManager(bucket_seconds=3600, max_buckets=48, relative_accuracy=0.01)
+        analytics.add_entry(make_entry('llama2', datetime(2024, 1, 1, 10), 1.5))
+        with patch('app.analytics_manager', analytics):
+            response = client.get('/analytics?model=llama2')
+            self.assertEqual(response.status_code, 200)
+            data = json.loads(response.data)
+            self.assertEqual(data['models']['llama2']['count'], 1)
+
+            response = client.get('/analytics?since=not-a-date')
+            self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,7 @@ import json
 import io
 import pytest
 from unittest.mock import patch, MagicMock
-from app import app, DEBUG_LEVELS
+from app import app, DEBUG_LEVELS, state_store
 
 @pytest.fixture
 def client():
@@ -233,6 +233,14 @@ def test_abort_without_active_request(client):
     assert data['status'] == 'error'
     assert 'No active request to abort' in data['message']
 
+def test_clear_history(client, mock_history):
+    """Test clearing history from the history section button"""
+    mock_manager, history = mock_history
+    response = client.post('/clear_history')
+    assert response.status_code == 200
+    assert json.loads(response.data)['status'] == 'success'
+    mock_manager.clear_history.assert_called_once()
+
 def test_abort_with_active_request(client, mock_requests, mock_history):
     """Test aborting an active request"""
     mock_manager, history = mock_history
@@ -250,11 +258,14 @@ def test_abort_with_active_request(client, mock_requests, mock_history):
     with client.session_transaction() as session:
         session['selected_model'] = model
 
-    # Mock active_requests to simulate a running request
-    with patch('app.active_requests') as mock_active_requests:
-        mock_active_requests.__iter__.return_value = ['fake_request_id']
-        mock_active_requests.pop.return_value = mock_response
-
+    # Simulate running requests for this session and another one
+    client.set_cookie('session_id', 'abort-session')
+    mine = MagicMock(session_id='abort-session')
+    other = MagicMock(session_id='other-session')
+    # Requests running in other workers are only known from the shared store
+    state_store.set('inflight:remote-mine', {'pid': 0, 'session_id': 'abort-session'})
+    state_store.set('inflight:remote-other', {'pid': 0, 'session_id': 'other-session'})
+    with patch.dict('app.active_requests', {'mine': mine, 'other': other}, clear=True):
         # Now abort the request
         response = client.post('/abort')
         assert response.status_code == 200
@@ -262,8 +273,13 @@ def test_abort_with_active_request(client, mock_requests, mock_history):
         assert data['status'] == 'success'
         assert 'Analysis aborted' in data['message']
 
-        # Verify that the request was closed
-        assert mock_response.close.call_count == 1
+        # Verify that only this session's request was closed
+        assert mine.close.call_count == 1
+        assert other.close.call_count == 0
+        assert state_store.get('abort:remote-mine') is True
+        assert state_store.get('abort:remote-other') is None
+        assert client.post('/abort').status_code == 404
+    state_store.delete('inflight:remote-other', 'abort:remote-mine')
 
 def test_analyze_with_streaming_response(client, mock_requests, mock_history):
     """Test analyze endpoint with streaming response"""
@@ -0,0 +1,43 @@
+import os
+import unittest
+from app import app
+from build_assets import minify_js, build_bundle, BUNDLE_OUTPUT, STATIC_DIR
+
+
+class TestMinifyJs(unittest.TestCase):
+    def test_strips_comments_and_indentation(self):
+        """Test that comments, indentation and blank lines are removed"""
+        source = 'function f() {\n    // comment\n\n    /* block\n       comment */\n    return 1;\n}\n'
+        self.assertEqual(minify_js(source), 'function f() {\nreturn 1;\n}\n')
+
+    def test_keeps_literals(self):
+        """Test that strings, templates and regexes are copied verbatim"""
+        source = ("const url = 'http://host//path';  // trailing\n"
+                  "const s = \"a /* not */  b\";\n"
+                  "const t = `  keep //\n    ${ {a: 1}.a }  ${`nested ${x}`}  `;\n"
+                  "const r = /\\/\\/[/*]+/g.test(s) ? 4 / 2 : 1;\n")
+        self.assertEqual(minify_js(source),
+                         "const url = 'http://host//path';\n"
+                         "const s = \"a /* not */  b\";\n"
+                         "const t = `  keep //\n    ${ {a: 1}.a }  ${`nested ${x}`}  `;\n"
+                         "const r = /\\/\\/[/*]+/g.test(s) ? 4 / 2 : 1;\n")
+
+
+class TestBundle(unittest.TestCase):
+    def test_bundle_up_to_date(self):
+        """Test that the committed bundle matches its sources (run: python build_assets.py)"""
+        with open(os.path.join(STATIC_DIR, BUNDLE_OUTPUT), encoding='utf-8') as f:
+            self.assertEqual(f.read(), build_bundle())
+
+    def test_index_loads_only_the_bundle(self):
+        """Test that the page loads one fingerprinted script and no inline code"""
+        app.config['TESTING'] = True
+        response = app.test_client().get('/')
+        html = response.get_data(as_text=True)
+        self.assertRegex(html, r'dist/app\.min\.js\?v=[0-9a-f]{12}')
+        self.assertNotIn('static/js/', html)
+        self.assertEqual(html.count('<script'), 3)  # Tailwind, the bundle and the page data
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import unittest
+import tempfile
+from benchmarks.runner import (benchmark, BENCHMARKS, time_case, save_results,
+                               load_results, compare_results)
+
+
+class TestBenchmarkRunner(unittest.TestCase):
+    def test_time_case_runs_setup_and_teardown(self):
+        """Test that a case is timed and setup/teardown are called once"""
+        calls = []
+        case = {
+            'name': 'noop',
+            'func': lambda state: calls.append(state),
+            'repeat': 3,
+            'setup': lambda: 'state',
+            'teardown': lambda state: calls.append('teardown'),
+        }
+        stats = time_case(case)
+        self.assertEqual(stats['repeat'], 3)
+        self.assertLessEqual(stats['min'], stats['median'])
+        self.assertEqual(calls, ['state', 'state', 'state', 'teardown'])
+
+    def test_register_benchmark(self):
+        """Test that the decorator registers a case"""
+        count = len(BENCHMARKS)
+
+        @benchmark('test.registered', repeat=1)
+        def bench(state):
+            pass
+
+        self.assertEqual(len(BENCHMARKS), count + 1)
+        self.assertEqual(BENCHMARKS[-1]['name'], 'test.registered')
+        BENCHMARKS.pop()
+
+    def test_save_and_load_results(self):
+        """Test that results round-trip through a JSON file"""
+        path = os.path.join(tempfile.mkdtemp(), 'results', 'baseline.json')
+        results = {'results': {'a': {'median': 0.5}}}
+        save_results(results, path)
+        self.assertEqual(load_results(path), results)
+        self.assertIsNone(load_results(path + '.missing'))
+
+    def test_compare_results_threshold(self):
+        """Test that only slowdowns beyond the threshold are regressions"""
+        baseline = {'results': {
+            'fast': {'median': 1.0},
+            'slow': {'median': 1.0},
+            'removed': {'median': 1.0},
+        }}
+        current = {'results': {
+            'fast': {'median': 1.1},
+            'slow': {'median': 1.5},
+            'added': {'median': 1.0},
+        }}
+        rows = {row['name']: row for row in compare_results(baseline, current, threshold=0.2)}
+        self.assertEqual(set(rows), {'fast', 'slow'})
+        self.assertFalse(rows['fast']['regressed'])
+        self.assertTrue(rows['slow']['regressed'])
+        self.assertAlmostEqual(rows['slow']['change'], 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+from unittest.mock import patch, MagicMock
+from budget_manager import BudgetManager, SUMMARY_PREFIX
+from conversation_manager import ConversationManager
+
+
+class TestBudgetManager(unittest.TestCase):
+    def setUp(self):
+        self.fetch_manager = MagicMock()
+        self.fetch_manager.fetch_model_info.return_value = {
+            'parameters': 'num_ctx 4096\nstop "<|eot_id|>"',
+            'model_info': {'llama.context_length': 131072}
+        }
+        self.budget = BudgetManager(self.fetch_manager, default_num_ctx=2048,
+                                    reserve_tokens=512, summary_tokens=64)
+
+    def test_family_ratios(self):
+        """Test that token estimates depend on the model family"""
+        self.assertEqual(BudgetManager.chars_per_token('codellama:7b'), 3.2)
+        self.assertEqual(BudgetManager.chars_per_token('llama3.2-vision'), 3.8)
+        self.assertEqual(BudgetManager.chars_per_token('unknown-model'), 3.5)
+        self.assertEqual(self.budget.estimate_tokens('x' * 38, 'llama2'), 10)
+        self.assertEqual(self.budget.estimate_tokens('', 'llama2'), 0)
+
+    def test_num_ctx_from_show(self):
+        """Test that num_ctx is read from /api/show and cached"""
+        self.assertEqual(self.budget.get_num_ctx('llama2'), 4096)
+        self.assertEqual(self.budget.get_num_ctx('llama2'), 4096)
+        self.fetch_manager.fetch_model_info.assert_called_once_with('llama2')
+        self.assertEqual(self.budget.get_budget('llama2'), 4096 - 512)
+
+    def test_num_ctx_capped_and_defaulted(self):
+        """Test that the default applies and context_length caps num_ctx"""
+        self.fetch_manager.fetch_model_info.return_value = {
+            'parameters': '', 'model_info': {'phi.context_length': 1024}
+        }
+        self.assertEqual(self.budget.get_num_ctx('phi'), 1024)
+        self.fetch_manager.fetch_model_info.return_value = None
+        self.assertEqual(self.budget.get_num_ctx('other'), 2048)
+
+    def test_fit_prompt(self):
+        """Test that an over-budget prompt is truncated"""
+        prompt = 'x' * 100000
+        fitted = self.budget.fit_prompt(prompt, 'llama2')
+        self.assertLess(len(fitted), len(prompt))
+        self.assertLessEqual(self.budget.estimate_tokens(fitted, 'llama2'), self.budget.get_budget('llama2'))
+        self.assertEqual(self.budget.fit_prompt('short', 'llama2'), 'short')
+
+    def test_fit_messages(self):
+        """Test that the oldest messages are dropped and the system message kept"""
+        long_text = 'y' * 4000
+        messages = [{'role': 'system', 'content': 'summary'}]
+        messages += [{'role': 'user' if i % 2 == 0 else 'assistant', 'content': long_text} for i in range(8)]
+        messages.append({'role': 'user', 'content': 'latest'})
+
+        kept, dropped = self.budget.fit_messages(messages, 'llama2')
+        self.assertEqual(kept[0]['content'], 'summary')
+        self.assertEqual(kept[-1]['content'], 'latest')
+        self.assertEqual(len(kept) + len(dropped), len(messages))
+        self.assertLessEqual(self.budget.estimate_messages(kept, 'llama2'), self.budget.get_budget('llama2'))
+
+    def test_summarize(self):
+        """Test that summaries are requested from /api/generate"""
+        response = MagicMock()
+        response.json.return_value = {'response': ' The user asked about Paris. '}
+        with patch('requests.post', return_value=response) as mock_post:
+            summary = self.budget.summarize('llama2', [{'role': 'user', 'content': 'Paris?'}], 'earlier')
+        self.assertEqual(summary, 'The user asked about Paris.')
+        payload = mock_post.call_args[1]['json']
+        self.assertIn('Earlier summary: earlier', payload['prompt'])
+        self.assertEqual(payload['options']['num_predict'], 64)
+
+    def test_compact_conversation(self):
+        """Test that compaction replaces old turns with a rolling summary"""
+        conversations = ConversationManager(max_conversations=10, max_messages=100,
+                                            max_chars=100000, idle_timeout=3600)
+        for i in range(3):
+            conversations.record_turn('s1', 'llama2', f'q{i}', f'a{i}')
+        conversations.compact('s1', 'llama2', 2, 'first summary', SUMMARY_PREFIX)
+        conversations.compact('s1', 'llama2', 2, 'second summary', SUMMARY_PREFIX)
+
+        messages = conversations.get_messages('s1')
+        self.assertEqual(messages[0], {'role': 'system', 'content': SUMMARY_PREFIX + 'second summary'})
+        self.assertEqual([m['content'] for m in messages[1:]], ['q2', 'a2'])
+        self.assertEqual(conversations.get_summary('s1', SUMMARY_PREFIX), 'second summary')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+import json
+import secrets
+import unittest
+from unittest.mock import patch, MagicMock
+from app import app, db, Session, conversation_manager
+from conversation_manager import ConversationManager
+
+
+class TestConversationManager(unittest.TestCase):
+    def setUp(self):
+        self.manager = ConversationManager(max_conversations=2, max_messages=4,
+                                           max_chars=1000, idle_timeout=3600)
+
+    def test_turns_accumulate(self):
+        """Test that recorded turns are replayed on the next request"""
+        messages = self.manager.build_messages('s1', 'llama2', 'hello')
+        self.assertEqual(messages, [{'role': 'user', 'content': 'hello'}])
+
+        self.manager.record_turn('s1', 'llama2', 'hello', 'hi there')
+        messages = self.manager.build_messages('s1', 'llama2', 'how are you?')
+        self.assertEqual([m['role'] for m in messages], ['user', 'assistant', 'user'])
+        self.assertEqual(messages[1]['content'], 'hi there')
+
+    def test_model_change_resets_conversation(self):
+        """Test that switching model starts a new conversation once the turn is recorded"""
+        self.manager.record_turn('s1', 'llama2', 'hello', 'hi')
+        messages = self.manager.build_messages('s1', 'mistral', 'hello again')
+        self.assertEqual(len(messages), 1)
+        # The upstream call may still fail, so the old conversation is kept until then
+        self.assertEqual(self.manager.get_model('s1'), 'llama2')
+        self.assertEqual(len(self.manager.get_messages('s1')), 2)
+
+        self.manager.record_turn('s1', 'mistral', 'hello again', 'hi')
+        self.assertEqual(self.manager.get_model('s1'), 'mistral')
+        self.assertEqual(len(self.manager.get_messages('s1')), 2)
+
+    def test_build_messages_stores_nothing(self):
+        """Test that building messages for new sessions does not grow the conversations"""
+        for i in range(5):
+            self.manager.build_messages(f's{i}', 'llama2', 'hello')
+        self.assertEqual(len(self.manager), 0)
+
+    def test_message_bound(self):
+        """Test that the oldest turns are dropped beyond max_messages"""
+        for i in range(5):
+            self.manager.record_turn('s1', 'llama2', f'q{i}', f'a{i}')
+        messages = self.manager.get_messages('s1')
+        self.assertEqual(len(messages), 4)
+        self.assertEqual(messages[0]['content'], 'q3')
+
+    def test_char_bound(self):
+        """Test that the oldest turns are dropped beyond max_chars"""
+        manager = ConversationManager(max_conversations=2, max_messages=100,
+                                      max_chars=25, idle_timeout=3600)
+        manager.record_turn('s1', 'llama2', 'x' * 10, 'y' * 10)
+        manager.record_turn('s1', 'llama2', 'z' * 10, 'w' * 10)
+        messages = manager.get_messages('s1')
+        self.assertEqual([m['content'][0] for m in messages], ['z', 'w'])
+
+    def test_lru_eviction(self):
+        """Test that least recently used conversations are evicted"""
+        self.manager.record_turn('s1', 'llama2', 'q', 'a')
+        self.manager.record_turn('s2', 'llama2', 'q', 'a')
+        self.manager.record_turn('s3', 'llama2', 'q', 'a')
+        self.assertEqual(len(self.manager), 2)
+        self.assertEqual(self.manager.get_messages('s1'), [])
+
+    def test_idle_eviction(self):
+        """Test that idle conversations are evicted"""
+        self.manager.record_turn('s1', 'llama2', 'q', 'a')
+        with patch('conversation_manager.time.time', return_value=10 ** 12):
+            self.manager.record_turn('s2', 'llama2', 'q', 'a')
+        self.assertEqual(self.manager.get_messages('s1'), [])
+
+    def test_reset(self):
+        """Test discarding a conversation"""
+        self.manager.record_turn('s1', 'llama2', 'q', 'a')
+        self.manager.reset('s1')
+        self.assertEqual(self.manager.get_messages('s1'), [])
+
+
+class TestChatRoute(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        self.session_id = secrets.token_hex(32)
+        with app.app_context():
+            sess, _ = Session.get_or_create(self.session_id)
+            sess.set_data('llama2')
+        self.client.set_cookie('session_id', self.session_id)
+
+    def tearDown(self):
+        conversation_manager.reset(self.session_id)
+        with app.app_context():
+            Session.query.filter_by(id=self.session_id).delete()
+            db.session.commit()
+
+    def _mock_reply(self, content):
+        response = MagicMock()
+        response.json.return_value = {
+            'message': {'role': 'assistant', 'content': content},
+            'prompt_eval_count': 5,
+            'eval_count': 3
+        }
+        return response
+
+    def test_chat_sends_conversation(self):
+        """Test that follow-up turns include the earlier exchange"""
+        with patch('requests.post', return_value=self._mock_reply('Paris.')) as mock_post:
+            response = self.client.post('/chat', json={'prompt': 'Capital of France?'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.data)['response'], 'Paris.')
+
+            self.client.post('/chat', json={'prompt': 'And Germany?'})
+            url = mock_post.call_args[0][0]
+            self.assertTrue(url.endswith('/api/chat'))
+            messages = mock_post.call_args[1]['json']['messages']
+            self.assertEqual([m['content'] for m in messages],
+                             ['Capital of France?', 'Paris.', 'And Germany?'])
+
+        response = self.client.get('/chat/history')
+        data = json.loads(response.data)
+        self.assertEqual(data['model'], 'llama2')
+        self.assertEqual(len(data['messages']), 4)
+
+        self.client.post('/chat/reset')
+        data = json.loads(self.client.get('/chat/history').data)
+        self.assertEqual(data['messages'], [])
+
+    def test_chat_without_session(self):
+        """Test that chat requires a session"""
+        client = app.test_client()
+        response = client.post('/chat', json={'prompt': 'hello'})
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
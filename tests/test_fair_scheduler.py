@@ -0,0 +1,145 @@
+import json
+import time
+import secrets
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+from sqlalchemy import inspect
+from app import app, db, Session, add_missing_columns
+from fair_scheduler import FairScheduler, SchedulerBusy
+
+
+class TestFairScheduler(unittest.TestCase):
+    def run_queued(self, scheduler, requests):
+        """Queue (session, weight, gpu_seconds) requests behind a running call and return the grant order."""
+        order = []
+        release = threading.Event()
+
+        def hold():
+            with scheduler.slot('holder'):
+                release.wait(5)
+
+        def call(session_id, weight, seconds):
+            with scheduler.slot(session_id, weight) as ticket:
+                order.append(session_id)
+                ticket.gpu_seconds = seconds
+
+        threads = [threading.Thread(target=hold)]
+        threads[0].start()
+        while scheduler.stats()['running'] < 1:
+            time.sleep(0.001)
+        for i, request in enumerate(requests):
+            threads.append(threading.Thread(target=call, args=request))
+            threads[-1].start()
+            while scheduler.stats()['waiting'] < i + 1:
+                time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        return order
+
+    def test_light_session_overtakes_backlog(self):
+        """Test that a session with little GPU use is served before another session's backlog"""
+        scheduler = FairScheduler(slots=1, max_wait=5)
+        with scheduler.slot('bulk') as ticket:
+            ticket.gpu_seconds = 5.0
+        order = self.run_queued(scheduler, [('bulk', 1, 5.0), ('bulk', 1, 5.0), ('interactive', 1, 0.5)])
+        self.assertEqual(order, ['interactive', 'bulk', 'bulk'])
+
+    def test_weights_share_capacity(self):
+        """Test that a session with twice the weight gets twice the slots while both are backlogged"""
+        scheduler = FairScheduler(slots=1, max_wait=5)
+        order = self.run_queued(scheduler, [('a', 2, 1.0)] * 4 + [('b', 1, 1.0)] * 2)
+        self.assertEqual(order, ['a', 'b', 'a', 'a', 'b', 'a'])
+
+    def test_wait_times_out(self):
+        """Test that a request gives up after max_wait and leaves the queue"""
+        scheduler = FairScheduler(slots=1, max_wait=0.05)
+        with scheduler.slot('holder'):
+            with self.assertRaises(SchedulerBusy):
+                with scheduler.slot('other'):
+                    pass
+            self.assertEqual((scheduler.stats()['running'], scheduler.stats()['waiting']), (1, 0))
+        self.assertEqual(scheduler.stats()['sessions'], {})
+
+    def test_unlimited(self):
+        """Test that slots=0 never queues"""
+        scheduler = FairScheduler(slots=0)
+        with scheduler.slot('a'), scheduler.slot('a'), scheduler.slot('b'):
+            self.assertEqual(scheduler.stats()['waiting'], 0)
+
+
+class TestSessionQuota(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        self.session_id = secrets.token_hex(32)
+        with app.app_context():
+            sess, _ = Session.get_or_create(self.session_id)
+            sess.set_data('llama2')
+        self.client.set_cookie('session_id', self.session_id)
+
+    def tearDown(self):
+        with app.app_context():
+            Session.query.filter_by(id=self.session_id).delete()
+            db.session.commit()
+
+    def test_token_bucket(self):
+        """Test that bursts are allowed up to the limit and tokens refill over time"""
+        with app.app_context():
+            take = lambda now: Session.take_token(self.session_id, rate=60, burst=2, now=now)
+            self.assertEqual([take(100.0), take(100.0)], [0, 0])
+            self.assertAlmostEqual(take(100.0), 1.0)
+            self.assertAlmostEqual(take(100.5), 0.5)
+            self.assertEqual(take(101.0), 0)
+            self.assertEqual(Session.take_token(self.session_id, rate=0), 0)
+
+    def test_gpu_quota_window(self):
+        """Test that GPU time is charged per window and blocks calls once the quota is used"""
+        with app.app_context(), patch('app.Config.GPU_QUOTA_SECONDS', 10), patch('app.Config.GPU_QUOTA_WINDOW', 100):
+            Session.charge_gpu(self.session_id, 6.0, now=1000.0)
+            Session.charge_gpu(self.session_id, 5.0, now=1050.0)
+            sess = Session.query.get(self.session_id)
+            db.session.refresh(sess)
+            self.assertEqual(sess.gpu_used(now=1060.0), 11.0)
+            self.assertEqual(sess.quota_retry_after(now=1060.0), 40.0)
+
+            Session.charge_gpu(self.session_id, 2.0, now=1100.0)
+            db.session.refresh(sess)
+            self.assertEqual(sess.quota_retry_after(now=1100.0), 0)
+            self.assertEqual(sess.quota(now=1100.0)['gpu_seconds'], 2.0)
+            self.assertEqual(sess.quota(now=1100.0)['gpu_total_seconds'], 13.0)
+
+    def test_routes(self):
+        """Test that /analyze is rate limited and charges Ollama's total_duration to the session"""
+        reply = MagicMock()
+        reply.json.return_value = {'response': 'Paris', 'total_duration': 2_500_000_000}
+        with patch('app.history_manager', MagicMock()), patch('app.Config.RATE_LIMIT_BURST', 1), \
+                patch('app.Config.RATE_LIMIT_PER_MINUTE', 1), patch('app.scheduler', FairScheduler(slots=1)), \
+                patch('requests.post', return_value=reply):
+            self.assertEqual(self.client.post('/analyze', json={'prompt': 'capital of france'}).status_code, 200)
+            response = self.client.post('/analyze', json={'prompt': 'capital of france'})
+            self.assertEqual(response.status_code, 429)
+            self.assertGreater(int(response.headers['Retry-After']), 50)
+
+        quota = json.loads(self.client.get('/api/quota').data)
+        self.assertEqual((quota['gpu_seconds'], quota['weight']), (2.5, 1.0))
+
+        quota = json.loads(self.client.post(f'/admin/sessions/{self.session_id}/quota',
+                                            json={'weight': 3, 'reset': True}).data)
+        self.assertEqual((quota['gpu_seconds'], quota['weight'], quota['gpu_total_seconds']), (0, 3.0, 2.5))
+        self.assertEqual(self.client.post(f'/admin/sessions/{self.session_id}/quota',
+                                          json={'weight': 0}).status_code, 400)
+
+    def test_missing_columns_added(self):
+        """Test that columns added to Session are created in an existing table"""
+        with app.app_context():
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql('ALTER TABLE session DROP COLUMN gpu_total_seconds')
+            add_missing_columns(Session)
+            columns = {column['name'] for column in inspect(db.engine).get_columns('session')}
+            self.assertIn('gpu_total_seconds', columns)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -15,8 +15,9 @@ class TestHistoryManager(unittest.TestCase):
     
     def tearDown(self):
         """Clean up test files"""
-        if os.path.exists(self.test_history_file):
-            os.remove(self.test_history_file)
+        for path in (self.test_history_file, f'{self.test_history_file}.lock'):
+            if os.path.exists(path):
+                os.remove(path)
     
     def test_add_entry(self):
         """Test adding entries to history"""
@@ -0,0 +1,129 @@
+import os
+import json
+import time
+import zlib
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+import numpy as np
+from app import app
+from history_index import HistoryIndex
+from history_manager import HistoryManager
+from history_embedder import HistoryEmbedder, entry_text
+from vector_index import VectorIndex
+
+
+def bag_of_words(texts, model='embed'):
+    """Stand-in embedding: texts sharing words get similar vectors."""
+    vectors = np.zeros((len(texts), 64), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in text.lower().split():
+            vectors[row, zlib.crc32(word.encode()) % 64] += 1
+    return vectors
+
+
+class TestHistoryEmbedder(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.index = HistoryIndex(os.path.join(self.tmpdir, 'index.db'))
+        self.manager = HistoryManager(os.path.join(self.tmpdir, 'history.json'), max_entries=5, index=self.index)
+        self.vectors = VectorIndex(os.path.join(self.tmpdir, 'history'), dtype='float16')
+        self.embeddings = MagicMock()
+        self.embeddings.embed.side_effect = bag_of_words
+        self.embedder = HistoryEmbedder(self.index, self.embeddings, self.vectors, model='embed',
+                                        batch_size=2, interval=0.05)
+        self.manager.add_listener(self.embedder)
+
+    def tearDown(self):
+        self.embedder.stop()
+        self.index.close()
+        shutil.rmtree(self.tmpdir)
+
+    def add(self, prompt, result='', model='llama2'):
+        self.manager.add_entry(model, prompt, result, 1.0, True)
+
+    def test_request_path_does_not_embed(self):
+        """Test that adding an entry only wakes the background thread"""
+        self.add('describe the cat')
+        self.embeddings.embed.assert_not_called()
+        self.assertTrue(self.embedder._wake.is_set())
+
+    def test_catch_up_in_batches(self):
+        """Test that entries are embedded in batches by id and only once"""
+        for i in range(5):
+            self.add(f'prompt {i}', f'result {i}')
+        self.assertEqual(self.embedder.catch_up(), 5)
+        self.assertEqual([len(call.args[0]) for call in self.embeddings.embed.call_args_list], [2, 2, 1])
+        self.assertEqual(self.embeddings.embed.call_args_list[0].args[0][0], 'prompt 0\n\nresult 0')
+        self.assertEqual(self.embedder.catch_up(), 0)
+        self.assertEqual((self.vectors.count, self.vectors.max_id(), self.vectors.model), (5, 5, 'embed'))
+        self.assertEqual(self.vectors.info()['dtype'], 'float16')
+
+    def test_waits_until_ready(self):
+        """Test that nothing is embedded until the model is available"""
+        self.add('describe the cat')
+        self.embedder.ready = lambda: False
+        self.assertEqual(self.embedder.catch_up(), 0)
+        self.embeddings.embed.assert_not_called()
+
+    def test_background_thread(self):
+        """Test that the thread embeds new entries and clearing history drops embeddings"""
+        self.embedder.start()
+        self.add('describe the cat')
+        self.add('summarize the report')
+        deadline = time.monotonic() + 5
+        while self.vectors.count < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.vectors.count, 2)
+
+        self.manager.clear_history()
+        self.assertEqual(self.vectors.count, 0)
+
+    def test_trains_ivf_as_history_grows(self):
+        """Test that the index is trained past the threshold and retrained as it grows"""
+        for i in range(9):
+            self.add(f'prompt {i}', f'result {i}')
+        self.manager.max_entries = 50
+        with patch('history_embedder.Config.HISTORY_EMBED_IVF_THRESHOLD', 4):
+            self.embedder.catch_up()
+            self.assertEqual(self.vectors.lists, 3)
+            self.assertEqual(self.embedder.train_if_needed(), 0)
+            for i in range(30):
+                self.add(f'more {i}')
+            self.embedder.catch_up()
+            self.assertEqual(self.vectors.lists, 6)
+
+    def test_entry_text_truncated(self):
+        """Test that long results are cut to the configured length"""
+        self.assertEqual(entry_text({'prompt': 'p', 'result': 'x' * 50}, max_chars=10), 'p\n\nxxxxxxx')
+
+    def test_similar_route(self):
+        """Test finding entries similar to an entry or a text"""
+        self.add('describe the cat in this photo', model='llava')
+        self.add('quarterly revenue summary')
+        self.add('what is the cat doing in this photo', model='llama2')
+        self.embedder.catch_up()
+
+        client = app.test_client()
+        services = SimpleNamespace(vectors=self.vectors)
+        with patch('app.history_services', services), patch('app.history_index', self.index), \
+                patch('app.embedding_manager', self.embeddings):
+            data = json.loads(client.get('/history/similar?id=1&k=1').data)
+            self.assertEqual([r['id'] for r in data['results']], [3])
+            self.assertEqual(data['results'][0]['prompt_snippet'], 'what is the cat doing in this photo')
+            self.assertEqual(data['embedded'], 3)
+
+            data = json.loads(client.get('/history/similar?q=revenue+summary').data)
+            self.assertEqual(data['results'][0]['id'], 2)
+
+            data = json.loads(client.get('/history/similar?q=cat+photo&model=llava').data)
+            self.assertEqual([r['id'] for r in data['results']], [1])
+
+            self.assertEqual(client.get('/history/similar?id=99').status_code, 404)
+            self.assertEqual(client.get('/history/similar').status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import io
+import csv
+import json
+import shutil
+import tempfile
+import unittest
+import os
+from unittest.mock import patch
+from app import app
+from history_index import HistoryIndex
+from history_manager import HistoryManager
+from history_export import export_lines, read_entries, EXPORT_COLUMNS
+
+
+def make_entry(i, model='llama2', day=1):
+    return {'id': i + 1, 'timestamp': f'2024-01-{day:02d}T10:00:{i % 60:02d}', 'model': model,
+            'prompt': f'prompt {i}, with "quotes"\nand a newline', 'result': f'result {i}',
+            'duration': 1.5, 'success': i % 2 == 0, 'tokens_per_second': 12.5,
+            'eval_count': 40 + i, 'prompt_eval_count': 12, 'total_duration': 1_500_000_000}
+
+
+class TestHistoryExport(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.index = HistoryIndex(os.path.join(self.tmpdir, 'index.db'))
+        self.manager = HistoryManager(os.path.join(self.tmpdir, 'history.json'), max_entries=5, index=self.index)
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_round_trip(self):
+        """Test that NDJSON and CSV exports import back to the same entries"""
+        entries = [make_entry(i) for i in range(3)]
+        for fmt in ('ndjson', 'csv'):
+            data = ''.join(export_lines(entries, fmt)).encode()
+            imported = list(read_entries(io.BytesIO(data), fmt))
+            self.assertEqual(imported, entries, fmt)
+
+    def test_csv_header_without_entries(self):
+        """Test that an empty CSV export still has its header"""
+        rows = list(csv.reader(io.StringIO(''.join(export_lines([], 'csv')))))
+        self.assertEqual(rows, [list(EXPORT_COLUMNS)])
+
+    def test_malformed_records_skipped(self):
+        """Test that bad lines are reported and the rest still read"""
+        errors = []
+        data = b'{"model": "a"}\nnot json\n[1]\n\n{"model": "b"}\n'
+        entries = list(read_entries(io.BytesIO(data), 'ndjson', lambda line, msg: errors.append(line)))
+        self.assertEqual([e['model'] for e in entries], ['a', 'b'])
+        self.assertEqual(errors, [2, 3])
+
+    def test_invalid_timestamps_skipped(self):
+        """Test that records whose timestamp cannot be parsed are reported and not imported"""
+        errors = []
+        data = (b'{"model": "a", "timestamp": "2024-01-01T10:00:00"}\n{"model": "b", "timestamp": "yesterday"}\n'
+                b'{"model": "c", "timestamp": 5}\n')
+        entries = list(read_entries(io.BytesIO(data), 'ndjson', lambda line, msg: errors.append((line, msg))))
+        self.assertEqual([e['model'] for e in entries], ['a'])
+        self.assertEqual(errors, [(2, "invalid timestamp 'yesterday'"), (3, 'invalid timestamp 5')])
+
+        data = b'timestamp,model\n2024-01-01T10:00:00,a\nyesterday,b\n'
+        errors = []
+        entries = list(read_entries(io.BytesIO(data), 'csv', lambda line, msg: errors.append(line)))
+        self.assertEqual(([e['model'] for e in entries], errors), (['a'], [3]))
+
+        count = self.manager.import_entries([make_entry(1), dict(make_entry(2), timestamp='yesterday')])
+        self.assertEqual((count, self.index.count()), (1, 1))
+
+    def test_import_in_batches(self):
+        """Test that imports index every entry in batches and keep the newest as recent history"""
+        with patch.object(self.index, 'add_entries', wraps=self.index.add_entries) as add_entries:
+            count = self.manager.import_entries((make_entry(i) for i in range(23)), batch_size=10)
+        self.assertEqual(count, 23)
+        self.assertEqual([len(call.args[0]) for call in add_entries.call_args_list], [10, 10, 3])
+        self.assertEqual(self.index.count(), 23)
+        self.assertEqual([e['result'] for e in self.manager.load_history()],
+                         [f'result {i}' for i in range(18, 23)])
+
+    def test_export_and_import_routes(self):
+        """Test streaming export with filters and importing the export elsewhere"""
+        self.manager.import_entries([make_entry(1, 'llama2', 1), make_entry(2, 'mistral', 2),
+                                     make_entry(3, 'llama2', 3)])
+        app.config['TESTING'] = True
+        client = app.test_client()
+        with patch('app.history_index', self.index), patch('app.history_manager', self.manager):
+            response = client.get('/history/export?model=llama2&since=2024-01-02')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.is_streamed)
+            self.assertEqual(response.mimetype, 'application/x-ndjson')
+            self.assertIn('history.ndjson', response.headers['Content-Disposition'])
+            lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+            self.assertEqual([(e['model'], e['timestamp'][:10]) for e in lines], [('llama2', '2024-01-03')])
+
+            response = client.get('/history/export?format=csv&until=2024-01-02')
+            rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+            self.assertEqual([row['model'] for row in rows], ['llama2'])
+
+            self.assertEqual(client.get('/history/export?format=xml').status_code, 400)
+            self.assertEqual(client.get('/history/export?since=yesterday').status_code, 400)
+
+            export = client.get('/history/export?format=csv').data
+            self.index.clear()
+            response = client.post('/history/import', data={'file': (io.BytesIO(export), 'history.csv')},
+                                   content_type='multipart/form-data')
+            self.assertEqual(json.loads(response.data)['imported'], 3)
+            self.assertEqual(list(self.index.iter_entries(EXPORT_COLUMNS[1:]))[0],
+                             dict(make_entry(1, 'llama2', 1), id=1))
+
+            response = client.post('/history/import', data=b'{"model": "x", "prompt": "p"}\nbad\n',
+                                   content_type='application/x-ndjson')
+            data = json.loads(response.data)
+            self.assertEqual((data['imported'], data['skipped']), (1, 1))
+        self.assertEqual(self.index.count(), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
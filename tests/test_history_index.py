@@ -0,0 +1,92 @@
+import os
+import unittest
+import tempfile
+import shutil
+from history_index import HistoryIndex
+from history_manager import HistoryManager
+
+
+class TestHistoryIndex(unittest.TestCase):
+    def setUp(self):
+        """Set up a temporary index and history file"""
+        self.tmpdir = tempfile.mkdtemp()
+        self.index = HistoryIndex(os.path.join(self.tmpdir, 'index.db'))
+        self.history_manager = HistoryManager(
+            history_file=os.path.join(self.tmpdir, 'history.json'),
+            max_entries=3,
+            index=self.index
+        )
+
+    def tearDown(self):
+        """Clean up test files"""
+        self.index.close()
+        shutil.rmtree(self.tmpdir)
+
+    def _add(self, model, prompt, result):
+        self.history_manager.add_entry(model=model, prompt=prompt, result=result,
+                                       duration=1.0, success=True)
+
+    def test_entries_indexed_on_add(self):
+        """Test that added entries are searchable, even after the file trims"""
+        for i in range(5):
+            self._add('llama2', f'question {i} about Paris', f'answer {i}')
+        self.assertEqual(len(self.history_manager.load_history()), 3)
+        self.assertEqual(self.index.count(), 5)
+        self.assertEqual(self.index.search('paris')['total'], 5)
+
+    def test_ranking_and_snippets(self):
+        """Test that prompt matches outrank result matches and snippets mark terms"""
+        self._add('llama2', 'Tell me about volcanoes', 'Volcanoes are mountains.')
+        self._add('mistral', 'Unrelated question', 'This mentions volcanoes once.')
+        data = self.index.search('volcanoes')
+        self.assertEqual(data['total'], 2)
+        first = data['results'][0]
+        self.assertEqual(first['model'], 'llama2')
+        self.assertIn('[volcanoes]', first['prompt_snippet'])
+        self.assertGreaterEqual(first['score'], data['results'][1]['score'])
+
+    def test_prefix_and_model_filter(self):
+        """Test prefix matching on the last word and filtering by model"""
+        self._add('llama2', 'summarize the report', 'ok')
+        self._add('mistral', 'summarize the article', 'ok')
+        self.assertEqual(self.index.search('summ')['total'], 2)
+        data = self.index.search('summ', model='mistral')
+        self.assertEqual(data['total'], 1)
+        self.assertEqual(data['results'][0]['model'], 'mistral')
+
+    def test_pagination(self):
+        """Test paging through results"""
+        for i in range(5):
+            self._add('llama2', f'paging test {i}', 'ok')
+        page1 = self.index.search('paging', per_page=2)
+        page3 = self.index.search('paging', page=3, per_page=2)
+        self.assertEqual(len(page1['results']), 2)
+        self.assertEqual(len(page3['results']), 1)
+        self.assertEqual(page1['total'], 5)
+
+    def test_query_syntax_is_escaped(self):
+        """Test that FTS operators in user input do not raise"""
+        self._add('llama2', 'what is "AND" OR NOT', 'ok')
+        self.assertEqual(self.index.search('"AND" OR NOT (')['total'], 1)
+        self.assertEqual(self.index.search('  ')['total'], 0)
+
+    def test_clear_and_get_entry(self):
+        """Test fetching a full entry and clearing the index with the history"""
+        self._add('llama2', 'find me', 'full result text')
+        entry_id = self.index.search('find')['results'][0]['id']
+        self.assertEqual(self.index.get_entry(entry_id)['result'], 'full result text')
+        self.history_manager.clear_history()
+        self.assertEqual(self.index.count(), 0)
+        self.assertIsNone(self.index.get_entry(entry_id))
+
+    def test_existing_history_seeds_index(self):
+        """Test that an empty index is seeded from the existing history file"""
+        self._add('llama2', 'seeded entry', 'ok')
+        index = HistoryIndex(os.path.join(self.tmpdir, 'other.db'))
+        HistoryManager(history_file=self.history_manager.history_file, max_entries=3, index=index)
+        self.assertEqual(index.search('seeded')['total'], 1)
+        index.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
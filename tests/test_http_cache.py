@@ -0,0 +1,109 @@
+import gzip
+import json
+import unittest
+from unittest.mock import patch, MagicMock
+from flask import Response, url_for
+from app import app
+import http_cache
+
+
+class TestHttpCache(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+
+    def test_json_gzip(self):
+        """Test that large JSON responses are gzipped when accepted"""
+        with patch.object(http_cache, 'brotli', None):
+            response = self.client.get('/api/library-models', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        data = json.loads(gzip.decompress(response.data))
+        self.assertIn('llama2', [m['name'] for m in data['models']])
+
+    def test_no_compression_without_accept_encoding(self):
+        """Test that clients not asking for compression get identity responses"""
+        response = self.client.get('/api/library-models', headers={'Accept-Encoding': 'identity'})
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertIn('models', json.loads(response.data))
+
+    def test_small_and_streamed_responses_untouched(self):
+        """Test that tiny bodies and event streams are not compressed"""
+        with app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+            small = http_cache.compress_response(app.make_response(({'ok': True}, 200)))
+            self.assertNotIn('Content-Encoding', small.headers)
+            stream = http_cache.compress_response(
+                Response(iter(['data: {}\n\n'] * 100), mimetype='text/event-stream'))
+            self.assertNotIn('Content-Encoding', stream.headers)
+
+    def test_library_etag_304(self):
+        """Test that the library catalog revalidates with ETag and Last-Modified"""
+        response = self.client.get('/api/library-models')
+        etag = response.headers['ETag']
+        self.assertTrue(etag.startswith('W/'))
+        self.assertIn('Last-Modified', response.headers)
+        self.assertIn('max-age=', response.headers['Cache-Control'])
+
+        cached = self.client.get('/api/library-models', headers={'If-None-Match': etag})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.data, b'')
+
+        cached = self.client.get('/api/library-models',
+                                 headers={'If-Modified-Since': response.headers['Last-Modified']})
+        self.assertEqual(cached.status_code, 304)
+
+    @patch('app.requests.get')
+    def test_models_last_modified(self, mock_get):
+        """Test that the model list uses the newest model's modified_at"""
+        mock_get.return_value = MagicMock(status_code=200, json=lambda: {'models': [
+            {'name': 'llama2', 'modified_at': '2024-05-01T10:00:00.123456789Z'},
+            {'name': 'mistral', 'modified_at': '2024-06-01T10:00:00Z'},
+        ]})
+        response = self.client.get('/api/models')
+        self.assertEqual(json.loads(response.data), {'models': ['llama2', 'mistral']})
+        self.assertEqual(response.headers['Last-Modified'], 'Sat, 01 Jun 2024 10:00:00 GMT')
+        self.assertIn('no-cache', response.headers['Cache-Control'])
+
+        cached = self.client.get('/api/models', headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(cached.status_code, 304)
+
+    def test_static_fingerprint(self):
+        """Test that static URLs carry a content hash and are cached as immutable"""
+        with app.test_request_context():
+            url = url_for('static', filename='js/prompt-manager.js')
+        self.assertRegex(url, r'\?v=[0-9a-f]{12}$')
+
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response.headers['Cache-Control'])
+        self.assertIn('public', response.headers['Cache-Control'])
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn(b'PromptManager', gzip.decompress(response.data))
+        response.close()
+
+        # Served from the compressed copy the second time
+        again = self.client.get(url, headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(again.data, response.data)
+        again.close()
+
+    def test_unknown_version_not_immutable(self):
+        """Test that a ?v= other than the file's fingerprint is neither immutable nor kept compressed"""
+        http_cache._static_cache.clear()
+        response = self.client.get('/static/js/prompt-manager.js?v=attacker', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('immutable', response.headers.get('Cache-Control', ''))
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        response.close()
+        self.assertEqual(len(http_cache._static_cache), 0)
+
+    @unittest.skipIf(http_cache.brotli is None, 'brotli not installed')
+    def test_brotli_preferred(self):
+        """Test that brotli is used when the client accepts it"""
+        response = self.client.get('/api/library-models', headers={'Accept-Encoding': 'gzip, br'})
+        self.assertEqual(response.headers['Content-Encoding'], 'br')
+        self.assertIn(b'llama2', http_cache.brotli.decompress(response.data))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+import fakeredis
+from app import app
+from state_store import RedisStateStore
+from library_catalog import LibraryCatalog, normalize_models
+
+LIBRARY = {'models': [
+    {'name': 'qwen2.5:7b', 'description': 'Qwen 2.5', 'details': {'family': 'qwen2'}},
+    {'name': 'qwen2.5:0.5b', 'description': '', 'details': {'family': 'qwen2'}},
+    {'name': 'qwen2.5-coder:32b', 'description': 'Qwen 2.5 for code', 'capabilities': ['tools'],
+     'details': {'family': 'qwen2'}},
+    {'name': 'gemma2', 'description': 'Google Gemma 2', 'sizes': ['2b', '9b', '27b'],
+     'details': {'family': 'gemma2'}},
+]}
+
+
+class TestLibraryCatalog(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.snapshot = os.path.join(self.tmpdir, 'library.json')
+        self.fetch_manager = MagicMock()
+        self.fetch_manager.get_library_models.return_value = LIBRARY
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def catalog(self, **kwargs):
+        kwargs.setdefault('url', 'http://library.test/models')
+        return LibraryCatalog(self.fetch_manager, snapshot_file=self.snapshot, **kwargs)
+
+    def test_normalize_merges_tags(self):
+        """Test that tagged entries merge into one model with its sizes"""
+        models = normalize_models(LIBRARY['models'])
+        self.assertEqual([m['name'] for m in models], ['gemma2', 'qwen2.5', 'qwen2.5-coder'])
+        self.assertEqual(models[1]['sizes'], ['7b', '0.5b'])
+        self.assertEqual(models[1]['description'], 'Qwen 2.5')
+
+    def test_offline_default(self):
+        """Test that the built-in catalog is served without a snapshot or network"""
+        catalog = self.catalog(url='')
+        self.assertEqual(catalog.source, 'default')
+        self.assertIn('llama2', [m['name'] for m in catalog.search()])
+        self.assertIn('13b', catalog.search('llama2')[0]['sizes'])
+        self.fetch_manager.get_library_models.assert_not_called()
+
+    def test_refresh_persists_snapshot(self):
+        """Test that a refresh is saved and loaded by the next start"""
+        catalog = self.catalog()
+        catalog.search()
+        catalog._worker.join(5)
+        self.fetch_manager.get_library_models.assert_called_once_with('http://library.test/models', timeout=10.0)
+        self.assertEqual(catalog.source, 'remote')
+        self.assertTrue(os.path.exists(self.snapshot))
+
+        restarted = self.catalog(url='')
+        self.assertEqual(restarted.source, 'snapshot')
+        self.assertEqual(restarted.models, catalog.models)
+        self.assertEqual(restarted.updated, catalog.updated)
+
+    def test_failed_refresh_keeps_catalog(self):
+        """Test that a failed refresh keeps the current models and retries later"""
+        self.fetch_manager.get_library_models.return_value = None
+        catalog = self.catalog()
+        self.assertFalse(catalog.refresh())
+        self.assertEqual(catalog.source, 'default')
+        catalog.maybe_refresh()
+        self.assertIsNone(catalog._worker)
+        self.assertFalse(os.path.exists(self.snapshot))
+
+    def test_search(self):
+        """Test prefix search over names, families and sizes with filters"""
+        catalog = self.catalog()
+        catalog.refresh()
+        names = lambda models: [m['name'] for m in models]
+        self.assertEqual(names(catalog.search('qwen')), ['qwen2.5', 'qwen2.5-coder'])
+        self.assertEqual(names(catalog.search('cod')), ['qwen2.5-coder'])
+        self.assertEqual(names(catalog.search('qwen2.5:7')), ['qwen2.5'])
+        self.assertEqual(names(catalog.search('gem 9b')), ['gemma2'])
+        self.assertEqual(names(catalog.search(family='QWEN2', size='32b')), ['qwen2.5-coder'])
+        self.assertEqual(names(catalog.search(capability='tools')), ['qwen2.5-coder'])
+        self.assertEqual(catalog.search('mistral'), [])
+        self.assertEqual(catalog.sizes('Gemma2'), catalog.search('gemma2')[0]['sizes'])
+        self.assertEqual(catalog.sizes('mistral'), [])
+
+    def test_one_worker_refreshes(self):
+        """Test that workers sharing a store refresh once and reload the snapshot"""
+        store = RedisStateStore(fakeredis.FakeRedis(), prefix='test:')
+        first, second = self.catalog(store=store), self.catalog(store=store)
+        first.maybe_refresh()
+        second.maybe_refresh()
+        first._worker.join(5)
+        self.assertIsNone(second._worker)
+        self.assertEqual(self.fetch_manager.get_library_models.call_count, 1)
+
+        second.maybe_refresh()
+        self.assertEqual(second.source, 'snapshot')
+        self.assertEqual(second.updated, first.updated)
+
+    def test_route(self):
+        """Test the search parameters and revalidation of the library route"""
+        catalog = self.catalog(url='')
+        client = app.test_client()
+        with patch('app.library_catalog', catalog):
+            response = client.get('/api/library-models?q=llama&limit=2')
+            data = json.loads(response.data)
+            self.assertEqual(len(data['models']), 2)
+            self.assertGreater(data['total'], 2)
+            self.assertEqual(data['updated'], catalog.updated.isoformat())
+
+            data = json.loads(client.get('/api/library-models?capability=vision').data)
+            self.assertIn('llava', [m['name'] for m in data['models']])
+
+            cached = client.get('/api/library-models?q=llama&limit=2',
+                                headers={'If-None-Match': response.headers['ETag']})
+            self.assertEqual(cached.status_code, 304)
+
+
+if __name__ == '__main__':
+    unittest.main()
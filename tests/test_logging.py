@@ -0,0 +1,115 @@
+import io
+import json
+import queue
+import logging
+import unittest
+from unittest.mock import patch
+import log_manager
+from log_manager import (TruncatingFormatter, SamplingFilter, NonBlockingQueueHandler,
+                         configure_logging, set_level, get_level)
+from app import app, DEBUG_LEVELS
+
+
+def make_record(msg, args=None, lineno=1, sampled=False):
+    record = logging.LogRecord('test', logging.INFO, 'test.py', lineno, msg, args, None)
+    if sampled:
+        record.sampled = True
+    return record
+
+
+class TestLogManager(unittest.TestCase):
+    def tearDown(self):
+        configure_logging('INFO')
+
+    def test_truncating_formatter(self):
+        """Test that long messages are cut and short ones untouched"""
+        formatter = TruncatingFormatter('%(message)s', max_length=10)
+        self.assertEqual(formatter.format(make_record('short')), 'short')
+        record = make_record('payload: %s', ('x' * 100,))
+        output = formatter.format(record)
+        self.assertTrue(output.startswith('payload: x'))
+        self.assertIn('[99 more chars]', output)
+        self.assertEqual(record.args, ('x' * 100,))
+
+    def test_sampling_filter(self):
+        """Test that only sampled records are thinned, per call site"""
+        sampling = SamplingFilter(rate=5)
+        passed = [sampling.filter(make_record('hot', sampled=True)) for _ in range(20)]
+        self.assertEqual(sum(passed), 4)
+        other_site = [sampling.filter(make_record('hot', lineno=2, sampled=True)) for _ in range(5)]
+        self.assertEqual(sum(other_site), 1)
+        self.assertTrue(all(sampling.filter(make_record('normal')) for _ in range(5)))
+
+    def test_queue_handler_does_not_block(self):
+        """Test that a full queue drops records instead of blocking"""
+        handler = NonBlockingQueueHandler(queue.Queue(2))
+        for _ in range(5):
+            handler.handle(make_record('message'))
+        self.assertEqual(handler.dropped, 3)
+
+    def test_lazy_formatting_off_thread(self):
+        """Test that records reach the output unformatted through the listener"""
+        stream = io.StringIO()
+        configure_logging('INFO', stream_handler=logging.StreamHandler(stream))
+        logger = logging.getLogger('test_logging')
+        logger.info('value is %s', 42)
+        logger.debug('hidden %s', 1)
+        log_manager.shutdown_logging()
+        output = stream.getvalue()
+        self.assertIn('value is 42', output)
+        self.assertNotIn('hidden', output)
+
+    def test_set_level(self):
+        """Test changing the level at runtime"""
+        set_level('warning')
+        self.assertEqual(get_level(), 'WARNING')
+
+
+class TestLogLevelRoute(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+
+    def tearDown(self):
+        set_level('INFO')
+
+    def test_change_level(self):
+        """Test reading and changing the level through the admin route"""
+        response = self.client.post('/admin/log-level', json={'level': 'DEBUG'})
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['level'], 'DEBUG')
+        self.assertEqual(data['levels'], DEBUG_LEVELS)
+
+        response = self.client.post('/admin/log-level', json={'level': 'VERBOSE'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_admin_token(self):
+        """Test that a configured admin token is required"""
+        with patch('config.Config.ADMIN_TOKEN', 'secret'):
+            response = self.client.get('/admin/log-level')
+            self.assertEqual(response.status_code, 403)
+            response = self.client.get('/admin/log-level', headers={'X-Admin-Token': 'secret'})
+            self.assertEqual(response.status_code, 200)
+
+    def test_remote_requests_rejected_without_token(self):
+        """Test that admin routes are local-only without a token"""
+        response = self.client.get('/admin/log-level', environ_base={'REMOTE_ADDR': '10.0.0.5'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_forwarded_for_does_not_grant_admin(self):
+        """Test that forwarded requests are not local, spoofed or relayed by a proxy on this host"""
+        response = self.client.get('/admin/log-level', environ_base={'REMOTE_ADDR': '203.0.113.9'},
+                                   headers={'X-Forwarded-For': '127.0.0.1'})
+        self.assertEqual(response.status_code, 403)
+        for header in ({'X-Forwarded-For': '203.0.113.9'}, {'Forwarded': 'for=203.0.113.9'}):
+            response = self.client.get('/admin/log-level', headers=header)
+            self.assertEqual(response.status_code, 403)
+        with patch('app.Config.ADMIN_TOKEN', 'secret'):
+            response = self.client.get('/admin/log-level', headers={'X-Forwarded-For': '203.0.113.9',
+                                                                    'X-Admin-Token': 'secret'})
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/admin/log-level').status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
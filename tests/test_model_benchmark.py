@@ -0,0 +1,149 @@
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+import fakeredis
+from app import app
+from fetch_manager import FetchManager
+from state_store import RedisStateStore
+from model_benchmark import ModelBenchmark, BenchmarkStore, benchmark_image, format_leaderboard
+
+
+class FakeOllama(BaseHTTPRequestHandler):
+    """Ollama stand-in that streams chat replies with timings.
+
+    Decode speeds are set per model, a call after an unload reports a load
+    time, and llava is the only vision model.
+    """
+
+    speeds = {}
+    loaded = set()
+    chats = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self.reply(200, {'models': [{'name': name, 'digest': f'sha-{name}'} for name in self.speeds]})
+        elif self.path == '/api/ps':
+            self.reply(200, {'models': [{'name': name, 'size': 5_000_000_000, 'size_vram': 4_000_000_000}
+                                        for name in self.loaded]})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        model = body['model']
+        if self.path == '/api/show':
+            self.reply(200, {'capabilities': ['completion', 'vision'] if model.startswith('llava')
+                             else ['completion']})
+        elif self.path == '/api/generate':
+            self.loaded.discard(model)
+            self.reply(200, {'model': model, 'done': True, 'done_reason': 'unload'})
+        elif self.path == '/api/chat':
+            self.chats.append(body)
+            load_duration = 0 if model in self.loaded else 2_000_000_000
+            self.loaded.add(model)
+            chunks = [{'message': {'role': 'assistant', 'content': word}, 'done': False}
+                      for word in ('A ', 'red ', 'disc')]
+            chunks.append({'message': {'role': 'assistant', 'content': ''}, 'done': True,
+                           'load_duration': load_duration, 'prompt_eval_count': 50,
+                           'prompt_eval_duration': 500_000_000, 'eval_count': 100,
+                           'eval_duration': int(100 / self.speeds[model] * 1e9)})
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.end_headers()
+            for chunk in chunks:
+                self.wfile.write(json.dumps(chunk).encode() + b'\n')
+
+
+class TestModelBenchmark(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOllama)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        FakeOllama.speeds = {'llama2:latest': 40.0, 'llava:7b': 25.0}
+        FakeOllama.loaded = set()
+        FakeOllama.chats = []
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = BenchmarkStore(os.path.join(self.tmpdir, 'benchmark_results.db'))
+        self.benchmark = ModelBenchmark(FetchManager(self.base_url), self.store, repeat=3,
+                                        state_store=RedisStateStore(fakeredis.FakeRedis(), prefix='test:'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_workloads_recorded(self):
+        """Test that text runs on every model, vision only on vision models, with load time and memory"""
+        results = self.benchmark.run()
+        self.assertEqual([(result['model'], result['workload']) for result in results],
+                         [('llama2:latest', 'text'), ('llava:7b', 'text'), ('llava:7b', 'vision')])
+        text = results[0]
+        self.assertEqual((text['runs'], text['decode_tps'], text['prompt_tps']), (3, 40.0, 100.0))
+        self.assertEqual(text['load_seconds'], 2.0)
+        self.assertEqual((text['memory_bytes'], text['vram_bytes']), (5_000_000_000, 4_000_000_000))
+        self.assertLess(text['ttft_seconds'], 5)
+
+        vision = [chat for chat in FakeOllama.chats if chat['messages'][0].get('images')]
+        self.assertEqual(len(vision), 3)
+        self.assertEqual(vision[0]['messages'][0]['images'], [benchmark_image()])
+        self.assertEqual(vision[0]['options']['temperature'], 0)
+
+    def test_leaderboard_history(self):
+        """Test that the leaderboard ranks the latest runs and keeps earlier ones as history"""
+        self.benchmark.run(workloads=['text'])
+        FakeOllama.speeds['llama2:latest'] = 20.0
+        self.benchmark.run(workloads=['text'])
+
+        rows = self.store.leaderboard('text')
+        self.assertEqual([row['model'] for row in rows], ['llava:7b', 'llama2:latest'])
+        self.assertEqual([run['decode_tps'] for run in rows[1]['history']], [20.0, 40.0])
+        self.assertIn('20.0 40.0', format_leaderboard(rows))
+        self.assertEqual(len(self.store.leaderboard('text', history=1)[1]['history']), 1)
+
+        with self.assertRaises(ValueError):
+            self.benchmark.run(workloads=['audio'])
+
+    def test_admin_route(self):
+        """Test starting a run in the background and reading the leaderboard"""
+        app.config['TESTING'] = True
+        client = app.test_client()
+        with patch('app.model_benchmark', self.benchmark):
+            response = client.post('/admin/benchmarks', json={'models': ['llama2'], 'workloads': ['text']})
+            self.assertEqual(response.status_code, 202)
+            self.benchmark.wait(10)
+
+            data = json.loads(client.get('/admin/benchmarks').data)
+            self.assertIsNone(data['running'])
+            self.assertEqual([row['model'] for row in data['leaderboard']], ['llama2:latest'])
+            self.assertEqual(data['leaderboard'][0]['run_id'], json.loads(response.data)['run_id'])
+
+            text = client.get('/admin/benchmarks?format=text').data.decode()
+            self.assertIn('llama2:latest', text)
+
+            self.benchmark.state_store.set('benchmark:running', {'run_id': 'other'})
+            self.assertEqual(client.post('/admin/benchmarks', json={}).status_code, 409)
+            self.assertEqual(client.post('/admin/benchmarks', json={'workloads': ['audio']}).status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
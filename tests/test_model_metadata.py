@@ -0,0 +1,119 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import fakeredis
+import app as app_module
+from state_store import RedisStateStore
+from budget_manager import BudgetManager
+from model_metadata import ModelMetadataCache, parse_capabilities, parse_show
+
+SHOW = {
+    'llava:latest': {
+        'parameters': 'num_ctx 4096',
+        'details': {'family': 'llama', 'families': ['llama', 'clip'], 'parameter_size': '7B',
+                    'quantization_level': 'Q4_0'},
+        'model_info': {'llama.context_length': 32768},
+        'projector_info': {'clip.has_vision_encoder': True},
+    },
+    'llama3.2:latest': {
+        'capabilities': ['completion', 'tools'],
+        'details': {'family': 'llama', 'parameter_size': '3.2B', 'quantization_level': 'Q4_K_M'},
+        'model_info': {'llama.context_length': 131072},
+    },
+    'llama3.2-vision:latest': {
+        'capabilities': ['completion', 'vision'],
+        'details': {'family': 'mllama', 'parameter_size': '9.8B'},
+    },
+    'nomic-embed-text:latest': {
+        'details': {'family': 'nomic-bert', 'families': ['nomic-bert']},
+        'model_info': {'nomic-bert.pooling_type': 1, 'nomic-bert.context_length': 2048},
+    },
+}
+
+TAGS = [{'name': name, 'digest': f'sha-{i}'} for i, name in enumerate(SHOW)]
+
+
+class TestModelMetadata(unittest.TestCase):
+    def setUp(self):
+        self.fetch_manager = MagicMock()
+        self.fetch_manager.fetch_model_info.side_effect = lambda model: SHOW.get(model)
+        self.store = RedisStateStore(fakeredis.FakeRedis(), prefix='test:')
+        self.cache = ModelMetadataCache(self.fetch_manager, store=self.store)
+
+    def test_parse_show(self):
+        """Test capabilities from the server or inferred from older /api/show data"""
+        self.assertEqual(parse_capabilities(SHOW['llava:latest']), ['completion', 'vision'])
+        self.assertEqual(parse_capabilities(SHOW['llama3.2:latest']), ['completion', 'tools'])
+        self.assertEqual(parse_capabilities(SHOW['nomic-embed-text:latest']), ['embedding'])
+        metadata = parse_show(SHOW['llava:latest'])
+        self.assertEqual((metadata['num_ctx'], metadata['context_length']), (4096, 32768))
+        self.assertEqual((metadata['parameter_size'], metadata['quantization_level']), ('7B', 'Q4_0'))
+
+    def test_populated_from_model_list(self):
+        """Test that a new model list fills the cache once, read without a tag"""
+        self.cache.update_models(TAGS, background=False)
+        self.assertEqual(self.fetch_manager.fetch_model_info.call_count, len(SHOW))
+        self.cache.update_models(TAGS, background=False)
+        self.assertEqual(self.fetch_manager.fetch_model_info.call_count, len(SHOW))
+
+        self.assertTrue(self.cache.supports('llava', 'vision'))
+        self.assertFalse(self.cache.supports('nomic-embed-text', 'completion'))
+        self.assertEqual(self.cache.get('llama3.2')['parameter_size'], '3.2B')
+        self.assertIsNone(self.cache.supports('not-installed', 'vision'))
+
+    def test_background_population(self):
+        """Test that the model list fetches metadata in a background thread"""
+        self.cache.update_models(TAGS)
+        self.cache._worker.join(5)
+        self.assertTrue(self.cache.supports('llama3.2-vision', 'vision'))
+
+    def test_shared_by_digest(self):
+        """Test that other workers reuse cached metadata and a re-pull is fetched again"""
+        self.cache.update_models(TAGS, background=False)
+        other = ModelMetadataCache(self.fetch_manager, store=self.store)
+        self.assertEqual(other.model_type('llava'), 'vision')
+        self.assertEqual(self.fetch_manager.fetch_model_info.call_count, len(SHOW))
+
+        other.update_models([{'name': 'llava:latest', 'digest': 'sha-new'}], background=False)
+        self.assertEqual(self.fetch_manager.fetch_model_info.call_count, len(SHOW) + 1)
+
+    def test_model_type(self):
+        """Test that capabilities decide the prompt set, with a name guess until cached"""
+        self.assertEqual(self.cache.model_type('llama3.2-vision'), 'vision')
+        self.assertEqual(self.cache.model_type('mistral'), 'text')
+        self.fetch_manager.fetch_model_info.assert_not_called()
+
+        self.cache.update_models([{'name': 'custom-vlm:latest', 'digest': 'sha-x'}], background=False)
+        self.fetch_manager.fetch_model_info.side_effect = lambda model: SHOW['llava:latest']
+        self.cache.update_models([{'name': 'custom-vlm:latest', 'digest': 'sha-y'}], background=False)
+        self.assertEqual(self.cache.model_type('custom-vlm'), 'vision')
+
+    def test_model_type_memo_bounded(self):
+        """Test that memoized types for arbitrary names stay bounded, least recently used dropped first"""
+        with patch('model_metadata.MAX_CACHED_TYPES', 3):
+            for name in ('a', 'b', 'c'):
+                self.cache.model_type(name)
+            self.cache.model_type('a')
+            self.cache.model_type('d')
+        self.assertEqual(list(self.cache._types), ['c', 'a', 'd'])
+
+    def test_budget_uses_cache(self):
+        """Test that context sizes come from the metadata cache"""
+        self.cache.update_models(TAGS, background=False)
+        budget = BudgetManager(self.fetch_manager, default_num_ctx=2048, metadata=self.cache)
+        self.assertEqual(budget.get_num_ctx('llava'), 4096)
+        self.assertEqual(budget.get_num_ctx('llama3.2'), 2048)
+        self.assertEqual(self.fetch_manager.fetch_model_info.call_count, len(SHOW))
+
+    def test_request_validation(self):
+        """Test that requests are checked against cached capabilities"""
+        self.cache.update_models(TAGS, background=False)
+        with patch.object(app_module, 'model_metadata', self.cache):
+            self.assertIsNone(app_module.check_capabilities('llava', images=True))
+            self.assertIn('does not support images', app_module.check_capabilities('llama3.2', images=True))
+            self.assertIn('text generation', app_module.check_capabilities('nomic-embed-text'))
+            self.assertIsNone(app_module.check_capabilities('unknown', images=True))
+            self.assertEqual(app_module.get_model_type('llama3.2-vision'), 'vision')
+
+
+if __name__ == '__main__':
+    unittest.main()
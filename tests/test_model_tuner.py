@@ -0,0 +1,164 @@
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from fetch_manager import FetchManager
+from profile_manager import ProfileManager
+from model_tuner import ModelTuner, combo_key, grid_combinations, measure, pick_best
+
+GRID = {'num_ctx': [2048, 8192], 'num_batch': [256, 512], 'num_thread': [2, 4]}
+
+
+class FakeOllama(BaseHTTPRequestHandler):
+    """Ollama stand-in whose speeds depend on the options: threads speed up
+    decoding, a larger batch speeds up prompt evaluation, a larger context
+    slows both down, and mistral runs out of memory at num_ctx 8192."""
+
+    models = {}
+    calls = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == '/api/tags':
+            self.reply(200, {'models': [{'name': name, 'digest': digest} for name, digest in self.models.items()]})
+        else:
+            self.reply(404, {'error': 'not found'})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if self.path == '/api/show':
+            embedding = body['model'].startswith('nomic-embed-text')
+            self.reply(200, {'capabilities': ['embedding'] if embedding else ['completion']})
+            return
+        options = body['options']
+        tuned = {name: options[name] for name in GRID}
+        self.calls.append((body['model'], combo_key(tuned)))
+        if body['model'].startswith('mistral') and options['num_ctx'] > 4096:
+            self.reply(500, {'error': 'model requires more system memory'})
+            return
+        decode_tps = 10 * options['num_thread'] - options['num_ctx'] / 1024
+        prompt_tps = 100 * options['num_batch'] / 256 - options['num_ctx'] / 1024
+        prompt_tokens = len(body['prompt'].split())
+        self.reply(200, {
+            'response': 'ok',
+            'load_duration': 1_500_000_000,
+            'prompt_eval_count': prompt_tokens,
+            'prompt_eval_duration': int(prompt_tokens / prompt_tps * 1e9),
+            'eval_count': 64,
+            'eval_duration': int(64 / decode_tps * 1e9),
+        })
+
+
+class TestModelTuner(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOllama)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        FakeOllama.models = {'llama2:latest': 'sha-1', 'nomic-embed-text:latest': 'sha-2', 'mistral:7b': 'sha-3'}
+        FakeOllama.calls = []
+        self.tmpdir = tempfile.mkdtemp()
+        self.results_file = os.path.join(self.tmpdir, 'tuning_results.json')
+        self.profiles_file = os.path.join(self.tmpdir, 'generation_profiles.json')
+        with open(self.profiles_file, 'w') as f:
+            json.dump({'models': {'llama2': {'options': {'num_predict': 256, 'num_ctx': 1024}}}}, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def tuner(self, fetch_manager=None):
+        return ModelTuner(fetch_manager or FetchManager(self.base_url), results_file=self.results_file,
+                          profiles_file=self.profiles_file, grid=GRID, prompts=['short prompt', 'a longer prompt'])
+
+    def test_best_options_written_to_profiles(self):
+        """Test that each text model's fastest options are layered on its existing profile"""
+        best = self.tuner().run()
+        self.assertEqual(set(best), {'llama2:latest', 'mistral:7b'})
+        self.assertEqual(best['llama2:latest']['options'], {'num_ctx': 2048, 'num_batch': 512, 'num_thread': 4})
+        self.assertAlmostEqual(best['llama2:latest']['decode_tps'], 38.0, places=1)
+        self.assertEqual(best['llama2:latest']['load_seconds'], 1.5)
+
+        profile = ProfileManager(self.profiles_file).resolve('llama2')
+        self.assertEqual(profile['options'], {'num_predict': 256, 'num_ctx': 2048, 'num_batch': 512, 'num_thread': 4})
+
+        with open(self.results_file) as f:
+            trials = json.load(f)['mistral:7b']['trials']
+        self.assertEqual(sum('error' in trial for trial in trials.values()), 4)
+        self.assertEqual(best['mistral:7b']['options']['num_ctx'], 2048)
+
+    def test_resumes_after_interruption(self):
+        """Test that a rerun only runs the combinations the interrupted run did not finish"""
+        fetch_manager = FetchManager(self.base_url)
+        generate = fetch_manager.generate
+        calls = []
+
+        def flaky_generate(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 5:
+                raise requests.exceptions.ConnectionError('connection refused')
+            return generate(*args, **kwargs)
+
+        fetch_manager.generate = flaky_generate
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.tuner(fetch_manager).run(['llama2'])
+        with open(self.results_file) as f:
+            self.assertEqual(len(json.load(f)['llama2:latest']['trials']), 2)
+
+        FakeOllama.calls = []
+        self.tuner().run(['llama2'])
+        combos = [combo for model, combo in FakeOllama.calls]
+        self.assertEqual(len(combos), 6 * 2)
+        self.assertEqual(len(set(combos)), 6)
+
+        FakeOllama.calls = []
+        self.tuner().run(['llama2'])
+        self.assertEqual(FakeOllama.calls, [])
+
+        FakeOllama.models['llama2:latest'] = 'sha-4'
+        self.tuner().run(['llama2'])
+        self.assertEqual(len(FakeOllama.calls), 8 * 2)
+
+    def test_measure_and_pick_best(self):
+        """Test speeds from Ollama's timings and the preference for a larger context"""
+        speeds = measure([
+            {'load_duration': 2e9, 'prompt_eval_count': 100, 'prompt_eval_duration': 1e9,
+             'eval_count': 30, 'eval_duration': 1e9},
+            {'load_duration': 0, 'prompt_eval_count': 100, 'prompt_eval_duration': 1e9,
+             'eval_count': 10, 'eval_duration': 1e9},
+        ])
+        self.assertEqual(speeds, {'prompt_tps': 100.0, 'decode_tps': 20.0, 'load_seconds': 2.0})
+
+        trials = {
+            'small': {'options': {'num_ctx': 2048}, 'prompt_tps': 100, 'decode_tps': 40},
+            'large': {'options': {'num_ctx': 8192}, 'prompt_tps': 90, 'decode_tps': 37},
+            'failed': {'options': {'num_ctx': 16384}, 'error': 'out of memory'},
+        }
+        self.assertEqual(pick_best(trials)['options'], {'num_ctx': 8192})
+        self.assertEqual(pick_best(trials, tolerance=0.05)['options'], {'num_ctx': 2048})
+        self.assertIsNone(pick_best({'failed': trials['failed']}))
+        self.assertEqual(len(grid_combinations(GRID)), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import os
+import json
+import shutil
+import secrets
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+from app import app, db, Session
+from budget_manager import BudgetManager
+from profile_manager import ProfileManager, parse_duration
+
+PROFILES = {
+    'default': {'options': {'num_predict': 512, 'temperature': 0.7}, 'keep_alive': '5m'},
+    'models': {
+        'llava': {'options': {'num_ctx': 4096, 'num_predict': 256}},
+        'llava:34b': {'options': {'num_ctx': 8192}, 'keep_alive': '30m'},
+    },
+    'bounds': {'num_predict': [16, 1024], 'num_ctx': [512, 8192], 'keep_alive': [0, 600]},
+}
+
+
+class TestProfileManager(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'generation_profiles.json')
+        self.writes = 0
+        self.write(PROFILES)
+        self.profiles = ProfileManager(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, profiles):
+        with open(self.path, 'w') as f:
+            json.dump(profiles, f)
+        # Give each write a new mtime, even within the file system's timestamp resolution
+        self.writes += 1
+        os.utime(self.path, (self.writes, self.writes))
+
+    def test_profiles_by_model(self):
+        """Test that the base name and then the full name profile are layered on the default"""
+        self.assertEqual(self.profiles.resolve('llava:7b'), {
+            'options': {'num_predict': 256, 'temperature': 0.7, 'num_ctx': 4096}, 'keep_alive': '5m'})
+        self.assertEqual(self.profiles.resolve('llava:34b'), {
+            'options': {'num_predict': 256, 'temperature': 0.7, 'num_ctx': 8192}, 'keep_alive': '30m'})
+        self.assertEqual(self.profiles.resolve('llama2')['options'], {'num_predict': 512, 'temperature': 0.7})
+
+    def test_overrides_within_bounds(self):
+        """Test that request overrides are clamped and options without bounds are refused"""
+        profile = self.profiles.resolve('llava', {'num_predict': 4000, 'num_ctx': 1024, 'keep_alive': '1h'})
+        self.assertEqual(profile['options']['num_predict'], 1024)
+        self.assertEqual(profile['options']['num_ctx'], 1024)
+        self.assertEqual(profile['keep_alive'], 600)
+        self.assertEqual(self.profiles.resolve('llava', {'keep_alive': -1})['keep_alive'], 600)
+        with self.assertRaises(ValueError):
+            self.profiles.resolve('llava', {'num_thread': 64})
+        with self.assertRaises(ValueError):
+            self.profiles.resolve('llava', {'num_predict': 'lots'})
+
+    def test_apply_and_reload(self):
+        """Test that payload settings win and that file changes are picked up"""
+        payload = self.profiles.apply({'model': 'llava', 'options': {'num_predict': 64}})
+        self.assertEqual(payload['options'], {'num_predict': 64, 'temperature': 0.7, 'num_ctx': 4096})
+        self.assertEqual(payload['keep_alive'], '5m')
+
+        self.write({'default': {'options': {'num_predict': 100}}})
+        self.assertEqual(self.profiles.apply({'model': 'llava'}), {'model': 'llava',
+                                                                   'options': {'num_predict': 100}})
+        os.remove(self.path)
+        self.assertEqual(self.profiles.apply({'model': 'llava'}), {'model': 'llava'})
+
+    def test_parse_duration(self):
+        """Test Ollama keep_alive durations"""
+        self.assertEqual([parse_duration(value) for value in ('30s', '5m', '1.5h', 90, '-1')],
+                         [30, 300, 5400, 90, -1])
+        with self.assertRaises(ValueError):
+            parse_duration('soon')
+
+    def test_budget_uses_profile_context(self):
+        """Test that prompts are fitted to the profile's num_ctx"""
+        budget = BudgetManager(MagicMock(), default_num_ctx=2048, reserve_tokens=512, profiles=self.profiles)
+        self.assertEqual(budget.get_num_ctx('llava:34b'), 8192)
+        self.assertEqual(budget.get_budget('llava', num_ctx=1024), 512)
+
+
+class TestProfileRoutes(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        self.session_id = secrets.token_hex(32)
+        with app.app_context():
+            sess, _ = Session.get_or_create(self.session_id)
+            sess.set_data('llava')
+        self.client.set_cookie('session_id', self.session_id)
+        self.tmpdir = tempfile.mkdtemp()
+        path = os.path.join(self.tmpdir, 'generation_profiles.json')
+        with open(path, 'w') as f:
+            json.dump(PROFILES, f)
+        self.profiles = ProfileManager(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        with app.app_context():
+            Session.query.filter_by(id=self.session_id).delete()
+            db.session.commit()
+
+    def test_profile_sent_with_generate_and_chat(self):
+        """Test that /analyze and /chat send the model's profile and the request's overrides"""
+        reply = MagicMock()
+        reply.json.return_value = {'response': 'A cat', 'message': {'role': 'assistant', 'content': 'A cat'}}
+        with patch('app.profile_manager', self.profiles), patch('app.history_manager', MagicMock()), \
+                patch('app.budget_manager', BudgetManager(MagicMock(), profiles=self.profiles)), \
+                patch('requests.post', return_value=reply) as mock_post:
+            response = self.client.post('/analyze', json={'prompt': 'describe', 'options': {'num_predict': 5000}})
+            self.assertEqual(response.status_code, 200)
+            payload = mock_post.call_args[1]['json']
+            self.assertEqual(payload['options'], {'num_predict': 1024, 'temperature': 0.7, 'num_ctx': 4096})
+            self.assertEqual(payload['keep_alive'], '5m')
+
+            self.client.post('/chat', json={'prompt': 'describe', 'keep_alive': '2m'})
+            payload = mock_post.call_args[1]['json']
+            self.assertTrue(mock_post.call_args[0][0].endswith('/api/chat'))
+            self.assertEqual((payload['options']['num_predict'], payload['keep_alive']), (256, 120))
+
+            response = self.client.post('/analyze', json={'prompt': 'describe', 'options': {'seed': 1}})
+            self.assertEqual(response.status_code, 400)
+
+            data = json.loads(self.client.get('/api/generation-profile?model=llava').data)
+            self.assertEqual((data['options']['num_ctx'], data['bounds']['num_ctx']), (4096, [512, 8192]))
+
+
+if __name__ == '__main__':
+    unittest.main()
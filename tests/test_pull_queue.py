@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+from app import app
+from pull_queue import PullQueue, parse_window, in_window
+
+LAYER = 4_000_000
+
+
+class FakeOllama:
+    """Stand-in for FetchManager.pull_model that downloads one layer in steps and resumes where it stopped."""
+
+    def __init__(self, step=1_000_000, gate=None):
+        self.step = step
+        self.gate = gate
+        self.done = {}
+        self.pulls = []
+
+    def pull_model(self, model):
+        self.pulls.append(model)
+        if self.gate is not None:
+            self.gate.wait(5)
+        yield {'status': 'pulling manifest'}
+        while self.done.get(model, 0) < LAYER:
+            yield {'status': 'pulling sha256:1', 'digest': 'sha256:1', 'completed': self.done.get(model, 0),
+                   'total': LAYER}
+            self.done[model] = self.done.get(model, 0) + self.step
+        yield {'status': 'pulling sha256:1', 'digest': 'sha256:1', 'completed': LAYER, 'total': LAYER}
+        yield {'status': 'success'}
+
+
+class TestPullQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'pull_queue.db')
+        self.queues = []
+
+    def tearDown(self):
+        for queue in self.queues:
+            queue.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def queue(self, ollama, **kwargs):
+        kwargs.setdefault('bandwidth', 0)
+        kwargs.setdefault('window', '')
+        queue = PullQueue(ollama, path=self.path, poll_interval=0.01, **kwargs)
+        self.queues.append(queue)
+        return queue
+
+    def wait_for(self, queue, job_id, statuses=('done', 'failed', 'cancelled')):
+        deadline = time.monotonic() + 5
+        while queue.get(job_id)['status'] not in statuses:
+            self.assertLess(time.monotonic(), deadline, f'job {job_id} still {queue.get(job_id)["status"]}')
+            time.sleep(0.01)
+        return queue.get(job_id)
+
+    def test_fifo_with_concurrency_limit(self):
+        """Test that pulls run one at a time in arrival order and report their queue position"""
+        gate = threading.Event()
+        ollama = FakeOllama(gate=gate)
+        queue = self.queue(ollama, max_concurrent=1)
+        jobs = [queue.enqueue(model) for model in ('llama2', 'llava:13b', 'mistral')]
+        self.assertEqual([job['position'] for job in jobs], [1, 2, 3])
+        self.assertEqual(queue.enqueue('llama2:latest')['id'], jobs[0]['id'])
+
+        self.assertEqual(queue.dispatch(), 1)
+        self.assertEqual(queue.dispatch(), 0)
+        self.assertEqual(queue.get(jobs[0]['id'])['status'], 'running')
+        self.assertEqual([queue.get(job['id'])['position'] for job in jobs[1:]], [1, 2])
+
+        gate.set()
+        queue.start()
+        for job in jobs:
+            self.assertEqual(self.wait_for(queue, job['id'])['status'], 'done')
+        self.assertEqual(ollama.pulls, ['llama2:latest', 'llava:13b', 'mistral:latest'])
+        self.assertEqual(queue.get(jobs[0]['id'])['progress'], 100)
+
+    def test_restart_resumes_queue(self):
+        """Test that a pull left running by a stopped worker is queued again ahead of later pulls"""
+        stopped = self.queue(FakeOllama())
+        first = stopped.enqueue('llama2')
+        second = stopped.enqueue('mistral')
+        self.assertEqual(stopped._claim()['id'], first['id'])
+
+        ollama = FakeOllama()
+        restarted = self.queue(ollama, stale_after=0)
+        restarted.start()
+        self.assertEqual(self.wait_for(restarted, first['id'])['status'], 'done')
+        self.assertEqual(self.wait_for(restarted, second['id'])['status'], 'done')
+        self.assertEqual(ollama.pulls, ['llama2:latest', 'mistral:latest'])
+
+    def test_time_window(self):
+        """Test that pulls start only inside the window and go back to the queue when it closes"""
+        self.assertEqual(parse_window('22:30-06:00'), (1350, 360))
+        self.assertTrue(in_window((1350, 360), datetime(2024, 1, 1, 2, 0)))
+        self.assertFalse(in_window((1350, 360), datetime(2024, 1, 1, 12, 0)))
+        with self.assertRaises(ValueError):
+            parse_window('night')
+
+        queue = self.queue(FakeOllama(), window='01:00-02:00')
+        queue.clock = lambda: datetime(2024, 1, 1, 3, 0)
+        job = queue.enqueue('llama2')
+        self.assertEqual(queue.dispatch(), 0)
+
+        closing = iter([datetime(2024, 1, 1, 1, 30)] + [datetime(2024, 1, 1, 2, 0)] * 10)
+        queue.clock = lambda: next(closing)
+        with patch('pull_queue.PROGRESS_INTERVAL', 0):
+            self.assertEqual(queue.dispatch(), 1)
+            job = self.wait_for(queue, job['id'], statuses=('queued',))
+        self.assertEqual((job['position'], job['detail']), (1, 'waiting for the pull window'))
+
+    def test_bandwidth_pauses_and_resumes(self):
+        """Test that a pull ahead of the bandwidth budget is paused and resumed from where it stopped"""
+        ollama = FakeOllama(step=2_000_000)
+        queue = self.queue(ollama, bandwidth=20_000_000)
+        job = queue.enqueue('llama2')
+        start = time.monotonic()
+        with patch('pull_queue.BURST_SECONDS', 0):
+            queue.dispatch()
+            job = self.wait_for(queue, job['id'])
+        self.assertEqual(job['status'], 'done')
+        self.assertGreaterEqual(len(ollama.pulls), 2)
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+    def test_cancel_and_failure(self):
+        """Test that a cancelled pull never runs and an Ollama error fails the job"""
+        queue = self.queue(FakeOllama())
+        job = queue.enqueue('llama2')
+        self.assertTrue(queue.cancel(job['id']))
+        self.assertFalse(queue.cancel(job['id']))
+        self.assertEqual(queue.dispatch(), 0)
+
+        ollama = FakeOllama()
+        queue = self.queue(ollama, prepare=lambda model: 'Not enough model storage to pull llama2:70b')
+        job = queue.enqueue('llama2:70b')
+        queue.dispatch()
+        job = self.wait_for(queue, job['id'])
+        self.assertEqual((job['status'], job['error']), ('failed', 'Not enough model storage to pull llama2:70b'))
+        self.assertEqual(ollama.pulls, [])
+
+        failing = MagicMock()
+        failing.pull_model.return_value = (progress for progress in
+                                           [{'error': 'pull model manifest: file does not exist'}])
+        queue = self.queue(failing)
+        job = queue.enqueue('nosuchmodel')
+        queue.dispatch()
+        job = self.wait_for(queue, job['id'])
+        self.assertEqual(job['status'], 'failed')
+        self.assertIn('file does not exist', job['error'])
+
+
+class TestPullRoutes(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_routes(self):
+        """Test queueing, streaming progress, listing and cancelling pulls"""
+        gate = threading.Event()
+        queue = PullQueue(FakeOllama(gate=gate), path=os.path.join(self.tmpdir, 'pull_queue.db'),
+                          bandwidth=0, window='', poll_interval=0.01)
+        with patch('app.pull_queue', queue), patch('app.PULL_EVENT_INTERVAL', 0.01):
+            response = self.client.post('/api/pull-model', json={'model': 'llama2', 'wait': False})
+            self.assertEqual(response.status_code, 202)
+            first = json.loads(response.data)
+            second = json.loads(self.client.post('/api/pull-model', json={'model': 'mistral', 'wait': False}).data)
+            queue.dispatch()
+
+            jobs = json.loads(self.client.get('/api/pull-jobs').data)['jobs']
+            self.assertEqual([(job['model'], job['status'], job['position']) for job in jobs],
+                             [('llama2:latest', 'running', None), ('mistral:latest', 'queued', 1)])
+            self.assertEqual(self.client.delete(f"/admin/pull-jobs/{second['id']}").status_code, 200)
+            self.assertEqual(self.client.delete(f"/admin/pull-jobs/{second['id']}").status_code, 404)
+
+            gate.set()
+            self.assertEqual(json.loads(self.client.get(f"/api/pull-jobs/{first['id']}").data)['model'],
+                             'llama2:latest')
+            queue.start()
+            response = self.client.post('/api/pull-model', json={'model': 'phi'})
+            events = [json.loads(line[6:]) for line in response.get_data(as_text=True).split('\n')
+                      if line.startswith('data: ')]
+            self.assertEqual((events[-1]['model'], events[-1]['status'], events[-1]['progress']),
+                             ('phi:latest', 'done', 100))
+            self.assertEqual(json.loads(self.client.get('/api/pull-jobs/999').data)['error'], 'Job not found')
+        queue.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import json
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from app import app
+from request_profiler import ProfileStore, SamplingProfiler, TRUNCATED_FRAME
+
+
+def slow_handler(seconds):
+    time.sleep(seconds)
+
+
+class TestSamplingProfiler(unittest.TestCase):
+    def test_samples_tracked_threads(self):
+        """Test that only tracked threads are counted, as folded stacks under their route"""
+        profiler = SamplingProfiler(interval=0.001, max_overhead=0.5, max_stacks=100)
+        thread = threading.Thread(target=slow_handler, args=(0.2,))
+        thread.start()
+        profiler.track('POST /analyze', thread.ident)
+        for _ in range(5):
+            profiler.sample()
+        profiler.untrack(thread.ident)
+        profiler.sample()
+        thread.join()
+
+        lines = profiler.folded().splitlines()
+        self.assertEqual(len(lines), 1)
+        stack, count = lines[0].rsplit(' ', 1)
+        self.assertEqual(count, '5')
+        self.assertTrue(stack.startswith('POST /analyze;'))
+        self.assertIn('test_request_profiler.py:slow_handler', stack)
+        self.assertEqual(profiler.stats()['samples'], 5)
+
+        profiler.reset()
+        self.assertEqual(profiler.folded(), '')
+
+    def test_stacks_bounded(self):
+        """Test that stacks beyond max_stacks are counted under their route"""
+        profiler = SamplingProfiler(interval=0.001, max_overhead=0.5, max_stacks=1)
+        profiler._stacks['GET /;app.py:index'] = 1
+        profiler.track('GET /')
+        profiler.sample()
+        self.assertEqual(profiler._stacks[f'GET /;{TRUNCATED_FRAME}'], 1)
+        self.assertEqual(len(profiler._stacks), 2)
+
+    def test_overhead_bounded(self):
+        """Test that the sampling thread keeps its measured overhead under the limit"""
+        profiler = SamplingProfiler(interval=0.0001, max_overhead=0.02, max_stacks=100)
+        release = threading.Event()
+        thread = threading.Thread(target=release.wait, args=(5,))
+        thread.start()
+        profiler.track('GET /', thread.ident)
+        time.sleep(0.3)
+        stats = profiler.stats()
+        release.set()
+        thread.join()
+        self.assertGreater(stats['samples'], 0)
+        self.assertLess(stats['overhead'], 0.05)
+
+
+class TestRequestProfiling(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = ProfileStore(self.tmpdir, max_files=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_profile_one_request(self):
+        """Test that an admin's flagged request is profiled and can be listed and downloaded"""
+        with patch('app.request_profiles', self.store):
+            response = self.client.get('/api/quota', headers={'X-Profile': '1'})
+            profile_id = response.headers['X-Profile-Id']
+            self.assertEqual(len(self.client.get('/api/quota').headers.getlist('X-Profile-Id')), 0)
+
+            profiles = json.loads(self.client.get('/admin/profiles').data)['profiles']
+            self.assertEqual([(profile['id'], profile['path'], profile['status']) for profile in profiles],
+                             [(profile_id, '/api/quota', 400)])
+
+            text = self.client.get(f'/admin/profiles/{profile_id}?format=text&limit=5').get_data(as_text=True)
+            self.assertIn('function calls', text)
+            download = self.client.get(f'/admin/profiles/{profile_id}')
+            self.assertEqual(download.headers['Content-Type'], 'application/octet-stream')
+            self.assertGreater(len(download.data), 0)
+            self.assertEqual(self.client.get('/admin/profiles/../../etc/passwd').status_code, 404)
+            self.assertEqual(self.client.get(f'/admin/profiles/{profile_id}?format=text&sort=bogus').status_code, 400)
+
+            for _ in range(2):
+                self.client.get('/api/quota?profile=1')
+            self.assertEqual(len(self.store.list()), 2)
+
+    def test_profile_requires_admin(self):
+        """Test that a profile flag from a non-admin is ignored"""
+        with patch('app.request_profiles', self.store), patch('app.Config.ADMIN_TOKEN', 'secret'):
+            response = self.client.get('/api/quota', headers={'X-Profile': '1'})
+            self.assertNotIn('X-Profile-Id', response.headers)
+            response = self.client.get('/api/quota', headers={'X-Profile': '1', 'X-Admin-Token': 'secret'})
+            self.assertIn('X-Profile-Id', response.headers)
+
+    def test_sampling_route(self):
+        """Test the folded stacks and stats of the sampling profiler"""
+        profiler = SamplingProfiler(interval=0.001, max_overhead=0.5)
+        with patch('app.sampling_profiler', profiler):
+            self.assertEqual(self.client.get('/admin/profiler').status_code, 404)
+            with patch('app.Config.PROFILE_SAMPLING', True):
+                self.client.get('/api/quota')
+                profiler.track('GET /api/quota')
+                profiler.sample()
+                self.assertIn('GET /api/quota;', self.client.get('/admin/profiler').get_data(as_text=True))
+                stats = json.loads(self.client.get('/admin/profiler?format=json').data)
+                self.assertGreater(stats['samples'], 0)
+                self.assertEqual(self.client.delete('/admin/profiler').status_code, 200)
+                self.assertEqual(profiler.stats()['samples'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+import json
+import zlib
+import secrets
+import unittest
+from unittest.mock import MagicMock, patch
+import numpy as np
+import fakeredis
+from app import app, db, Session
+from state_store import RedisStateStore
+from semantic_cache import SemanticCache
+from cache_keys import images_hash
+
+
+def bag_of_words(texts, model='embed', timeout=None):
+    """Stand-in embedding: texts sharing words get similar vectors."""
+    vectors = np.zeros((len(texts), 64), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in text.lower().strip('?').split():
+            vectors[row, zlib.crc32(word.encode()) % 64] += 1
+    return vectors
+
+
+class TestSemanticCache(unittest.TestCase):
+    def setUp(self):
+        self.store = RedisStateStore(fakeredis.FakeRedis(), prefix='test:')
+        self.embeddings = MagicMock()
+        self.embeddings.embed.side_effect = bag_of_words
+        self.cache = SemanticCache(self.embeddings, self.store, model='embed', threshold=0.8, max_entries=3)
+
+    def remember(self, prompt, response, model='llama2', image_hash=''):
+        vector = self.cache.lookup(model, prompt, image_hash)['vector']
+        self.cache.store_answer(model, prompt, response, image_hash, vector=vector)
+
+    def test_similar_prompt_hits(self):
+        """Test that a reworded prompt for the same model and images is served from the cache"""
+        self.remember('what is the capital of france', 'Paris')
+        hit = self.cache.lookup('llama2', 'what is the capital city of france?')['hit']
+        self.assertEqual(hit['response'], 'Paris')
+        self.assertEqual(hit['prompt'], 'what is the capital of france')
+        self.assertGreaterEqual(hit['similarity'], 0.8)
+        self.assertNotIn('vector', hit)
+
+        self.assertIsNone(self.cache.lookup('llama2', 'summarize this quarterly report')['hit'])
+        self.assertIsNone(self.cache.lookup('mistral', 'what is the capital of france')['hit'])
+        self.assertIsNone(self.cache.lookup('llama2', 'what is the capital of france',
+                                            images_hash(['aW1hZ2U=']))['hit'])
+
+    def test_exact_prompt_skips_embedding(self):
+        """Test that the same prompt is found without embedding it"""
+        self.remember('describe the image', 'A cat', image_hash=images_hash(['aW1hZ2U=']))
+        self.embeddings.embed.reset_mock()
+        hit = self.cache.lookup('llama2', 'describe the image', images_hash(['aW1hZ2U=']))['hit']
+        self.assertEqual((hit['response'], hit['similarity']), ('A cat', 1.0))
+        self.embeddings.embed.assert_not_called()
+
+    def test_embedding_failures_are_misses(self):
+        """Test that an unavailable embedding model never fails a lookup"""
+        self.remember('what is the capital of france', 'Paris')
+        self.embeddings.embed.side_effect = TimeoutError('timed out')
+        self.assertEqual(self.cache.lookup('llama2', 'capital of france?'), {'hit': None, 'vector': None})
+        self.cache.ready = lambda: False
+        self.assertIsNone(self.cache.lookup('llama2', 'capital of france?')['hit'])
+        stats = self.cache.stats()
+        self.assertEqual((stats['errors'], stats['skipped'], stats['misses']), (1, 1, 3))
+
+    def test_oldest_answers_dropped(self):
+        """Test that each group keeps only max_entries answers"""
+        for i, word in enumerate(['alpha', 'bravo', 'charlie', 'delta']):
+            self.remember(f'{word} question', f'answer {i}')
+        self.assertIsNone(self.cache.lookup('llama2', 'alpha question')['hit'])
+        self.assertEqual(self.cache.lookup('llama2', 'delta question')['hit']['response'], 'answer 3')
+
+    def test_stats_and_clear(self):
+        """Test hit rate and latency stats, and clearing the cache"""
+        self.remember('what is the capital of france', 'Paris')
+        self.cache.lookup('llama2', 'what is the capital of france')
+        stats = self.cache.stats()
+        self.assertEqual((stats['hits'], stats['exact_hits'], stats['misses'], stats['stores']), (1, 1, 1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+        self.assertIsNotNone(stats['lookup_ms']['p95'])
+        self.assertIsNotNone(stats['embed_ms']['p50'])
+
+        self.assertEqual(self.cache.clear(), 1)
+        self.assertIsNone(self.cache.lookup('llama2', 'what is the capital of france')['hit'])
+        self.assertEqual(self.cache.stats()['lookups'], 1)
+
+
+class TestAnalyzeCache(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        self.session_id = secrets.token_hex(32)
+        with app.app_context():
+            sess, _ = Session.get_or_create(self.session_id)
+            sess.set_data('llama2')
+        self.client.set_cookie('session_id', self.session_id)
+        self.embeddings = MagicMock()
+        self.embeddings.embed.side_effect = bag_of_words
+        self.cache = SemanticCache(self.embeddings, RedisStateStore(fakeredis.FakeRedis(), prefix='test:'),
+                                   model='embed', threshold=0.8)
+
+    def tearDown(self):
+        with app.app_context():
+            Session.query.filter_by(id=self.session_id).delete()
+            db.session.commit()
+
+    def generate_calls(self, mock_post):
+        return sum(1 for call in mock_post.call_args_list if call.args[0].endswith('/api/generate'))
+
+    def test_analyze_served_from_cache(self):
+        """Test that a reworded prompt is answered from the cache and marked as cached"""
+        reply = MagicMock()
+        reply.json.return_value = {'response': 'Paris'}
+        with patch('app.semantic_cache', self.cache), patch('app.history_manager', MagicMock()), \
+                patch('app.Config.SEMANTIC_CACHE', True), \
+                patch('requests.post', return_value=reply) as mock_post:
+            data = json.loads(self.client.post('/analyze', json={'prompt': 'what is the capital of france'}).data)
+            self.assertEqual(data, {'response': 'Paris', 'model': 'llama2'})
+
+            data = json.loads(self.client.post('/analyze', json={'prompt': 'what is the capital city of france'}).data)
+            self.assertEqual(data['response'], 'Paris')
+            self.assertEqual(data['cached']['prompt'], 'what is the capital of france')
+            self.assertEqual(self.generate_calls(mock_post), 1)
+
+            data = json.loads(self.client.post('/analyze', json={'prompt': 'what is the capital city of france',
+                                                                 'cache': False}).data)
+            self.assertNotIn('cached', data)
+            self.assertEqual(self.generate_calls(mock_post), 2)
+
+            stats = json.loads(self.client.get('/admin/semantic-cache').data)
+            self.assertEqual((stats['enabled'], stats['hits'], stats['misses']), (True, 1, 1))
+
+    def test_cache_hits_not_rate_limited(self):
+        """Test that answers served from the cache do not use up the session's rate limit"""
+        reply = MagicMock()
+        reply.json.return_value = {'response': 'Paris'}
+        with patch('app.semantic_cache', self.cache), patch('app.history_manager', MagicMock()), \
+                patch('app.Config.SEMANTIC_CACHE', True), patch('app.Config.RATE_LIMIT_BURST', 1), \
+                patch('app.Config.RATE_LIMIT_PER_MINUTE', 1), patch('requests.post', return_value=reply):
+            prompt = {'prompt': 'what is the capital of france'}
+            for _ in range(3):
+                self.assertEqual(self.client.post('/analyze', json=prompt).status_code, 200)
+            response = self.client.post('/analyze', json={'prompt': 'tell me a story about dragons'})
+            self.assertEqual(response.status_code, 429)
+
+
+if __name__ == '__main__':
+    unittest.main()
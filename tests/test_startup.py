@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import subprocess
+import unittest
+from types import SimpleNamespace
+from startup import LazyObject, reset_lazy_objects, startup_timings, timed
+from app import create_app, ensure_tables
+
+
+class TestLazyObject(unittest.TestCase):
+    def test_created_on_first_use(self):
+        """Test that the factory runs once, on first attribute access"""
+        calls = []
+
+        def factory():
+            calls.append(1)
+            return {'answer': 42}
+
+        lazy = LazyObject(factory, 'test_lazy')
+        self.assertFalse(lazy.initialized)
+        self.assertEqual(calls, [])
+        self.assertEqual(lazy.get('answer'), 42)
+        self.assertEqual(len(lazy), 1)
+        self.assertEqual(list(lazy), ['answer'])
+        self.assertTrue(lazy)
+        self.assertEqual(calls, [1])
+        self.assertIn('lazy:test_lazy', startup_timings)
+
+    def test_reset_after_fork(self):
+        """Test that the target is built once on first access, and again after a reset"""
+        built = []
+
+        def factory():
+            built.append(SimpleNamespace(value=len(built)))
+            return built[-1]
+
+        lazy = LazyObject(factory, 'test_reset')
+        self.assertFalse(lazy.initialized)
+        self.assertEqual(built, [])
+        self.assertEqual(lazy.value, 0)
+        self.assertEqual(lazy.value, 0)
+        self.assertEqual(len(built), 1)
+
+        reset_lazy_objects()
+        self.assertFalse(lazy.initialized)
+        self.assertEqual(len(built), 1)
+        self.assertEqual(lazy.value, 1)
+        self.assertEqual(lazy.value, 1)
+        self.assertEqual(len(built), 2)
+        self.assertIsNot(built[0], built[1])
+
+    def test_timed(self):
+        """Test that phases are recorded"""
+        with timed('test_phase'):
+            pass
+        self.assertGreaterEqual(startup_timings['test_phase'], 0)
+
+
+class TestCreateApp(unittest.TestCase):
+    def test_factory_registers_routes(self):
+        """Test that a new app has the routes and reports startup timings"""
+        app = create_app()
+        app.config['TESTING'] = True
+        rules = {rule.rule for rule in app.url_map.iter_rules()}
+        self.assertIn('/analyze', rules)
+        self.assertIn('/admin/startup', rules)
+        for phase in ('config', 'extensions', 'routes', 'create_app'):
+            self.assertIn(phase, startup_timings)
+
+        response = app.test_client().get('/admin/startup')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['pid'], os.getpid())
+        self.assertIn('history_services', data['initialized'])
+
+    def test_import_does_not_load_numpy(self):
+        """Test that importing the app leaves numpy and the modules using it to first use"""
+        code = ('import sys, app; print(sorted(m for m in ("numpy", "embedding_manager", "vector_index", '
+                '"semantic_cache", "analytics_manager") if m in sys.modules))')
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, timeout=120,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip().splitlines()[-1], '[]')
+
+    def test_tables_created_lazily(self):
+        """Test that session tables are created on first use"""
+        app = create_app()
+        with app.app_context():
+            ensure_tables()
+        self.assertIn('lazy:session_tables', startup_timings)
+
+
+if __name__ == '__main__':
+    unittest.main()
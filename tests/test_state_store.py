@@ -0,0 +1,203 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+from unittest.mock import Mock, MagicMock
+import fakeredis
+from state_store import StateStore, SQLiteStateStore, RedisStateStore, create_state_store
+from history_manager import HistoryManager, HISTORY_KEY, GENERATION_KEY
+from history_index import HistoryIndex, IndexFollower
+from conversation_manager import ConversationManager
+
+
+def append_entries(path, worker, count):
+    """Worker process body: append history entries through a fresh store connection."""
+    manager = HistoryManager(max_entries=1000, store=SQLiteStateStore(path))
+    for i in range(count):
+        manager.add_entry(model=f'worker-{worker}', prompt=f'prompt {i}', result='ok',
+                          duration=0.1, success=True)
+
+
+class StateStoreTests:
+    """Behaviour every StateStore backend must share."""
+
+    def test_get_set_delete(self):
+        """Test JSON values round-trip and can be deleted"""
+        self.assertIsNone(self.store.get('missing'))
+        self.store.set('key', {'a': [1, 2]})
+        self.assertEqual(self.store.get('key'), {'a': [1, 2]})
+        self.store.delete('key')
+        self.assertIsNone(self.store.get('key'))
+
+    def test_ttl_and_nx(self):
+        """Test expiring values and set-if-absent"""
+        self.assertTrue(self.store.set('key', 1, ttl=0.05, nx=True))
+        self.assertFalse(self.store.set('key', 2, nx=True))
+        self.assertEqual(self.store.get('key'), 1)
+        time.sleep(0.1)
+        self.assertIsNone(self.store.get('key'))
+        self.assertTrue(self.store.set('key', 3, nx=True))
+
+    def test_incr(self):
+        """Test integer increments"""
+        self.assertEqual(self.store.incr('counter'), 1)
+        self.assertEqual(self.store.incr('counter', 5), 6)
+        self.assertEqual(self.store.get('counter'), 6)
+
+    def test_append_and_range(self):
+        """Test capped lists with Redis-style ranges"""
+        for i in range(5):
+            length = self.store.append('list', i, max_len=3)
+        self.assertEqual(length, 3)
+        self.assertEqual(self.store.range('list'), [2, 3, 4])
+        self.assertEqual(self.store.range('list', -2, -1), [3, 4])
+        self.assertEqual(self.store.range('list', 1, 1), [3])
+        self.assertEqual(self.store.range('missing'), [])
+        self.store.delete('list')
+        self.assertEqual(self.store.range('list'), [])
+
+    def test_keys(self):
+        """Test listing keys by prefix"""
+        self.store.set('inflight:a', 1)
+        self.store.set('inflight:b', 2)
+        self.store.set('other', 3)
+        self.assertEqual(sorted(self.store.keys('inflight:')), ['inflight:a', 'inflight:b'])
+
+    def test_lock(self):
+        """Test that a held lock cannot be taken again until released"""
+        with self.store.lock('job', timeout=1):
+            self.assertFalse(self.store.set('lock:job', 'other', nx=True))
+        self.assertTrue(self.store.set('lock:job', 'other', nx=True))
+
+    def test_shared_conversations(self):
+        """Test that two managers on one store see the same conversation, reading it without the process lock"""
+        first = ConversationManager(store=self.store)
+        second = ConversationManager(store=self.store)
+        second._lock = MagicMock()
+        first.record_turn('s1', 'llama2', 'hi', 'hello')
+        self.assertEqual(second.get_model('s1'), 'llama2')
+        messages = second.build_messages('s1', 'llama2', 'again')
+        self.assertEqual([m['content'] for m in messages], ['hi', 'hello', 'again'])
+        self.assertEqual(len(second), 1)
+        self.assertEqual(second.get_summary('s1'), '')
+        self.assertEqual(len(second.get_messages('s1')), 2)
+        second._lock.__enter__.assert_not_called()
+        second.reset('s1')
+        self.assertEqual(first.get_messages('s1'), [])
+
+
+class TestSQLiteStateStore(StateStoreTests, unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'state.db')
+        self.store = SQLiteStateStore(self.path)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_concurrent_processes(self):
+        """Test that history appends from several processes are all kept"""
+        ctx = multiprocessing.get_context('fork')
+        workers = [ctx.Process(target=append_entries, args=(self.path, w, 25)) for w in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(30)
+            self.assertEqual(worker.exitcode, 0)
+        entries = self.store.range(HISTORY_KEY)
+        self.assertEqual(len(entries), 100)
+        for w in range(4):
+            prompts = [e['prompt'] for e in entries if e['model'] == f'worker-{w}']
+            self.assertEqual(prompts, [f'prompt {i}' for i in range(25)])
+
+    def test_history_file_imported_once(self):
+        """Test that an existing history file moves into the store only once"""
+        history_file = os.path.join(self.tmpdir, 'history.json')
+        with open(history_file, 'w') as f:
+            json.dump([{'model': 'old', 'prompt': 'p', 'result': 'r', 'success': True}], f)
+        manager = HistoryManager(history_file, 10, store=self.store)
+        self.assertEqual([e['model'] for e in manager.load_history()], ['old'])
+
+        manager.clear_history()
+        self.assertEqual(self.store.get(GENERATION_KEY), 1)
+        manager = HistoryManager(history_file, 10, store=self.store)
+        self.assertEqual(manager.load_history(), [])
+
+
+class TestRedisStateStore(StateStoreTests, unittest.TestCase):
+    def setUp(self):
+        self.store = RedisStateStore(fakeredis.FakeRedis(), prefix='test:')
+
+    def test_prefix(self):
+        """Test that keys are namespaced on the server"""
+        self.store.set('key', 1)
+        self.assertEqual(self.store.client.get('test:key'), b'1')
+        self.assertEqual(self.store.keys('ke'), ['key'])
+
+
+class TestIndexFollower(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.index = HistoryIndex(os.path.join(self.tmpdir, 'index.db'))
+        self.store = SQLiteStateStore(os.path.join(self.tmpdir, 'state.db'))
+        self.entries = []
+        listener = Mock()
+        listener.add_entry.side_effect = self.entries.append
+        listener.clear.side_effect = self.entries.clear
+        self.follower = IndexFollower(self.index, [listener], lambda: self.store.get(GENERATION_KEY))
+
+    def tearDown(self):
+        self.index.close()
+        self.store.close()
+        shutil.rmtree(self.tmpdir)
+
+    def _add(self, prompt):
+        self.index.add_entry({'timestamp': '2024-01-01T00:00:00', 'model': 'm', 'prompt': prompt,
+                              'result': '', 'success': True})
+
+    def test_sync_new_entries_and_clear(self):
+        """Test that only new entries are fed and a clear starts over"""
+        self._add('one')
+        self.follower.start_at(self.index.max_id())
+        self._add('two')
+        self.assertEqual(self.follower.sync(), 1)
+        self.assertEqual(self.follower.sync(), 0)
+        self.assertEqual([e['prompt'] for e in self.entries], ['two'])
+
+        self.index.clear()
+        self.store.incr(GENERATION_KEY)
+        self._add('three')
+        self.follower.sync()
+        self.assertEqual([e['prompt'] for e in self.entries], ['three'])
+
+
+class TestCreateStateStore(unittest.TestCase):
+    def test_urls(self):
+        """Test that store URLs pick the backend"""
+        self.assertIsInstance(create_state_store('fakeredis://'), RedisStateStore)
+        tmpdir = tempfile.mkdtemp()
+        try:
+            store = create_state_store(f'sqlite:///{tmpdir}/state.db')
+            self.assertIsInstance(store, SQLiteStateStore)
+            store.close()
+        finally:
+            shutil.rmtree(tmpdir)
+        with self.assertRaises(ValueError):
+            create_state_store('memcached://localhost')
+
+    def test_incomplete_backend(self):
+        """Test that a backend missing operations fails when created"""
+        class GetOnlyStore(StateStore):
+            def get(self, key):
+                return None
+
+        with self.assertRaises(TypeError):
+            GetOnlyStore()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from collections import namedtuple
+from unittest.mock import MagicMock, patch
+from app import app
+from history_index import HistoryIndex
+from pull_queue import PullQueue
+from storage_manager import ModelStorageManager, estimate_pull_size, GB
+
+TAGS = {'models': [
+    {'name': 'llama2:latest', 'size': 4 * GB, 'modified_at': '2024-01-01T10:00:00.123456789Z'},
+    {'name': 'mistral:latest', 'size': 4 * GB, 'modified_at': '2024-01-02T10:00:00Z'},
+    {'name': 'llava:13b', 'size': 8 * GB, 'modified_at': '2024-01-03T10:00:00Z'},
+    {'name': 'phi:latest', 'size': 2 * GB, 'modified_at': '2024-01-04T10:00:00Z'},
+]}
+
+DiskUsage = namedtuple('DiskUsage', 'total used free')
+
+
+class TestStorageManager(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.index = HistoryIndex(os.path.join(self.tmpdir, 'index.db'))
+        # llama2 was pulled first but used last
+        self.index.add_entries([
+            {'timestamp': '2024-02-01T10:00:00', 'model': 'llama2', 'prompt': 'p'},
+            {'timestamp': '2024-01-05T10:00:00', 'model': 'llama2', 'prompt': 'p'},
+            {'timestamp': '2024-01-06T10:00:00', 'model': 'phi', 'prompt': 'p'},
+        ])
+        self.fetch_manager = MagicMock()
+        self.fetch_manager.fetch_models_list.return_value = TAGS
+        self.fetch_manager.delete_model.return_value = True
+
+    def tearDown(self):
+        self.index.close()
+        shutil.rmtree(self.tmpdir)
+
+    def manager(self, **kwargs):
+        kwargs.setdefault('budget_bytes', 12 * GB)
+        kwargs.setdefault('pinned', [])
+        kwargs.setdefault('models_dir', '')
+        kwargs.setdefault('min_free_bytes', 0)
+        kwargs.setdefault('dry_run', False)
+        return ModelStorageManager(self.fetch_manager, self.index, **kwargs)
+
+    def test_estimate_pull_size(self):
+        """Test download size estimates from the size tag"""
+        self.assertEqual(estimate_pull_size('llama2:7b'), int(7e9 * 0.6))
+        self.assertEqual(estimate_pull_size('mixtral:8x7b-instruct'), int(56e9 * 0.6))
+        self.assertEqual(estimate_pull_size('nomic-embed-text:137m'), int(137e6 * 0.6))
+        self.assertEqual(estimate_pull_size('llama2'), 0)
+        self.assertEqual(estimate_pull_size('mixtral:latest', ['8x22b', '8x7b']), int(56e9 * 0.6))
+
+    def test_pull_size_fallback(self):
+        """Test that untagged pulls reserve the catalog's smallest size, else the default reserve"""
+        catalog = MagicMock()
+        catalog.sizes.side_effect = lambda name: {'llama3': ['8b', '70b']}.get(name, [])
+        manager = self.manager(library_catalog=catalog, default_pull_bytes=3 * GB)
+        self.assertEqual(manager.pull_size('llama3'), int(8e9 * 0.6))
+        self.assertEqual(manager.pull_size('llama3:latest'), int(8e9 * 0.6))
+        self.assertEqual(manager.pull_size('llama3:70b'), int(70e9 * 0.6))
+        self.assertEqual(manager.pull_size('unlisted'), 3 * GB)
+        self.assertEqual(self.manager(default_pull_bytes=3 * GB).pull_size('mistral'), 3 * GB)
+
+        manager = self.manager(budget_bytes=20 * GB, pinned=['mistral', 'llava', 'phi', 'llama2'],
+                               library_catalog=catalog)
+        self.assertIn('Not enough model storage', manager.prepare_pull('llama3'))
+
+    def test_usage_least_recently_used_first(self):
+        """Test that history use and pull time order the models"""
+        usage = self.manager().usage()
+        self.assertEqual([m['name'] for m in usage], ['mistral:latest', 'llava:13b', 'phi:latest', 'llama2:latest'])
+        self.assertEqual([m['used_in_history'] for m in usage], [False, False, True, True])
+        self.assertEqual(self.index.last_used()['llama2'], '2024-02-01T10:00:00')
+
+    def test_dry_run_reports_savings(self):
+        """Test that a dry run plans evictions without deleting"""
+        report = self.manager(dry_run=True).enforce()
+        self.assertEqual(report['total_bytes'], 18 * GB)
+        self.assertEqual(report['evict'], ['mistral:latest', 'llava:13b'])
+        self.assertEqual(report['projected_savings_bytes'], 12 * GB)
+        self.assertEqual(report['deleted'], [])
+        self.fetch_manager.delete_model.assert_not_called()
+
+    def test_enforce_skips_pinned(self):
+        """Test that pinned models are kept and the next least used is evicted"""
+        report = self.manager(pinned=['mistral', 'llava:13b']).enforce()
+        self.assertEqual(report['deleted'], ['phi:latest', 'llama2:latest'])
+        self.assertEqual(report['freed_bytes'], 6 * GB)
+        self.assertEqual(self.fetch_manager.delete_model.call_count, 2)
+
+    def test_within_budget(self):
+        """Test that nothing is evicted under the budget or without one"""
+        self.assertEqual(self.manager(budget_bytes=20 * GB).enforce()['evict'], [])
+        self.assertIsNone(self.manager(budget_bytes=0).prepare_pull('llama2:70b'))
+        self.fetch_manager.fetch_models_list.assert_called_once()
+
+    def test_prepare_pull(self):
+        """Test that a pull evicts for its estimated size and refuses when pinned models block it"""
+        manager = self.manager(budget_bytes=20 * GB)
+        self.assertIsNone(manager.prepare_pull('gemma:7b'))
+        self.fetch_manager.delete_model.assert_called_once_with('mistral:latest')
+
+        self.assertIsNone(manager.prepare_pull('llava:13b'))
+        self.fetch_manager.delete_model.assert_called_once()
+
+        manager = self.manager(budget_bytes=20 * GB, pinned=['mistral', 'llava', 'phi', 'llama2'])
+        self.assertIn('Not enough model storage', manager.prepare_pull('llama2:70b'))
+
+    def test_free_space_check(self):
+        """Test that the pull checks free space in the model directory"""
+        manager = self.manager(budget_bytes=0, models_dir=self.tmpdir, min_free_bytes=GB, dry_run=True)
+        with patch('storage_manager.shutil.disk_usage', return_value=DiskUsage(100 * GB, 96 * GB, 4 * GB)):
+            self.assertIsNone(manager.prepare_pull('phi:2.7b'))
+            self.assertIn('Not enough free space', manager.prepare_pull('llama2:13b'))
+        self.fetch_manager.delete_model.assert_not_called()
+
+    def test_routes(self):
+        """Test the storage report, eviction and pull refusal routes"""
+        client = app.test_client()
+        with patch('app.storage_manager', self.manager()):
+            data = json.loads(client.get('/admin/models/storage').data)
+            self.assertEqual((data['dry_run'], data['evict']), (True, ['mistral:latest', 'llava:13b']))
+            self.fetch_manager.delete_model.assert_not_called()
+
+            data = json.loads(client.post('/admin/models/storage', json={'dry_run': False}).data)
+            self.assertEqual(data['deleted'], ['mistral:latest', 'llava:13b'])
+
+        manager = self.manager(pinned=['mistral', 'llava', 'phi', 'llama2'])
+        queue = PullQueue(self.fetch_manager, path=os.path.join(self.tmpdir, 'pull_queue.db'), bandwidth=0,
+                          window='', prepare=manager.prepare_pull)
+        self.fetch_manager.reset_mock()
+        with patch('app.pull_queue', queue):
+            response = client.post('/api/pull-model', json={'model': 'llama2:70b', 'wait': False})
+            self.assertEqual(response.status_code, 202)
+            job = json.loads(response.data)
+            # Nothing is evicted or refused until the pull starts
+            self.fetch_manager.fetch_models_list.assert_not_called()
+            queue.dispatch()
+            queue.stop()
+            job = queue.get(job['id'])
+            self.assertEqual(job['status'], 'failed')
+            self.assertIn('Not enough model storage', job['error'])
+            self.fetch_manager.pull_model.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
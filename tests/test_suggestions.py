@@ -0,0 +1,113 @@
+import json
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from suggestion_manager import SuggestionManager, PromptTrie
+from app import app
+
+
+def model_type_for(model):
+    return 'vision' if 'llava' in model else 'text'
+
+
+class TestPromptTrie(unittest.TestCase):
+    def test_complete_and_remove(self):
+        """Test prefix completion and pruning on removal"""
+        trie = PromptTrie()
+        for prompt in ('Explain this', 'Explain that', 'Write code'):
+            trie.insert(prompt)
+        self.assertEqual(sorted(trie.complete('expl')), ['Explain that', 'Explain this'])
+        self.assertEqual(trie.complete('x'), [])
+        trie.remove('Explain this')
+        self.assertEqual(trie.complete('expl'), ['Explain that'])
+        trie.remove('Explain that')
+        self.assertNotIn('e', trie.root)
+
+
+class TestSuggestionManager(unittest.TestCase):
+    def setUp(self):
+        self.manager = SuggestionManager(model_type_for, half_life=24, max_prompts=10)
+        self.now = datetime.now()
+
+    def _use(self, model, prompt, hours_ago=0, success=True):
+        timestamp = (self.now - timedelta(hours=hours_ago)).isoformat()
+        self.manager.add_entry({'model': model, 'prompt': prompt, 'timestamp': timestamp,
+                                'success': success})
+
+    def test_frequency_ranking(self):
+        """Test that frequently used prompts rank first, per model type"""
+        for _ in range(3):
+            self._use('llama2', 'Summarize this')
+        self._use('llama2', 'Translate this')
+        self._use('llava', 'Describe the chart')
+        self._use('llama2', 'Failed prompt', success=False)
+        self.assertEqual(self.manager.top_prompts('text', 5), ['Summarize this', 'Translate this'])
+        self.assertEqual(self.manager.top_prompts('vision', 5), ['Describe the chart'])
+
+    def test_recency_decay(self):
+        """Test that old uses count less than recent ones"""
+        for _ in range(3):
+            self._use('llama2', 'Old favourite', hours_ago=24 * 5)
+        self._use('llama2', 'New prompt')
+        self.assertEqual(self.manager.top_prompts('text', 1), ['New prompt'])
+
+    def test_invalid_timestamp(self):
+        """Test that a use with an unparsable timestamp is counted as now instead of raising"""
+        self.manager.add_entry({'model': 'llama2', 'prompt': 'Bad time', 'timestamp': 'yesterday', 'success': True})
+        self._use('llama2', 'Good time')
+        self.assertEqual(sorted(self.manager.top_prompts('text', 5)), ['Bad time', 'Good time'])
+
+    def test_merge_with_defaults(self):
+        """Test that history prompts come first and duplicates are removed"""
+        self._use('llama2', 'explain this concept in simple terms.')
+        self._use('llama2', 'My own prompt')
+        defaults = ['Explain this concept in simple terms.', 'Help me debug this code.']
+        suggestions = self.manager.get_suggestions('text', defaults, history_limit=2, limit=10)
+        self.assertEqual(len(suggestions), 3)
+        self.assertIn('My own prompt', suggestions[:2])
+        self.assertEqual(suggestions[-1], 'Help me debug this code.')
+
+    def test_autocomplete(self):
+        """Test that completions rank history prompts before unused defaults"""
+        self._use('llama2', 'Help me write a poem')
+        self._use('llama2', 'Help me write a poem')
+        self._use('llama2', 'Help me plan a trip')
+        completions = self.manager.autocomplete('text', 'help me', ['Help me debug this code.'], limit=5)
+        self.assertEqual([c['prompt'] for c in completions],
+                         ['Help me write a poem', 'Help me plan a trip', 'Help me debug this code.'])
+        self.assertEqual(completions[0]['count'], 2)
+        self.assertEqual(completions[-1]['source'], 'default')
+
+    def test_eviction_bound(self):
+        """Test that the number of tracked prompts stays bounded"""
+        for i in range(30):
+            self._use('llama2', f'prompt {i}')
+        self.assertLessEqual(len(self.manager._scores['text']), 11)
+        self.assertLessEqual(len(self.manager.autocomplete('text', 'prompt', limit=50)), 11)
+
+    def test_clear(self):
+        """Test forgetting all usage"""
+        self._use('llama2', 'Summarize this')
+        self.manager.clear()
+        self.assertEqual(self.manager.top_prompts('text', 5), [])
+
+
+class TestSuggestionRoutes(unittest.TestCase):
+    def test_suggestion_endpoints(self):
+        """Test the suggestion and autocomplete endpoints"""
+        client = app.test_client()
+        manager = SuggestionManager(model_type_for, half_life=24, max_prompts=10)
+        manager.record('llama2', 'What is the population of Korea today?')
+        with patch('app.suggestion_manager', manager):
+            data = json.loads(client.get('/api/prompt-suggestions?model=llama2').data)
+            self.assertEqual(data['model_type'], 'text')
+            self.assertEqual(data['suggestions'][0], 'What is the population of Korea today?')
+
+            data = json.loads(client.get('/api/prompt-autocomplete?model=llama2&prefix=what').data)
+            prompts = [c['prompt'] for c in data['completions']]
+            self.assertEqual(prompts[0], 'What is the population of Korea today?')
+            self.assertIn('What is the population of Korea?', prompts)
+
+
+if __name__ == '__main__':
+    unittest.main()
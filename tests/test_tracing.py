@@ -0,0 +1,202 @@
+import io
+import os
+import json
+import shutil
+import logging
+import secrets
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+import log_manager
+from app import app, db, Session
+from budget_manager import BudgetManager
+from log_manager import configure_logging
+from tracing import Tracer, Span, MemoryExporter, FileExporter, span, activate, deactivate, format_waterfall
+
+
+def timed_trace(tracer, name, total_ms, children):
+    """Build a finished trace whose root took total_ms, with child spans of the given durations in ms."""
+    root = tracer.start_trace(name)
+    start = root.start_time_unix_nano
+    offset = 0
+    for child_name, ms in children:
+        child = Span(child_name, root.trace, root.span_id)
+        child.start_time_unix_nano = start + offset
+        child.end_time_unix_nano = start + offset + int(ms * 1e6)
+        root.trace.spans.append(child)
+        offset += int(ms * 1e6)
+    root.end_time_unix_nano = start + int(total_ms * 1e6)
+    root.trace.spans.append(root)
+    tracer.export(root.trace)
+    return root.trace
+
+
+class TestTracing(unittest.TestCase):
+    def setUp(self):
+        self.exporter = MemoryExporter(max_traces=10, slow_ms=0)
+        self.tracer = Tracer([self.exporter], sample_rate=1.0)
+
+    def test_nested_spans(self):
+        """Test that spans nest under the current span and the trace is exported when the root ends"""
+        with span('outside') as untraced:
+            untraced.set_attribute('ignored', True)
+        self.assertIsNone(untraced.trace_id)
+
+        root = self.tracer.start_trace('POST /analyze')
+        token = activate(root)
+        with span('ollama.call', kind='CLIENT', model='llava') as call:
+            with span('ollama.first_byte') as first_byte:
+                pass
+        with self.assertRaises(ValueError):
+            with span('history.write'):
+                raise ValueError('disk full')
+        deactivate(token)
+        self.assertEqual(self.exporter.traces(), [])
+        root.end()
+
+        trace = self.exporter.get(root.trace_id)
+        self.assertEqual([span.name for span in trace.spans],
+                         ['ollama.first_byte', 'ollama.call', 'history.write', 'POST /analyze'])
+        self.assertEqual(first_byte.parent_span_id, call.span_id)
+        self.assertEqual(call.parent_span_id, root.span_id)
+        self.assertEqual(trace.spans[2].status, 'ERROR')
+        self.assertIn('ollama.first_byte', format_waterfall(trace))
+
+    def test_traceparent(self):
+        """Test that an incoming traceparent is continued, and its sampled flag decides the export"""
+        parent = '00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-00'
+        root = self.tracer.start_trace('GET /', traceparent=parent)
+        self.assertEqual((root.trace_id, root.parent_span_id), ('4bf92f3577b34da6a3ce929d0e0e4736', '00f067aa0ba902b7'))
+        self.assertEqual(root.traceparent, f'00-4bf92f3577b34da6a3ce929d0e0e4736-{root.span_id}-00')
+        root.end()
+        self.assertEqual(self.exporter.traces(), [])
+
+        root = self.tracer.start_trace('GET /', traceparent='garbage')
+        self.assertEqual(len(root.trace_id), 32)
+        self.assertIsNone(root.parent_span_id)
+
+    def test_breakdown(self):
+        """Test that the breakdown shows where the time of a route's slowest requests goes"""
+        exporter = MemoryExporter(max_traces=200, slow_ms=500)
+        tracer = Tracer([exporter])
+        for _ in range(98):
+            timed_trace(tracer, 'POST /analyze', 100, [('session.lookup', 5), ('ollama.call', 90)])
+        slow = timed_trace(tracer, 'POST /analyze', 1000, [('session.lookup', 800), ('ollama.call', 150)])
+        timed_trace(tracer, 'GET /', 10, [])
+
+        route = exporter.breakdown(pct=99)[0]
+        self.assertEqual((route['name'], route['count'], route['p50_ms'], route['p99_ms']),
+                         ('POST /analyze', 99, 100.0, 1000.0))
+        self.assertEqual(route['tail_count'], 1)
+        self.assertEqual([(item['name'], item['share']) for item in route['tail_spans']],
+                         [('session.lookup', 0.8), ('ollama.call', 0.15), ('POST /analyze', 0.05)])
+        self.assertEqual(exporter.slow(), [slow])
+
+    def test_slow_traces_kept(self):
+        """Test that slow traces outlive a burst of fast ones"""
+        exporter = MemoryExporter(max_traces=3, slow_ms=500)
+        tracer = Tracer([exporter])
+        slow = timed_trace(tracer, 'POST /chat', 900, [])
+        for _ in range(5):
+            timed_trace(tracer, 'GET /', 10, [])
+        self.assertEqual(len(exporter.traces()), 4)
+        self.assertEqual(exporter.slow(), [slow])
+
+    def test_file_exporter(self):
+        """Test that traces are appended as OTLP/JSON lines"""
+        tmpdir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmpdir, 'traces.jsonl')
+            tracer = Tracer([FileExporter(path)])
+            first = timed_trace(tracer, 'POST /analyze', 50, [('ollama.call', 40)])
+            timed_trace(tracer, 'GET /', 10, [])
+            with open(path) as f:
+                lines = [json.loads(line) for line in f]
+            self.assertEqual(len(lines), 2)
+            spans = lines[0]['resourceSpans'][0]['scopeSpans'][0]['spans']
+            self.assertEqual([(s['traceId'], s['name'], s['kind']) for s in spans],
+                             [(first.trace_id, 'ollama.call', 1), (first.trace_id, 'POST /analyze', 2)])
+            self.assertEqual(spans[0]['parentSpanId'], spans[1]['spanId'])
+            self.assertEqual(int(spans[1]['endTimeUnixNano']) - int(spans[1]['startTimeUnixNano']), 50_000_000)
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_trace_id_in_logs(self):
+        """Test that log records carry the trace id of the request that logged them"""
+        stream = io.StringIO()
+        configure_logging('INFO', stream_handler=logging.StreamHandler(stream))
+        try:
+            logger = logging.getLogger('test_tracing')
+            root = self.tracer.start_trace('GET /')
+            token = activate(root)
+            logger.info('inside')
+            deactivate(token)
+            logger.info('outside')
+        finally:
+            log_manager.shutdown_logging()
+            configure_logging()
+        lines = stream.getvalue().splitlines()
+        self.assertIn(f'trace_id={root.trace_id} inside', lines[0])
+        self.assertIn('trace_id=- outside', lines[1])
+
+
+class TestTracingRoutes(unittest.TestCase):
+    def setUp(self):
+        app.config['TESTING'] = True
+        self.client = app.test_client()
+        self.session_id = secrets.token_hex(32)
+        with app.app_context():
+            db.create_all()
+            sess, _ = Session.get_or_create(self.session_id)
+            sess.set_data('llama2')
+        self.client.set_cookie('session_id', self.session_id)
+        self.exporter = MemoryExporter(max_traces=10, slow_ms=0)
+
+    def tearDown(self):
+        with app.app_context():
+            Session.query.filter_by(id=self.session_id).delete()
+            db.session.commit()
+
+    def test_analyze_traced(self):
+        """Test that /analyze is split into spans, its trace id passed to Ollama and shown to admins"""
+        reply = MagicMock(status_code=200)
+        reply.json.return_value = {'response': 'Paris', 'total_duration': 2_000_000_000,
+                                   'load_duration': 1_500_000_000}
+        with patch('app.tracer', Tracer([self.exporter])), patch('app.history_manager', MagicMock()), \
+                patch('app.budget_manager', BudgetManager(MagicMock())), patch('app.Config.SEMANTIC_CACHE', False), \
+                patch('requests.post', return_value=reply) as mock_post:
+            response = self.client.post('/analyze', json={'prompt': 'capital of france'})
+            self.assertEqual(response.status_code, 200)
+            trace_id = response.headers['X-Trace-Id']
+            self.assertIn(trace_id, mock_post.call_args[1]['headers']['traceparent'])
+
+            data = json.loads(self.client.get('/admin/traces?route=POST /analyze').data)
+            trace = data['traces'][0]
+            self.assertEqual(trace['trace_id'], trace_id)
+            self.assertEqual(trace['attributes']['ollama.load_duration_ms'], 1500.0)
+            names = [span['name'] for span in trace['spans']]
+            for name in ('POST /analyze', 'session.lookup', 'model.resolve', 'prompt.resolve', 'ollama.call',
+                         'ollama.first_byte', 'ollama.stream', 'history.write', 'response.serialize'):
+                self.assertIn(name, names)
+            self.assertEqual(data['breakdown'][0]['name'], 'POST /analyze')
+
+            text = self.client.get(f'/admin/traces/{trace_id}?format=text').get_data(as_text=True)
+            self.assertIn('session.lookup', text)
+            otlp = json.loads(self.client.get(f'/admin/traces/{trace_id}?format=otlp').data)
+            self.assertEqual(otlp['resourceSpans'][0]['scopeSpans'][0]['spans'][0]['traceId'], trace_id)
+            self.assertEqual(self.client.get('/admin/traces/0123').status_code, 404)
+
+            self.assertEqual(self.client.delete('/admin/traces').status_code, 200)
+            self.assertEqual([trace.root.name for trace in self.exporter.traces()], ['DELETE /admin/traces'])
+
+    def test_tracing_off(self):
+        """Test that no trace is recorded when tracing is off"""
+        with patch('app.tracer', Tracer([self.exporter])), patch('app.Config.TRACING', False):
+            response = self.client.get('/api/quota')
+            self.assertNotIn('X-Trace-Id', response.headers)
+            self.assertEqual(self.client.get('/admin/traces').status_code, 404)
+        self.assertEqual(self.exporter.traces(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+import numpy as np
+import fakeredis
+from app import app
+from state_store import RedisStateStore
+from embedding_manager import EmbeddingManager
+from vector_index import VectorIndex, VectorCollections, normalize
+
+
+def clustered(count, dim=32, clusters=20, seed=0):
+    """Unit vectors around random cluster centers, like real embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(clusters, size=count)] + rng.normal(scale=0.3, size=(count, dim))
+    return normalize(vectors)
+
+
+class TestVectorIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'docs')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_flat_search(self):
+        """Test exact search for several queries at once, best match first"""
+        index = VectorIndex(self.path)
+        vectors = clustered(500)
+        self.assertEqual(index.add(range(100, 600), vectors, model='embed'), list(range(100, 600)))
+        results = index.search(vectors[[7, 42]] * 3, k=5)
+        self.assertEqual([row[0][0] for row in results], [107, 142])
+        self.assertAlmostEqual(results[0][0][1], 1.0, places=5)
+        scores = [score for _, score in results[1]]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+
+        expected = np.argsort(-(vectors @ vectors[42]))[:5] + 100
+        self.assertEqual([id for id, _ in results[1]], expected.tolist())
+
+    def test_persisted_and_shared(self):
+        """Test that another instance sees appended vectors and skips known ids"""
+        index = VectorIndex(self.path)
+        vectors = clustered(10)
+        index.add([1, 2, 3], vectors[:3], model='embed')
+        other = VectorIndex(self.path)
+        self.assertEqual((other.count, other.dim, other.model), (3, 32, 'embed'))
+        self.assertEqual(other.add(None, vectors[3:6]), [4, 5, 6])
+        self.assertEqual(index.add([3, 7, 7], vectors[6:9]), [7])
+        self.assertEqual(index.count, 7)
+        self.assertEqual(other.search(vectors[7], k=1)[0][0][0], 7)
+
+    def test_partial_append_ignored(self):
+        """Test that rows written past the count by a failed writer are dropped"""
+        index = VectorIndex(self.path)
+        vectors = clustered(4)
+        index.add([1, 2], vectors[:2])
+        with open(os.path.join(self.path, 'vectors.bin'), 'ab') as f:
+            f.write(b'\0' * 64)
+        index.add([3], vectors[2:3])
+        self.assertEqual(os.path.getsize(os.path.join(self.path, 'vectors.bin')), 3 * 32 * 4)
+        self.assertEqual(VectorIndex(self.path).search(vectors[2], k=1)[0][0][0], 3)
+
+    def test_mismatch_rejected(self):
+        """Test that vectors from another model or size are refused"""
+        index = VectorIndex(self.path)
+        index.add([1], clustered(1), model='embed')
+        with self.assertRaises(ValueError):
+            index.add([2], clustered(1, dim=16))
+        with self.assertRaises(ValueError):
+            index.add([2], clustered(1), model='other')
+        with self.assertRaises(ValueError):
+            index.search(clustered(1, dim=16))
+
+    def test_ivf_recall(self):
+        """Test that IVF search with int8 codes finds nearly all exact top results"""
+        index = VectorIndex(self.path)
+        vectors = clustered(4000)
+        index.add(range(3000), vectors[:3000])
+        index.train(32)
+        index.add(range(3000, 4000), vectors[3000:])
+        self.assertEqual(VectorIndex(self.path).lists, 32)
+
+        queries = clustered(50, seed=1)
+        exact = np.argsort(-(queries @ vectors.T), axis=1)[:, :10]
+        results = index.search(queries, k=10, probes=8)
+        recall = np.mean([len(set(e) & {id for id, _ in r}) / 10 for e, r in zip(exact.tolist(), results)])
+        self.assertGreater(recall, 0.9)
+
+        index.train(0)
+        self.assertEqual([id for id, _ in index.search(queries[0], k=10)[0]], exact[0].tolist())
+        with self.assertRaises(ValueError):
+            index.train(5000)
+
+    def test_collections(self):
+        """Test named collections in one directory"""
+        store = RedisStateStore(fakeredis.FakeRedis(), prefix='test:')
+        collections = VectorCollections(self.tmpdir, store=store)
+        collections.get('docs').add(None, clustered(3))
+        self.assertEqual(collections.names(), ['docs'])
+        with self.assertRaises(ValueError):
+            collections.get('../etc')
+        collections.drop('docs')
+        self.assertEqual(collections.names(), [])
+
+
+class TestEmbedding(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.fetch_manager = MagicMock()
+        # Each text embeds to a one-hot vector on its length
+        self.fetch_manager.embed.side_effect = lambda model, texts, timeout: [
+            np.eye(16)[len(text) % 16].tolist() for text in texts]
+        self.embeddings = EmbeddingManager(self.fetch_manager, batch_size=3, concurrency=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_batches_keep_order(self):
+        """Test that texts are embedded in batches and returned in order"""
+        texts = ['x' * n for n in range(1, 9)]
+        vectors = self.embeddings.embed(texts, 'embed')
+        self.assertEqual(self.fetch_manager.embed.call_count, 3)
+        self.assertEqual([len(call.args[1]) for call in self.fetch_manager.embed.call_args_list], [3, 3, 2])
+        self.assertEqual(np.argmax(vectors, axis=1).tolist(), list(range(1, 9)))
+
+    def test_routes(self):
+        """Test embedding into a collection and searching it"""
+        client = app.test_client()
+        with patch('app.embedding_manager', self.embeddings), \
+                patch('app.vector_collections', VectorCollections(self.tmpdir)):
+            data = json.loads(client.post('/embed', json={'input': ['a', 'bb']}).data)
+            self.assertEqual((data['model'], data['dimensions']), ('nomic-embed-text', 16))
+            self.assertEqual(len(data['embeddings']), 2)
+
+            data = json.loads(client.post('/embed', json={'input': ['a', 'bb', 'ccc'], 'model': 'embed',
+                                                          'collection': 'docs', 'ids': [10, 20, 30]}).data)
+            self.assertEqual((data['ids'], 'embeddings' in data), ([10, 20, 30], False))
+
+            data = json.loads(client.post('/embed/search', json={'query': 'zz', 'collection': 'docs',
+                                                                 'k': 2}).data)
+            self.assertEqual(data['model'], 'embed')
+            self.assertEqual(data['results'][0], {'id': 20, 'score': 1.0})
+
+            data = json.loads(client.post('/embed/search', json={'query': ['q', 'qqq'],
+                                                                 'collection': 'docs', 'k': 1}).data)
+            self.assertEqual([row[0]['id'] for row in data['results']], [10, 30])
+
+            self.assertEqual(client.post('/embed', json={'input': [1, 2]}).status_code, 400)
+            self.assertEqual(client.post('/embed', json={'input': 'a', 'collection': '../x'}).status_code, 400)
+            self.assertEqual(client.post('/embed/search', json={'query': 'a', 'collection': 'none'}).status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
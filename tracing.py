@@ -0,0 +1,515 @@
+import os
+import re
+import json
+import math
+import time
+import random
+import logging
+import secrets
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Dict, Any, Optional, Callable, Iterator
+from flask import Flask, g, request
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# W3C trace context header, read from incoming requests and sent to Ollama
+TRACEPARENT_HEADER = 'traceparent'
+TRACEPARENT_PATTERN = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$')
+
+# Response header telling a client which trace its request was recorded under
+TRACE_ID_HEADER = 'X-Trace-Id'
+
+SERVICE_NAME = 'ollama-web'
+
+# Span kinds and status codes as numbered in the OTLP protocol
+SPAN_KINDS = {'INTERNAL': 1, 'SERVER': 2, 'CLIENT': 3}
+STATUS_CODES = {'UNSET': 0, 'OK': 1, 'ERROR': 2}
+
+_current_span: ContextVar[Optional['Span']] = ContextVar('current_span', default=None)
+
+
+def otlp_value(value) -> Dict[str, Any]:
+    """Encode an attribute value as an OTLP/JSON AnyValue."""
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class Trace:
+    """The spans of one request, exported together when its root span ends."""
+
+    def __init__(self, tracer: 'Tracer', trace_id: str, sampled: bool):
+        self.tracer = tracer
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans: List[Span] = []
+        self.root: Optional[Span] = None
+
+    @property
+    def duration_ms(self) -> float:
+        return self.root.duration_ms if self.root is not None else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Summarize the trace with its spans in start order, times in ms from the root's start."""
+        start = self.root.start_time_unix_nano if self.root is not None else 0
+        return {
+            'trace_id': self.trace_id,
+            'name': self.root.name if self.root is not None else None,
+            'duration_ms': round(self.duration_ms, 3),
+            'attributes': dict(self.root.attributes) if self.root is not None else {},
+            'spans': [{
+                'span_id': span.span_id,
+                'parent_span_id': span.parent_span_id,
+                'name': span.name,
+                'start_ms': round((span.start_time_unix_nano - start) / 1e6, 3),
+                'duration_ms': round(span.duration_ms, 3),
+                'status': span.status,
+                'attributes': dict(span.attributes),
+            } for span in sorted(self.spans, key=lambda span: span.start_time_unix_nano)],
+        }
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Encode the trace as an OTLP/JSON ExportTraceServiceRequest."""
+        return {'resourceSpans': [{
+            'resource': {'attributes': [
+                {'key': 'service.name', 'value': otlp_value(SERVICE_NAME)},
+                {'key': 'process.pid', 'value': otlp_value(os.getpid())},
+            ]},
+            'scopeSpans': [{
+                'scope': {'name': __name__},
+                'spans': [span.to_otlp() for span in self.spans],
+            }],
+        }]}
+
+
+class Span:
+    """A timed operation within a trace, following the OpenTelemetry span model."""
+
+    def __init__(self, name: str, trace: Trace, parent_span_id: str = None, kind: str = 'INTERNAL',
+                 attributes: Dict[str, Any] = None):
+        self.name = name
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.kind = kind
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.events: List[Dict[str, Any]] = []
+        self.status = 'UNSET'
+        self.status_message = None
+        self.start_time_unix_nano = time.time_ns()
+        self.end_time_unix_nano: Optional[int] = None
+        self._start = time.perf_counter_ns()
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    @property
+    def duration_ms(self) -> float:
+        if self.end_time_unix_nano is None:
+            return (time.perf_counter_ns() - self._start) / 1e6
+        return (self.end_time_unix_nano - self.start_time_unix_nano) / 1e6
+
+    @property
+    def traceparent(self) -> str:
+        """The span's W3C traceparent header value, for calls made within it."""
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.trace.sampled else '00'}"
+
+    def set_attribute(self, key: str, value):
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def add_event(self, name: str, attributes: Dict[str, Any] = None):
+        self.events.append({'name': name, 'time_unix_nano': time.time_ns(), 'attributes': dict(attributes or {})})
+
+    def set_status(self, status: str, message: str = None):
+        self.status = status
+        self.status_message = message
+
+    def record_exception(self, exc: BaseException):
+        self.add_event('exception', {'exception.type': type(exc).__name__, 'exception.message': str(exc)})
+        self.set_status('ERROR', str(exc))
+
+    def end(self):
+        """End the span; ending the root span exports the trace."""
+        if self.end_time_unix_nano is not None:
+            return
+        # Durations come from the monotonic clock, so wall clock steps do not skew them
+        self.end_time_unix_nano = self.start_time_unix_nano + time.perf_counter_ns() - self._start
+        self.trace.spans.append(self)
+        if self.trace.root is self:
+            self.trace.tracer.export(self.trace)
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Encode the span as an OTLP/JSON Span."""
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': SPAN_KINDS.get(self.kind, 1),
+            'startTimeUnixNano': str(self.start_time_unix_nano),
+            'endTimeUnixNano': str(self.end_time_unix_nano),
+            'attributes': [{'key': key, 'value': otlp_value(value)} for key, value in self.attributes.items()],
+            'status': {'code': STATUS_CODES[self.status]},
+        }
+        if self.parent_span_id:
+            span['parentSpanId'] = self.parent_span_id
+        if self.status_message:
+            span['status']['message'] = self.status_message
+        if self.events:
+            span['events'] = [{
+                'name': event['name'],
+                'timeUnixNano': str(event['time_unix_nano']),
+                'attributes': [{'key': key, 'value': otlp_value(value)} for key, value in event['attributes'].items()],
+            } for event in self.events]
+        return span
+
+
+class NonRecordingSpan:
+    """Span handed out outside a traced request; everything done to it is ignored."""
+
+    trace_id = None
+    span_id = None
+    traceparent = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, attributes):
+        pass
+
+    def add_event(self, name, attributes=None):
+        pass
+
+    def set_status(self, status, message=None):
+        pass
+
+    def record_exception(self, exc):
+        pass
+
+    def end(self):
+        pass
+
+
+NON_RECORDING_SPAN = NonRecordingSpan()
+
+
+def self_times(trace: Trace) -> Dict[str, float]:
+    """Sum each span name's own time in a trace, its duration less its children's, in ms."""
+    children: Dict[str, float] = {}
+    for span in trace.spans:
+        if span.parent_span_id:
+            children[span.parent_span_id] = children.get(span.parent_span_id, 0.0) + span.duration_ms
+    times: Dict[str, float] = {}
+    for span in trace.spans:
+        times[span.name] = times.get(span.name, 0.0) + max(span.duration_ms - children.get(span.span_id, 0.0), 0.0)
+    return times
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+
+def format_waterfall(trace: Trace, width: int = 40) -> str:
+    """Render a trace as a plain text waterfall, one line per span, children indented under their parent."""
+    root = trace.root
+    total = max(root.duration_ms, 1e-6)
+    children: Dict[str, List[Span]] = {}
+    for span in trace.spans:
+        children.setdefault(span.parent_span_id, []).append(span)
+    lines = [f'{root.name}  {root.duration_ms:.1f}ms  trace {trace.trace_id}']
+
+    def add(span: Span, depth: int):
+        offset = int((span.start_time_unix_nano - root.start_time_unix_nano) / 1e6 / total * width)
+        length = max(1, int(span.duration_ms / total * width))
+        bar = (' ' * offset + '#' * length)[:width].ljust(width)
+        label = '  ' * depth + span.name
+        lines.append(f'{label:<32} |{bar}| {span.duration_ms:9.1f}ms{"  ERROR" if span.status == "ERROR" else ""}')
+        for child in sorted(children.get(span.span_id, []), key=lambda child: child.start_time_unix_nano):
+            add(child, depth + 1)
+
+    add(root, 0)
+    return '\n'.join(lines) + '\n'
+
+
+class MemoryExporter:
+    """Keeps this worker's recent traces, and its slow ones for longer.
+
+    Traces taking ``slow_ms`` or more go to a second buffer, so a burst of
+    fast requests does not push the slow ones out.
+    """
+
+    def __init__(self, max_traces: int = None, slow_ms: float = None):
+        """Initialize the exporter.
+
+        Args:
+            max_traces (int): Traces kept in each of the recent and slow buffers
+            slow_ms (float): Duration from which a trace counts as slow
+        """
+        self.max_traces = max_traces or Config.TRACE_MAX_TRACES
+        self.slow_ms = Config.TRACE_SLOW_MS if slow_ms is None else slow_ms
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=self.max_traces)
+        self._slow = deque(maxlen=self.max_traces)
+
+    def export(self, trace: Trace):
+        with self._lock:
+            self._recent.append(trace)
+            if trace.duration_ms >= self.slow_ms:
+                self._slow.append(trace)
+
+    def traces(self) -> List[Trace]:
+        """Get the kept traces, each once, oldest first."""
+        with self._lock:
+            traces = {id(trace): trace for trace in list(self._slow) + list(self._recent)}
+        return sorted(traces.values(), key=lambda trace: trace.root.start_time_unix_nano)
+
+    def get(self, trace_id: str) -> Optional[Trace]:
+        """Get a kept trace by id, None if it is not kept."""
+        for trace in reversed(self.traces()):
+            if trace.trace_id == trace_id:
+                return trace
+        return None
+
+    def slow(self, min_ms: float = None, name: str = None, limit: int = 20) -> List[Trace]:
+        """Get the slowest kept traces of at least min_ms, optionally of one route, slowest first."""
+        min_ms = self.slow_ms if min_ms is None else min_ms
+        traces = [trace for trace in self.traces()
+                  if trace.duration_ms >= min_ms and (name is None or trace.root.name == name)]
+        return sorted(traces, key=lambda trace: -trace.duration_ms)[:limit]
+
+    def breakdown(self, pct: float = 99) -> List[Dict[str, Any]]:
+        """Show per route where the time of its slowest requests goes.
+
+        For each route the request duration percentiles are given, with the
+        mean own time of each span name over the requests at or above the
+        pct percentile and its share of their duration.
+
+        Returns:
+            Routes with their percentiles and tail spans, slowest tail first
+        """
+        routes: Dict[str, List[Trace]] = {}
+        for trace in self.traces():
+            routes.setdefault(trace.root.name, []).append(trace)
+        results = []
+        for name, traces in routes.items():
+            durations = [trace.duration_ms for trace in traces]
+            threshold = percentile(durations, pct)
+            tail = [trace for trace in traces if trace.duration_ms >= threshold]
+            totals: Dict[str, float] = {}
+            for trace in tail:
+                for span_name, ms in self_times(trace).items():
+                    totals[span_name] = totals.get(span_name, 0.0) + ms
+            tail_ms = sum(trace.duration_ms for trace in tail) or 1.0
+            results.append({
+                'name': name,
+                'count': len(traces),
+                'p50_ms': round(percentile(durations, 50), 3),
+                'p95_ms': round(percentile(durations, 95), 3),
+                'p99_ms': round(percentile(durations, 99), 3),
+                'tail_count': len(tail),
+                'tail_spans': [{'name': span_name, 'mean_ms': round(ms / len(tail), 3),
+                                'share': round(ms / tail_ms, 4)}
+                               for span_name, ms in sorted(totals.items(), key=lambda item: -item[1])],
+            })
+        return sorted(results, key=lambda route: -route['p99_ms'])
+
+    def clear(self):
+        with self._lock:
+            self._recent.clear()
+            self._slow.clear()
+
+
+class FileExporter:
+    """Appends each trace as one OTLP/JSON line to a file.
+
+    Lines can be loaded by an OpenTelemetry Collector's otlpjsonfile
+    receiver. Writes are appends of whole lines, so workers can share the
+    file.
+    """
+
+    def __init__(self, path: str = None):
+        """Initialize the exporter.
+
+        Args:
+            path (str): File the traces are appended to
+        """
+        self.path = path or Config.TRACE_FILE
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, trace: Trace):
+        line = json.dumps(trace.to_otlp(), separators=(',', ':')) + '\n'
+        with self._lock, open(self.path, 'a') as f:
+            f.write(line)
+
+
+class Tracer:
+    """Starts traces for requests and hands finished, sampled ones to exporters."""
+
+    def __init__(self, exporters: List[Any] = None, sample_rate: float = None):
+        """Initialize the tracer.
+
+        Args:
+            exporters (list): Objects with an export(trace) method
+            sample_rate (float): Fraction of traces exported, unless an incoming traceparent decides
+        """
+        self.exporters = list(exporters or [])
+        self.sample_rate = Config.TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+
+    def exporter(self, kind: type):
+        """Get the first exporter of a type, None if there is none."""
+        return next((exporter for exporter in self.exporters if isinstance(exporter, kind)), None)
+
+    def start_trace(self, name: str, traceparent: str = None, kind: str = 'SERVER',
+                    attributes: Dict[str, Any] = None) -> Span:
+        """Start the root span of a new trace, continuing a caller's trace if it sent a traceparent.
+
+        The span is not made current; see activate.
+        """
+        match = TRACEPARENT_PATTERN.match((traceparent or '').strip().lower())
+        if match and match.group(1) != '0' * 32:
+            trace = Trace(self, match.group(1), sampled=bool(int(match.group(3), 16) & 1))
+            parent_span_id = match.group(2)
+        else:
+            trace = Trace(self, secrets.token_hex(16), sampled=random.random() < self.sample_rate)
+            parent_span_id = None
+        trace.root = Span(name, trace, parent_span_id, kind, attributes)
+        return trace.root
+
+    def export(self, trace: Trace):
+        if not trace.sampled:
+            return
+        for exporter in self.exporters:
+            try:
+                exporter.export(trace)
+            except Exception as e:
+                logger.error(f'Error exporting trace {trace.trace_id}: {e}')
+
+
+def current_span():
+    """Get the span of the running operation, a non-recording span outside a traced request."""
+    return _current_span.get() or NON_RECORDING_SPAN
+
+
+def activate(span: Span):
+    """Make a span current, returning the token to pass to deactivate."""
+    return _current_span.set(span)
+
+
+def deactivate(token):
+    _current_span.reset(token)
+
+
+@contextmanager
+def span(name: str, kind: str = 'INTERNAL', **attributes) -> Iterator[Any]:
+    """Time a block as a child of the current span.
+
+    Outside a traced request nothing is recorded and a non-recording span
+    is yielded, so instrumented code works the same everywhere. An
+    exception raised in the block marks the span as failed.
+
+    Args:
+        name (str): Span name, e.g. 'session.lookup'
+        kind (str): INTERNAL, or CLIENT for calls to other services
+        **attributes: Attributes set on the span
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield NON_RECORDING_SPAN
+        return
+    child = Span(name, parent.trace, parent.span_id, kind, attributes)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end()
+
+
+def inject(headers: Dict[str, str] = None) -> Dict[str, str]:
+    """Add the current span's traceparent to outgoing request headers."""
+    headers = dict(headers or {})
+    traceparent = current_span().traceparent
+    if traceparent:
+        headers[TRACEPARENT_HEADER] = traceparent
+    return headers
+
+
+class TraceContextFilter(logging.Filter):
+    """Stamp log records with the trace and span ids of the request that logged them.
+
+    Records logged outside a traced request get '-'. The filter must run on
+    the logging thread, as the ids come from its context.
+    """
+
+    def filter(self, record):
+        active = _current_span.get()
+        record.trace_id = active.trace_id if active is not None else '-'
+        record.span_id = active.span_id if active is not None else '-'
+        return True
+
+
+def init_tracing(app: Flask, get_tracer: Callable[[], Tracer]):
+    """Register the hooks tracing each request as a root span on an app.
+
+    Args:
+        app (Flask): The application
+        get_tracer (callable): Get the tracer requests are traced with, used when TRACING is on
+    """
+
+    def start_trace():
+        if not Config.TRACING:
+            return
+        route = request.url_rule.rule if request.url_rule else request.path
+        root = get_tracer().start_trace(f'{request.method} {route}',
+                                        traceparent=request.headers.get(TRACEPARENT_HEADER),
+                                        attributes={'http.method': request.method, 'http.target': request.path})
+        g.trace_span = root
+        g.trace_token = activate(root)
+
+    def finish_trace(response):
+        root = g.get('trace_span')
+        if root is not None:
+            root.set_attribute('http.status_code', response.status_code)
+            if response.status_code >= 500:
+                root.set_status('ERROR')
+            response.headers[TRACE_ID_HEADER] = root.trace_id
+        return response
+
+    def end_trace(exc):
+        # Teardown runs after a streamed response is done, so the root covers the whole stream
+        root = g.pop('trace_span', None)
+        if root is None:
+            return
+        if exc is not None:
+            root.record_exception(exc)
+        root.end()
+        try:
+            deactivate(g.pop('trace_token'))
+        except ValueError:
+            # A streamed response ends in another context than the one it started in
+            _current_span.set(None)
+
+    app.before_request(start_trace)
+    app.after_request(finish_trace)
+    app.teardown_request(end_trace)
@@ -0,0 +1,67 @@
+import argparse
+import logging
+import os
+import sys
+
+
+def grid_option(value):
+    """Parse a --grid name=v1,v2 argument into the option's name and values"""
+    name, _, numbers = value.partition('=')
+    try:
+        values = [int(number) for number in numbers.split(',')]
+    except ValueError:
+        values = None
+    if not name.strip() or not values:
+        raise argparse.ArgumentTypeError(f'expected name=v1,v2 with integer values: {value}')
+    return name.strip(), values
+
+
+def main(argv=None):
+    """Benchmark local Ollama models over a grid of options and save the best to their profiles"""
+    sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+    import requests
+    from config import Config
+    from fetch_manager import FetchManager
+    from model_tuner import ModelTuner, DEFAULT_TOLERANCE, default_grid
+
+    parser = argparse.ArgumentParser(description='Tune Ollama options for each local model')
+    parser.add_argument('-m', dest='models', action='append',
+                        help='Only tune this model (repeatable)')
+    parser.add_argument('--grid', action='append', type=grid_option, metavar='NAME=V1,V2',
+                        help='Option values to try, replacing the default values of that option')
+    parser.add_argument('--results', default=Config.TUNING_RESULTS_FILE,
+                        help='Results file the run resumes from')
+    parser.add_argument('--profiles', default=Config.GENERATION_PROFILES_FILE,
+                        help='Generation profiles file to write the best options to')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='Decode speed that may be given up for a larger num_ctx (default: 0.1)')
+    parser.add_argument('--force', action='store_true',
+                        help='Run combinations that already have results again')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Report the best options without writing the profiles file')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s    %(message)s')
+
+    grid = {**default_grid(), **dict(args.grid or [])}
+    tuner = ModelTuner(FetchManager(Config.OLLAMA_HOST), results_file=args.results,
+                       profiles_file=args.profiles, grid=grid, tolerance=args.tolerance)
+    try:
+        best = tuner.run(args.models, force=args.force, write=not args.dry_run)
+    except (ConnectionError, requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+        print(f'Ollama stopped answering, run again to resume: {e}')
+        return False
+
+    for name, trial in best.items():
+        if trial is None:
+            print(f'{name:<30} every combination failed')
+            continue
+        options = ' '.join(f'{option}={value}' for option, value in sorted(trial['options'].items()))
+        print(f"{name:<30} {options:<45} prompt {trial['prompt_tps']:>8.1f} tok/s  "
+              f"decode {trial['decode_tps']:>7.1f} tok/s  load {trial['load_seconds']:>6.2f}s")
+    return all(trial is not None for trial in best.values())
+
+
+if __name__ == '__main__':
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,483 @@
+import os
+import re
+import json
+import shutil
+import logging
+import threading
+import contextlib
+import numpy as np
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+META_FILE = 'meta.json'
+CENTROIDS_FILE = 'centroids.npy'
+
+# Raw files appended one row per vector: (dtype, row has dim columns).
+# Vectors use the index's dtype, float32 or the half-size float16.
+ARRAYS = {
+    'vectors': (np.float32, True),
+    'ids': (np.int64, False),
+    'lists': (np.int32, False),
+    'codes': (np.int8, True),
+    'scales': (np.float32, False),
+}
+
+# Arrays only kept in IVF mode
+IVF_ARRAYS = ('lists', 'codes', 'scales')
+
+VECTOR_DTYPES = ('float32', 'float16')
+
+# Bytes of float32 vectors scored per matrix product, bounding memory for large indexes
+SEARCH_CHUNK_BYTES = 32 * 1024 * 1024
+
+# IVF candidates re-scored with exact vectors, per requested result
+RERANK_FACTOR = 4
+
+# k-means training: iterations and training vectors per list
+KMEANS_ITERATIONS = 20
+KMEANS_SAMPLES_PER_LIST = 256
+
+COLLECTION_NAME = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+
+
+def normalize(vectors) -> np.ndarray:
+    """Scale vectors to unit length, so dot products are cosine similarities."""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Quantize unit vectors to int8 codes with one scale per vector."""
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def chunk_rows(dim: int) -> int:
+    """Rows of a dim-dimensional array scored per matrix product."""
+    return max(1024, SEARCH_CHUNK_BYTES // (4 * dim))
+
+
+def nearest(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Index of the most similar centroid for each vector."""
+    lists = np.empty(len(vectors), dtype=np.int32)
+    step = chunk_rows(centroids.shape[1])
+    for start in range(0, len(vectors), step):
+        chunk = np.asarray(vectors[start:start + step], dtype=np.float32)
+        lists[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return lists
+
+
+def kmeans(vectors: np.ndarray, k: int, iterations: int = KMEANS_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """Spherical k-means: centroids are unit vectors, as the index uses cosine similarity."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        lists = nearest(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, lists, vectors)
+        counts = np.bincount(lists, minlength=k)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty]
+        # Restart empty lists from random vectors
+        centroids[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = normalize(centroids)
+    return centroids
+
+
+def top_k(scores: np.ndarray, positions: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Best k scores of each row, highest first, with their positions."""
+    if scores.shape[1] > k:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, part, axis=1)
+        positions = np.take_along_axis(positions, part, axis=1)
+    order = np.argsort(-scores, axis=1, kind='stable')
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(positions, order, axis=1)
+
+
+class VectorIndex:
+    """Cosine similarity index over vectors, stored on disk and memory-mapped.
+
+    Vectors and their ids are appended to raw files, so the index can grow
+    past memory and is shared by worker processes through the page cache.
+    meta.json holds the row count and is replaced atomically after each
+    append, so readers never see a partial row.
+
+    Vectors are stored as float32, or as float16 to halve the file size;
+    they are converted back to float32 a chunk at a time while scoring.
+
+    The index is searched exactly by default. After ``train`` it also keeps
+    an inverted file (IVF) of k-means lists with int8 codes: a search then
+    scores the codes of the closest lists only and re-ranks the best with
+    the exact vectors.
+    """
+
+    def __init__(self, path: str, store=None, dtype: str = 'float32'):
+        """Open or create an index.
+
+        Args:
+            path (str): Directory holding the index files
+            store (StateStore): Optional shared store, so one worker writes at a time
+            dtype (str): Storage type of the vectors of a new index, float32 or float16
+        """
+        if dtype not in VECTOR_DTYPES:
+            raise ValueError(f'Unsupported vector dtype {dtype}, expected one of {VECTOR_DTYPES}')
+        self.path = path
+        self.name = os.path.basename(os.path.normpath(path))
+        self.store = store
+        self._lock = threading.RLock()
+        self._meta = {'dim': None, 'model': None, 'count': 0, 'lists': 0, 'dtype': dtype, 'version': 0}
+        self._meta_mtime = None
+        self._maps = {}
+        self._centroids = None
+        self._inverted = None
+        os.makedirs(path, exist_ok=True)
+        self._refresh()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _refresh(self):
+        """Reload meta.json when another worker changed the index."""
+        try:
+            mtime = os.stat(self._file(META_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._meta_mtime:
+            return
+        with self._lock:
+            with open(self._file(META_FILE), 'r') as f:
+                meta = json.load(f)
+            if meta.get('version') != self._meta.get('version'):
+                self._maps = {}
+                self._inverted = None
+                self._centroids = np.load(self._file(CENTROIDS_FILE)) if meta.get('lists') else None
+            self._meta = meta
+            self._meta_mtime = mtime
+
+    def _write_meta(self, **changes):
+        meta = dict(self._meta, **changes)
+        meta['version'] = meta.get('version', 0) + 1
+        tmp_file = self._file(f'{META_FILE}.{os.getpid()}.tmp')
+        with open(tmp_file, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_file, self._file(META_FILE))
+        self._meta = meta
+        self._meta_mtime = os.stat(self._file(META_FILE)).st_mtime_ns
+        self._maps = {}
+        self._inverted = None
+
+    def _write_lock(self):
+        if self.store is None:
+            return contextlib.nullcontext()
+        return self.store.lock(f'vectors:{self.name}', timeout=60)
+
+    def _shape(self, name: str, count: int):
+        dtype, has_dim = ARRAYS[name]
+        if name == 'vectors':
+            dtype = np.dtype(self._meta.get('dtype', 'float32'))
+        return dtype, (count, self._meta['dim']) if has_dim else (count,)
+
+    def _array(self, name: str) -> np.ndarray:
+        """Memory-map the first count rows of an array file."""
+        array = self._maps.get(name)
+        if array is None:
+            dtype, shape = self._shape(name, self._meta['count'])
+            if shape[0] == 0:
+                array = np.empty(shape, dtype=dtype)
+            else:
+                array = np.memmap(self._file(f'{name}.bin'), dtype=dtype, mode='r', shape=shape)
+            self._maps[name] = array
+        return array
+
+    def _append(self, name: str, rows: np.ndarray):
+        dtype, shape = self._shape(name, self._meta['count'])
+        with open(self._file(f'{name}.bin'), 'ab') as f:
+            # Drop rows past the count, left by a writer that stopped before updating meta.json
+            f.truncate(int(np.prod(shape)) * np.dtype(dtype).itemsize)
+            f.write(np.ascontiguousarray(rows, dtype=dtype).tobytes())
+
+    def _rewrite(self, name: str, rows: np.ndarray):
+        tmp_file = self._file(f'{name}.bin.{os.getpid()}.tmp')
+        np.ascontiguousarray(rows, dtype=self._shape(name, 0)[0]).tofile(tmp_file)
+        os.replace(tmp_file, self._file(f'{name}.bin'))
+
+    @property
+    def count(self) -> int:
+        self._refresh()
+        return self._meta['count']
+
+    @property
+    def dim(self) -> Optional[int]:
+        self._refresh()
+        return self._meta['dim']
+
+    @property
+    def model(self) -> Optional[str]:
+        self._refresh()
+        return self._meta['model']
+
+    @property
+    def lists(self) -> int:
+        self._refresh()
+        return self._meta['lists']
+
+    def info(self) -> Dict[str, Any]:
+        """Get the index size, model and mode."""
+        self._refresh()
+        return {key: self._meta.get(key) for key in ('count', 'dim', 'model', 'lists', 'dtype')}
+
+    def max_id(self) -> int:
+        """Get the largest id in the index, 0 when empty."""
+        self._refresh()
+        ids = self._array('ids')
+        return int(ids.max()) if len(ids) else 0
+
+    def vector(self, id: int) -> Optional[np.ndarray]:
+        """Get the stored vector of an id, None if it is not in the index."""
+        self._refresh()
+        positions = np.flatnonzero(self._array('ids') == id)
+        if len(positions) == 0:
+            return None
+        return np.asarray(self._array('vectors')[positions[0]], dtype=np.float32)
+
+    def add(self, ids: Optional[Sequence[int]], vectors, model: str = None) -> List[int]:
+        """Add vectors under integer ids; ids already in the index are skipped.
+
+        Args:
+            ids (Sequence[int]): One id per vector, None to number them after the largest id
+            vectors: Array-like of shape (n, dim)
+            model (str): Model that produced the vectors, checked against the index
+
+        Returns:
+            The ids of the vectors added
+
+        Raises:
+            ValueError: If the vectors do not match the index's dimension or model
+        """
+        vectors = normalize(vectors)
+        if ids is not None and len(ids) != len(vectors):
+            raise ValueError(f'Got {len(ids)} ids for {len(vectors)} vectors')
+        if len(vectors) == 0:
+            return []
+        with self._lock, self._write_lock():
+            self._refresh()
+            if ids is None:
+                start = self.max_id() + 1
+                ids = np.arange(start, start + len(vectors))
+            ids = np.asarray(ids, dtype=np.int64)
+            dim, indexed_model = self._meta['dim'], self._meta['model']
+            if dim is not None and vectors.shape[1] != dim:
+                raise ValueError(f'Index {self.name} has {dim} dimensions, got {vectors.shape[1]}')
+            if model and indexed_model and model != indexed_model:
+                raise ValueError(f'Index {self.name} holds embeddings from {indexed_model}, not {model}')
+            self._meta['dim'] = vectors.shape[1]
+
+            _, first = np.unique(ids, return_index=True)
+            keep = np.zeros(len(ids), dtype=bool)
+            keep[first] = True
+            keep &= ~np.isin(ids, self._array('ids'))
+            ids, vectors = ids[keep], vectors[keep]
+            if len(ids) == 0:
+                return []
+
+            self._append('vectors', vectors)
+            self._append('ids', ids)
+            if self._meta['lists']:
+                codes, scales = quantize(vectors)
+                self._append('lists', nearest(vectors, self._centroids))
+                self._append('codes', codes)
+                self._append('scales', scales)
+            self._write_meta(count=self._meta['count'] + len(ids), model=indexed_model or model)
+        return ids.tolist()
+
+    def train(self, lists: int) -> int:
+        """Build the IVF lists and int8 codes, or go back to exact search with lists=0.
+
+        Args:
+            lists (int): Number of k-means lists, usually about sqrt(count)
+
+        Returns:
+            Number of lists
+        """
+        with self._lock, self._write_lock():
+            self._refresh()
+            count = self._meta['count']
+            if lists <= 0:
+                for name in IVF_ARRAYS:
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(self._file(f'{name}.bin'))
+                self._centroids = None
+                self._write_meta(lists=0)
+                return 0
+            if count < lists:
+                raise ValueError(f'Index {self.name} has {count} vectors, fewer than {lists} lists')
+
+            vectors = self._array('vectors')
+            samples = min(count, lists * KMEANS_SAMPLES_PER_LIST)
+            rng = np.random.default_rng(0)
+            sample = np.asarray(vectors[np.sort(rng.choice(count, samples, replace=False))], dtype=np.float32)
+            centroids = kmeans(sample, lists)
+
+            self._rewrite('lists', nearest(vectors, centroids))
+            codes = np.empty((count, self._meta['dim']), dtype=np.int8)
+            scales = np.empty(count, dtype=np.float32)
+            step = chunk_rows(self._meta['dim'])
+            for start in range(0, count, step):
+                codes[start:start + step], scales[start:start + step] = \
+                    quantize(np.asarray(vectors[start:start + step], dtype=np.float32))
+            self._rewrite('codes', codes)
+            self._rewrite('scales', scales)
+            np.save(self._file(CENTROIDS_FILE), centroids)
+            self._centroids = centroids
+            self._write_meta(lists=lists)
+        logger.info(f'Trained index {self.name}: {count} vectors in {lists} lists')
+        return lists
+
+    def search(self, queries, k: int = 10, probes: int = None) -> List[List[Tuple[int, float]]]:
+        """Find the most similar vectors for each query.
+
+        Args:
+            queries: One query vector or an array of shape (n, dim)
+            k (int): Results per query
+            probes (int): IVF lists searched per query, more is slower and more exact
+
+        Returns:
+            For each query, up to k (id, similarity) pairs, most similar first
+        """
+        self._refresh()
+        queries = normalize(queries)
+        if self._meta['count'] == 0 or k <= 0:
+            return [[] for _ in queries]
+        if queries.shape[1] != self._meta['dim']:
+            raise ValueError(f"Index {self.name} has {self._meta['dim']} dimensions, got {queries.shape[1]}")
+        if self._meta['lists']:
+            scores, positions = self._search_ivf(queries, k, probes or Config.VECTOR_IVF_PROBES)
+        else:
+            scores, positions = self._search_flat(queries, k)
+        ids = self._array('ids')
+        return [[(int(ids[p]), float(s)) for s, p in zip(row_scores, row_positions) if p >= 0]
+                for row_scores, row_positions in zip(scores, positions)]
+
+    def _search_flat(self, queries: np.ndarray, k: int):
+        """Score every vector, one matrix product per chunk for all queries."""
+        vectors = self._array('vectors')
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        best_positions = np.empty((len(queries), 0), dtype=np.int64)
+        step = chunk_rows(self._meta['dim'])
+        for start in range(0, len(vectors), step):
+            chunk = np.asarray(vectors[start:start + step], dtype=np.float32)
+            scores = queries @ chunk.T
+            positions = np.broadcast_to(np.arange(start, start + len(chunk)), scores.shape)
+            best_scores, best_positions = top_k(np.hstack([best_scores, scores]),
+                                                np.hstack([best_positions, positions]), k)
+        return best_scores, best_positions
+
+    def _inverted_lists(self):
+        """Positions of the vectors in each list, computed once per index version."""
+        if self._inverted is None:
+            lists = np.asarray(self._array('lists'))
+            order = np.argsort(lists, kind='stable')
+            bounds = np.searchsorted(lists[order], np.arange(self._meta['lists'] + 1))
+            self._inverted = (order, bounds)
+        return self._inverted
+
+    def _search_ivf(self, queries: np.ndarray, k: int, probes: int):
+        """Score int8 codes in each query's closest lists, then re-rank exactly."""
+        order, bounds = self._inverted_lists()
+        codes, scales, vectors = self._array('codes'), self._array('scales'), self._array('vectors')
+        probes = min(probes, self._meta['lists'])
+        probed = np.argpartition(-(queries @ self._centroids.T), probes - 1, axis=1)[:, :probes]
+
+        candidates = [[] for _ in queries]
+        for list_id in np.unique(probed):
+            positions = order[bounds[list_id]:bounds[list_id + 1]]
+            if len(positions) == 0:
+                continue
+            # All queries probing this list are scored in one product
+            rows = np.flatnonzero((probed == list_id).any(axis=1))
+            scores = (queries[rows] @ codes[positions].T.astype(np.float32)) * scales[positions]
+            for row, row_scores in zip(rows, scores):
+                candidates[row].append((row_scores, positions))
+
+        rerank = k * RERANK_FACTOR
+        best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        best_positions = np.full((len(queries), k), -1, dtype=np.int64)
+        for row, parts in enumerate(candidates):
+            if not parts:
+                continue
+            scores = np.concatenate([p[0] for p in parts])[None, :]
+            positions = np.concatenate([p[1] for p in parts])[None, :]
+            _, positions = top_k(scores, positions, rerank)
+            positions = np.sort(positions[0])
+            exact = (np.asarray(vectors[positions], dtype=np.float32) @ queries[row])[None, :]
+            scores, positions = top_k(exact, positions[None, :], k)
+            best_scores[row, :scores.shape[1]] = scores[0]
+            best_positions[row, :positions.shape[1]] = positions[0]
+        return best_scores, best_positions
+
+    def clear(self):
+        """Remove every vector and the IVF lists."""
+        with self._lock, self._write_lock():
+            for name in ARRAYS:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(self._file(f'{name}.bin'))
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self._file(CENTROIDS_FILE))
+            self._centroids = None
+            self._write_meta(dim=None, model=None, count=0, lists=0)
+
+
+class VectorCollections:
+    """Named vector indexes in subdirectories of one directory."""
+
+    def __init__(self, root: str = None, store=None):
+        """Initialize the collections.
+
+        Args:
+            root (str): Directory holding one subdirectory per collection
+            store (StateStore): Optional shared store passed to each index
+        """
+        self.root = root or Config.VECTOR_INDEX_DIR
+        self.store = store
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str, dtype: str = 'float32') -> VectorIndex:
+        """Open a collection, creating it on first use.
+
+        Args:
+            name (str): Collection name
+            dtype (str): Storage type of the vectors if the collection is new
+
+        Raises:
+            ValueError: If the name is not a simple file name
+        """
+        if not COLLECTION_NAME.match(name or '') or name in ('.', '..'):
+            raise ValueError(f'Invalid collection name: {name!r}')
+        with self._lock:
+            index = self._indexes.get(name)
+            if index is None:
+                index = VectorIndex(os.path.join(self.root, name), store=self.store, dtype=dtype)
+                self._indexes[name] = index
+            return index
+
+    def names(self) -> List[str]:
+        """Get the names of existing collections."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.exists(os.path.join(self.root, name, META_FILE)))
+
+    def drop(self, name: str):
+        """Delete a collection and its files."""
+        index = self.get(name)
+        index.clear()
+        with self._lock:
+            self._indexes.pop(name, None)
+        shutil.rmtree(index.path, ignore_errors=True)